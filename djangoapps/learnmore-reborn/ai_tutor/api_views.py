@@ -1,5 +1,8 @@
+import os
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from .models import TutorSession, TutorMessage, TutorKnowledgeBase, TutorFeedback, TutorConfiguration
 from .serializers import (
@@ -12,10 +15,14 @@ from .serializers import (
     TutorFeedbackSerializer,
     TutorConfigurationSerializer
 )
+from .pagination import TutorSessionCursorPagination
+from .response_cache import response_cache
+from .streaming import EventStreamRenderer, streaming_reply_response
 
 class TutorSessionViewSet(viewsets.ModelViewSet):
     queryset = TutorSession.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TutorSessionCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -26,7 +33,11 @@ class TutorSessionViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        return TutorSession.objects.filter(user=user).order_by('-updated_at')
+        queryset = TutorSession.objects.filter(user=user).order_by('-updated_at')
+        if self.action == 'list':
+            # Counts and last-message previews in the same query as the sessions
+            queryset = queryset.with_activity()
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -72,6 +83,35 @@ class TutorSessionViewSet(viewsets.ModelViewSet):
             return Response(response_data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def stream_message(self, request, pk=None):
+        """
+        Send a new message in the tutor session and stream the AI tutor's response
+        as Server-Sent Events (``user_message``, ``token``..., ``done``).
+        """
+        session = self.get_object()
+        serializer = TutorMessageCreateSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            # Save the user message; the tutor response is saved when the stream completes
+            user_message = serializer.save(
+                session=session,
+                message_type='user'
+            )
+            return streaming_reply_response(
+                session, user_message, lambda message: TutorMessageSerializer(message).data
+            )
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], url_path='response-cache', permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Counters of the semantic response cache. The cache is per process, so
+        the figures are those of the worker (``pid``) that served the request.
+        """
+        return Response({**response_cache.stats(), "pid": os.getpid()})
 
 class TutorMessageViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TutorMessageSerializer
@@ -0,0 +1,183 @@
+"""
+Persistent store of knowledge base chunk embeddings.
+
+Every vector store rebuild used to send every knowledge base chunk to the
+embedding provider again, although the chunks had not changed. Chunk
+embeddings are now kept in ``KnowledgeChunkEmbedding`` rows as raw
+little-endian float32 bytes (4 bytes per dimension, against roughly 20 for a
+JSON list), keyed by the SHA-256 of the chunk text and the embedding model
+id. ``StoredEmbeddings`` wraps the provider: chunks already stored for the
+model are read from the database and only new text is embedded. Rebuilding
+or migrating a vector store (say from Chroma to the NumPy index) is then
+purely local I/O; with ``stored_only()`` any chunk that would need the
+provider raises ``MissingEmbeddings`` instead.
+
+Recent query vectors are kept in memory too: a student's question is embedded
+once for the semantic response cache and reused when the retriever asks for it.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .models import KnowledgeChunkEmbedding
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DTYPE = np.dtype('<f4')
+# Hashes per IN (...) lookup, below SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 500
+QUERY_CACHE_SIZE = 256
+
+
+class MissingEmbeddings(Exception):
+    """Raised in stored-only mode when a chunk has no stored embedding."""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def vector_to_bytes(vector) -> bytes:
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def bytes_to_vector(data) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype=VECTOR_DTYPE)
+
+
+def embedding_model_id(embeddings: Embeddings) -> str:
+    """
+    Identify the model behind ``embeddings``, so vectors from different models never mix.
+
+    Uses a ``model_id`` attribute when the wrapper has one, otherwise the
+    class, model name, output dimension and API base URL (a stub server
+    returns different vectors from the real API for the same model name).
+    """
+    explicit = getattr(embeddings, 'model_id', None)
+    if explicit:
+        return str(explicit)
+    parts = [type(embeddings).__name__]
+    for attribute in ('model', 'model_name', 'dimensions', 'dimension', 'size', 'openai_api_base', 'base_url'):
+        value = getattr(embeddings, attribute, None)
+        if value:
+            parts.append(str(value))
+    return ":".join(parts)[:255]
+
+
+class StoredEmbeddings(Embeddings):
+    """Embeddings wrapper that persists document vectors by content hash and model."""
+
+    def __init__(self, embedding_function: Embeddings, model_id: Optional[str] = None):
+        self.embedding_function = embedding_function
+        self.model_id = model_id or embedding_model_id(embedding_function)
+        self.stored_hits = 0
+        self.provider_calls = 0
+        self._local = threading.local()
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    @contextmanager
+    def stored_only(self):
+        """Within the block (in this thread), never call the provider for documents."""
+        previous = getattr(self._local, 'stored_only', False)
+        self._local.stored_only = True
+        try:
+            yield self
+        finally:
+            self._local.stored_only = previous
+
+    def load(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """Stored vectors for the given content hashes (missing hashes are left out)."""
+        hashes = list(dict.fromkeys(hashes))
+        vectors: Dict[str, List[float]] = {}
+        for offset in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            rows = KnowledgeChunkEmbedding.objects.filter(
+                model_id=self.model_id, content_hash__in=hashes[offset:offset + LOOKUP_BATCH_SIZE]
+            ).values_list('content_hash', 'vector')
+            for digest, data in rows:
+                vectors[digest] = bytes_to_vector(data).tolist()
+        return vectors
+
+    def count_missing(self, texts: Iterable[str]) -> int:
+        """Number of distinct texts with no stored embedding for this model."""
+        hashes = {content_hash(text) for text in texts}
+        return len(hashes) - len(self.load(hashes))
+
+    def save(self, vectors: Dict[str, List[float]]) -> None:
+        KnowledgeChunkEmbedding.objects.bulk_create(
+            [
+                KnowledgeChunkEmbedding(
+                    content_hash=digest, model_id=self.model_id,
+                    dimension=len(vector), vector=vector_to_bytes(vector),
+                )
+                for digest, vector in vectors.items()
+            ],
+            batch_size=LOOKUP_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        vectors = self.load(hashes)
+        self.stored_hits += sum(1 for digest in hashes if digest in vectors)
+
+        missing = {digest: text for digest, text in zip(hashes, texts) if digest not in vectors}
+        if missing:
+            if getattr(self._local, 'stored_only', False):
+                raise MissingEmbeddings(
+                    f"{len(missing)} chunk(s) have no stored embedding for model {self.model_id}"
+                )
+            new_vectors = self.embedding_function.embed_documents(list(missing.values()))
+            self.provider_calls += 1
+            fresh = dict(zip(missing.keys(), new_vectors))
+            try:
+                self.save(fresh)
+            except Exception as e:
+                logger.error(f"Error storing chunk embeddings: {str(e)}")
+            vectors.update(fresh)
+        return [vectors[digest] for digest in hashes]
+
+    def _recall_query(self, text: str) -> Optional[List[float]]:
+        with self._queries_lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+            return vector
+
+    def _remember_query(self, text: str, vector: List[float]) -> List[float]:
+        with self._queries_lock:
+            self._queries[text] = vector
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._recall_query(text)
+        if vector is None:
+            vector = self._remember_query(text, self.embedding_function.embed_query(text))
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._recall_query(text)
+        if vector is None:
+            vector = self._remember_query(text, await self.embedding_function.aembed_query(text))
+        return vector
+
+    def prune(self, keep_texts: Iterable[str]) -> int:
+        """Delete this model's stored vectors for chunks no longer in ``keep_texts``."""
+        keep = {content_hash(text) for text in keep_texts}
+        stale = [
+            pk for pk, digest in
+            KnowledgeChunkEmbedding.objects.filter(model_id=self.model_id).values_list('pk', 'content_hash')
+            if digest not in keep
+        ]
+        for offset in range(0, len(stale), LOOKUP_BATCH_SIZE):
+            KnowledgeChunkEmbedding.objects.filter(pk__in=stale[offset:offset + LOOKUP_BATCH_SIZE]).delete()
+        return len(stale)
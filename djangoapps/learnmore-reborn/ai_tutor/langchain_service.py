@@ -3,21 +3,32 @@ LangChain service implementation for the AI Tutor system.
 This file contains the core LangChain integration for working with LLMs and vector stores.
 """
 
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
 import logging
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from langchain_community.llms import OpenAI
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_chroma import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
 from langchain_community.docstore.document import Document
-from langchain_core.callbacks.manager import CallbackManager
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 
+from .chunking import ContentChunker
+from .conversation import ConversationWindow, fit_to_budget, summarize_turns
+from .embedding_store import StoredEmbeddings
+from .lexical_index import HybridRetriever, record_added
+from .response_cache import response_cache, source_fingerprint
+from .vector_index import NumpyVectorIndex, NumpyVectorStore
 from .models import TutorSession, TutorMessage, TutorKnowledgeBase, TutorConfiguration
 
 logger = logging.getLogger(__name__)
@@ -25,12 +36,39 @@ logger = logging.getLogger(__name__)
 # Default paths for vector store
 VECTOR_STORE_PATH = os.path.join(settings.BASE_DIR, 'ai_tutor', 'vector_store')
 os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+# Kept outside VECTOR_STORE_PATH, whose non-empty listing means a Chroma store exists
+NUMPY_INDEX_PATH = os.path.join(settings.BASE_DIR, 'ai_tutor', 'numpy_index', 'vector_store')
+
+# Compiled chains are shared by sessions with the same system prompt
+CHAIN_CACHE_SIZE = 64
+PROMPT_CACHE_SIZE = 1024
+SUMMARY_KEY = 'history_summary'
 
 # Default system prompt
 DEFAULT_SYSTEM_PROMPT = """You are an AI tutor for {course_title}. Your goal is to help the student understand concepts, 
 answer their questions, and guide their learning. Use the provided context to give accurate, helpful responses. 
 If you don't know something, admit it rather than making up information. Aim to be educational rather than just providing answers."""
 
+class TokenQueueCallbackHandler(BaseCallbackHandler):
+    """Callback handler that hands LLM tokens to another thread through a queue."""
+    
+    def __init__(self, token_queue: "queue.Queue[Optional[str]]"):
+        self.token_queue = token_queue
+    
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.token_queue.put(token)
+
+class AsyncTokenQueueCallbackHandler(AsyncCallbackHandler):
+    """Async counterpart of TokenQueueCallbackHandler for chains run with ``ainvoke``."""
+    
+    def __init__(self, token_queue: "asyncio.Queue[Optional[str]]"):
+        self.token_queue = token_queue
+    
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.token_queue.put_nowait(token)
+
 class TutorLangChainService:
     """Service for handling LangChain integration with the AI Tutor system."""
     
@@ -44,7 +82,22 @@ class TutorLangChainService:
             raise ValueError("Invalid OPENAI_API_KEY (or override).")
         self.embeddings = None
         self.llm = None
+        self.condense_llm = None
         self.vector_store = None
+        self.vector_backend = getattr(settings, 'AI_TUTOR_VECTOR_BACKEND', 'chroma')
+        self.chunker = ContentChunker(
+            max_tokens=getattr(settings, 'AI_TUTOR_CHUNK_MAX_TOKENS', 350),
+            overlap_tokens=getattr(settings, 'AI_TUTOR_CHUNK_OVERLAP_TOKENS', 40),
+        )
+        self.history_max_messages = getattr(settings, 'AI_TUTOR_HISTORY_MAX_MESSAGES', 10)
+        self.history_token_budget = getattr(settings, 'AI_TUTOR_HISTORY_TOKEN_BUDGET', 1500)
+        self.summary_token_budget = getattr(settings, 'AI_TUTOR_SUMMARY_TOKEN_BUDGET', 300)
+        self.summary_batch = getattr(settings, 'AI_TUTOR_SUMMARY_BATCH', 6)
+        self.config_cache_seconds = getattr(settings, 'AI_TUTOR_CONFIG_CACHE_SECONDS', 60)
+        self._cache_lock = threading.Lock()
+        self._config_cache = None
+        self._prompts: "OrderedDict[tuple, str]" = OrderedDict()
+        self._chains: "OrderedDict[tuple, ConversationalRetrievalChain]" = OrderedDict()
         self.initialize_components()
     
     def initialize_components(self):
@@ -54,22 +107,45 @@ class TutorLangChainService:
                 logger.warning("No OpenAI API key found. Using placeholder responses.")
                 return
             
-            # Initialize embeddings
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=self.api_key
-            )
+            # An OpenAI-compatible endpoint other than api.openai.com, e.g. the
+            # stub server started by `manage.py run_stub_llm` for offline benchmarks
+            base_url = getattr(settings, 'AI_TUTOR_OPENAI_BASE_URL', None) or None
+            
+            # Initialize embeddings; chunk vectors are stored so rebuilds do not re-embed
+            self.embeddings = StoredEmbeddings(OpenAIEmbeddings(
+                openai_api_key=self.api_key,
+                openai_api_base=base_url,
+                # Token-length checks download tiktoken data from openai.com
+                check_embedding_ctx_length=base_url is None,
+            ))
             
-            # Initialize LLM
+            # Initialize LLM; answers stream token by token to any callbacks passed per call
             self.llm = ChatOpenAI(
                 openai_api_key=self.api_key,
+                openai_api_base=base_url,
                 temperature=0.7,
                 model_name="gpt-3.5-turbo",
                 verbose=True,
-                callback_manager=CallbackManager([StreamingStdOutCallbackHandler()]),
+                streaming=True,
+            )
+            
+            # Follow-up questions are condensed by a separate, non-streaming LLM so that
+            # only tokens of the answer itself reach the student
+            self.condense_llm = ChatOpenAI(
+                openai_api_key=self.api_key,
+                openai_api_base=base_url,
+                temperature=0,
+                model_name="gpt-3.5-turbo",
             )
             
             # Initialize vector store if it exists
-            if os.path.exists(VECTOR_STORE_PATH) and os.listdir(VECTOR_STORE_PATH):
+            if self.vector_backend == 'numpy':
+                if NumpyVectorIndex.exists(NUMPY_INDEX_PATH):
+                    self.vector_store = NumpyVectorStore(NUMPY_INDEX_PATH, self.embeddings)
+                    logger.info(f"Loaded existing vector index from {NUMPY_INDEX_PATH}")
+                else:
+                    logger.info("No existing vector index found. It will be created when documents are added.")
+            elif os.path.exists(VECTOR_STORE_PATH) and os.listdir(VECTOR_STORE_PATH):
                 self.vector_store = Chroma(
                     persist_directory=VECTOR_STORE_PATH,
                     embedding_function=self.embeddings
@@ -89,14 +165,24 @@ class TutorLangChainService:
                 return False
             
             # Create vector store
+            if self.vector_backend == 'numpy':
+                self.vector_store = NumpyVectorStore.from_documents(
+                    documents=documents,
+                    embedding=self.embeddings,
+                    persist_directory=NUMPY_INDEX_PATH
+                )
+                logger.info(f"Created vector index at {NUMPY_INDEX_PATH}")
+                return True
+            
             self.vector_store = Chroma.from_documents(
                 documents=documents,
                 embedding=self.embeddings,
                 persist_directory=VECTOR_STORE_PATH
             )
             
-            # Persist the vector store
-            self.vector_store.persist()
+            # Chroma 0.4+ persists on write and langchain_chroma has no persist()
+            if hasattr(self.vector_store, 'persist'):
+                self.vector_store.persist()
             logger.info(f"Created and persisted vector store at {VECTOR_STORE_PATH}")
             return True
             
@@ -115,8 +201,10 @@ class TutorLangChainService:
                 return self.create_vector_store(documents)
             
             # Add documents to existing store
-            self.vector_store.add_documents(documents)
-            self.vector_store.persist()
+            ids = self.vector_store.add_documents(documents)
+            record_added(self.vector_store, ids, documents)
+            if hasattr(self.vector_store, 'persist'):
+                self.vector_store.persist()
             logger.info(f"Added {len(documents)} documents to vector store")
             return True
             
@@ -137,48 +225,153 @@ class TutorLangChainService:
         return context
     
     def get_conversation_history(self, session: TutorSession, max_messages: int = 10) -> List[Dict[str, str]]:
-        """Get the conversation history for a tutor session."""
-        messages = TutorMessage.objects.filter(session=session).order_by('created_at')
+        """Get the last ``max_messages`` user and tutor messages of a session, oldest first."""
+        return self._history_from_messages(self._recent_messages(session, max_messages))
+    
+    async def aget_conversation_history(self, session: TutorSession, max_messages: int = 10) -> List[Dict[str, str]]:
+        """Async get_conversation_history."""
+        messages = [msg async for msg in self._recent_messages_query(session, max_messages)]
+        return self._history_from_messages(reversed(messages))
+    
+    def get_conversation_window(self, session: TutorSession) -> ConversationWindow:
+        """
+        Get the turns sent to the LLM: the most recent messages that fit the
+        history token budget, plus the running summary of older turns.
+        """
+        history = self.get_conversation_history(session, self.history_max_messages)
+        return self._window_from_history(session, history)
+    
+    async def aget_conversation_window(self, session: TutorSession) -> ConversationWindow:
+        """Async get_conversation_window."""
+        history = await self.aget_conversation_history(session, self.history_max_messages)
+        return self._window_from_history(session, history)
+    
+    @staticmethod
+    def _recent_messages_query(session: TutorSession, max_messages: int):
+        # Newest first, so that only the window is read however long the session is
+        messages = TutorMessage.objects.filter(
+            session=session, message_type__in=('user', 'tutor')
+        ).order_by('-created_at', '-id')
+        return messages[:max_messages] if max_messages > 0 else messages
+    
+    def _recent_messages(self, session: TutorSession, max_messages: int) -> List[TutorMessage]:
+        return list(reversed(self._recent_messages_query(session, max_messages)))
+    
+    @staticmethod
+    def _history_from_messages(messages) -> List[Dict[str, str]]:
+        # Convert to format expected by LangChain
+        return [
+            {"role": "human" if msg.message_type == 'user' else "ai", "content": msg.content, "id": msg.id}
+            for msg in messages
+        ]
+    
+    def _window_from_history(self, session: TutorSession, history: List[Dict[str, str]]) -> ConversationWindow:
+        turns, token_count = fit_to_budget(history, self.history_token_budget)
+        summary = (session.session_context or {}).get(SUMMARY_KEY, {}).get("text", "")
+        return ConversationWindow(turns=turns, summary=summary, token_count=token_count)
+    
+    def update_conversation_summary(self, session: TutorSession) -> bool:
+        """
+        Fold turns that have left the conversation window into the session's running summary.
         
-        # Convert to format expected by LangChain (system messages are excluded)
-        history = []
-        for msg in messages:
-            if msg.message_type == 'user':
-                history.append({"role": "human", "content": msg.content})
-            elif msg.message_type == 'tutor':
-                history.append({"role": "ai", "content": msg.content})
+        Runs only once at least ``AI_TUTOR_SUMMARY_BATCH`` turns are waiting, so
+        the summarising LLM call is made every few turns rather than every turn.
+        Returns True if the summary was updated.
+        """
+        try:
+            window = self.get_conversation_window(session)
+            if not window.turns:
+                return False
+            state = (session.session_context or {}).get(SUMMARY_KEY, {})
+            pending = list(
+                TutorMessage.objects.filter(
+                    session=session,
+                    message_type__in=('user', 'tutor'),
+                    id__gt=state.get("until_id", 0),
+                    id__lt=window.turns[0]["id"],
+                ).order_by('id')[:self.summary_batch * 4]
+            )
+            if len(pending) < self.summary_batch:
+                return False
+            
+            summary = summarize_turns(
+                self.condense_llm, state.get("text", ""), self._history_from_messages(pending),
+                self.summary_token_budget
+            )
+            session.session_context = {
+                **(session.session_context or {}),
+                SUMMARY_KEY: {"text": summary, "until_id": pending[-1].id},
+            }
+            # update() rather than save() so the session's updated_at is left alone
+            TutorSession.objects.filter(pk=session.pk).update(session_context=session.session_context)
+            return True
+        except Exception as e:
+            logger.error(f"Error updating conversation summary: {str(e)}")
+            return False
+    
+    def get_active_configuration(self) -> Optional[TutorConfiguration]:
+        """Return the active TutorConfiguration, re-read at most every AI_TUTOR_CONFIG_CACHE_SECONDS."""
+        now = time.monotonic()
+        cached = self._config_cache
+        if cached is not None and now - cached[0] < self.config_cache_seconds:
+            return cached[1]
+        config = TutorConfiguration.objects.filter(is_active=True).first()
+        self._config_cache = (now, config)
+        return config
+    
+    async def aget_active_configuration(self) -> Optional[TutorConfiguration]:
+        """Async get_active_configuration; only leaves the event loop when the cached value has expired."""
+        cached = self._config_cache
+        if cached is not None and time.monotonic() - cached[0] < self.config_cache_seconds:
+            return cached[1]
+        return await sync_to_async(self.get_active_configuration)()
+    
+    def get_system_prompt(self, session: TutorSession) -> str:
+        """Format the active system prompt for a session, cached per session, scope and configuration."""
+        config = self.get_active_configuration()
+        key = (session.id, session.course_id, session.module_id, session.quiz_id,
+               config.id if config else None, config.updated_at if config else None)
+        with self._cache_lock:
+            prompt = self._prompts.get(key)
+            if prompt is not None:
+                self._prompts.move_to_end(key)
+                return prompt
         
-        # Return the last N messages
-        return history[-max_messages:] if max_messages > 0 else history
+        system_prompt = config.system_prompt if config else DEFAULT_SYSTEM_PROMPT
+        prompt = system_prompt.format(**self.get_session_context(session))
+        with self._cache_lock:
+            self._prompts[key] = prompt
+            while len(self._prompts) > PROMPT_CACHE_SIZE:
+                self._prompts.popitem(last=False)
+        return prompt
     
     def get_retrieval_chain(self, session: TutorSession):
-        """Create a conversational retrieval chain for the tutor session."""
+        """
+        Get a conversational retrieval chain for the tutor session.
+        
+        Chains hold no conversation state (history is passed in per call as
+        ``chat_history``), so one compiled chain is shared by every session
+        with the same system prompt.
+        """
         if not self.llm or not self.vector_store:
             logger.warning("LLM or vector store not initialized. Cannot create retrieval chain.")
             return None
         
         try:
-            # Get context for the session
-            context = self.get_session_context(session)
-            
-            # Create memory with existing conversation history
-            memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
-            )
-            
-            # Get system prompt template
-            config = TutorConfiguration.objects.filter(is_active=True).first()
-            system_prompt = config.system_prompt if config else DEFAULT_SYSTEM_PROMPT
-            
-            # Format the system prompt with context
-            formatted_system_prompt = system_prompt.format(**context)
+            formatted_system_prompt = self.get_system_prompt(session)
+            key = (id(self.vector_store), id(self.llm), formatted_system_prompt)
+            with self._cache_lock:
+                qa_chain = self._chains.get(key)
+                if qa_chain is not None:
+                    self._chains.move_to_end(key)
+                    return qa_chain
             
             # Create QA chain
             qa_chain = ConversationalRetrievalChain.from_llm(
                 llm=self.llm,
-                retriever=self.vector_store.as_retriever(search_kwargs={"k": 5}),
-                memory=memory,
+                condense_question_llm=self.condense_llm,
+                # Keyword and vector rankings are fused, so fewer chunks are needed per answer
+                retriever=HybridRetriever(vector_store=self.vector_store, k=4),
                 verbose=True,
                 return_source_documents=True,
                 condense_question_prompt=PromptTemplate.from_template(
@@ -200,6 +393,10 @@ class TutorLangChainService:
                 }
             )
             
+            with self._cache_lock:
+                self._chains[key] = qa_chain
+                while len(self._chains) > CHAIN_CACHE_SIZE:
+                    self._chains.popitem(last=False)
             return qa_chain
             
         except Exception as e:
@@ -208,68 +405,319 @@ class TutorLangChainService:
     
     def get_tutor_response(self, session: TutorSession, message_content: str) -> Dict[str, Any]:
         """Generate a response from the AI tutor using LangChain."""
-        if not self.api_key:
-            # Return placeholder response if no API key
-            return {
-                "content": f"I understand you're asking about '{message_content}'. "
-                          f"This is a placeholder response because the LLM service is not configured.",
-                "sources": [],
-                "metadata": {"placeholder": True}
-            }
-        
         try:
-            # Get retrieval chain
-            chain = self.get_retrieval_chain(session)
-            
-            if not chain:
-                return {
-                    "content": "I'm sorry, but I'm having trouble accessing my knowledge. Please try again later.",
-                    "sources": [],
-                    "metadata": {"error": "retrieval_chain_unavailable"}
-                }
-            
-            # Load conversation history into memory
-            history = self.get_conversation_history(session)
-            for i in range(0, len(history), 2):
-                if i + 1 < len(history):
-                    chain.memory.chat_memory.add_user_message(history[i]["content"])
-                    chain.memory.chat_memory.add_ai_message(history[i+1]["content"])
+            immediate, chain, inputs, cache_lookup = self._prepare_response(session, message_content)
+            if immediate is not None:
+                return immediate
             
             # Generate response
-            response = chain({"question": message_content})
+            response = chain(inputs)
+            result = self._finish_response(session, message_content, response, cache_lookup)
+            self.update_conversation_summary(session)
+            return result
             
-            # Extract sources if available
-            sources = []
-            if "source_documents" in response:
-                for doc in response["source_documents"]:
-                    if hasattr(doc, "metadata") and "source" in doc.metadata:
-                        sources.append(doc.metadata["source"])
+        except Exception as e:
+            logger.error(f"Error generating tutor response: {str(e)}")
+            return self._error_response(e)
+    
+    def stream_tutor_response(self, session: TutorSession, message_content: str) -> Iterator[Dict[str, Any]]:
+        """
+        Generate a response from the AI tutor token by token.
+        
+        Yields ``{"type": "token", "content": ...}`` events while the answer is
+        generated, then a single ``{"type": "done", "response": ...}`` event
+        holding the same dict as :meth:`get_tutor_response`. History and
+        configuration are read in the calling thread; only the chain runs in a
+        worker thread, so that thread never touches the database. The
+        conversation summary is refreshed after ``done`` is yielded, so callers
+        should save and deliver the answer before asking for the next event.
+        """
+        try:
+            immediate, chain, inputs, cache_lookup = self._prepare_response(session, message_content)
+        except Exception as e:
+            logger.error(f"Error generating tutor response: {str(e)}")
+            immediate = self._error_response(e)
+        
+        if immediate is not None:
+            yield {"type": "token", "content": immediate["content"]}
+            yield {"type": "done", "response": immediate}
+            return
+        
+        tokens: "queue.Queue[Optional[str]]" = queue.Queue()
+        outcome: Dict[str, Any] = {}
+        
+        def run_chain():
+            try:
+                outcome["response"] = chain(inputs, callbacks=[TokenQueueCallbackHandler(tokens)])
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                tokens.put(None)
+        
+        worker = threading.Thread(target=run_chain, name=f"tutor-stream-{session.id}", daemon=True)
+        worker.start()
+        while True:
+            token = tokens.get()
+            if token is None:
+                break
+            yield {"type": "token", "content": token}
+        worker.join()
+        
+        if "error" in outcome:
+            logger.error(f"Error streaming tutor response: {str(outcome['error'])}")
+            result = self._error_response(outcome["error"])
+        else:
+            result = self._finish_response(session, message_content, outcome["response"], cache_lookup)
+        yield {"type": "done", "response": result}
+        self.update_conversation_summary(session)
+    
+    async def aget_tutor_response(self, session: TutorSession, message_content: str) -> Dict[str, Any]:
+        """
+        Async get_tutor_response.
+        
+        Database reads use the async ORM and the retrieval chain runs with
+        ``ainvoke``, so the event loop is free while waiting on the embedding
+        and LLM APIs.
+        """
+        try:
+            immediate, chain, inputs, cache_lookup = await self._aprepare_response(session, message_content)
+            if immediate is not None:
+                return immediate
             
-            return {
-                "content": response["answer"],
-                "sources": sources,
-                "metadata": {"model": "gpt-3.5-turbo", "temperature": 0.7}
-            }
+            response = await chain.ainvoke(inputs)
+            result = self._finish_response(session, message_content, response, cache_lookup)
+            await sync_to_async(self.update_conversation_summary)(session)
+            return result
             
         except Exception as e:
             logger.error(f"Error generating tutor response: {str(e)}")
-            return {
-                "content": "I apologize, but I encountered an error processing your question. Please try again.",
-                "sources": [],
-                "metadata": {"error": str(e)}
-            }
+            return self._error_response(e)
     
-    def process_knowledge_base(self, force_recreate: bool = False):
-        """Process all knowledge base entries and add them to the vector store."""
+    async def astream_tutor_response(self, session: TutorSession, message_content: str) -> AsyncIterator[Dict[str, Any]]:
+        """Async stream_tutor_response; yields the same events without a worker thread."""
+        try:
+            immediate, chain, inputs, cache_lookup = await self._aprepare_response(session, message_content)
+        except Exception as e:
+            logger.error(f"Error generating tutor response: {str(e)}")
+            immediate = self._error_response(e)
+        
+        if immediate is not None:
+            yield {"type": "token", "content": immediate["content"]}
+            yield {"type": "done", "response": immediate}
+            return
+        
+        tokens: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        task = asyncio.ensure_future(chain.ainvoke(
+            inputs, config={"callbacks": [AsyncTokenQueueCallbackHandler(tokens)]}
+        ))
+        task.add_done_callback(lambda _: tokens.put_nowait(None))
+        try:
+            while True:
+                token = await tokens.get()
+                if token is None:
+                    break
+                yield {"type": "token", "content": token}
+        finally:
+            # Stop generating if the client went away mid-answer
+            if not task.done():
+                task.cancel()
+        
+        try:
+            result = self._finish_response(session, message_content, task.result(), cache_lookup)
+        except Exception as e:
+            logger.error(f"Error streaming tutor response: {str(e)}")
+            result = self._error_response(e)
+        yield {"type": "done", "response": result}
+        await sync_to_async(self.update_conversation_summary)(session)
+    
+    def _prepare_response(self, session: TutorSession, message_content: str):
+        """
+        Do everything that precedes the LLM call.
+        
+        Returns (immediate response or None, chain, chain inputs, cache lookup).
+        An immediate response (placeholder, cache hit or error) means no chain
+        needs to run.
+        """
+        if not self.api_key:
+            return self._placeholder_response(message_content), None, None, None
+        
+        window = self.get_conversation_window(session)
+        prior_turns = self._prior_turns(window, message_content)
+        
+        cache_lookup = None
+        if self._is_opening_question(window, prior_turns):
+            cache_lookup = self._response_cache_lookup(session, message_content)
+            if cache_lookup and cache_lookup[2] is not None:
+                return cache_lookup[2], None, None, None
+        
+        # Get retrieval chain
+        chain = self.get_retrieval_chain(session)
+        
+        if not chain:
+            return self._unavailable_response(), None, None, None
+        
+        return None, chain, self._chain_inputs(message_content, window.summary, prior_turns), cache_lookup
+    
+    async def _aprepare_response(self, session: TutorSession, message_content: str):
+        """Async _prepare_response."""
+        if not self.api_key:
+            return self._placeholder_response(message_content), None, None, None
+        
+        window = await self.aget_conversation_window(session)
+        prior_turns = self._prior_turns(window, message_content)
+        
+        cache_lookup = None
+        if self._is_opening_question(window, prior_turns):
+            cache_lookup = await self._aresponse_cache_lookup(session, message_content)
+            if cache_lookup and cache_lookup[2] is not None:
+                return cache_lookup[2], None, None, None
+        
+        # Building the chain reads the configuration and the session's course/module
+        chain = await sync_to_async(self.get_retrieval_chain)(session)
+        
+        if not chain:
+            return self._unavailable_response(), None, None, None
+        
+        return None, chain, self._chain_inputs(message_content, window.summary, prior_turns), cache_lookup
+    
+    @staticmethod
+    def _prior_turns(window: ConversationWindow, message_content: str) -> List[Dict[str, str]]:
+        # The question being answered is usually saved before the tutor is asked
+        turns = window.turns
+        if turns and turns[-1]["role"] == "human" and turns[-1]["content"] == message_content:
+            return turns[:-1]
+        return turns
+    
+    def _is_opening_question(self, window: ConversationWindow, prior_turns: List[Dict[str, str]]) -> bool:
+        # Opening questions do not depend on earlier turns (a greeting from the
+        # tutor aside), so near-identical ones from other students in the same
+        # scope can share an answer
+        return (
+            response_cache.enabled and self.embeddings is not None and not window.summary
+            and not any(turn["role"] == "human" for turn in prior_turns)
+        )
+    
+    @staticmethod
+    def _chain_inputs(message_content: str, summary: str, turns: List[Dict[str, str]]) -> Dict[str, Any]:
+        chat_history: List[BaseMessage] = []
+        if summary:
+            chat_history.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        for turn in turns:
+            message_class = HumanMessage if turn["role"] == "human" else AIMessage
+            chat_history.append(message_class(content=turn["content"]))
+        return {"question": message_content, "chat_history": chat_history}
+    
+    @staticmethod
+    def _placeholder_response(message_content: str) -> Dict[str, Any]:
+        # Returned when no API key is configured
+        return {
+            "content": f"I understand you're asking about '{message_content}'. "
+                      f"This is a placeholder response because the LLM service is not configured.",
+            "sources": [],
+            "metadata": {"placeholder": True}
+        }
+    
+    @staticmethod
+    def _unavailable_response() -> Dict[str, Any]:
+        return {
+            "content": "I'm sorry, but I'm having trouble accessing my knowledge. Please try again later.",
+            "sources": [],
+            "metadata": {"error": "retrieval_chain_unavailable"}
+        }
+    
+    def _finish_response(self, session: TutorSession, message_content: str, response: Dict[str, Any],
+                         cache_lookup) -> Dict[str, Any]:
+        """Turn the chain output into a tutor response and cache it if it answers an opening question."""
+        # Extract sources if available
+        sources = []
+        fingerprints = []
+        if "source_documents" in response:
+            for doc in response["source_documents"]:
+                fingerprints.append(source_fingerprint(getattr(doc, "id", None), doc.page_content))
+                if hasattr(doc, "metadata") and "source" in doc.metadata:
+                    sources.append(doc.metadata["source"])
+        
+        result = {
+            "content": response["answer"],
+            "sources": sources,
+            "metadata": {"model": "gpt-3.5-turbo", "temperature": 0.7}
+        }
+        if cache_lookup:
+            scope, embedding, _ = cache_lookup
+            response_cache.store(scope, session.course_id, message_content, embedding, result, fingerprints)
+        return result
+    
+    @staticmethod
+    def _error_response(error: Exception) -> Dict[str, Any]:
+        return {
+            "content": "I apologize, but I encountered an error processing your question. Please try again.",
+            "sources": [],
+            "metadata": {"error": str(error)}
+        }
+    
+    def _response_cache_lookup(self, session: TutorSession, message_content: str):
+        """
+        Look the question up in the semantic response cache.
+        
+        Returns (scope, query embedding, cached response or None), or None if
+        the question could not be embedded. On a miss the retriever gets the
+        same embedding back from ``StoredEmbeddings`` instead of a second
+        provider call.
+        """
+        try:
+            embedding = self.embeddings.embed_query(message_content)
+        except Exception as e:
+            logger.warning(f"Could not embed question for the response cache: {str(e)}")
+            return None
+        
+        config = self.get_active_configuration()
+        return self._cached_response(session, embedding, config.id if config else None)
+    
+    async def _aresponse_cache_lookup(self, session: TutorSession, message_content: str):
+        """Async _response_cache_lookup."""
+        try:
+            embedding = await self.embeddings.aembed_query(message_content)
+        except Exception as e:
+            logger.warning(f"Could not embed question for the response cache: {str(e)}")
+            return None
+        
+        config = await self.aget_active_configuration()
+        return self._cached_response(session, embedding, config.id if config else None)
+    
+    def _cached_response(self, session: TutorSession, embedding, config_id: Optional[int]):
+        scope = (session.course_id, session.module_id, config_id)
+        cached = response_cache.lookup(scope, session.course_id, embedding, self._sources_unchanged)
+        if cached is None:
+            return scope, embedding, None
+        
+        response, similarity = cached
+        logger.info(f"Semantic cache hit (similarity {similarity:.3f}) for session {session.id}")
+        return scope, embedding, {
+            **response,
+            "metadata": {**response.get("metadata", {}), "cached": True, "cache_similarity": round(similarity, 4)},
+        }
+    
+    def _sources_unchanged(self, fingerprints) -> bool:
+        """Check that the chunks a cached answer was built from still have the same text."""
+        ids = [doc_id for doc_id, _ in fingerprints if doc_id]
+        if not ids:
+            return True
+        try:
+            current = {doc.id: source_fingerprint(doc.id, doc.page_content) for doc in self.vector_store.get_by_ids(ids)}
+        except Exception as e:
+            logger.warning(f"Could not verify cached answer sources: {str(e)}")
+            return False
+        return all(current.get(doc_id) == (doc_id, digest) for doc_id, digest in fingerprints if doc_id)
+    
+    def process_knowledge_base(self, force_recreate: bool = False, stored_only: bool = False):
+        """
+        Process all knowledge base entries and add them to the vector store.
+        
+        Chunk embeddings already stored for the current model are reused, so
+        only new or changed chunks are sent to the embedding provider. With
+        ``stored_only`` no chunk is: the run fails if any embedding is missing.
+        """
         try:
-            # Check if we should recreate the vector store
-            if force_recreate and os.path.exists(VECTOR_STORE_PATH):
-                import shutil
-                shutil.rmtree(VECTOR_STORE_PATH)
-                os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
-                self.vector_store = None
-                logger.info("Existing vector store deleted for recreation")
-            
             # Get all knowledge base entries
             entries = TutorKnowledgeBase.objects.all()
             logger.info(f"Processing {entries.count()} knowledge base entries")
@@ -278,15 +726,10 @@ class TutorLangChainService:
                 logger.warning("No knowledge base entries found to process")
                 return False
             
-            # Create text splitter
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
-            
             # Process entries into documents
             documents = []
+            # Boilerplate repeated across entries is only embedded once per course
+            duplicate_filters = {}
             for entry in entries:
                 # Create metadata
                 metadata = {
@@ -297,22 +740,56 @@ class TutorLangChainService:
                     "module_id": entry.module.id if entry.module else None,
                 }
                 
-                # Split content into chunks
-                entry_documents = text_splitter.create_documents(
-                    texts=[entry.content],
-                    metadatas=[metadata]
+                # Split content into heading-scoped chunks
+                duplicate_filter = duplicate_filters.setdefault(
+                    metadata["course_id"], self.chunker.new_duplicate_filter()
                 )
-                
-                documents.extend(entry_documents)
+                for chunk in self.chunker.chunk(entry.content, duplicate_filter=duplicate_filter):
+                    documents.append(Document(
+                        page_content=chunk.page_content,
+                        metadata={**metadata, **chunk.metadata()},
+                    ))
             
             logger.info(f"Created {len(documents)} document chunks from knowledge base entries")
             
+            if stored_only:
+                # Checked before anything is deleted, so a failed rebuild keeps the old store
+                if not isinstance(self.embeddings, StoredEmbeddings):
+                    logger.error("Embeddings not initialized. Cannot rebuild from stored embeddings.")
+                    return False
+                missing = self.embeddings.count_missing([document.page_content for document in documents])
+                if missing:
+                    logger.error(
+                        f"{missing} chunks have no stored embedding for {self.embeddings.model_id}; "
+                        "process the knowledge base with the provider available first"
+                    )
+                    return False
+            
+            # Check if we should recreate the vector store
+            if force_recreate:
+                import shutil
+                for path in (VECTOR_STORE_PATH, NUMPY_INDEX_PATH):
+                    if os.path.exists(path):
+                        shutil.rmtree(path)
+                os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+                self.vector_store = None
+                logger.info("Existing vector store deleted for recreation")
+            
             # Update or create vector store
-            if self.vector_store:
-                success = self.update_vector_store(documents)
-            else:
-                success = self.create_vector_store(documents)
+            with self.embeddings.stored_only() if stored_only else nullcontext():
+                if self.vector_store:
+                    success = self.update_vector_store(documents)
+                else:
+                    success = self.create_vector_store(documents)
             
+            if success:
+                # Cached answers may cite chunks that were just replaced
+                response_cache.invalidate_all()
+                if force_recreate and isinstance(self.embeddings, StoredEmbeddings):
+                    # A full rebuild knows every current chunk; drop vectors of edited or deleted ones
+                    pruned = self.embeddings.prune(document.page_content for document in documents)
+                    if pruned:
+                        logger.info(f"Pruned {pruned} stored embeddings of chunks no longer in the knowledge base")
             return success
             
         except Exception as e:
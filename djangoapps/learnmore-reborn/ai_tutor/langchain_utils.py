@@ -4,11 +4,28 @@ This is a placeholder implementation that will be replaced with actual
 LangChain code when the AI integration is completed.
 """
 
+from django.db.models import Count, Max
+
+from .lexical_index import BM25Index
 from .models import TutorSession, TutorMessage, TutorKnowledgeBase
 import logging
 
 logger = logging.getLogger(__name__)
 
+# BM25 index over knowledge base entries, rebuilt when the table changes
+_knowledge_index = BM25Index()
+
+
+def get_knowledge_index():
+    """Return the BM25 index of knowledge base entries, rebuilding it if entries were added, edited or removed."""
+    signature = tuple(TutorKnowledgeBase.objects.aggregate(count=Count('id'), latest=Max('updated_at')).values())
+    entries = TutorKnowledgeBase.objects.values_list('id', 'title', 'content', 'course_id', 'module_id')
+    _knowledge_index.rebuild((
+        (entry_id, f"{title}\n{content}", {"course_id": course_id, "module_id": module_id})
+        for entry_id, title, content, course_id, module_id in entries.iterator()
+    ), signature)
+    return _knowledge_index
+
 def get_tutor_response(session, user_message_content):
     """
     Generate a response from the AI tutor using LangChain.
@@ -68,10 +85,11 @@ def get_tutor_response(session, user_message_content):
 
 def get_relevant_knowledge(session, query, top_k=3):
     """
-    Retrieve relevant knowledge from the knowledge base using vector similarity search.
+    Retrieve relevant knowledge from the knowledge base, ranked by BM25.
     
-    This is a placeholder that returns canned knowledge.
-    When implemented, this will use vector embeddings to find relevant content.
+    Entries are scoped to the session's course and module and ranked against
+    the query; if nothing matches the query terms, the first ``top_k`` entries
+    in scope are returned as before.
     
     Args:
         session: TutorSession object
@@ -82,23 +100,21 @@ def get_relevant_knowledge(session, query, top_k=3):
         List of relevant knowledge chunks
     """
     try:
-        # This would use a vector store to retrieve relevant knowledge
-        # For now, just return knowledge records related to the course/module if available
-        
         filters = {}
         if session.course:
             filters['course'] = session.course
         if session.module:
             filters['module'] = session.module
-            
-        # Get some knowledge base entries if they exist
-        knowledge_entries = TutorKnowledgeBase.objects.filter(**filters)[:top_k]
         
-        if knowledge_entries.exists():
-            return list(knowledge_entries)
-        else:
-            # If no entries found, return empty list
-            return []
+        hits = get_knowledge_index().search(
+            query, top_k, course_id=session.course_id, module_id=session.module_id
+        )
+        if hits:
+            entries = TutorKnowledgeBase.objects.in_bulk([entry_id for entry_id, _, _, _ in hits])
+            return [entries[entry_id] for entry_id, _, _, _ in hits if entry_id in entries]
+        
+        # No keyword matches: fall back to knowledge base entries in scope
+        return list(TutorKnowledgeBase.objects.filter(**filters)[:top_k])
             
     except Exception as e:
         logger.error(f"Error retrieving knowledge: {str(e)}")
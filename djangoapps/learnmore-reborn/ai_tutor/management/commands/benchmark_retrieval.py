@@ -0,0 +1,68 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_tutor.retrieval_benchmark import BACKENDS, HashingEmbeddings, parse_chunking, run_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Benchmark tutor retrieval on a generated corpus: recall@k, MRR, query latency, '
+            'ingestion throughput and memory for each vector backend and chunking configuration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sections', default='1000',
+                            help='Corpus sizes in lecture sections (about one chunk each), comma separated, '
+                                 'e.g. 1000,100000,1000000')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--backends', default='numpy,numpy+bm25,chroma,chroma+bm25',
+                            help=f'Comma separated, any of: {", ".join(BACKENDS)}')
+        parser.add_argument('--chunking', default='350:40,200:20',
+                            help='Chunking configurations as max_tokens:overlap_tokens, comma separated')
+        parser.add_argument('--embeddings', choices=['hashing', 'openai'], default='hashing',
+                            help='hashing: offline bag-of-words vectors; openai: the configured embedding model')
+        parser.add_argument('--dimension', type=int, default=384, help='Dimension of the hashing embeddings')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workdir', help='Directory for the temporary indexes (default: system temp)')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        backends = [backend.strip() for backend in options['backends'].split(',') if backend.strip()]
+        unknown = set(backends) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f"Unknown backend(s): {', '.join(sorted(unknown))}")
+        chunkings = [spec.strip() for spec in options['chunking'].split(',') if spec.strip()]
+        try:
+            sizes = [int(size) for size in options['sections'].split(',')]
+            for spec in chunkings:
+                parse_chunking(spec)
+        except ValueError as e:
+            raise CommandError(f"Invalid --sections or --chunking: {e}")
+
+        embeddings = self._embeddings(options)
+        results = []
+        for sections in sizes:
+            self.stdout.write(self.style.NOTICE(f"Corpus of {sections} sections, {options['queries']} queries"))
+            results += run_benchmark(
+                sections, options['queries'], backends, chunkings, embeddings,
+                k=options['k'], seed=options['seed'], workdir=options['workdir'],
+                progress=lambda line: self.stdout.write(line),
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump([result.as_dict() for result in results], f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _embeddings(self, options):
+        if options['embeddings'] == 'hashing':
+            return HashingEmbeddings(options['dimension'])
+
+        from langchain_openai import OpenAIEmbeddings
+        api_key = getattr(settings, 'OPENAI_API_KEY', None)
+        if not api_key:
+            raise CommandError("OPENAI_API_KEY is not set; use --embeddings hashing to benchmark offline.")
+        base_url = getattr(settings, 'AI_TUTOR_OPENAI_BASE_URL', '') or None
+        return OpenAIEmbeddings(openai_api_key=api_key, openai_api_base=base_url,
+                                check_embedding_ctx_length=base_url is None)
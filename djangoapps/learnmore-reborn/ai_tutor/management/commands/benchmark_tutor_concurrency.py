@@ -0,0 +1,120 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test.utils import override_settings
+
+from ai_tutor.langchain_service import TutorLangChainService
+from ai_tutor.models import TutorSession
+
+QUESTION = "Question {i}: how does topic {i} relate to the rest of the course?"
+
+
+class ThreadSampler:
+    """Record the peak number of live threads while a benchmark runs."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = ('Measure how many concurrent tutor requests one process sustains, '
+            'comparing the async pipeline with a thread pool. Run against the stub LLM '
+            '(manage.py run_stub_llm) to benchmark offline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--mode', choices=['async', 'threads', 'both'], default='both')
+        parser.add_argument('--username', help='User owning the benchmark sessions (default: first user)')
+        parser.add_argument('--api-key', help='OpenAI API key override, e.g. sk-stub')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = (User.objects.filter(username=options['username']) if options['username']
+                else User.objects.order_by('id')).first()
+        if user is None:
+            raise CommandError("No user found to own the benchmark sessions.")
+
+        service = TutorLangChainService(use_openai_api_key=options['api_key'])
+        if not service.llm or not service.vector_store:
+            raise CommandError(
+                "The tutor has no LLM or vector store. Set OPENAI_API_KEY/AI_TUTOR_OPENAI_BASE_URL "
+                "and run initialize_vector_store first."
+            )
+
+        sessions = TutorSession.objects.bulk_create([
+            TutorSession(user=user, title=f"Benchmark {i}", status='active') for i in range(options['requests'])
+        ])
+        modes = ['async', 'threads'] if options['mode'] == 'both' else [options['mode']]
+        try:
+            # Every question should reach the LLM
+            with override_settings(AI_TUTOR_SEMANTIC_CACHE_ENABLED=False):
+                for mode in modes:
+                    with ThreadSampler() as sampler:
+                        if mode == 'async':
+                            results, wall = async_to_sync(self._run_async)(service, sessions, options['concurrency'])
+                        else:
+                            results, wall = self._run_threads(service, sessions, options['concurrency'])
+                    self._report(mode, results, wall, sampler.peak, options['concurrency'])
+        finally:
+            TutorSession.objects.filter(id__in=[session.id for session in sessions]).delete()
+
+    async def _run_async(self, service, sessions, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def ask(i, session):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await service.aget_tutor_response(session, QUESTION.format(i=i))
+                return time.perf_counter() - start, 'error' in response.get('metadata', {})
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(ask(i, session) for i, session in enumerate(sessions)))
+        return results, time.perf_counter() - start
+
+    def _run_threads(self, service, sessions, concurrency):
+        def ask(args):
+            i, session = args
+            try:
+                start = time.perf_counter()
+                response = service.get_tutor_response(session, QUESTION.format(i=i))
+                return time.perf_counter() - start, 'error' in response.get('metadata', {})
+            finally:
+                close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(ask, enumerate(sessions)))
+        return results, time.perf_counter() - start
+
+    def _report(self, mode, results, wall, peak_threads, concurrency):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, failed in results if failed)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode:>7}: {len(results)} requests at concurrency {concurrency} in {wall:.2f}s "
+            f"({len(results) / wall:.1f} req/s), p50 {statistics.median(latencies) * 1000:.0f} ms, "
+            f"p95 {p95 * 1000:.0f} ms, {errors} errors, peak threads {peak_threads}"
+        ))
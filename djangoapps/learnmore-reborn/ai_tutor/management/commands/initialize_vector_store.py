@@ -13,9 +13,23 @@ class Command(BaseCommand):
             action='store_true',
             help='Force recreation of the vector store',
         )
+        parser.add_argument(
+            '--backend',
+            choices=['chroma', 'numpy'],
+            help='Vector store backend to build (default: AI_TUTOR_VECTOR_BACKEND); implies --recreate',
+        )
+        parser.add_argument(
+            '--stored-only',
+            action='store_true',
+            help='Use only stored chunk embeddings and never call the embedding provider; '
+                 'fails without changing the store if any chunk has none',
+        )
 
     def handle(self, *args, **options):
-        recreate = options['recreate']
+        recreate = options['recreate'] or bool(options['backend'])
+        if options['backend']:
+            tutor_langchain_service.vector_backend = options['backend']
+            tutor_langchain_service.vector_store = None
         
         # Check if there are knowledge base entries
         kb_count = TutorKnowledgeBase.objects.count()
@@ -33,7 +47,9 @@ class Command(BaseCommand):
         
         try:
             # Process knowledge base and update vector store
-            success = tutor_langchain_service.process_knowledge_base(force_recreate=recreate)
+            success = tutor_langchain_service.process_knowledge_base(
+                force_recreate=recreate, stored_only=options['stored_only']
+            )
             
             if success:
                 self.stdout.write(self.style.SUCCESS(
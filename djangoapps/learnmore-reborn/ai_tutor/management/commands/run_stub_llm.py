@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from ai_tutor.stub_llm import StubLLMApp
+
+
+class Command(BaseCommand):
+    help = 'Run a stub OpenAI-compatible LLM server for offline tutor benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--first-token-ms', type=int, default=500,
+                            help='Delay before the first token of each completion')
+        parser.add_argument('--token-ms', type=int, default=20, help='Delay between streamed tokens')
+        parser.add_argument('--tokens', type=int, default=60, help='Tokens per completion')
+        parser.add_argument('--embedding-ms', type=int, default=50, help='Delay per embeddings request')
+        parser.add_argument('--embedding-dim', type=int, default=1536)
+
+    def handle(self, *args, **options):
+        import uvicorn
+
+        app = StubLLMApp(
+            first_token_delay=options['first_token_ms'] / 1000,
+            token_delay=options['token_ms'] / 1000,
+            completion_tokens=options['tokens'],
+            embedding_delay=options['embedding_ms'] / 1000,
+            embedding_dim=options['embedding_dim'],
+        )
+        base_url = f"http://{options['host']}:{options['port']}/v1"
+        self.stdout.write(self.style.NOTICE(
+            f"Stub LLM listening on {base_url}. Start the tutor with "
+            f"OPENAI_API_KEY=sk-stub AI_TUTOR_OPENAI_BASE_URL={base_url}"
+        ))
+        uvicorn.run(app, host=options['host'], port=options['port'], log_level='warning')
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0001_initial'),
+        ('courses', '0017_course_qr_enabled_module_qr_access_quiz_qr_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tutormessage',
+            index=models.Index(fields=['session', 'created_at'], name='ai_tutor_tu_session_94de0b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tutorsession',
+            index=models.Index(fields=['user', '-updated_at'], name='ai_tutor_session_user_recent'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0002_session_activity_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='tutorknowledgebase',
+            name='vector_embedding',
+        ),
+        migrations.CreateModel(
+            name='KnowledgeChunkEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the chunk text', max_length=64)),
+                ('model_id', models.CharField(max_length=255)),
+                ('dimension', models.PositiveIntegerField()),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Knowledge Chunk Embedding',
+                'verbose_name_plural': 'Knowledge Chunk Embeddings',
+                'constraints': [models.UniqueConstraint(fields=('model_id', 'content_hash'), name='ai_tutor_chunk_embedding_key')],
+            },
+        ),
+    ]
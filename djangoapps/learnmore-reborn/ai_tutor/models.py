@@ -1,14 +1,18 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr
 from django.conf import settings
 from courses.models import Course, Module, Quiz
 
+# Characters of the last message shown next to each session in lists
+LAST_MESSAGE_PREVIEW_LENGTH = 120
+
 class TutorKnowledgeBase(models.Model):
     """Model for storing knowledge base content for the AI tutor."""
     title = models.CharField(max_length=255)
     content = models.TextField()
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='knowledge_bases', null=True, blank=True)
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='knowledge_bases', null=True, blank=True)
-    vector_embedding = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -19,6 +23,50 @@ class TutorKnowledgeBase(models.Model):
     def __str__(self):
         return self.title
 
+class KnowledgeChunkEmbedding(models.Model):
+    """
+    Embedding of one knowledge base chunk, stored once per chunk text and embedding model.
+    
+    ``vector`` holds ``dimension`` little-endian float32 values; see
+    ``ai_tutor.embedding_store``.
+    """
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the chunk text")
+    model_id = models.CharField(max_length=255)
+    dimension = models.PositiveIntegerField()
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Knowledge Chunk Embedding"
+        verbose_name_plural = "Knowledge Chunk Embeddings"
+        constraints = [
+            models.UniqueConstraint(fields=['model_id', 'content_hash'], name='ai_tutor_chunk_embedding_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.model_id} {self.content_hash[:12]}"
+
+class TutorSessionQuerySet(models.QuerySet):
+    def with_activity(self):
+        """
+        Annotate each session with its message count and the time and start of its last message.
+        
+        Correlated subqueries rather than a join and GROUP BY, so that with an
+        ORDER BY ... LIMIT only the sessions on the page are looked at.
+        """
+        messages = TutorMessage.objects.filter(session=OuterRef('pk'))
+        last_message = messages.order_by('-created_at', '-id')
+        return self.annotate(
+            message_count=Coalesce(
+                Subquery(messages.order_by().values('session').annotate(count=Count('id')).values('count')),
+                0
+            ),
+            last_message_at=Subquery(last_message.values('created_at')[:1]),
+            last_message_preview=Subquery(
+                last_message.annotate(preview=Substr('content', 1, LAST_MESSAGE_PREVIEW_LENGTH)).values('preview')[:1]
+            ),
+        )
+
 class TutorSession(models.Model):
     """Model for storing AI tutor session data."""
     STATUS_CHOICES = [
@@ -37,10 +85,15 @@ class TutorSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TutorSessionQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Tutor Session"
         verbose_name_plural = "Tutor Sessions"
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='ai_tutor_session_user_recent'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
@@ -63,6 +116,9 @@ class TutorMessage(models.Model):
         verbose_name = "Tutor Message"
         verbose_name_plural = "Tutor Messages"
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['session', 'created_at']),
+        ]
     
     def __str__(self):
         return f"{self.message_type} message in {self.session}"
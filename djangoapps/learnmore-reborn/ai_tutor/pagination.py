@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+# Sessions are listed most recently updated first; id breaks ties
+SESSION_ORDERING = ('-updated_at', '-id')
+
+
+class TutorSessionCursorPagination(CursorPagination):
+    """
+    Keyset pagination for tutor sessions.
+
+    Each page continues from the last session of the previous one using the
+    (user, -updated_at) index, so later pages cost the same as the first.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = SESSION_ORDERING
+
+
+def session_cursor(session):
+    """Encode the position of a session for the dashboard's "older sessions" link."""
+    return f"{session.updated_at.isoformat()}_{session.id}"
+
+
+def keyset_page(queryset, cursor=None, page_size=20):
+    """
+    Return one page of sessions after ``cursor`` and the cursor of the next page.
+
+    The next cursor is None on the last page. An invalid cursor starts from the top.
+    """
+    queryset = queryset.order_by(*SESSION_ORDERING)
+    if cursor:
+        try:
+            updated_at, session_id = cursor.rsplit('_', 1)
+            updated_at = datetime.fromisoformat(updated_at)
+            queryset = queryset.filter(
+                Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=int(session_id))
+            )
+        except ValueError:
+            pass
+
+    sessions = list(queryset[:page_size + 1])
+    next_cursor = session_cursor(sessions[page_size - 1]) if len(sessions) > page_size else None
+    return sessions[:page_size], next_cursor
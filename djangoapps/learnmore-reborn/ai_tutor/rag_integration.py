@@ -9,14 +9,17 @@ import json
 from django.conf import settings
 from .models import TutorKnowledgeBase, TutorSession, TutorMessage
 from courses.models import Course, Module, Quiz, Question
+from .chunking import ContentChunker
+from .response_cache import response_cache
 
 try:
     from langchain.vectorstores import Chroma
     from langchain.embeddings import OpenAIEmbeddings
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
     from langchain.document_loaders import TextLoader
     from langchain.schema import Document
     import numpy as np
+    from .vector_index import NumpyVectorStore
+    from .lexical_index import hybrid_search, record_added
     LANGCHAIN_AVAILABLE = True
     
     # Create a mock embedding class for demo purposes when OpenAI keys aren't available
@@ -43,8 +46,11 @@ except ImportError:
 
 # Configuration
 VECTOR_DB_DIR = os.path.join(settings.BASE_DIR, 'ai_tutor', 'vector_db')
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+NUMPY_INDEX_DIR = os.path.join(settings.BASE_DIR, 'ai_tutor', 'numpy_index', 'vector_db')
+CHUNK_MAX_TOKENS = getattr(settings, 'AI_TUTOR_CHUNK_MAX_TOKENS', 350)
+CHUNK_OVERLAP_TOKENS = getattr(settings, 'AI_TUTOR_CHUNK_OVERLAP_TOKENS', 40)
+
+chunker = ContentChunker(max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
 
 def get_embedding_model():
     """Get the embedding model based on configuration."""
@@ -66,28 +72,30 @@ def get_vector_store():
     
     # Initialize the vector store with the embedding model
     embedding_model = get_embedding_model()
+    if getattr(settings, 'AI_TUTOR_VECTOR_BACKEND', 'chroma') == 'numpy':
+        return NumpyVectorStore(NUMPY_INDEX_DIR, embedding_model)
     return Chroma(persist_directory=VECTOR_DB_DIR, embedding_function=embedding_model)
 
-def split_text(text, metadata=None):
-    """Split text into chunks for embedding."""
+def split_text(text, metadata=None, duplicate_filter=None):
+    """
+    Split text into structure-aware chunks for embedding.
+
+    Markdown and HTML are split on headings, lists and code blocks within a
+    token budget. Each document records its chunk index and heading path, and
+    chunks already seen by ``duplicate_filter`` are skipped.
+    """
     if not LANGCHAIN_AVAILABLE:
         raise ImportError("LangChain is required for RAG integration")
     
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len
-    )
-    
     if not metadata:
         metadata = {}
     
     # Split text into chunks
-    chunks = text_splitter.split_text(text)
+    chunks = chunker.chunk(text or "", duplicate_filter=duplicate_filter)
     
     # Create Document objects with metadata
     documents = [
-        Document(page_content=chunk, metadata=metadata)
+        Document(page_content=chunk.page_content, metadata={**metadata, **chunk.metadata()})
         for chunk in chunks
     ]
     
@@ -104,6 +112,8 @@ def ingest_knowledge_base():
     knowledge_bases = TutorKnowledgeBase.objects.all()
     
     documents = []
+    # Boilerplate repeated across entries is only embedded once per course
+    duplicate_filters = {}
     for kb in knowledge_bases:
         metadata = {
             "source": "knowledge_base",
@@ -113,12 +123,15 @@ def ingest_knowledge_base():
             "module_id": kb.module_id
         }
         
-        kb_documents = split_text(kb.content, metadata)
+        duplicate_filter = duplicate_filters.setdefault(kb.course_id, chunker.new_duplicate_filter())
+        kb_documents = split_text(kb.content, metadata, duplicate_filter)
         documents.extend(kb_documents)
     
     # Add documents to vector store
     if documents:
-        vector_store.add_documents(documents)
+        ids = vector_store.add_documents(documents)
+        record_added(vector_store, ids, documents)
+        response_cache.invalidate_all()
         return {"status": "success", "count": len(documents)}
     
     return {"status": "warning", "message": "No knowledge base content to ingest"}
@@ -139,6 +152,8 @@ def ingest_course_content(course_id=None):
     
     # Process each course
     for course in courses:
+        duplicate_filter = chunker.new_duplicate_filter()
+        
         # Course description
         course_metadata = {
             "source": "course",
@@ -147,8 +162,9 @@ def ingest_course_content(course_id=None):
             "type": "description"
         }
         
-        course_documents = split_text(course.description, course_metadata)
-        vector_store.add_documents(course_documents)
+        course_documents = split_text(course.description, course_metadata, duplicate_filter)
+        ids = vector_store.add_documents(course_documents)
+        record_added(vector_store, ids, course_documents)
         document_count += len(course_documents)
         
         # Process modules
@@ -164,8 +180,9 @@ def ingest_course_content(course_id=None):
             
             # Only process if module has content
             if module.content:
-                module_documents = split_text(module.content, module_metadata)
-                vector_store.add_documents(module_documents)
+                module_documents = split_text(module.content, module_metadata, duplicate_filter)
+                ids = vector_store.add_documents(module_documents)
+                record_added(vector_store, ids, module_documents)
                 document_count += len(module_documents)
             
             # Process quizzes
@@ -183,14 +200,26 @@ def ingest_course_content(course_id=None):
                 
                 # Combine quiz description and instructions
                 quiz_content = f"Quiz: {quiz.title}\n\nDescription: {quiz.description}\n\nInstructions: {quiz.instructions}"
-                quiz_documents = split_text(quiz_content, quiz_metadata)
-                vector_store.add_documents(quiz_documents)
+                quiz_documents = split_text(quiz_content, quiz_metadata, duplicate_filter)
+                ids = vector_store.add_documents(quiz_documents)
+                record_added(vector_store, ids, quiz_documents)
                 document_count += len(quiz_documents)
     
+    # Cached tutor answers may be built on the content that was just re-ingested
+    if course_id:
+        response_cache.invalidate_course(course_id)
+    else:
+        response_cache.invalidate_all()
+    
     return {"status": "success", "count": document_count}
 
 def retrieve_relevant_content(query, session_id=None, k=3):
-    """Retrieve relevant content from the vector store based on the query."""
+    """
+    Retrieve relevant content based on the query.
+    
+    Vector similarity and BM25 keyword rankings are fused so that exact terms
+    (function names, course codes, acronyms) are found as well as paraphrases.
+    """
     if not LANGCHAIN_AVAILABLE:
         return {"status": "error", "message": "LangChain is required for RAG integration"}
     
@@ -207,7 +236,7 @@ def retrieve_relevant_content(query, session_id=None, k=3):
                 filter_metadata["module_id"] = session.module_id
     
     # Retrieve relevant documents
-    documents = vector_store.similarity_search(query, k=k, filter=filter_metadata if filter_metadata else None)
+    documents = hybrid_search(vector_store, query, k=k, filter=filter_metadata if filter_metadata else None)
     
     results = []
     for doc in documents:
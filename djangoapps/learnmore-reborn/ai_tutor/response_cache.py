@@ -0,0 +1,252 @@
+"""
+Semantic cache for AI tutor answers.
+
+Students in the same course often open a session with nearly the same
+question. Each of those questions costs a retrieval chain and two LLM calls
+(condense + answer). ``SemanticResponseCache`` remembers answers per
+course/module scope together with the embedding of the question that
+produced them; a new question whose embedding is within
+``AI_TUTOR_SEMANTIC_CACHE_THRESHOLD`` cosine similarity of a cached one is
+answered from the cache, provided that:
+
+* the entry is younger than ``AI_TUTOR_SEMANTIC_CACHE_TTL`` seconds,
+* the course has not been re-ingested since (a per-course version counter,
+  kept in the Django cache so every worker sees the bump), and
+* the source chunks the answer was built from are unchanged.
+
+Entries are evicted least-recently-used beyond
+``AI_TUTOR_SEMANTIC_CACHE_MAX_ENTRIES``. Hit/miss counters are kept for
+monitoring.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "ai_tutor:response_cache:version:{scope}"
+ALL_COURSES = "all"
+
+
+def source_fingerprint(doc_id: Optional[str], text: str) -> Tuple[Optional[str], str]:
+    """Identify a source chunk by id and a hash of its text."""
+    return doc_id, hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    scope: Hashable
+    course_key: str
+    query: str
+    embedding: np.ndarray
+    response: Dict[str, Any]
+    sources: List[Tuple[Optional[str], str]]
+    versions: Tuple[int, int]
+    created_at: float
+
+
+class SemanticResponseCache:
+    """In-process LRU of tutor answers, looked up by question embedding similarity."""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 threshold: Optional[float] = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._by_scope: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+        self._local_versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(getattr(settings, 'AI_TUTOR_SEMANTIC_CACHE_ENABLED', True))
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return int(getattr(settings, 'AI_TUTOR_SEMANTIC_CACHE_MAX_ENTRIES', 1000))
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(getattr(settings, 'AI_TUTOR_SEMANTIC_CACHE_TTL', 24 * 60 * 60))
+
+    @property
+    def threshold(self) -> float:
+        if self._threshold is not None:
+            return self._threshold
+        return float(getattr(settings, 'AI_TUTOR_SEMANTIC_CACHE_THRESHOLD', 0.95))
+
+    # ------------------------------------------------------------------
+    # Versions
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _course_key(course_id: Optional[int]) -> str:
+        return str(course_id) if course_id is not None else "none"
+
+    def _version(self, course_key: str) -> int:
+        key = VERSION_KEY.format(scope=course_key)
+        try:
+            return int(cache.get(key) or 0)
+        except Exception:
+            # Cache backend unavailable: versions are only shared within this process
+            return self._local_versions.get(course_key, 0)
+
+    def _bump_version(self, course_key: str) -> None:
+        key = VERSION_KEY.format(scope=course_key)
+        self._local_versions[course_key] = self._local_versions.get(course_key, 0) + 1
+        try:
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Could not share response cache invalidation for {course_key}: {str(e)}")
+
+    def _versions(self, course_key: str) -> Tuple[int, int]:
+        return self._version(ALL_COURSES), self._version(course_key)
+
+    # ------------------------------------------------------------------
+    # Lookup and storage
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalise(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, scope: Hashable, course_id: Optional[int], embedding,
+               sources_unchanged: Optional[Callable[[List[Tuple[Optional[str], str]]], bool]] = None
+               ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Return ``(response, similarity)`` for the closest cached question in ``scope``, or None.
+
+        ``sources_unchanged`` is called with the stored source fingerprints of
+        a candidate entry and should return False if any of them changed.
+        """
+        query = self._normalise(embedding)
+        course_key = self._course_key(course_id)
+        with self._lock:
+            entry_ids = list(self._by_scope.get(scope, ()))
+            candidates = [(entry_id, self._entries[entry_id]) for entry_id in entry_ids]
+        if not candidates:
+            self._record_miss()
+            return None
+
+        matrix = np.stack([entry.embedding for _, entry in candidates])
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        entry_id, entry = candidates[best]
+        if similarity < self.threshold:
+            self._record_miss()
+            return None
+
+        expired = time.monotonic() - entry.created_at > self.ttl
+        if expired or entry.versions != self._versions(course_key) or (
+                sources_unchanged is not None and entry.sources and not sources_unchanged(entry.sources)):
+            with self._lock:
+                self._remove(entry_id)
+                self.stale += 1
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if entry_id in self._entries:
+                self._entries.move_to_end(entry_id)
+            self.hits += 1
+        return entry.response, similarity
+
+    def store(self, scope: Hashable, course_id: Optional[int], query: str, embedding,
+              response: Dict[str, Any], sources: List[Tuple[Optional[str], str]]) -> None:
+        """Remember ``response`` as the answer to ``query`` within ``scope``."""
+        course_key = self._course_key(course_id)
+        entry = CacheEntry(
+            scope=scope,
+            course_key=course_key,
+            query=query,
+            embedding=self._normalise(embedding),
+            response=response,
+            sources=list(sources),
+            versions=self._versions(course_key),
+            created_at=time.monotonic(),
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        scope_ids = self._by_scope.get(entry.scope)
+        if scope_ids is not None:
+            scope_ids.remove(entry_id)
+            if not scope_ids:
+                del self._by_scope[entry.scope]
+
+    def _record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    # ------------------------------------------------------------------
+    # Invalidation and metrics
+    # ------------------------------------------------------------------
+
+    def invalidate_course(self, course_id: Optional[int]) -> None:
+        """Drop cached answers for a course; other workers notice through the version bump."""
+        course_key = self._course_key(course_id)
+        self._bump_version(course_key)
+        with self._lock:
+            for entry_id in [i for i, entry in self._entries.items() if entry.course_key == course_key]:
+                self._remove(entry_id)
+
+    def invalidate_all(self) -> None:
+        """Drop every cached answer, e.g. after the whole knowledge base is re-ingested."""
+        self._bump_version(ALL_COURSES)
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self.hits = self.misses = self.stale = self.evictions = 0
+
+
+response_cache = SemanticResponseCache()
@@ -0,0 +1,296 @@
+"""
+Offline retrieval benchmark for the AI tutor.
+
+Builds an index from a generated course corpus, runs a labelled query set
+against it and reports retrieval quality (recall@k, MRR) and cost (query
+latency, ingestion throughput, memory and disk footprint) for each vector
+backend and chunking configuration.
+
+The corpus is markdown "lectures" made of sections of filler prose. Each
+section also states one fact built from rare made-up terms; a query asks
+about those terms in a different order, and the chunks containing the fact
+are the relevant results. Everything is generated from a seed, so runs are
+repeatable and the same queries can be compared across backends.
+"""
+
+import gc
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .chunking import ContentChunker
+from .lexical_index import get_lexical_index, hybrid_search
+from .stub_llm import stub_embedding
+from .vector_index import NumpyVectorStore
+
+BACKENDS = ('numpy', 'chroma', 'numpy+bm25', 'chroma+bm25')
+SECTIONS_PER_DOCUMENT = 8
+INGEST_BATCH_SIZE = 1000
+
+FILLER_WORDS = (
+    "the a of and to in is that for it as with was on be by this are from or at an which have not "
+    "can data model system value process course student example result method time point case "
+    "function number set structure type form order state change level step part field rule "
+    "important common simple general different useful possible clear basic main specific"
+).split()
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "xi", "bo", "de", "fu", "gy")
+
+
+@dataclass
+class BenchmarkQuery:
+    text: str
+    fact: int
+
+
+@dataclass
+class BenchmarkCorpus:
+    documents: List[str]
+    facts: List[str]
+    fact_terms: List[List[str]]
+    # Indexes of the facts stated in each document
+    document_facts: List[range]
+    queries: List[BenchmarkQuery]
+
+
+@dataclass
+class BenchmarkResult:
+    backend: str
+    chunking: str
+    chunks: int
+    queries: int
+    k: int
+    recall_at_k: float
+    mrr: float
+    p50_ms: float
+    p95_ms: float
+    ingest_seconds: float
+    chunks_per_second: float
+    lexical_build_seconds: float
+    rss_mb: float
+    disk_mb: float
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline embeddings: hashed bag of words, so texts sharing words are similar."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [stub_embedding(text, self.dimension).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return stub_embedding(text, self.dimension).tolist()
+
+
+def _term(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 4)))
+
+
+def generate_corpus(sections: int, queries: int, seed: int = 0, vocabulary: Optional[int] = None,
+                    sentences_per_section: int = 6) -> BenchmarkCorpus:
+    """
+    Generate ``sections`` lecture sections, each with one fact, and ``queries`` questions about them.
+
+    Fact terms are drawn from a vocabulary that grows with the corpus, so
+    larger corpora have proportionally as many near-collisions as small ones.
+    """
+    rng = random.Random(seed)
+    vocabulary = vocabulary or max(500, sections // 2)
+    terms = sorted({_term(rng) for _ in range(vocabulary * 2)})[:vocabulary]
+
+    documents: List[str] = []
+    facts: List[str] = []
+    fact_terms: List[List[str]] = []
+    document_facts: List[range] = []
+    for doc in range(0, sections, SECTIONS_PER_DOCUMENT):
+        first_fact = len(facts)
+        lines = [f"# Lecture {doc // SECTIONS_PER_DOCUMENT + 1}", ""]
+        for section in range(doc, min(doc + SECTIONS_PER_DOCUMENT, sections)):
+            terms_used = rng.sample(terms, 3)
+            fact = f"The {terms_used[0]} of a {terms_used[1]} is defined by its {terms_used[2]}."
+            sentences = [
+                " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+                for _ in range(sentences_per_section)
+            ]
+            sentences.insert(rng.randrange(len(sentences) + 1), fact)
+            lines += [f"## Section {section + 1}", "", " ".join(sentences), ""]
+            facts.append(fact)
+            fact_terms.append(terms_used)
+        documents.append("\n".join(lines))
+        document_facts.append(range(first_fact, len(facts)))
+
+    benchmark_queries = []
+    for _ in range(queries):
+        fact = rng.randrange(len(facts))
+        query_terms = list(fact_terms[fact])
+        rng.shuffle(query_terms)
+        benchmark_queries.append(BenchmarkQuery(f"how does {' '.join(query_terms)} work", fact))
+    return BenchmarkCorpus(documents, facts, fact_terms, document_facts, benchmark_queries)
+
+
+def chunk_corpus(corpus: BenchmarkCorpus, chunker: ContentChunker) -> Tuple[List[str], List[str], Dict[int, Set[str]]]:
+    """Chunk every document; return chunk ids, chunk texts and the chunk ids containing each fact."""
+    ids: List[str] = []
+    texts: List[str] = []
+    relevant: Dict[int, Set[str]] = {}
+    duplicate_filter = chunker.new_duplicate_filter()
+    for doc_index, document in enumerate(corpus.documents):
+        for chunk in chunker.chunk(document, fmt="markdown", duplicate_filter=duplicate_filter):
+            chunk_id = f"doc{doc_index}_chunk{chunk.index}"
+            ids.append(chunk_id)
+            texts.append(chunk.page_content)
+            # Only the facts of this document can be in its chunks
+            for fact in corpus.document_facts[doc_index]:
+                if corpus.facts[fact] in chunk.text:
+                    relevant.setdefault(fact, set()).add(chunk_id)
+    return ids, texts, relevant
+
+
+def rank_metrics(ranked: Sequence[str], relevant: Set[str], k: int) -> Tuple[float, float]:
+    """Return (recall@k, reciprocal rank) of one ranked result list."""
+    if not relevant:
+        return 0.0, 0.0
+    top = list(ranked[:k])
+    recall = len(relevant.intersection(top)) / len(relevant)
+    for rank, chunk_id in enumerate(top, start=1):
+        if chunk_id in relevant:
+            return recall, 1.0 / rank
+    return recall, 0.0
+
+
+def current_rss_mb() -> float:
+    """Resident memory of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / 2 ** 20
+
+
+def open_store(backend: str, path: str, embeddings: Embeddings):
+    """Open an empty vector store for ``backend`` ('numpy' or 'chroma', optionally '+bm25')."""
+    if backend.split('+')[0] == 'numpy':
+        return NumpyVectorStore(path, embeddings)
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=path, embedding_function=embeddings, collection_name="retrieval_benchmark")
+
+
+def run_backend(backend: str, chunking: str, ids: List[str], texts: List[str], relevant: Dict[int, Set[str]],
+                queries: Sequence[BenchmarkQuery], embeddings: Embeddings, k: int,
+                workdir: Optional[str] = None) -> BenchmarkResult:
+    """Ingest the chunks into a fresh store for ``backend`` and run the queries against it."""
+    path = tempfile.mkdtemp(prefix=f"retrieval_benchmark_{backend.replace('+', '_')}_", dir=workdir)
+    try:
+        gc.collect()
+        rss_before = current_rss_mb()
+        store = open_store(backend, path, embeddings)
+
+        start = time.perf_counter()
+        for offset in range(0, len(texts), INGEST_BATCH_SIZE):
+            batch_ids = ids[offset:offset + INGEST_BATCH_SIZE]
+            store.add_texts(
+                texts[offset:offset + INGEST_BATCH_SIZE],
+                metadatas=[{"chunk_id": chunk_id, "source": "benchmark"} for chunk_id in batch_ids],
+                ids=batch_ids,
+            )
+        ingest_seconds = time.perf_counter() - start
+
+        hybrid = backend.endswith('+bm25')
+        lexical_build_seconds = 0.0
+        if hybrid:
+            start = time.perf_counter()
+            get_lexical_index(store)
+            lexical_build_seconds = time.perf_counter() - start
+
+        search: Callable = (lambda q: hybrid_search(store, q, k=k)) if hybrid else (lambda q: store.similarity_search(q, k=k))
+        latencies, recalls, reciprocal_ranks = [], [], []
+        for query in queries:
+            start = time.perf_counter()
+            documents = search(query.text)
+            latencies.append(time.perf_counter() - start)
+            recall, reciprocal_rank = rank_metrics(
+                [document.metadata.get("chunk_id") for document in documents], relevant.get(query.fact, set()), k
+            )
+            recalls.append(recall)
+            reciprocal_ranks.append(reciprocal_rank)
+
+        rss_mb = current_rss_mb() - rss_before
+        latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        return BenchmarkResult(
+            backend=backend,
+            chunking=chunking,
+            chunks=len(texts),
+            queries=len(queries),
+            k=k,
+            recall_at_k=float(np.mean(recalls)) if recalls else 0.0,
+            mrr=float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0,
+            p50_ms=float(np.percentile(latencies_ms, 50)),
+            p95_ms=float(np.percentile(latencies_ms, 95)),
+            ingest_seconds=ingest_seconds,
+            chunks_per_second=len(texts) / ingest_seconds if ingest_seconds else 0.0,
+            lexical_build_seconds=lexical_build_seconds,
+            rss_mb=max(rss_mb, 0.0),
+            disk_mb=directory_size_mb(path),
+        )
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def parse_chunking(spec: str) -> Tuple[int, int]:
+    """Parse a chunking configuration written as ``max_tokens:overlap_tokens``."""
+    max_tokens, _, overlap = spec.partition(':')
+    return int(max_tokens), int(overlap or 0)
+
+
+def run_benchmark(sections: int, query_count: int, backends: Sequence[str], chunkings: Sequence[str],
+                  embeddings: Embeddings, k: int = 5, seed: int = 0, workdir: Optional[str] = None,
+                  progress: Optional[Callable[[str], None]] = None) -> List[BenchmarkResult]:
+    """Run every backend against every chunking configuration of one generated corpus."""
+    corpus = generate_corpus(sections, query_count, seed=seed)
+    results = []
+    for chunking in chunkings:
+        max_tokens, overlap_tokens = parse_chunking(chunking)
+        chunker = ContentChunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        ids, texts, relevant = chunk_corpus(corpus, chunker)
+        if progress:
+            progress(f"Chunking {chunking}: {len(texts)} chunks from {len(corpus.documents)} documents")
+        for backend in backends:
+            result = run_backend(backend, chunking, ids, texts, relevant, corpus.queries, embeddings, k, workdir)
+            if progress:
+                progress(format_result(result))
+            results.append(result)
+    return results
+
+
+def format_result(result: BenchmarkResult) -> str:
+    return (
+        f"{result.backend:>12} {result.chunking:>7}: {result.chunks} chunks, "
+        f"recall@{result.k} {result.recall_at_k:.3f}, MRR {result.mrr:.3f}, "
+        f"p50 {result.p50_ms:.1f} ms, p95 {result.p95_ms:.1f} ms, "
+        f"ingest {result.chunks_per_second:.0f} chunks/s"
+        + (f" (+{result.lexical_build_seconds:.2f}s BM25 build)" if result.lexical_build_seconds else "")
+        + f", RSS +{result.rss_mb:.0f} MB, disk {result.disk_mb:.1f} MB"
+    )
@@ -28,15 +28,17 @@ class TutorSessionSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 class TutorSessionListSerializer(serializers.ModelSerializer):
-    message_count = serializers.SerializerMethodField()
+    """Sessions annotated by ``TutorSession.objects.with_activity()``."""
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_at = serializers.DateTimeField(read_only=True)
+    last_message_preview = serializers.CharField(read_only=True)
     
     class Meta:
         model = TutorSession
-        fields = ['id', 'user', 'title', 'status', 'created_at', 'updated_at', 'message_count']
-        read_only_fields = ['created_at', 'updated_at', 'message_count']
-    
-    def get_message_count(self, obj):
-        return obj.messages.count()
+        fields = ['id', 'user', 'title', 'status', 'created_at', 'updated_at', 'message_count',
+                  'last_message_at', 'last_message_preview']
+        read_only_fields = ['created_at', 'updated_at', 'message_count', 'last_message_at',
+                            'last_message_preview']
 
 class TutorSessionCreateSerializer(serializers.ModelSerializer):
     class Meta:
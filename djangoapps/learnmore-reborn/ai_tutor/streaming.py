@@ -0,0 +1,126 @@
+"""
+Server-Sent Events relay for AI tutor answers.
+
+The tutor's answer is sent to the browser token by token as it is generated,
+instead of after the whole answer is ready. The stream carries three event
+types:
+
+``user_message``
+    the saved question, sent first;
+``token``
+    a piece of the answer (``{"content": "..."}``);
+``done``
+    the saved tutor message, once the answer is complete. Its content is the
+    final answer and replaces the streamed text.
+"""
+
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from .models import TutorMessage, TutorSession
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def message_payload(message: TutorMessage) -> Dict[str, Any]:
+    return {
+        'id': message.id,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def _reply_fields(response_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'content': response_data["content"],
+        'metadata': {
+            "sources": response_data.get("sources", []),
+            **response_data.get("metadata", {})
+        },
+    }
+
+
+def stream_tutor_reply(session: TutorSession, user_message: TutorMessage,
+                       serialize: Callable[[TutorMessage], Dict[str, Any]] = message_payload) -> Iterator[str]:
+    """
+    Yield SSE events for the tutor's answer to ``user_message``.
+
+    The tutor message is saved, and the session's ``updated_at`` touched, as
+    soon as the answer is complete. The service's follow-up work (refreshing
+    the conversation summary) runs after the ``done`` event has been sent, so
+    a client that disconnects then does not lose the answer.
+    """
+    from .langchain_service import tutor_langchain_service
+
+    yield sse_event('user_message', serialize(user_message))
+
+    for event in tutor_langchain_service.stream_tutor_response(session, user_message.content):
+        if event['type'] == 'token':
+            yield sse_event('token', {'content': event['content']})
+        else:
+            tutor_message = TutorMessage.objects.create(
+                session=session, message_type='tutor', **_reply_fields(event['response'])
+            )
+            session.save()  # This will update the updated_at timestamp
+            yield sse_event('done', {'tutor_message': serialize(tutor_message)})
+
+
+async def astream_tutor_reply(session: TutorSession, user_message: TutorMessage,
+                              serialize: Callable[[TutorMessage], Dict[str, Any]] = message_payload
+                              ) -> AsyncIterator[str]:
+    """Async :func:`stream_tutor_reply`, for ASGI servers; the answer is saved with the async ORM."""
+    from .langchain_service import tutor_langchain_service
+
+    yield sse_event('user_message', serialize(user_message))
+
+    async for event in tutor_langchain_service.astream_tutor_response(session, user_message.content):
+        if event['type'] == 'token':
+            yield sse_event('token', {'content': event['content']})
+        else:
+            tutor_message = await TutorMessage.objects.acreate(
+                session=session, message_type='tutor', **_reply_fields(event['response'])
+            )
+            await session.asave()
+            yield sse_event('done', {'tutor_message': serialize(tutor_message)})
+
+
+def streaming_reply_response(session: TutorSession, user_message: TutorMessage,
+                             serialize: Callable[[TutorMessage], Dict[str, Any]] = message_payload,
+                             asynchronous: bool = False) -> StreamingHttpResponse:
+    """
+    Wrap the tutor reply stream in an unbuffered ``text/event-stream`` response.
+
+    Pass ``asynchronous=True`` when serving over ASGI; WSGI servers can only
+    stream a synchronous iterator (Django buffers async ones completely).
+    """
+    stream = astream_tutor_reply if asynchronous else stream_tutor_reply
+    response = StreamingHttpResponse(
+        stream(session, user_message, serialize),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets API clients negotiate ``Accept: text/event-stream``.
+
+    Streams bypass rendering; only error responses reach this renderer, and
+    are rendered as JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode(self.charset)
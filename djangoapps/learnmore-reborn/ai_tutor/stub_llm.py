@@ -0,0 +1,177 @@
+"""
+Stub OpenAI-compatible LLM server for offline benchmarks.
+
+``StubLLMApp`` is a plain ASGI application answering ``/v1/chat/completions``
+(streaming and non-streaming) and ``/v1/embeddings`` with deterministic
+content after a configurable delay, so the tutor pipeline can be load tested
+without network access or API costs. ``/stats`` reports how many requests
+were in flight at once, which shows whether the server under test actually
+overlaps its LLM calls.
+
+Run it with ``python manage.py run_stub_llm`` and point the tutor at it with
+``AI_TUTOR_OPENAI_BASE_URL=http://127.0.0.1:8765/v1`` and any ``sk-`` key.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+FILLER = (
+    "This stub answer stands in for the tutor model so that request handling "
+    "can be measured without calling a real language model."
+).split()
+
+
+def stub_embedding(text: str, dim: int) -> np.ndarray:
+    """Hashed bag-of-words vector, so that texts sharing words are similar."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class StubLLMApp:
+    """Minimal OpenAI-compatible ASGI app with simulated latency."""
+
+    def __init__(self, first_token_delay: float = 0.5, token_delay: float = 0.02,
+                 completion_tokens: int = 60, embedding_delay: float = 0.05, embedding_dim: int = 1536):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.completion_tokens = completion_tokens
+        self.embedding_delay = embedding_delay
+        self.embedding_dim = embedding_dim
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        path = scope["path"].rstrip("/")
+        if path.endswith("/stats"):
+            await self._send_json(send, self.stats())
+            return
+
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            payload = json.loads(body or b"{}")
+            if path.endswith("/chat/completions"):
+                await self._chat_completion(payload, send)
+            elif path.endswith("/embeddings"):
+                await self._embeddings(payload, send)
+            else:
+                await self._send_json(send, {"error": {"message": f"Unknown path {path}"}}, status=404)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "in_flight": self.in_flight, "max_in_flight": self.max_in_flight}
+
+    def answer_tokens(self, messages: List[Dict[str, Any]]) -> List[str]:
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        words = [f"Stub answer to: {' '.join(str(question).split()[-12:])}."]
+        while len(words) < self.completion_tokens:
+            words.append(FILLER[len(words) % len(FILLER)])
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    async def _chat_completion(self, payload: Dict[str, Any], send) -> None:
+        model = payload.get("model", "stub")
+        tokens = self.answer_tokens(payload.get("messages", []))
+        created = int(time.time())
+        await asyncio.sleep(self.first_token_delay)
+
+        if not payload.get("stream"):
+            await asyncio.sleep(self.token_delay * (len(tokens) - 1))
+            await self._send_json(send, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream")],
+        })
+
+        async def chunk(delta: Dict[str, Any], finish_reason=None) -> None:
+            data = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            await send({"type": "http.response.body", "body": f"data: {json.dumps(data)}\n\n".encode(),
+                        "more_body": True})
+
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            await chunk({"role": "assistant", "content": token} if i == 0 else {"content": token})
+        await chunk({}, "stop")
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n", "more_body": False})
+
+    async def _embeddings(self, payload: Dict[str, Any], send) -> None:
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(self.embedding_delay)
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = stub_embedding(text if isinstance(text, str) else " ".join(map(str, text)), self.embedding_dim)
+            if payload.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        await self._send_json(send, {
+            "object": "list",
+            "data": data,
+            "model": payload.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    @staticmethod
+    async def _send_json(send, data: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(data).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
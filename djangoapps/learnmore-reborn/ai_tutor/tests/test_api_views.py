@@ -219,6 +219,64 @@ class TestTutorSessionAPI:
         assert tutor_messages.first().metadata['sources'] == ['knowledge_base:1']
         assert tutor_messages.first().metadata['model'] == 'test-model'
 
+    
+    def test_stream_message(self, authenticated_client):
+        """Test streaming the tutor's answer through the API."""
+        client, user = authenticated_client
+        session = TutorSession.objects.create(
+            user=user,
+            title='Test Session',
+            status='active'
+        )
+        
+        events = [
+            {'type': 'token', 'content': 'Streamed'},
+            {'type': 'done', 'response': {'content': 'Streamed', 'sources': [], 'metadata': {}}},
+        ]
+        with patch('ai_tutor.langchain_service.tutor_langchain_service.stream_tutor_response',
+                   return_value=iter(events)):
+            url = reverse('ai_tutor:tutor-session-stream-message', args=[session.id])
+            response = client.post(url, {'session': session.id, 'message_type': 'user', 'content': 'What is machine learning?'},
+                                   format='json',
+                                   HTTP_ACCEPT='text/event-stream')
+            assert response.status_code == 200
+            assert response['Content-Type'] == 'text/event-stream'
+            body = b''.join(response.streaming_content).decode()
+        
+        assert 'event: token\ndata: {"content": "Streamed"}' in body
+        tutor_message = TutorMessage.objects.get(session=session, message_type='tutor')
+        assert '"message_type": "tutor"' in body.split('event: done')[1]
+        assert tutor_message.content == 'Streamed'
+        
+        # Validation errors are still reported as JSON
+        response = client.post(url, {}, format='json', HTTP_ACCEPT='text/event-stream')
+        assert response.status_code == 400
+        assert 'content' in json.loads(response.content)
+    
+    def test_list_sessions_with_activity(self, authenticated_client, django_assert_num_queries):
+        """Message counts and previews come from one query, and pages follow on by cursor."""
+        client, user = authenticated_client
+        for i in range(5):
+            session = TutorSession.objects.create(user=user, title=f'Session {i}')
+            for j in range(i):
+                TutorMessage.objects.create(session=session, message_type='user', content=f'Question {i}.{j}')
+        
+        url = reverse('ai_tutor:tutor-session-list')
+        with django_assert_num_queries(1):
+            response = client.get(url, {'page_size': 3})
+        
+        data = response.json()
+        assert [s['title'] for s in data['results']] == ['Session 4', 'Session 3', 'Session 2']
+        assert [s['message_count'] for s in data['results']] == [4, 3, 2]
+        assert data['results'][0]['last_message_preview'] == 'Question 4.3'
+        assert data['results'][0]['last_message_at'] is not None
+        
+        data = client.get(data['next']).json()
+        assert [s['title'] for s in data['results']] == ['Session 1', 'Session 0']
+        assert data['results'][1]['message_count'] == 0
+        assert data['results'][1]['last_message_preview'] is None
+        assert data['next'] is None
+        
 
 @pytest.mark.django_db
 class TestTutorMessageAPI:
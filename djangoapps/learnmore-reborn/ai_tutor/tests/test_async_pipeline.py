@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from ai_tutor.langchain_service import TutorLangChainService
+from ai_tutor.models import TutorSession
+from ai_tutor.response_cache import response_cache
+from ai_tutor.stub_llm import StubLLMApp, stub_embedding
+from ai_tutor.vector_index import NumpyVectorStore
+
+User = get_user_model()
+
+DIM = 32
+
+
+@pytest.fixture
+def stub():
+    return StubLLMApp(first_token_delay=0.2, token_delay=0, completion_tokens=8, embedding_delay=0,
+                      embedding_dim=DIM)
+
+
+@pytest.fixture
+def service(stub, tmp_path):
+    """A tutor service whose LLM and embeddings talk to the in-process stub server."""
+    response_cache.clear()
+    client_kwargs = {"openai_api_key": "sk-stub", "openai_api_base": "http://stub/v1",
+                     "http_async_client": httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))}
+
+    service = TutorLangChainService()
+    service.api_key = "sk-stub"
+    service.embeddings = OpenAIEmbeddings(check_embedding_ctx_length=False, **client_kwargs)
+    service.llm = ChatOpenAI(model_name="gpt-3.5-turbo", streaming=True, **client_kwargs)
+    service.condense_llm = ChatOpenAI(model_name="gpt-3.5-turbo", **client_kwargs)
+
+    texts = ["Joins combine rows from two tables.", "Indexes speed up lookups."]
+    service.vector_store = NumpyVectorStore(str(tmp_path), service.embeddings)
+    service.vector_store.index.add(
+        ["kb_1", "kb_2"], [stub_embedding(text, DIM) for text in texts], texts,
+        [{"source": "knowledge_base"}, {"source": "knowledge_base"}]
+    )
+    yield service
+    response_cache.clear()
+
+
+@pytest.mark.django_db
+class TestAsyncTutorPipeline:
+    """Test cases for the async tutor pipeline against the stub LLM server."""
+
+    def test_concurrent_requests_overlap(self, service, stub):
+        """Concurrent questions wait on the LLM together instead of one after another."""
+        user = User.objects.create_user(username='student', password='password')
+        sessions = [TutorSession.objects.create(user=user, title=f'Session {i}') for i in range(10)]
+
+        async def ask_all():
+            return await asyncio.gather(*(
+                service.aget_tutor_response(session, f"question {i} about joins")
+                for i, session in enumerate(sessions)
+            ))
+
+        responses = async_to_sync(ask_all)()
+
+        assert all(response["content"].startswith("Stub answer to:") for response in responses)
+        assert responses[3]["sources"] == ["knowledge_base", "knowledge_base"]
+        # Ten answers each taking 0.2s were generated at the same time
+        assert stub.max_in_flight >= 5
+
+    def test_astream_tutor_response(self, service):
+        """Tokens arrive one by one and the final response carries the full answer."""
+        user = User.objects.create_user(username='student', password='password')
+        session = TutorSession.objects.create(user=user, title='Session')
+
+        async def collect():
+            return [event async for event in service.astream_tutor_response(session, "what are joins")]
+
+        events = async_to_sync(collect)()
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+
+        assert len(tokens) == 8
+        assert events[-1]["type"] == "done"
+        assert events[-1]["response"]["content"] == "".join(tokens)
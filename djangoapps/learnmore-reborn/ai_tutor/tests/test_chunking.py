@@ -0,0 +1,99 @@
+from ai_tutor.chunking import (
+    ContentChunker,
+    NearDuplicateFilter,
+    count_tokens,
+    parse_html,
+    parse_markdown,
+)
+
+
+def word_count(text):
+    return len(text.split())
+
+
+class TestParsing:
+    """Test cases for block parsing of markdown and HTML."""
+
+    def test_markdown_blocks_and_heading_path(self):
+        """Headings nest into a path and lists/code blocks stay whole."""
+        text = (
+            "# Python\n\nIntro paragraph.\n\n"
+            "## Loops\n\n- for loops\n- while loops\n\n"
+            "```python\nfor i in range(3):\n\n    print(i)\n```\n\n"
+            "## Functions\n\nDefine with def."
+        )
+        blocks = parse_markdown(text)
+
+        assert [block.kind for block in blocks] == ["paragraph", "list", "code", "paragraph"]
+        assert blocks[0].heading_path == ("Python",)
+        assert blocks[1].heading_path == ("Python", "Loops")
+        assert blocks[1].text == "- for loops\n- while loops"
+        # The blank line inside the fence does not split the code block
+        assert "print(i)" in blocks[2].text and blocks[2].text.startswith("```python")
+        assert blocks[3].heading_path == ("Python", "Functions")
+
+    def test_html_blocks_and_heading_path(self):
+        """HTML headings, lists and pre blocks are recognised; scripts are dropped."""
+        html = (
+            "<h1>Databases</h1><p>Tables &amp; rows.</p>"
+            "<h2>Indexes</h2><ul><li>B-tree</li><li>Hash</li></ul>"
+            "<pre>CREATE INDEX idx\n  ON t (c);</pre><script>alert(1)</script>"
+        )
+        blocks = parse_html(html)
+
+        assert [block.kind for block in blocks] == ["paragraph", "list", "code"]
+        assert blocks[0].text == "Tables & rows."
+        assert blocks[1].heading_path == ("Databases", "Indexes")
+        assert blocks[1].text == "- B-tree\n- Hash"
+        assert blocks[2].text == "CREATE INDEX idx\n  ON t (c);"
+
+
+class TestContentChunker:
+    """Test cases for the structure-aware chunker."""
+
+    def test_sections_are_not_merged(self):
+        """Chunks never span two sections of reasonable size."""
+        sentence = "Each lesson sentence carries a few distinct words number {}. "
+        text = "# A\n\n" + "".join(sentence.format(i) for i in range(10)) + \
+               "\n\n# B\n\n" + "".join(sentence.format(i + 100) for i in range(10))
+        chunks = ContentChunker(max_tokens=500, token_counter=word_count).chunk(text)
+
+        assert [chunk.heading_path for chunk in chunks] == [("A",), ("B",)]
+        assert chunks[1].page_content.startswith("B\n\n")
+        assert chunks[1].metadata() == {"chunk_index": 1, "heading_path": "B", "token_count": chunks[1].token_count}
+
+    def test_token_budget_is_respected(self):
+        """Long sections are split on sentences within the budget."""
+        text = "# Long\n\n" + " ".join(f"Sentence {i} has exactly seven words here." for i in range(50))
+        chunker = ContentChunker(max_tokens=40, overlap_tokens=0, token_counter=word_count)
+        chunks = chunker.chunk(text)
+
+        assert len(chunks) > 1
+        assert all(chunk.token_count <= 40 for chunk in chunks)
+        assert all(chunk.heading_path == ("Long",) for chunk in chunks)
+
+    def test_overlap_carries_last_sentence(self):
+        """A split section repeats only the final sentence of the previous chunk."""
+        paragraphs = [" ".join(f"Topic {p} sentence {i} words." for i in range(5)) for p in range(3)]
+        text = "# Overlap\n\n" + "\n\n".join(paragraphs)
+        chunker = ContentChunker(max_tokens=30, overlap_tokens=10, dedupe_threshold=None, token_counter=word_count)
+        chunks = chunker.chunk(text)
+
+        assert len(chunks) == 3
+        assert chunks[1].text.startswith("Topic 0 sentence 4 words.")
+
+    def test_near_duplicate_chunks_are_dropped(self):
+        """Repeated boilerplate is only emitted once, also across documents."""
+        boilerplate = "Remember to submit your assignment through the portal before the deadline."
+        text = f"# One\n\n{boilerplate}\n\n# Two\n\n{boilerplate}"
+        chunker = ContentChunker(min_tokens=0, token_counter=word_count)
+        assert len(chunker.chunk(text)) == 1
+
+        shared = NearDuplicateFilter()
+        assert len(chunker.chunk(boilerplate, duplicate_filter=shared)) == 1
+        assert chunker.chunk(boilerplate + "!", duplicate_filter=shared) == []
+
+    def test_count_tokens(self):
+        """Token counting works with or without tiktoken."""
+        assert count_tokens("") == 0
+        assert count_tokens("hello world") >= 2
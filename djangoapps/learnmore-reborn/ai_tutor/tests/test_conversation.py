@@ -0,0 +1,127 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from ai_tutor.conversation import fit_to_budget, summarize_turns, truncate_to_tokens
+from ai_tutor.langchain_service import TutorLangChainService
+from ai_tutor.models import TutorMessage, TutorSession
+
+User = get_user_model()
+
+
+def word_count(text):
+    return len(text.split())
+
+
+class TestConversationHelpers:
+    """Test cases for the conversation window helpers."""
+
+    def test_fit_to_budget_keeps_newest_turns(self):
+        """Turns are dropped from the oldest end, and the newest turn is always kept."""
+        turns = [{"role": "human", "content": "one two three"},
+                 {"role": "ai", "content": "four five"},
+                 {"role": "human", "content": "six"}]
+
+        kept, tokens = fit_to_budget(turns, 3, word_count)
+        assert [turn["content"] for turn in kept] == ["four five", "six"]
+        assert tokens == 3
+
+        kept, tokens = fit_to_budget(turns, 0, word_count)
+        assert [turn["content"] for turn in kept] == ["six"]
+
+    def test_truncate_to_tokens(self):
+        """Text is cut at a word boundary from either end."""
+        text = "a b c d e f"
+        assert truncate_to_tokens(text, 10, token_counter=word_count) == text
+        assert truncate_to_tokens(text, 2, keep="start", token_counter=word_count) == "a b"
+        assert truncate_to_tokens(text, 2, keep="end", token_counter=word_count) == "e f"
+
+    def test_summary_falls_back_to_recent_turns(self):
+        """A failing summariser keeps the most recent text within the budget."""
+        llm = MagicMock()
+        llm.invoke.side_effect = Exception("rate limited")
+        turns = [{"role": "human", "content": "what is a join " * 50},
+                 {"role": "ai", "content": "it combines rows"}]
+
+        summary = summarize_turns(llm, "earlier notes", turns, max_tokens=20)
+        assert summary.endswith("Tutor: it combines rows")
+        assert len(summary.split()) <= 20
+
+
+@pytest.mark.django_db
+class TestConversationWindow:
+    """Test cases for bounded conversation history in the LangChain service."""
+
+    def make_session(self, turns):
+        user = User.objects.create_user(username='student', password='password')
+        session = TutorSession.objects.create(user=user, title='Session')
+        TutorMessage.objects.create(session=session, message_type='system', content='Session started')
+        for i in range(turns):
+            TutorMessage.objects.create(session=session, message_type='user', content=f'question {i}')
+            TutorMessage.objects.create(session=session, message_type='tutor', content=f'answer {i}')
+        return session
+
+    def test_history_reads_only_the_window(self):
+        """The most recent messages are fetched with a LIMIT and returned oldest first."""
+        session = self.make_session(20)
+        service = TutorLangChainService()
+
+        with CaptureQueriesContext(connection) as queries:
+            history = service.get_conversation_history(session, max_messages=4)
+
+        assert [turn["content"] for turn in history] == ['question 18', 'answer 18', 'question 19', 'answer 19']
+        assert len(queries) == 1
+        assert 'LIMIT 4' in queries[0]['sql']
+
+    def test_summary_covers_turns_outside_the_window(self, settings):
+        """Turns that leave the window are folded into the session summary in batches."""
+        settings.AI_TUTOR_HISTORY_MAX_MESSAGES = 4
+        settings.AI_TUTOR_SUMMARY_BATCH = 6
+        session = self.make_session(3)
+        service = TutorLangChainService()
+        service.condense_llm = MagicMock()
+        service.condense_llm.invoke.return_value = AIMessage(content="The student asked about questions 0 and 1.")
+
+        # Only two messages have left the window so far
+        assert service.update_conversation_summary(session) is False
+
+        for i in range(3, 5):
+            TutorMessage.objects.create(session=session, message_type='user', content=f'question {i}')
+            TutorMessage.objects.create(session=session, message_type='tutor', content=f'answer {i}')
+        assert service.update_conversation_summary(session) is True
+
+        session.refresh_from_db()
+        state = session.session_context['history_summary']
+        assert state['text'] == "The student asked about questions 0 and 1."
+        assert state['until_id'] == TutorMessage.objects.get(session=session, content='answer 2').id
+        assert 'question 0' in service.condense_llm.invoke.call_args[0][0]
+
+        window = service.get_conversation_window(session)
+        assert window.summary == state['text']
+        assert [turn["content"] for turn in window.turns] == ['question 3', 'answer 3', 'question 4', 'answer 4']
+
+    def test_chain_receives_summary_and_window(self, settings):
+        """The chain gets the summary and recent turns as chat history, without the current question."""
+        settings.AI_TUTOR_HISTORY_MAX_MESSAGES = 3
+        session = self.make_session(2)
+        session.session_context = {'history_summary': {'text': 'Earlier: joins.', 'until_id': 0}}
+        session.save()
+        TutorMessage.objects.create(session=session, message_type='user', content='and indexes?')
+
+        chain = MagicMock(return_value={"answer": "Indexes speed up lookups.", "source_documents": []})
+        service = TutorLangChainService()
+        service.api_key = 'test_key'
+        with patch.object(TutorLangChainService, 'get_retrieval_chain', return_value=chain):
+            response = service.get_tutor_response(session, 'and indexes?')
+
+        assert response["content"] == "Indexes speed up lookups."
+        inputs = chain.call_args[0][0]
+        assert inputs["question"] == 'and indexes?'
+        assert inputs["chat_history"] == [
+            SystemMessage(content="Summary of the earlier conversation: Earlier: joins."),
+            HumanMessage(content='question 1'),
+            AIMessage(content='answer 1'),
+        ]
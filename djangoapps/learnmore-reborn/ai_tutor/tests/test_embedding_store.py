@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from ai_tutor import langchain_service
+from ai_tutor.embedding_store import MissingEmbeddings, StoredEmbeddings, content_hash
+from ai_tutor.langchain_service import TutorLangChainService
+from ai_tutor.models import KnowledgeChunkEmbedding, TutorKnowledgeBase
+from ai_tutor.retrieval_benchmark import HashingEmbeddings
+
+
+def stored_embeddings(dimension=32):
+    provider = MagicMock(wraps=HashingEmbeddings(dimension))
+    return provider, StoredEmbeddings(provider, model_id=f"hashing-{dimension}")
+
+
+@pytest.mark.django_db
+class TestStoredEmbeddings:
+    """Test cases for persisted knowledge base chunk embeddings."""
+
+    def test_query_vectors_are_reused(self):
+        """The question embedded for the response cache is not embedded again for retrieval."""
+        provider, embeddings = stored_embeddings()
+
+        assert embeddings.embed_query("what is a join") == embeddings.embed_query("what is a join")
+        embeddings.embed_query("what is an index")
+        assert provider.embed_query.call_count == 2
+
+    def test_vectors_are_stored_once_as_float32(self):
+        """Each distinct chunk is embedded once and stored as float32 bytes."""
+        provider, embeddings = stored_embeddings()
+
+        first = embeddings.embed_documents(["joins combine rows", "indexes speed lookups", "joins combine rows"])
+        provider.embed_documents.assert_called_once_with(["joins combine rows", "indexes speed lookups"])
+
+        row = KnowledgeChunkEmbedding.objects.get(content_hash=content_hash("joins combine rows"))
+        assert (row.model_id, row.dimension, len(bytes(row.vector))) == ("hashing-32", 32, 32 * 4)
+
+        again = embeddings.embed_documents(["indexes speed lookups", "joins combine rows"])
+        assert provider.embed_documents.call_count == 1
+        np.testing.assert_allclose(again, [first[1], first[0]], rtol=1e-6)
+        assert KnowledgeChunkEmbedding.objects.count() == 2
+
+    def test_models_do_not_share_vectors(self):
+        _, embeddings = stored_embeddings(32)
+        embeddings.embed_documents(["joins combine rows"])
+        other_provider, other = stored_embeddings(16)
+        other.embed_documents(["joins combine rows"])
+        assert other_provider.embed_documents.called
+        assert KnowledgeChunkEmbedding.objects.count() == 2
+
+    def test_stored_only_never_calls_the_provider(self):
+        provider, embeddings = stored_embeddings()
+        embeddings.embed_documents(["known chunk"])
+        with embeddings.stored_only():
+            embeddings.embed_documents(["known chunk"])
+            with pytest.raises(MissingEmbeddings):
+                embeddings.embed_documents(["new chunk"])
+        assert provider.embed_documents.call_count == 1
+
+
+@pytest.mark.django_db
+class TestKnowledgeBaseRebuild:
+    """Test cases for rebuilding the vector store from stored embeddings."""
+
+    def test_default_index_paths_do_not_nest(self):
+        numpy_path = os.path.join(langchain_service.NUMPY_INDEX_PATH, '')
+        chroma_path = os.path.join(langchain_service.VECTOR_STORE_PATH, '')
+        assert not numpy_path.startswith(chroma_path) and not chroma_path.startswith(numpy_path)
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        self.chroma_path = tmp_path / 'vector_store'
+        self.chroma_path.mkdir()
+        monkeypatch.setattr('ai_tutor.langchain_service.VECTOR_STORE_PATH', str(self.chroma_path))
+        monkeypatch.setattr('ai_tutor.langchain_service.NUMPY_INDEX_PATH', str(tmp_path / 'numpy_index'))
+        service = TutorLangChainService()
+        self.provider, service.embeddings = stored_embeddings()
+        service.vector_backend = 'numpy'
+        TutorKnowledgeBase.objects.create(title='Joins', content='# Joins\n\nAn inner join keeps matching rows.')
+        TutorKnowledgeBase.objects.create(title='Indexes', content='# Indexes\n\nA B-tree index speeds up lookups.')
+        return service
+
+    def test_backend_change_reuses_stored_embeddings(self, service):
+        """Moving the index to another backend makes no embedding provider calls."""
+        assert service.process_knowledge_base(force_recreate=True) is True
+        assert self.provider.embed_documents.call_count == 1
+
+        service.vector_backend = 'chroma'
+        service.vector_store = None
+        assert service.process_knowledge_base(force_recreate=True, stored_only=True) is True
+        assert self.provider.embed_documents.call_count == 1
+        assert service.vector_store.similarity_search('inner join', k=1)[0].metadata['title'] == 'Joins'
+
+    def test_numpy_index_is_not_mistaken_for_a_chroma_store(self, service):
+        """The Chroma directory stays empty, so a Chroma-backed service does not try to open it."""
+        assert service.process_knowledge_base(force_recreate=True) is True
+        assert list(self.chroma_path.iterdir()) == []
+
+    def test_stored_only_rebuild_with_missing_chunks_keeps_the_store(self, service):
+        assert service.process_knowledge_base(force_recreate=True) is True
+        store = service.vector_store
+        TutorKnowledgeBase.objects.create(title='Views', content='A view is a stored query.')
+
+        assert service.process_knowledge_base(force_recreate=True, stored_only=True) is False
+        assert service.vector_store is store
+        assert len(store.index) == 2
+
+    def test_rebuild_prunes_vectors_of_removed_chunks(self, service):
+        assert service.process_knowledge_base(force_recreate=True) is True
+        TutorKnowledgeBase.objects.filter(title='Indexes').update(content='Hash indexes only support equality.')
+
+        assert service.process_knowledge_base(force_recreate=True) is True
+        stored = set(KnowledgeChunkEmbedding.objects.values_list('content_hash', flat=True))
+        assert len(stored) == 2
+        assert content_hash('Hash indexes only support equality.') in stored
@@ -13,6 +13,7 @@ from ai_tutor.models import (
     TutorConfiguration
 )
 from ai_tutor.langchain_service import TutorLangChainService
+from ai_tutor.lexical_index import HybridRetriever
 from courses.models import Course, Module
 from langchain_community.docstore.document import Document
 
@@ -220,7 +221,6 @@ class TestLangChainService:
         service = TutorLangChainService()
         service.llm = MagicMock()
         service.vector_store = MagicMock()
-        service.vector_store.as_retriever.return_value = "mock_retriever"
         
         # Get retrieval chain
         chain = service.get_retrieval_chain(session)
@@ -232,11 +232,17 @@ class TestLangChainService:
         # Extract args from the call
         call_args = mock_chain_from_llm.call_args[1]
         assert call_args['llm'] == service.llm
-        assert call_args['retriever'] == "mock_retriever"
-        assert 'memory' in call_args
+        assert isinstance(call_args['retriever'], HybridRetriever)
+        assert call_args['retriever'].vector_store is service.vector_store
+        # History is passed in per call, so the chain holds no memory
+        assert 'memory' not in call_args
         assert call_args['verbose'] is True
         assert call_args['return_source_documents'] is True
         
+        # The compiled chain is reused for the same prompt
+        assert service.get_retrieval_chain(session) is mock_chain
+        assert mock_chain_from_llm.call_count == 1
+        
         # Test without LLM or vector store
         service.llm = None
         service.vector_store = None
@@ -266,17 +272,9 @@ class TestLangChainService:
         )
         
         # Create LangChain service with mocked components
-        with patch('ai_tutor.langchain_service.RecursiveCharacterTextSplitter') as mock_splitter, \
-             patch.object(TutorLangChainService, 'create_vector_store') as mock_create, \
+        with patch.object(TutorLangChainService, 'create_vector_store') as mock_create, \
              patch.object(TutorLangChainService, 'update_vector_store') as mock_update:
             
-            # Mock the text splitter to return documents
-            mock_splitter_instance = MagicMock()
-            mock_splitter.return_value = mock_splitter_instance
-            
-            # Mock document creation
-            mock_splitter_instance.create_documents.return_value = [Document(page_content="test", metadata={})]
-            
             # Mock vector store operations
             mock_create.return_value = True
             mock_update.return_value = True
@@ -293,6 +291,12 @@ class TestLangChainService:
             assert mock_create.called
             assert not mock_update.called
             
+            # Each entry becomes a chunk carrying its chunk metadata
+            documents = mock_create.call_args[0][0]
+            assert len(documents) == 2
+            assert documents[0].metadata['chunk_index'] == 0
+            assert 'heading_path' in documents[0].metadata
+            
             # Test updating an existing vector store
             mock_create.reset_mock()
             mock_update.reset_mock()
@@ -303,4 +307,38 @@ class TestLangChainService:
             # Assert vector store was updated
             assert result is True
             assert mock_update.called
-            assert not mock_create.called
\ No newline at end of file
+            assert not mock_create.called    
+    def test_stream_tutor_response(self):
+        """Test that answer tokens are relayed as they are generated, followed by the full response."""
+        user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+        session = TutorSession.objects.create(user=user, title='Test Session', status='active')
+        
+        def fake_chain(inputs, callbacks=None):
+            for token in ['Neural ', 'networks ', 'learn.']:
+                callbacks[0].on_llm_new_token(token)
+            return {
+                "answer": "Neural networks learn.",
+                "source_documents": [Document(page_content="Lecture text", metadata={"source": "Lecture 1"})]
+            }
+        
+        service = TutorLangChainService()
+        service.api_key = 'test_key'
+        with patch.object(TutorLangChainService, 'get_retrieval_chain', return_value=fake_chain):
+            events = list(service.stream_tutor_response(session, "What is a neural network?"))
+        
+        assert [event["content"] for event in events if event["type"] == "token"] == [
+            'Neural ', 'networks ', 'learn.'
+        ]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["response"]["content"] == "Neural networks learn."
+        assert events[-1]["response"]["sources"] == ["Lecture 1"]
+        
+        # Without an API key the placeholder is sent as a single token
+        service.api_key = ''
+        events = list(service.stream_tutor_response(session, "What is a neural network?"))
+        assert len(events) == 2
+        assert events[1]["response"]["metadata"]["placeholder"] is True
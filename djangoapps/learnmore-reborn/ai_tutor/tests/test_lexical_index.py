@@ -0,0 +1,185 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from django.contrib.auth import get_user_model
+from langchain_core.embeddings import Embeddings
+
+from ai_tutor.langchain_utils import get_relevant_knowledge
+from ai_tutor.lexical_index import (
+    BM25Index,
+    get_lexical_index,
+    hybrid_search,
+    hybrid_search_with_scores,
+    reciprocal_rank_fusion,
+    register_store_version,
+    tokenize,
+)
+from ai_tutor.models import TutorKnowledgeBase, TutorSession
+from ai_tutor.vector_index import NumpyVectorStore
+from courses.models import Course, Module
+
+User = get_user_model()
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings for tests: a seeded random vector per text."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(sum(map(ord, text)))
+        return rng.normal(size=16).tolist()
+
+
+class TestBM25Index:
+    """Test cases for the BM25 inverted index."""
+
+    def test_tokenize_keeps_identifiers_and_parts(self):
+        """Identifiers and course codes survive tokenisation."""
+        assert tokenize("Call get_user_model() in INFS7202") == [
+            "call", "get_user_model", "get", "user", "model", "infs7202"
+        ]
+
+    def test_exact_terms_rank_first(self):
+        """Rare exact terms outrank documents that only share common words."""
+        index = BM25Index()
+        index.add("a", "Python functions are defined with def and return values.")
+        index.add("b", "Use argpartition to select the top k scores from an array.")
+        index.add("c", "Functions can return values; Python functions are first class.")
+
+        results = index.search("how does argpartition work", k=2)
+        assert [doc_id for doc_id, _, _, _ in results] == ["b"]
+        assert results[0][3] > 0
+
+    def test_remove_replace_and_filters(self):
+        """Removed and replaced documents stop matching; course/module filters apply."""
+        index = BM25Index()
+        index.add("a", "sql joins explained", {"course_id": 1, "module_id": 10})
+        index.add("b", "sql indexes explained", {"course_id": 2, "module_id": 20})
+        index.add("c", "sql transactions", {"course_id": 1, "module_id": 11})
+
+        assert {hit[0] for hit in index.search("sql", 5, course_id=1)} == {"a", "c"}
+        assert [hit[0] for hit in index.search("sql", 5, module_id=20)] == ["b"]
+
+        index.remove("a")
+        index.add("c", "normal forms", {"course_id": 1, "module_id": 11})
+        assert [hit[0] for hit in index.search("sql", 5)] == ["b"]
+        assert len(index) == 2
+
+    def test_rebuild_skips_a_current_signature(self):
+        """rebuild replaces the contents only when the signature changes, and leaves lazy input unread otherwise."""
+        index = BM25Index()
+        index.add("stale", "old notes")
+        assert index.rebuild([("a", "sql joins", {})], signature=1)
+        assert [hit[0] for hit in index.search("sql", 5)] == ["a"]
+        assert "stale" not in index
+
+        def unread():
+            raise AssertionError("documents read for a current index")
+            yield
+
+        assert not index.rebuild(unread(), signature=1)
+        assert index.rebuild([("b", "sql indexes", {})], signature=2)
+        assert [hit[0] for hit in index.search("sql", 5)] == ["b"]
+
+    def test_reciprocal_rank_fusion(self):
+        """Keys ranked well in both lists come first."""
+        fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])
+        assert [key for key, _ in fused][:2] == ["y", "x"]
+
+
+class TestHybridSearch:
+    """Test cases for fused vector and keyword retrieval."""
+
+    def test_keyword_match_is_retrieved(self, tmp_path):
+        """A chunk containing the exact query term is returned even if its vector is not the closest."""
+        texts = [f"General lesson text number {i} about studying." for i in range(20)]
+        texts.append("The qr_scan_limit setting caps scans per code.")
+        metadatas = [{"course_id": 1, "module_id": 1} for _ in texts]
+        store = NumpyVectorStore.from_texts(
+            texts, HashEmbeddings(), metadatas=metadatas,
+            ids=[f"chunk_{i}" for i in range(len(texts))], persist_directory=str(tmp_path)
+        )
+
+        docs = hybrid_search(store, "what is qr_scan_limit", k=3, filter={"course_id": 1})
+        assert "The qr_scan_limit setting caps scans per code." in [doc.page_content for doc in docs]
+        assert hybrid_search(store, "what is qr_scan_limit", k=3, filter={"course_id": 2}) == []
+
+    def test_scores_are_relative_to_the_best_possible(self, tmp_path):
+        """A chunk first in both rankings scores 1.0 and scores fall from there."""
+        texts = [f"General lesson text number {i} about studying." for i in range(5)]
+        texts.append("The qr_scan_limit setting caps scans per code.")
+        store = NumpyVectorStore.from_texts(texts, HashEmbeddings(), persist_directory=str(tmp_path))
+
+        scored = hybrid_search_with_scores(store, texts[-1], k=4)
+
+        assert scored[0][0].page_content == texts[-1]
+        assert scored[0][1] == pytest.approx(1.0)
+        scores = [score for _, score in scored]
+        assert scores == sorted(scores, reverse=True) and all(0 < score <= 1 for score in scores)
+
+
+class ChromaLikeStore:
+    """Just enough of a Chroma store for the BM25 mirror: documents and a counted collection."""
+
+    def __init__(self, name, texts):
+        self.texts = texts
+        self._collection = SimpleNamespace(name=name, id=name, count=lambda: len(self.texts))
+
+    def get(self, include):
+        return {
+            "ids": [f"chunk_{i}" for i in range(len(self.texts))],
+            "documents": list(self.texts),
+            "metadatas": [{} for _ in self.texts],
+        }
+
+
+class TestLexicalIndexSignature:
+    """Test cases for noticing writes made to a store by another process."""
+
+    def test_registered_version_catches_in_place_edits(self):
+        store = ChromaLikeStore("edited-in-place", ["alpha notes"])
+        assert get_lexical_index(store).search("alpha")
+
+        # Same chunk count: the collection alone cannot tell the text changed
+        store.texts = ["beta notes"]
+        assert get_lexical_index(store).search("beta") == []
+
+        version = [0]
+        register_store_version(store, lambda: version[0])
+        get_lexical_index(store)
+        store.texts = ["gamma notes"]
+        version[0] += 1
+        assert [hit[1] for hit in get_lexical_index(store).search("gamma")] == ["gamma notes"]
+
+
+@pytest.mark.django_db
+class TestRelevantKnowledge:
+    """Test cases for knowledge base ranking."""
+
+    def test_entries_are_ranked_by_query(self):
+        """Knowledge entries are ranked against the query within the session's course."""
+        user = User.objects.create_user(username='student', password='password')
+        instructor = User.objects.create_user(username='teacher', password='password')
+        course = Course.objects.create(title='Databases', instructor=instructor)
+        other = Course.objects.create(title='Networks', instructor=instructor)
+        module = Module.objects.create(title='SQL', course=course, order=1)
+
+        TutorKnowledgeBase.objects.create(title='Joins', content='Inner and outer joins.', course=course)
+        normalisation = TutorKnowledgeBase.objects.create(
+            title='Normalisation', content='Third normal form removes transitive dependencies.', course=course
+        )
+        TutorKnowledgeBase.objects.create(title='Routing', content='Normal routing tables.', course=other)
+
+        session = TutorSession.objects.create(user=user, course=course, title='Study')
+        assert get_relevant_knowledge(session, 'third normal form', top_k=1) == [normalisation]
+
+        # Edits are picked up without restarting
+        normalisation.content = 'Functional dependencies.'
+        normalisation.save()
+        assert get_relevant_knowledge(session, 'functional dependencies', top_k=1) == [normalisation]
+
+        module_session = TutorSession.objects.create(user=user, course=course, module=module, title='Module')
+        assert get_relevant_knowledge(module_session, 'joins') == []
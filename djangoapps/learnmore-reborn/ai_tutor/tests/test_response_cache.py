@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from langchain_core.documents import Document
+from rest_framework.test import APIClient
+
+from ai_tutor import response_cache as response_cache_module
+from ai_tutor.langchain_service import TutorLangChainService
+from ai_tutor.models import TutorSession
+from ai_tutor.response_cache import SemanticResponseCache, response_cache, source_fingerprint
+from courses.models import Course
+
+User = get_user_model()
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestSemanticResponseCache:
+    """Test cases for the semantic response cache."""
+
+    def answer(self, text):
+        return {"content": text, "sources": [], "metadata": {}}
+
+    def test_hit_requires_similarity_and_scope(self):
+        """Similar questions in the same scope hit; dissimilar questions and other scopes miss."""
+        cache = SemanticResponseCache(threshold=0.95)
+        cache.store((1, None, 1), 1, "what is a join", unit(1, 0, 0), self.answer("joins"), [])
+
+        response, similarity = cache.lookup((1, None, 1), 1, unit(1, 0.1, 0))
+        assert response["content"] == "joins"
+        assert similarity > 0.95
+        assert cache.lookup((1, None, 1), 1, unit(1, 1, 0)) is None
+        assert cache.lookup((2, None, 1), 2, unit(1, 0, 0)) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+        assert cache.stats()["hit_rate"] == pytest.approx(1 / 3)
+
+    def test_ttl_and_lru_eviction(self, monkeypatch):
+        """Expired entries are dropped and the least recently used entry is evicted first."""
+        clock = [1000.0]
+        monkeypatch.setattr(response_cache_module.time, "monotonic", lambda: clock[0])
+        cache = SemanticResponseCache(max_entries=2, ttl=60)
+        cache.store("s", 1, "a", unit(1, 0, 0), self.answer("a"), [])
+        cache.store("s", 1, "b", unit(0, 1, 0), self.answer("b"), [])
+        assert cache.lookup("s", 1, unit(1, 0, 0)) is not None  # "a" is now most recent
+        cache.store("s", 1, "c", unit(0, 0, 1), self.answer("c"), [])
+
+        assert cache.lookup("s", 1, unit(0, 1, 0)) is None
+        assert cache.stats()["evictions"] == 1
+
+        clock[0] += 61
+        assert cache.lookup("s", 1, unit(1, 0, 0)) is None
+        assert cache.stats()["stale"] == 1
+        assert cache.stats()["entries"] == 1
+
+    def test_course_invalidation(self):
+        """Re-ingesting a course drops its answers but keeps other courses'."""
+        cache = SemanticResponseCache()
+        cache.store("c1", 1, "q", unit(1, 0), self.answer("one"), [])
+        cache.store("c2", 2, "q", unit(1, 0), self.answer("two"), [])
+
+        cache.invalidate_course(1)
+        assert cache.lookup("c1", 1, unit(1, 0)) is None
+        assert cache.lookup("c2", 2, unit(1, 0))[0]["content"] == "two"
+
+        cache.invalidate_all()
+        assert cache.lookup("c2", 2, unit(1, 0)) is None
+
+    def test_changed_sources_invalidate_entry(self):
+        """An entry whose source chunks changed is not served."""
+        cache = SemanticResponseCache()
+        sources = [source_fingerprint("chunk_1", "old text")]
+        cache.store("s", 1, "q", unit(1, 0), self.answer("a"), sources)
+
+        current = {"chunk_1": "old text"}
+        check = lambda fingerprints: all(source_fingerprint(i, current[i]) == (i, h) for i, h in fingerprints)
+        assert cache.lookup("s", 1, unit(1, 0), check) is not None
+
+        current["chunk_1"] = "new text"
+        assert cache.lookup("s", 1, unit(1, 0), check) is None
+        assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.django_db
+class TestServiceResponseCache:
+    """Test cases for semantic caching in the LangChain service."""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        response_cache.clear()
+        yield
+        response_cache.clear()
+
+    def make_service(self):
+        service = TutorLangChainService()
+        service.api_key = 'test_key'
+        service.embeddings = MagicMock()
+        service.embeddings.embed_query.side_effect = lambda text: [1.0, 0.0] if 'join' in text else [0.0, 1.0]
+        service.vector_store = MagicMock()
+        service.vector_store.get_by_ids.return_value = [Document(page_content="Joins combine rows.", id="chunk_1")]
+        return service
+
+    def test_opening_question_is_answered_from_cache(self):
+        """A repeated opening question in the same course skips the chain; edited sources do not."""
+        instructor = User.objects.create_user(username='teacher', password='password')
+        student = User.objects.create_user(username='student', password='password')
+        course = Course.objects.create(title='Databases', instructor=instructor)
+        first = TutorSession.objects.create(user=student, course=course, title='One')
+        second = TutorSession.objects.create(user=student, course=course, title='Two')
+
+        chain = MagicMock(return_value={
+            "answer": "A join combines rows.",
+            "source_documents": [Document(page_content="Joins combine rows.", id="chunk_1",
+                                          metadata={"source": "Lecture 3"})],
+        })
+        service = self.make_service()
+        with patch.object(TutorLangChainService, 'get_retrieval_chain', return_value=chain):
+            response = service.get_tutor_response(first, "What is a join?")
+            assert response["content"] == "A join combines rows."
+            assert chain.call_count == 1
+
+            cached = service.get_tutor_response(second, "what is a join")
+            assert cached["content"] == "A join combines rows."
+            assert cached["sources"] == ["Lecture 3"]
+            assert cached["metadata"]["cached"] is True
+            assert chain.call_count == 1
+
+            service.vector_store.get_by_ids.return_value = [Document(page_content="Edited.", id="chunk_1")]
+            service.get_tutor_response(second, "what is a join")
+            assert chain.call_count == 2
+
+        assert response_cache.stats()["hits"] == 1
+
+    def test_stats_endpoint_is_staff_only(self):
+        response_cache.store("s", 1, "a", unit(1, 0), {"content": "a", "sources": [], "metadata": {}}, [])
+        response_cache.lookup("s", 1, unit(1, 0))
+        client = APIClient()
+        url = reverse('ai_tutor:tutor-session-cache-stats')
+
+        client.force_authenticate(user=User.objects.create_user(username='student', password='password'))
+        assert client.get(url).status_code == 403
+
+        client.force_authenticate(user=User.objects.create_user(username='admin', password='password', is_staff=True))
+        response = client.get(url)
+        assert response.status_code == 200
+        assert (response.data["entries"], response.data["hits"], response.data["pid"]) == (1, 1, os.getpid())
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from ai_tutor.chunking import ContentChunker
+from ai_tutor.retrieval_benchmark import (
+    HashingEmbeddings,
+    chunk_corpus,
+    generate_corpus,
+    rank_metrics,
+    run_benchmark,
+)
+
+
+class TestRetrievalBenchmark:
+    """Test cases for the offline retrieval benchmark."""
+
+    def test_rank_metrics(self):
+        """Recall counts relevant chunks in the top k; MRR uses the first relevant rank."""
+        assert rank_metrics(["a", "b", "c"], {"b", "z"}, k=3) == (0.5, 0.5)
+        assert rank_metrics(["a", "b", "c"], {"c"}, k=2) == (0.0, 0.0)
+        assert rank_metrics(["a"], set(), k=1) == (0.0, 0.0)
+
+    def test_corpus_is_labelled_and_repeatable(self):
+        """Every query's fact lands in at least one chunk, and the same seed gives the same corpus."""
+        corpus = generate_corpus(40, 15, seed=3)
+        assert len(corpus.facts) == 40
+        assert len(corpus.queries) == 15
+        assert generate_corpus(40, 15, seed=3).queries == corpus.queries
+
+        ids, texts, relevant = chunk_corpus(corpus, ContentChunker(max_tokens=120, overlap_tokens=10))
+        assert len(ids) == len(texts) == len(set(ids))
+        for query in corpus.queries:
+            assert relevant[query.fact]
+            assert all(term in query.text for term in corpus.fact_terms[query.fact])
+
+    def test_run_benchmark_numpy(self):
+        """The numpy backends find the labelled chunks and report every metric."""
+        results = run_benchmark(64, 20, ["numpy", "numpy+bm25"], ["200:20"], HashingEmbeddings(128), k=5)
+
+        assert [result.backend for result in results] == ["numpy", "numpy+bm25"]
+        for result in results:
+            assert result.chunks >= 64
+            assert result.queries == 20
+            assert result.recall_at_k > 0.5
+            assert 0 < result.mrr <= 1
+            assert 0 < result.p50_ms <= result.p95_ms
+            assert result.chunks_per_second > 0
+            assert result.disk_mb > 0
+        assert results[1].lexical_build_seconds > 0
+
+    def test_command_writes_json(self, tmp_path):
+        """The management command writes one result per backend and chunking configuration."""
+        output = tmp_path / "results.json"
+        call_command("benchmark_retrieval", sections="16", queries=5, backends="numpy",
+                     chunking="200:20,120:10", dimension=64, output=str(output))
+
+        results = json.loads(output.read_text())
+        assert [result["chunking"] for result in results] == ["200:20", "120:10"]
+        assert {"recall_at_k", "mrr", "p50_ms", "p95_ms", "chunks_per_second", "rss_mb"} <= set(results[0])
+
+    def test_command_rejects_unknown_backend(self):
+        with pytest.raises(CommandError):
+            call_command("benchmark_retrieval", backends="faiss")
@@ -0,0 +1,16 @@
+"""
+Tests that the tutor modules shared with learnmore_plus have not diverged.
+"""
+from pathlib import Path
+
+import pytest
+
+SHARED_MODULES = ('chunking.py', 'conversation.py', 'lexical_index.py')
+APP_DIR = Path(__file__).resolve().parent.parent
+SIBLING_DIR = APP_DIR.parents[1] / 'learnmore_plus' / 'apps' / 'ai_tutor'
+
+
+@pytest.mark.skipif(not SIBLING_DIR.is_dir(), reason="learnmore_plus is not checked out alongside")
+@pytest.mark.parametrize('name', SHARED_MODULES)
+def test_shared_module_matches_learnmore_plus(name):
+    assert (APP_DIR / name).read_text() == (SIBLING_DIR / name).read_text()
@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from ai_tutor import vector_index
+from ai_tutor.vector_index import NumpyVectorIndex, NumpyVectorStore
+
+DIM = 16
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings for tests: a seeded random vector per text."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(sum(map(ord, text)))
+        return rng.normal(size=DIM).tolist()
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(120, DIM)).astype(np.float32)
+    metadatas = [{"course_id": i % 4, "module_id": (i % 4) * 10 + i % 3, "n": i} for i in range(120)]
+    ids = [f"doc_{i}" for i in range(120)]
+    return ids, vectors, metadatas
+
+
+def brute_force(vectors, metadatas, alive, query, k, course_id=None, module_id=None):
+    normalised = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalised @ (query / np.linalg.norm(query))
+    rows = [
+        i for i in range(len(vectors))
+        if i in alive
+        and (course_id is None or metadatas[i]["course_id"] == course_id)
+        and (module_id is None or metadatas[i]["module_id"] == module_id)
+    ]
+    return [f"doc_{i}" for i in sorted(rows, key=lambda i: -scores[i])[:k]]
+
+
+class TestNumpyVectorIndex:
+    """Test cases for the memory-mapped vector index."""
+
+    def build(self, path, corpus, batch=25):
+        ids, vectors, metadatas = corpus
+        index = NumpyVectorIndex(str(path))
+        for start in range(0, len(ids), batch):
+            end = start + batch
+            index.add(ids[start:end], vectors[start:end], [f"text {i}" for i in range(start, min(end, len(ids)))],
+                      metadatas[start:end])
+        return index
+
+    @pytest.mark.parametrize("course_id,module_id", [(None, None), (2, None), (None, 11), (3, 31), (3, 11)])
+    def test_search_matches_brute_force(self, tmp_path, corpus, monkeypatch, course_id, module_id):
+        """Top-k with course/module prefilters matches an exhaustive search, across main and tail rows."""
+        monkeypatch.setattr(vector_index, "COMPACT_TAIL_ROWS", 40)
+        index = self.build(tmp_path, corpus)
+        assert len(index._meta) > 0 and len(index._tail_meta) > 0
+
+        ids, vectors, metadatas = corpus
+        query = np.random.default_rng(1).normal(size=DIM)
+        expected = brute_force(vectors, metadatas, set(range(120)), query, 5, course_id, module_id)
+        assert [row[0] for row in index.search(query, 5, course_id, module_id)] == expected
+
+    def test_delete_compact_and_reopen(self, tmp_path, corpus, monkeypatch):
+        """Deleted rows disappear from results, survive compaction and a reload from disk."""
+        monkeypatch.setattr(vector_index, "COMPACT_TAIL_ROWS", 40)
+        index = self.build(tmp_path, corpus)
+        ids, vectors, metadatas = corpus
+
+        index.delete([f"doc_{i}" for i in range(0, 120, 5)])
+        index.delete_where(course_id=1)
+        alive = {i for i in range(120) if i % 5 and metadatas[i]["course_id"] != 1}
+        assert len(index) == len(alive)
+
+        query = np.random.default_rng(2).normal(size=DIM)
+        expected = brute_force(vectors, metadatas, alive, query, 6)
+        assert [row[0] for row in index.search(query, 6)] == expected
+
+        index.compact()
+        assert index.deleted_count == 0
+        assert [row[0] for row in index.search(query, 6)] == expected
+        assert index.search(query, 6, course_id=1) == []
+
+        reopened = NumpyVectorIndex(str(tmp_path))
+        assert [row[0] for row in reopened.search(query, 6)] == expected
+        assert reopened.get("doc_7") == ("text 7", metadatas[7])
+
+    def test_add_replaces_existing_id(self, tmp_path):
+        """Re-adding an id replaces its vector and metadata."""
+        index = NumpyVectorIndex(str(tmp_path))
+        index.add(["a"], [[1.0, 0.0]], ["first"], [{"course_id": 1}])
+        index.add(["a"], [[0.0, 1.0]], ["second"], [{"course_id": 2}])
+
+        assert len(index) == 1
+        doc_id, text, metadata, score = index.search([0.0, 1.0], 1)[0]
+        assert (doc_id, text, metadata["course_id"]) == ("a", "second", 2)
+        assert score == pytest.approx(1.0)
+
+    def test_concurrent_writers_keep_each_others_rows(self, tmp_path):
+        """Writers with their own copy of the index (as in separate processes) do not lose rows."""
+        writers = [NumpyVectorIndex(str(tmp_path)) for _ in range(4)]
+
+        def add_rows(number, index):
+            for i in range(25):
+                index.add([f"w{number}_{i}"], [[1.0, float(i)]], ["text"], [{"course_id": number}])
+
+        threads = [threading.Thread(target=add_rows, args=(number, index)) for number, index in enumerate(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(NumpyVectorIndex(str(tmp_path))) == 100
+
+
+class TestNumpyVectorStore:
+    """Test cases for the LangChain adapter."""
+
+    def test_similarity_search_with_filters(self, tmp_path):
+        """Chroma-style filters are mapped onto the index prefilters."""
+        texts = [f"lesson {i}" for i in range(12)]
+        metadatas = [{"course_id": i % 2, "module_id": i % 4, "source": "module"} for i in range(12)]
+        store = NumpyVectorStore.from_texts(texts, HashEmbeddings(), metadatas=metadatas,
+                                            persist_directory=str(tmp_path))
+
+        docs = store.similarity_search("lesson 3", k=3, filter={"course_id": 1})
+        assert docs[0].page_content == "lesson 3"
+        assert all(doc.metadata["course_id"] == 1 for doc in docs)
+
+        docs = store.similarity_search(
+            "lesson 3", k=2, filter={"$and": [{"course_id": {"$eq": 1}}, {"module_id": {"$eq": 3}}]}
+        )
+        assert {doc.metadata["module_id"] for doc in docs} == {3}
+
+        store.delete(where={"course_id": 1})
+        assert all(doc.metadata["course_id"] == 0 for doc in store.similarity_search("lesson 3", k=5))
@@ -1,7 +1,9 @@
 import pytest
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from django.test import Client
+from django.http import HttpResponse
+from django.test import AsyncClient, Client
+from asgiref.sync import async_to_sync
 from ai_tutor.models import (
     TutorSession,
     TutorMessage,
@@ -248,6 +250,129 @@ class TestAITutorViews:
         assert tutor_messages.first().metadata['sources'] == ['knowledge_base:1']
         assert tutor_messages.first().metadata['model'] == 'test-model'
     
+    def test_stream_message_view(self, authenticated_client):
+        """Test streaming the tutor's answer as Server-Sent Events."""
+        client, user = authenticated_client
+        session = TutorSession.objects.create(
+            user=user,
+            title='Test Session',
+            status='active'
+        )
+        
+        events = [
+            {'type': 'token', 'content': 'This is '},
+            {'type': 'token', 'content': 'a test response'},
+            {'type': 'done', 'response': {
+                'content': 'This is a test response',
+                'sources': ['knowledge_base:1'],
+                'metadata': {'model': 'test-model'}
+            }},
+        ]
+        with patch('ai_tutor.langchain_service.tutor_langchain_service.stream_tutor_response',
+                   return_value=iter(events)):
+            url = reverse('ai_tutor:stream_tutor_message', args=[session.id])
+            response = client.post(url, {'message': 'What is machine learning?'})
+            
+            assert response.status_code == 200
+            assert response['Content-Type'] == 'text/event-stream'
+            # Only the question is saved until the stream is consumed
+            assert TutorMessage.objects.filter(session=session).count() == 1
+            body = b''.join(response.streaming_content).decode()
+        
+        assert body.startswith('event: user_message\n')
+        assert 'event: token\ndata: {"content": "This is "}\n\n' in body
+        assert body.index('event: token') < body.index('event: done')
+        
+        tutor_message = TutorMessage.objects.get(session=session, message_type='tutor')
+        assert tutor_message.content == 'This is a test response'
+        assert tutor_message.metadata['sources'] == ['knowledge_base:1']
+        assert f'"id": {tutor_message.id}' in body.split('event: done')[1]
+    
+    def test_stream_sends_done_before_follow_up_work(self, authenticated_client):
+        """The answer is saved and sent before the service refreshes the summary, so a disconnect keeps it."""
+        client, user = authenticated_client
+        session = TutorSession.objects.create(user=user, title='Test Session', status='active')
+        follow_up = []
+        
+        def fake_stream(session, message_content):
+            yield {'type': 'token', 'content': 'Saved answer'}
+            yield {'type': 'done', 'response': {'content': 'Saved answer', 'sources': [], 'metadata': {}}}
+            follow_up.append(TutorMessage.objects.filter(session=session, message_type='tutor').count())
+        
+        with patch('ai_tutor.langchain_service.tutor_langchain_service.stream_tutor_response', fake_stream):
+            response = client.post(
+                reverse('ai_tutor:stream_tutor_message', args=[session.id]), {'message': 'Hello?'}
+            )
+            chunks = iter(response.streaming_content)
+            for chunk in chunks:
+                if chunk.startswith(b'event: done'):
+                    break
+            # The client disconnects once it has the answer
+            response.close()
+        
+        assert follow_up == []
+        assert TutorMessage.objects.get(session=session, message_type='tutor').content == 'Saved answer'
+    
+    def test_dashboard_pages_sessions(self, authenticated_client, django_assert_max_num_queries):
+        """The dashboard shows a page of sessions with counts and links to older ones."""
+        client, user = authenticated_client
+        sessions = [TutorSession.objects.create(user=user, title=f'Session {i}') for i in range(25)]
+        TutorMessage.objects.create(session=sessions[-1], message_type='user', content='How do joins work?')
+        
+        url = reverse('ai_tutor:dashboard')
+        with patch('ai_tutor.views.render', return_value=HttpResponse()) as mock_render:
+            # Auth session load and save, user, and one query for the page of sessions
+            with django_assert_max_num_queries(6):
+                client.get(url)
+            context = mock_render.call_args[0][2]
+            
+            page = context['user_sessions']
+            assert len(page) == 20
+            assert page[0].title == 'Session 24'
+            assert page[0].message_count == 1
+            assert page[0].last_message_preview == 'How do joins work?'
+            
+            client.get(url, {'after': context['next_cursor']})
+            context = mock_render.call_args[0][2]
+        
+        assert [s.title for s in context['user_sessions']] == [f'Session {i}' for i in range(4, -1, -1)]
+        assert context['next_cursor'] is None
+    
+    def test_stream_message_view_async(self):
+        """Test that under ASGI the answer is streamed from the async pipeline."""
+        user = User.objects.create_user(username='asyncuser', password='testpassword')
+        session = TutorSession.objects.create(user=user, title='Test Session', status='active')
+        client = AsyncClient()
+        client.force_login(user)
+        
+        async def fake_stream(session, message_content):
+            yield {'type': 'token', 'content': 'Async '}
+            yield {'type': 'token', 'content': 'answer'}
+            yield {'type': 'done', 'response': {'content': 'Async answer', 'sources': [], 'metadata': {}}}
+        
+        async def post_and_read():
+            response = await client.post(
+                reverse('ai_tutor:stream_tutor_message', args=[session.id]), {'message': 'Hello?'}
+            )
+            return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+        
+        with patch('ai_tutor.langchain_service.tutor_langchain_service.astream_tutor_response', fake_stream):
+            response, body = async_to_sync(post_and_read)()
+        
+        assert response['Content-Type'] == 'text/event-stream'
+        assert response.is_async
+        assert 'data: {"content": "Async "}' in body
+        assert TutorMessage.objects.get(session=session, message_type='tutor').content == 'Async answer'
+    
+    def test_stream_message_view_empty(self, authenticated_client):
+        """Test that an empty message is rejected before streaming starts."""
+        client, user = authenticated_client
+        session = TutorSession.objects.create(user=user, title='Test Session', status='active')
+        
+        response = client.post(reverse('ai_tutor:stream_tutor_message', args=[session.id]), {'message': '  '})
+        assert response.status_code == 400
+        assert not TutorMessage.objects.filter(session=session).exists()
+    
     def test_provide_feedback_view(self, authenticated_client):
         """Test providing feedback on a message."""
         client, user = authenticated_client
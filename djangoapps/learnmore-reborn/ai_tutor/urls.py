@@ -11,6 +11,7 @@ urlpatterns = [
     
     # AJAX endpoints
     path('sessions/<int:session_id>/send/', views.send_message, name='send_tutor_message'),
+    path('sessions/<int:session_id>/stream/', views.stream_message, name='stream_tutor_message'),
     path('messages/<int:message_id>/feedback/', views.provide_feedback, name='provide_tutor_feedback'),
     path('sessions/<int:session_id>/end/', views.end_session, name='end_tutor_session'),
     
@@ -0,0 +1,574 @@
+"""
+Built-in NumPy vector index for the AI tutor.
+
+An alternative to Chroma for catalogs that fit comfortably on one machine.
+Embeddings are L2-normalised float32 rows in a memory-mapped ``.npy`` matrix,
+so process start-up only maps the file and cosine similarity is a single
+matrix-vector product. Rows are kept sorted by (course_id, module_id) so that
+course/module filters select contiguous row ranges before scoring instead of
+filtering afterwards.
+
+On-disk layout of an index directory::
+
+    vectors.npy         float32 (rows, dim), sorted by course/module
+    meta.npy            structured array: course_id, module_id, alive
+    documents.json      ids, texts and metadata for the rows above
+    tail_*.{npy,json}   rows appended since the last compaction
+    manifest.json       dimension and version, bumped on every write
+
+Appends go to the small tail segment and deletes only clear the ``alive``
+flag. Once the tail or the number of deleted rows grows past a threshold the
+index is compacted: live rows are merged, re-sorted and rewritten.
+
+Web workers and management commands may write to the same directory, so every
+write holds an exclusive lock on ``index.lock`` and reloads the index first if
+another process has written to it since it was loaded.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.core.files import locks
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .lexical_index import split_filter
+
+logger = logging.getLogger(__name__)
+
+META_DTYPE = np.dtype([('course_id', '<i4'), ('module_id', '<i4'), ('alive', '?')])
+NO_ID = -1
+
+# Compact when the tail exceeds this many rows (or this fraction of the main segment) ...
+COMPACT_TAIL_ROWS = 2048
+COMPACT_TAIL_FRACTION = 0.1
+# ... or when this fraction of all rows has been deleted
+COMPACT_DELETED_FRACTION = 0.2
+# Rows copied per step while compacting, to bound memory use
+COMPACT_BLOCK_ROWS = 8192
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value) if value is not None else NO_ID
+    except (TypeError, ValueError):
+        return NO_ID
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _atomic_save_json(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _atomic_save_npy(path: str, array: np.ndarray) -> None:
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class NumpyVectorIndex:
+    """Memory-mapped cosine-similarity index with course/module row ranges."""
+
+    def __init__(self, path: str, dimension: Optional[int] = None):
+        self.path = path
+        self.dimension = dimension
+        self._lock = threading.RLock()
+        self._write_depth = 0
+        self._manifest_mtime = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, 'manifest.json'))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        manifest_path = self._file('manifest.json')
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._manifest_mtime = os.stat(manifest_path).st_mtime_ns
+        self.dimension = manifest.get('dimension', self.dimension)
+        self.version = manifest.get('version', 0)
+
+        if os.path.exists(self._file('vectors.npy')):
+            self._vectors = np.load(self._file('vectors.npy'), mmap_mode='r')
+            self._meta = np.load(self._file('meta.npy'))
+            with open(self._file('documents.json'), encoding='utf-8') as f:
+                documents = json.load(f)
+        else:
+            self._vectors = np.zeros((0, self.dimension or 0), dtype=np.float32)
+            self._meta = np.zeros(0, dtype=META_DTYPE)
+            documents = {'ids': [], 'texts': [], 'metadatas': []}
+
+        if os.path.exists(self._file('tail_vectors.npy')):
+            self._tail_vectors = np.load(self._file('tail_vectors.npy'))
+            self._tail_meta = np.load(self._file('tail_meta.npy'))
+            with open(self._file('tail_documents.json'), encoding='utf-8') as f:
+                tail_documents = json.load(f)
+        else:
+            self._tail_vectors = np.zeros((0, self.dimension or 0), dtype=np.float32)
+            self._tail_meta = np.zeros(0, dtype=META_DTYPE)
+            tail_documents = {'ids': [], 'texts': [], 'metadatas': []}
+
+        self._ids = documents['ids'] + tail_documents['ids']
+        self._texts = documents['texts'] + tail_documents['texts']
+        self._metadatas = documents['metadatas'] + tail_documents['metadatas']
+        self._row_by_id = {
+            doc_id: row for row, doc_id in enumerate(self._ids) if self._is_alive(row)
+        }
+        self._main_meta_dirty = False
+        self._build_ranges()
+
+    def _build_ranges(self) -> None:
+        """Precompute course -> row range and module -> row ranges for the sorted main segment."""
+        self._course_ranges: Dict[int, Tuple[int, int]] = {}
+        self._module_ranges: Dict[int, List[Tuple[int, int]]] = {}
+        if not len(self._meta):
+            return
+        courses = self._meta['course_id']
+        course_ids, starts, counts = np.unique(courses, return_index=True, return_counts=True)
+        for course_id, start, count in zip(course_ids.tolist(), starts.tolist(), counts.tolist()):
+            self._course_ranges[course_id] = (start, start + count)
+
+        # (course, module) pairs are contiguous because rows are sorted on both
+        pairs = courses.astype(np.int64) << 32 | (self._meta['module_id'].astype(np.int64) & 0xFFFFFFFF)
+        boundaries = np.flatnonzero(np.diff(pairs)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(pairs)]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            module_id = int(self._meta['module_id'][start])
+            self._module_ranges.setdefault(module_id, []).append((start, end))
+
+    def refresh(self) -> None:
+        """Reload if another process has written to the index since it was loaded."""
+        manifest_path = self._file('manifest.json')
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None and self._manifest_mtime is not None:
+            # The index directory was removed (e.g. a forced rebuild); start empty
+            with self._lock:
+                self._manifest_mtime = None
+                self.dimension = None
+                self._load()
+        elif mtime != self._manifest_mtime:
+            with self._lock:
+                self._load()
+
+    @contextmanager
+    def _writing(self):
+        """Hold the index exclusively (across processes) for a read-modify-write."""
+        with self._lock:
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            os.makedirs(self.path, exist_ok=True)
+            lock_file = open(self._file('index.lock'), 'a')
+            try:
+                locks.lock(lock_file, locks.LOCK_EX)
+                self._write_depth = 1
+                self._reload_if_changed()
+                yield
+            finally:
+                self._write_depth = 0
+                locks.unlock(lock_file)
+                lock_file.close()
+
+    def _reload_if_changed(self) -> None:
+        self.refresh()
+        # Two quick writes can leave the manifest with the same mtime; the version always moves
+        try:
+            with open(self._file('manifest.json'), encoding='utf-8') as f:
+                version = json.load(f).get('version', 0)
+        except FileNotFoundError:
+            return
+        if version != self.version:
+            self._load()
+
+    def _write_manifest(self) -> None:
+        self.version += 1
+        _atomic_save_json(self._file('manifest.json'), {'dimension': self.dimension, 'version': self.version})
+        self._manifest_mtime = os.stat(self._file('manifest.json')).st_mtime_ns
+
+    def _write_tail(self) -> None:
+        main_rows = len(self._meta)
+        _atomic_save_npy(self._file('tail_vectors.npy'), self._tail_vectors)
+        _atomic_save_npy(self._file('tail_meta.npy'), self._tail_meta)
+        _atomic_save_json(self._file('tail_documents.json'), {
+            'ids': self._ids[main_rows:],
+            'texts': self._texts[main_rows:],
+            'metadatas': self._metadatas[main_rows:],
+        })
+
+    # ------------------------------------------------------------------
+    # Properties
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return int(self._meta['alive'].sum() + self._tail_meta['alive'].sum())
+
+    @property
+    def deleted_count(self) -> int:
+        return len(self._meta) + len(self._tail_meta) - len(self)
+
+    def get(self, doc_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = self._row_by_id.get(doc_id)
+        if row is None or not self._is_alive(row):
+            return None
+        return self._texts[row], self._metadatas[row]
+
+    def iter_documents(self) -> Iterable[Tuple[str, str, Dict[str, Any]]]:
+        """Return (id, text, metadata) for every live row."""
+        with self._lock:
+            rows = sorted(self._row_by_id.values())
+            return [(self._ids[row], self._texts[row], self._metadatas[row]) for row in rows]
+
+    def _is_alive(self, row: int) -> bool:
+        main_rows = len(self._meta)
+        if row < main_rows:
+            return bool(self._meta['alive'][row])
+        return bool(self._tail_meta['alive'][row - main_rows])
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add(self, ids: Sequence[str], vectors, texts: Sequence[str],
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> List[str]:
+        """Append (or replace) rows. Existing ids are deleted and re-added to the tail."""
+        vectors = _normalise(np.atleast_2d(vectors))
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in ids]
+        if not len(ids):
+            return []
+        with self._writing():
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._vectors = self._vectors.reshape(0, self.dimension)
+                self._tail_vectors = self._tail_vectors.reshape(0, self.dimension)
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected vectors of dimension {self.dimension}, got {vectors.shape[1]}")
+
+            self._mark_deleted([doc_id for doc_id in ids if doc_id in self._row_by_id])
+
+            meta = np.zeros(len(ids), dtype=META_DTYPE)
+            meta['course_id'] = [_as_int(m.get('course_id')) for m in metadatas]
+            meta['module_id'] = [_as_int(m.get('module_id')) for m in metadatas]
+            meta['alive'] = True
+
+            first_row = len(self._ids)
+            self._tail_vectors = np.concatenate((self._tail_vectors, vectors))
+            self._tail_meta = np.concatenate((self._tail_meta, meta))
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(dict(m) for m in metadatas)
+            for offset, doc_id in enumerate(ids):
+                self._row_by_id[doc_id] = first_row + offset
+
+            if self._needs_compaction():
+                self.compact()
+            else:
+                self._write_tail()
+                self._write_main_meta()
+                self._write_manifest()
+        return list(ids)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Mark rows as deleted. Returns the number of rows removed."""
+        with self._writing():
+            removed = self._mark_deleted(ids)
+            if removed:
+                if self._needs_compaction():
+                    self.compact()
+                else:
+                    self._write_main_meta()
+                    _atomic_save_npy(self._file('tail_meta.npy'), self._tail_meta)
+                    self._write_manifest()
+            return removed
+
+    def delete_where(self, course_id: Optional[int] = None, module_id: Optional[int] = None, **metadata) -> int:
+        """Delete every row matching the given course/module and metadata values."""
+        with self._writing():
+            main_rows = len(self._meta)
+            rows = np.concatenate((
+                self._matching_rows(self._meta, course_id, module_id),
+                self._matching_rows(self._tail_meta, course_id, module_id) + main_rows,
+            )).tolist()
+            ids = [
+                self._ids[row] for row in rows
+                if all(self._metadatas[row].get(key) == value for key, value in metadata.items())
+            ]
+            return self.delete(ids)
+
+    @staticmethod
+    def _matching_rows(meta: np.ndarray, course_id: Optional[int], module_id: Optional[int]) -> np.ndarray:
+        mask = meta['alive'].copy()
+        if course_id is not None:
+            mask &= meta['course_id'] == course_id
+        if module_id is not None:
+            mask &= meta['module_id'] == module_id
+        return np.flatnonzero(mask)
+
+    def _mark_deleted(self, ids: Iterable[str]) -> int:
+        main_rows = len(self._meta)
+        removed = 0
+        for doc_id in ids:
+            row = self._row_by_id.pop(doc_id, None)
+            if row is None:
+                continue
+            if row < main_rows:
+                self._meta['alive'][row] = False
+                self._main_meta_dirty = True
+            else:
+                self._tail_meta['alive'][row - main_rows] = False
+            removed += 1
+        return removed
+
+    def _write_main_meta(self) -> None:
+        # Only deletes touch the main segment's metadata; skip rewriting it otherwise
+        if self._main_meta_dirty:
+            _atomic_save_npy(self._file('meta.npy'), self._meta)
+            self._main_meta_dirty = False
+
+    def _needs_compaction(self) -> bool:
+        total = len(self._meta) + len(self._tail_meta)
+        if not total:
+            return False
+        tail_limit = max(COMPACT_TAIL_ROWS, int(len(self._meta) * COMPACT_TAIL_FRACTION))
+        return len(self._tail_meta) > tail_limit or self.deleted_count / total > COMPACT_DELETED_FRACTION
+
+    def compact(self) -> None:
+        """Merge the tail into the main segment, drop deleted rows and re-sort by course/module."""
+        with self._writing():
+            main_rows = len(self._meta)
+            live_main = np.flatnonzero(self._meta['alive'])
+            live_tail = np.flatnonzero(self._tail_meta['alive'])
+            meta = np.concatenate((self._meta[live_main], self._tail_meta[live_tail]))
+            source_rows = np.concatenate((live_main, live_tail + main_rows))
+            order = np.lexsort((meta['module_id'], meta['course_id']))
+
+            dimension = self.dimension or 0
+            tmp_path = self._file('vectors.tmp.npy')
+            if len(order):
+                out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(order), dimension))
+                for start in range(0, len(order), COMPACT_BLOCK_ROWS):
+                    rows = source_rows[order[start:start + COMPACT_BLOCK_ROWS]]
+                    from_main = rows < main_rows
+                    block = np.empty((len(rows), dimension), dtype=np.float32)
+                    block[from_main] = self._vectors[rows[from_main]]
+                    block[~from_main] = self._tail_vectors[rows[~from_main] - main_rows]
+                    out[start:start + len(rows)] = block
+                out.flush()
+                del out
+            else:
+                np.save(tmp_path, np.zeros((0, dimension), dtype=np.float32))
+
+            rows = source_rows[order].tolist()
+            documents = {
+                'ids': [self._ids[row] for row in rows],
+                'texts': [self._texts[row] for row in rows],
+                'metadatas': [self._metadatas[row] for row in rows],
+            }
+            meta = meta[order]
+            meta['alive'] = True
+
+            os.replace(tmp_path, self._file('vectors.npy'))
+            _atomic_save_npy(self._file('meta.npy'), meta)
+            _atomic_save_json(self._file('documents.json'), documents)
+            for name in ('tail_vectors.npy', 'tail_meta.npy', 'tail_documents.json'):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._write_manifest()
+            self._load()
+            logger.info(f"Compacted vector index at {self.path} to {len(rows)} rows")
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _main_ranges(self, course_id: Optional[int], module_id: Optional[int]) -> List[Tuple[int, int]]:
+        if module_id is not None:
+            ranges = self._module_ranges.get(module_id, [])
+            if course_id is not None:
+                course_start, course_end = self._course_ranges.get(course_id, (0, 0))
+                ranges = [(start, end) for start, end in ranges if course_start <= start and end <= course_end]
+            return ranges
+        if course_id is not None:
+            return [self._course_ranges[course_id]] if course_id in self._course_ranges else []
+        return [(0, len(self._meta))] if len(self._meta) else []
+
+    def search(self, vector, k: int = 4, course_id: Optional[int] = None,
+               module_id: Optional[int] = None) -> List[Tuple[str, str, Dict[str, Any], float]]:
+        """
+        Return the ``k`` most similar rows as (id, text, metadata, cosine similarity).
+
+        Course and module filters are applied before scoring: only the
+        matching row ranges of the main segment are multiplied with the query.
+        """
+        self.refresh()
+        if k <= 0 or not self.dimension:
+            return []
+        query = _normalise(np.asarray(vector, dtype=np.float32).reshape(-1))
+        if query.shape[0] != self.dimension:
+            raise ValueError(f"Expected a query of dimension {self.dimension}, got {query.shape[0]}")
+
+        # Snapshot the segments so a concurrent compaction cannot shift rows mid-search
+        with self._lock:
+            vectors, meta = self._vectors, self._meta
+            tail_vectors, tail_meta = self._tail_vectors, self._tail_meta
+            ids, texts, metadatas = self._ids, self._texts, self._metadatas
+            ranges = self._main_ranges(course_id, module_id)
+
+        row_parts, score_parts = [], []
+        for start, end in ranges:
+            alive = meta['alive'][start:end]
+            scores = vectors[start:end] @ query
+            row_parts.append(np.flatnonzero(alive) + start)
+            score_parts.append(scores[alive])
+
+        if len(tail_meta):
+            tail_rows = self._matching_rows(tail_meta, course_id, module_id)
+            if len(tail_rows):
+                row_parts.append(tail_rows + len(meta))
+                score_parts.append(tail_vectors[tail_rows] @ query)
+
+        if not row_parts:
+            return []
+        rows = np.concatenate(row_parts)
+        scores = np.concatenate(score_parts)
+        if not len(rows):
+            return []
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [
+            (ids[row], texts[row], metadatas[row], float(score))
+            for row, score in zip(rows[top].tolist(), scores[top].tolist())
+        ]
+
+
+_open_indexes: Dict[str, NumpyVectorIndex] = {}
+_open_indexes_lock = threading.Lock()
+
+
+def open_index(path: str) -> NumpyVectorIndex:
+    """Return the process-wide index for ``path``, loading it on first use."""
+    path = os.path.abspath(path)
+    with _open_indexes_lock:
+        if path not in _open_indexes:
+            _open_indexes[path] = NumpyVectorIndex(path)
+        return _open_indexes[path]
+
+
+class NumpyVectorStore(VectorStore):
+    """LangChain vector store backed by a ``NumpyVectorIndex``."""
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings):
+        self._embedding_function = embedding_function
+        self.index = open_index(persist_directory)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = self._embedding_function.embed_documents(texts)
+        return self.index.add(ids, vectors, texts, metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids:
+            self.index.delete(ids)
+        where = kwargs.get('where') or kwargs.get('filter')
+        if where:
+            course_id, module_id, extra = split_filter(where)
+            self.index.delete_where(course_id, module_id, **extra)
+        return True
+
+    def persist(self) -> None:
+        """Writes are persisted as they happen; kept for parity with the Chroma API."""
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        documents = []
+        for doc_id in ids:
+            found = self.index.get(doc_id)
+            if found is not None:
+                text, metadata = found
+                documents.append(Document(page_content=text, metadata=metadata, id=doc_id))
+        return documents
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        course_id, module_id, extra = split_filter(filter)
+        # Conditions beyond course/module are checked after scoring, so over-fetch for them
+        fetch_k = k * 4 if extra else k
+        results = []
+        for doc_id, text, metadata, score in self.index.search(embedding, fetch_k, course_id, module_id):
+            if any(metadata.get(key) != value for key, value in extra.items()):
+                continue
+            results.append((Document(page_content=text, metadata=metadata, id=doc_id), score))
+            if len(results) >= k:
+                break
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] mapped to [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: Optional[str] = None,
+                   **kwargs: Any) -> 'NumpyVectorStore':
+        if not persist_directory:
+            raise ValueError("persist_directory is required for NumpyVectorStore")
+        store = cls(persist_directory, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -1,22 +1,36 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 from .models import TutorSession, TutorMessage, TutorFeedback, TutorConfiguration
+from .pagination import keyset_page
+from .streaming import streaming_reply_response
 from courses.models import Course, Module
 
+# Sessions shown per page of the dashboard
+DASHBOARD_PAGE_SIZE = 20
+
 @login_required
 def ai_tutor_dashboard(request):
     """
     Display a dashboard showing all tutor sessions for the current user.
     """
-    user_sessions = TutorSession.objects.filter(user=request.user).order_by('-updated_at')
-    courses = Course.objects.filter(enrollments__user=request.user).distinct()
+    sessions = (
+        TutorSession.objects.filter(user=request.user)
+        .select_related('course', 'module')
+        .with_activity()
+    )
+    cursor = request.GET.get('after')
+    user_sessions, next_cursor = keyset_page(sessions, cursor, DASHBOARD_PAGE_SIZE)
+    courses = Course.objects.filter(enrollments__user=request.user).distinct().prefetch_related('modules')
     
     context = {
         'user_sessions': user_sessions,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
         'courses': courses,
     }
     
@@ -88,11 +102,14 @@ def tutor_session_view(request, session_id):
 
 @login_required
 @require_POST
-def send_message(request, session_id):
+async def send_message(request, session_id):
     """
     Send a message to the AI tutor and get a response.
+    
+    Async so that, under ASGI, waiting on the LLM does not hold a worker thread.
     """
-    session = get_object_or_404(TutorSession, id=session_id, user=request.user)
+    user = await request.auser()
+    session = await aget_object_or_404(TutorSession, id=session_id, user=user)
     message_content = request.POST.get('message', '').strip()
     
     if not message_content:
@@ -102,24 +119,20 @@ def send_message(request, session_id):
         }, status=400)
     
     # Create user message
-    user_message = TutorMessage.objects.create(
+    user_message = await TutorMessage.objects.acreate(
         session=session,
         message_type='user',
         content=message_content
     )
     
-    # TODO: Process with AI (LangChain, etc)
-    # This will be replaced with actual AI processing
-    # For now, just create a dummy response
-    
     # Get response from LangChain service
     from .langchain_service import tutor_langchain_service
     
     # Generate response using LangChain
-    response_data = tutor_langchain_service.get_tutor_response(session, message_content)
+    response_data = await tutor_langchain_service.aget_tutor_response(session, message_content)
     
     # Create tutor response message
-    tutor_message = TutorMessage.objects.create(
+    tutor_message = await TutorMessage.objects.acreate(
         session=session,
         message_type='tutor',
         content=response_data["content"],
@@ -130,7 +143,7 @@ def send_message(request, session_id):
     )
     
     # Update session
-    session.save()  # This will update the updated_at timestamp
+    await session.asave()  # This will update the updated_at timestamp
     
     return JsonResponse({
         'status': 'success',
@@ -146,6 +159,34 @@ def send_message(request, session_id):
         }
     })
 
+@login_required
+@require_POST
+async def stream_message(request, session_id):
+    """
+    Send a message to the AI tutor and stream the response as Server-Sent Events.
+    """
+    user = await request.auser()
+    session = await aget_object_or_404(TutorSession, id=session_id, user=user)
+    message_content = request.POST.get('message', '').strip()
+    
+    if not message_content:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Message cannot be empty'
+        }, status=400)
+    
+    # Create user message
+    user_message = await TutorMessage.objects.acreate(
+        session=session,
+        message_type='user',
+        content=message_content
+    )
+    
+    # The tutor message is saved once the stream completes
+    return streaming_reply_response(
+        session, user_message, asynchronous=isinstance(request, ASGIRequest)
+    )
+
 @login_required
 @require_POST
 def provide_feedback(request, message_id):
@@ -3,7 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db.models import Count, F, Sum, Avg, Min, Max, StdDev
-from datetime import timedelta
+from datetime import date, timedelta
 
 from .models import (
     UserActivity,
@@ -21,6 +21,7 @@ from .serializers import (
     LearnerAnalyticsSerializer,
     LearnerComparisonSerializer
 )
+from .retention import activity_by_day
 from courses.models import Course, Module, Quiz, QuizAttempt, QuestionResponse
 from progress.models import Progress, ModuleProgress
 
@@ -93,6 +94,34 @@ class UserActivityViewSet(viewsets.ModelViewSet):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """
+        Activity counts per day and type, including days already archived.
+        
+        Takes start_date and end_date (YYYY-MM-DD, default: the last 30 days),
+        activity_type and, for superusers, user_id.
+        """
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        try:
+            end_day = date.fromisoformat(end_date) if end_date else timezone.localdate()
+            start_day = date.fromisoformat(start_date) if start_date else end_day - timedelta(days=30)
+        except ValueError:
+            return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Same scope as the activity list
+        user = request.user
+        filters = {'activity_type': request.query_params.get('activity_type')}
+        if user.is_superuser:
+            filters['user_id'] = request.query_params.get('user_id') or None
+        elif hasattr(user, 'profile') and user.profile.is_instructor:
+            filters['course_ids'] = list(Course.objects.filter(instructor=user).values_list('id', flat=True))
+        else:
+            filters['user_id'] = user.id
+        
+        return Response(activity_by_day(start_day, end_day, **filters))
 
 
 class CourseAnalyticsViewSet(viewsets.ReadOnlyModelViewSet):
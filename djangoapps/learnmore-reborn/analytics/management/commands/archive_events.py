@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.retention import EVENT_TABLES, archive_directory, archive_table, cutoff_day, days_to_archive
+
+
+class Command(BaseCommand):
+    help = ('Roll up, archive (gzipped NDJSON, one file per day) and delete event rows older than '
+            'the retention period, keeping UserActivity and QRCodeScan small')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'EVENT_RETENTION_DAYS', 90),
+            help='Keep this many days of raw events (default: EVENT_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--tables',
+            default=','.join(EVENT_TABLES),
+            help=f'Comma-separated tables to archive, any of: {", ".join(EVENT_TABLES)}',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the days that would be archived without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1")
+        names = [name.strip() for name in options['tables'].split(',') if name.strip()]
+        unknown = set(names) - set(EVENT_TABLES)
+        if unknown:
+            raise CommandError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+
+        before = cutoff_day(options['days'])
+        for name in names:
+            table = EVENT_TABLES[name]
+            if options['dry_run']:
+                days = days_to_archive(table, before)
+                self.stdout.write(f"{name}: {len(days)} day(s) before {before} to archive")
+                continue
+            total = archive_table(
+                table, before,
+                progress=lambda day, count, name=name: self.stdout.write(f"{name} {day}: {count} rows"),
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: archived {total} rows before {before} to {archive_directory()}"
+            ))
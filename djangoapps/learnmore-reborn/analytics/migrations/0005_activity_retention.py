@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_alter_useractivity_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('activity_type', models.CharField(max_length=50)),
+                ('course_id', models.IntegerField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'User Activity Daily Stats',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['timestamp'], name='analytics_u_timesta_2b8b17_idx'),
+        ),
+        migrations.AddField(
+            model_name='useractivitydailystat',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activity_daily_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='useractivitydailystat',
+            index=models.Index(fields=['day', 'activity_type'], name='analytics_u_day_797100_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivitydailystat',
+            index=models.Index(fields=['user', 'day'], name='analytics_u_user_id_df0611_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivitydailystat',
+            index=models.Index(fields=['course_id', 'day'], name='analytics_u_course__5d2e43_idx'),
+        ),
+    ]
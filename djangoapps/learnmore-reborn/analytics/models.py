@@ -24,12 +24,38 @@ class UserActivity(models.Model):
         indexes = [
             models.Index(fields=['user', 'timestamp']),
             models.Index(fields=['activity_type', 'timestamp']),
+            models.Index(fields=['timestamp']),
         ]
     
     def __str__(self):
         username = self.user.username if self.user else "Anonymous"
         return f"{username} - {self.activity_type} - {self.timestamp}"
 
+class UserActivityDailyStat(models.Model):
+    """
+    Daily activity counts kept after the raw UserActivity rows are archived.
+    
+    Written by ``analytics.retention`` when it archives a day; a day has
+    either raw rows or rollup rows, never both.
+    """
+    day = models.DateField()
+    activity_type = models.CharField(max_length=50)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_daily_stats', null=True, blank=True)
+    course_id = models.IntegerField(null=True, blank=True)  # details['course_id'] of the activities, if any
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "User Activity Daily Stats"
+        ordering = ['day']
+        indexes = [
+            models.Index(fields=['day', 'activity_type']),
+            models.Index(fields=['user', 'day']),
+            models.Index(fields=['course_id', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} - {self.activity_type} - {self.count}"
+
 class LearnerAnalytics(models.Model):
     """
     Analytics data tracking a learner's performance across quizzes and courses.
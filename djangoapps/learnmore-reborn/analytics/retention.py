@@ -0,0 +1,228 @@
+"""
+Retention and archival for high-volume event tables.
+
+``UserActivity`` (one row per tracked request) and ``QRCodeScan`` grow
+without bound, and the dashboards that read them by time range slow down
+with them. The ``archive_events`` command keeps only the last
+EVENT_RETENTION_DAYS days in those tables. Older rows are handled one day at
+a time, each day in one transaction:
+
+1. the day is rolled up: ``UserActivityDailyStat`` rows (per activity type,
+   user and course) for activity, ``QRCodeDailyStat`` (see
+   ``qr_codes.rollups``) for scans;
+2. its rows are written to ``EVENT_ARCHIVE_DIR/<table>/<year>/<day>.ndjson.gz``,
+   one JSON object per line, so the archive is one file per day and can be
+   read back with ``read_archive``;
+3. its rows are deleted.
+
+A day therefore has either raw rows or rollup rows, never both, and
+``activity_by_day`` answers any range by adding the two; QR dashboards
+already read ``QRCodeDailyStat`` for every day.
+"""
+
+import datetime
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from qr_codes import rollups as qr_rollups
+from qr_codes.models import QRCodeScan
+
+from .models import UserActivity, UserActivityDailyStat
+
+logger = logging.getLogger(__name__)
+
+# Rows read and deleted per query while archiving a day
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+def _course_id(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rollup_user_activity(day: datetime.date) -> int:
+    """
+    Add the day's raw activity to ``UserActivityDailyStat``.
+
+    Called just before the rows are archived and deleted, so each row is
+    counted exactly once.
+    """
+    start, end = qr_rollups.day_bounds(day)
+    rows = UserActivity.objects.filter(timestamp__gte=start, timestamp__lt=end).values(
+        'activity_type', 'user', 'details__course_id'
+    ).annotate(count=Count('id')).order_by()
+    stats = UserActivityDailyStat.objects.bulk_create([
+        UserActivityDailyStat(
+            day=day,
+            activity_type=row['activity_type'],
+            user_id=row['user'],
+            course_id=_course_id(row['details__course_id']),
+            count=row['count'],
+        )
+        for row in rows
+    ], batch_size=500)
+    return len(stats)
+
+
+@dataclass
+class EventTable:
+    """An event table under retention."""
+    name: str
+    model: type
+    time_field: str
+    # Rolls one day's rows into aggregates before they are archived
+    rollup: Callable[[datetime.date], int]
+    # Wraps the deletes, e.g. to keep signal handlers from touching the rollups
+    deleting: Callable = nullcontext
+    # Runs once a day has been archived, e.g. to drop caches derived from its rows
+    archived: Optional[Callable[[datetime.date], None]] = None
+
+
+# Scan timestamps are set on insert, so no scans arrive for an archived day
+# and rebuilding the day's QR rollups from the stored scans is exact
+EVENT_TABLES = {
+    'user_activity': EventTable('user_activity', UserActivity, 'timestamp', rollup_user_activity),
+    'qr_scans': EventTable('qr_scans', QRCodeScan, 'scanned_at', qr_rollups.rebuild_daily_stats,
+                           deleting=qr_rollups.paused, archived=qr_rollups.invalidate_batch_stats),
+}
+
+
+def archive_directory() -> str:
+    return str(getattr(settings, 'EVENT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive')))
+
+
+def archive_path(table: str, day: datetime.date) -> str:
+    return os.path.join(archive_directory(), table, f"{day:%Y}", f"{day.isoformat()}.ndjson.gz")
+
+
+def read_archive(table: str, day: datetime.date) -> Iterator[Dict]:
+    """Yield the archived rows of ``table`` for ``day`` (nothing if the day was not archived)."""
+    path = archive_path(table, day)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as handle:
+        for line in handle:
+            yield json.loads(line)
+
+
+def cutoff_day(retention_days: Optional[int] = None) -> datetime.date:
+    """Days before this one are archived."""
+    if retention_days is None:
+        retention_days = int(getattr(settings, 'EVENT_RETENTION_DAYS', 90))
+    return timezone.localdate() - datetime.timedelta(days=retention_days)
+
+
+def days_to_archive(table: EventTable, before: datetime.date) -> List[datetime.date]:
+    """Days before ``before`` that still have rows in the table, oldest first."""
+    start, _ = qr_rollups.day_bounds(before)
+    days = table.model.objects.filter(**{f'{table.time_field}__lt': start}).annotate(
+        day=TruncDate(table.time_field)
+    ).values_list('day', flat=True).distinct().order_by('day')
+    return list(days)
+
+
+def archive_day(table: EventTable, day: datetime.date) -> int:
+    """Roll up, archive and delete one day of ``table``; returns the number of rows archived."""
+    start, end = qr_rollups.day_bounds(day)
+    rows = table.model.objects.filter(**{f'{table.time_field}__gte': start, f'{table.time_field}__lt': end})
+    path = archive_path(table.name, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with transaction.atomic():
+        table.rollup(day)
+
+        # Written aside and moved into place only once the rows are deleted,
+        # so a failed run leaves neither a partial file nor missing rows
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            ids = []
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as handle:
+                for row in rows.order_by(table.time_field).values().iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+                    handle.write((json.dumps(row, cls=DjangoJSONEncoder) + '\n').encode('utf-8'))
+                    ids.append(row['id'])
+
+            with table.deleting():
+                for offset in range(0, len(ids), ARCHIVE_CHUNK_SIZE):
+                    table.model.objects.filter(pk__in=ids[offset:offset + ARCHIVE_CHUNK_SIZE]).delete()
+
+            if os.path.exists(path):
+                # Late rows for an archived day: gzip files may be concatenated
+                with open(path, 'ab') as target, open(tmp_path, 'rb') as source:
+                    shutil.copyfileobj(source, target)
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    if table.archived:
+        table.archived(day)
+    return len(ids)
+
+
+def archive_table(table: EventTable, before: datetime.date,
+                  progress: Optional[Callable[[datetime.date, int], None]] = None) -> int:
+    """Archive every day of ``table`` before ``before``; returns the number of rows archived."""
+    total = 0
+    for day in days_to_archive(table, before):
+        archived = archive_day(table, day)
+        logger.info(f"Archived {archived} {table.name} rows for {day}")
+        total += archived
+        if progress:
+            progress(day, archived)
+    return total
+
+
+def activity_by_day(start_day: datetime.date, end_day: datetime.date, user_id=None,
+                    activity_type: Optional[str] = None, course_ids=None) -> List[Dict]:
+    """
+    Activity counts per day and type from ``start_day`` to ``end_day`` inclusive.
+
+    Returns ``[{'day': date, 'activity_type': str, 'count': n}]``, reading the
+    rollups for archived days and the raw rows for the rest.
+    """
+    start, _ = qr_rollups.day_bounds(start_day)
+    _, end = qr_rollups.day_bounds(end_day)
+    raw = UserActivity.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    stats = UserActivityDailyStat.objects.filter(day__gte=start_day, day__lte=end_day)
+    if user_id is not None:
+        raw = raw.filter(user_id=user_id)
+        stats = stats.filter(user_id=user_id)
+    if activity_type:
+        raw = raw.filter(activity_type=activity_type)
+        stats = stats.filter(activity_type=activity_type)
+    if course_ids is not None:
+        raw = raw.filter(details__course_id__in=list(course_ids))
+        stats = stats.filter(course_id__in=list(course_ids))
+
+    counts: Dict = {}
+    for row in raw.annotate(day=TruncDate('timestamp')).values('day', 'activity_type').annotate(
+            count=Count('id')).order_by():
+        key = (row['day'], row['activity_type'])
+        counts[key] = counts.get(key, 0) + row['count']
+    for row in stats.values('day', 'activity_type').annotate(count=Sum('count')).order_by():
+        key = (row['day'], row['activity_type'])
+        counts[key] = counts.get(key, 0) + row['count']
+
+    return [
+        {'day': day, 'activity_type': activity_type, 'count': count}
+        for (day, activity_type), count in sorted(counts.items())
+    ]
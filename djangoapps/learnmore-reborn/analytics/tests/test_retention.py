@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from qr_codes.models import QRCodeBatch, QRCodeDailyStat, QRCodeScan
+from qr_codes.tests.utils import create_test_qr_code
+from .factories import CourseFactory, UserActivityFactory
+from ..models import UserActivity, UserActivityDailyStat
+from ..retention import EVENT_TABLES, activity_by_day, archive_path, read_archive
+
+
+def backdate(queryset, field, days):
+    """Move rows ``days`` into the past (timestamps are set on insert)."""
+    queryset.update(**{field: timezone.now() - timedelta(days=days)})
+    return (timezone.now() - timedelta(days=days)).date()
+
+
+class RetentionTestCase(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        settings_override = override_settings(EVENT_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='learner', password='testpass123')
+        self.other_user = User.objects.create_user(username='visitor', password='testpass123')
+
+
+class ArchiveUserActivityTest(RetentionTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(3):
+            UserActivityFactory(user=self.user, activity_type='view_course', details={'course_id': 7})
+        UserActivityFactory(user=self.other_user, activity_type='login', details={})
+        self.old_day = backdate(UserActivity.objects.all(), 'timestamp', 100)
+        self.recent = UserActivityFactory(user=self.user, activity_type='view_course', details={'course_id': 7})
+
+    def test_old_days_are_rolled_up_archived_and_deleted(self):
+        call_command('archive_events', '--days', '90', '--tables', 'user_activity')
+
+        self.assertEqual(list(UserActivity.objects.all()), [self.recent])
+        stats = {
+            (stat.activity_type, stat.user_id, stat.course_id): stat.count
+            for stat in UserActivityDailyStat.objects.filter(day=self.old_day)
+        }
+        self.assertEqual(stats, {('view_course', self.user.id, 7): 3, ('login', self.other_user.id, None): 1})
+
+        archived = list(read_archive('user_activity', self.old_day))
+        self.assertEqual(len(archived), 4)
+        self.assertEqual({row['activity_type'] for row in archived}, {'view_course', 'login'})
+        self.assertTrue(archive_path('user_activity', self.old_day).endswith('.ndjson.gz'))
+
+    def test_dry_run_changes_nothing(self):
+        call_command('archive_events', '--days', '90', '--dry-run')
+        self.assertEqual(UserActivity.objects.count(), 5)
+        self.assertFalse(UserActivityDailyStat.objects.exists())
+
+    def test_failed_archive_keeps_the_rows(self):
+        with patch('analytics.retention.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                call_command('archive_events', '--days', '90', '--tables', 'user_activity')
+
+        self.assertEqual(UserActivity.objects.count(), 5)
+        self.assertFalse(UserActivityDailyStat.objects.exists())
+        self.assertEqual(list(read_archive('user_activity', self.old_day)), [])
+        self.assertEqual(os.listdir(os.path.dirname(archive_path('user_activity', self.old_day))), [])
+
+    def test_activity_by_day_reads_rollups_for_archived_days(self):
+        today = timezone.localdate()
+        before = activity_by_day(self.old_day, today, user_id=self.user.id)
+        call_command('archive_events', '--days', '90', '--tables', 'user_activity')
+        after = activity_by_day(self.old_day, today, user_id=self.user.id)
+
+        self.assertEqual(before, after)
+        self.assertEqual(after, [
+            {'day': self.old_day, 'activity_type': 'view_course', 'count': 3},
+            {'day': today, 'activity_type': 'view_course', 'count': 1},
+        ])
+        self.assertEqual(
+            sum(row['count'] for row in activity_by_day(self.old_day, today, course_ids=[7])), 4
+        )
+
+    def test_daily_endpoint(self):
+        call_command('archive_events', '--days', '90', '--tables', 'user_activity')
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.get(reverse('user-activity-daily'), {'start_date': self.old_day.isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['count'] for row in response.data], [3, 1])
+        self.assertEqual(client.get(reverse('user-activity-daily'), {'start_date': 'soon'}).status_code, 400)
+
+
+class ArchiveQRScansTest(RetentionTestCase):
+    def test_scan_rollups_survive_archiving(self):
+        qr_code = create_test_qr_code(CourseFactory(instructor=self.user))
+        for _ in range(2):
+            QRCodeScan.objects.create(qr_code=qr_code, user=self.user, ip_address='10.0.0.1')
+        old_day = backdate(QRCodeScan.objects.all(), 'scanned_at', 120)
+        QRCodeScan.objects.create(qr_code=qr_code)
+
+        call_command('archive_events', '--days', '90', '--tables', 'qr_scans')
+        # Recomputing the rollups from the scan log must not drop archived days
+        call_command('rollup_qr_scans', '--since', old_day.isoformat())
+
+        self.assertEqual(QRCodeScan.objects.count(), 1)
+        self.assertEqual(len(list(read_archive('qr_scans', old_day))), 2)
+        stat = QRCodeDailyStat.objects.get(day=old_day)
+        self.assertEqual((stat.scans, stat.unique_users, stat.unique_ips), (2, 1, 1))
+        self.assertEqual(QRCodeDailyStat.objects.get(day=timezone.localdate()).scans, 1)
+
+    def test_batch_stats_are_invalidated_once_per_day(self):
+        batch = QRCodeBatch.objects.create(name='Posters', target_type='course', created_by=self.user)
+        qr_code = create_test_qr_code(CourseFactory(instructor=self.user))
+        qr_code.batch = batch
+        qr_code.save()
+        for _ in range(3):
+            QRCodeScan.objects.create(qr_code=qr_code, user=self.user)
+        backdate(QRCodeScan.objects.all(), 'scanned_at', 120)
+
+        with patch('qr_codes.services.QRCodeService.invalidate_batch_stats') as invalidate:
+            call_command('archive_events', '--days', '90', '--tables', 'qr_scans')
+
+        invalidate.assert_called_once_with(batch.pk)
+        self.assertFalse(QRCodeScan.objects.exists())
+
+    def test_every_table_is_registered(self):
+        self.assertEqual(set(EVENT_TABLES), {'user_activity', 'qr_scans'})
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
-    Course, Module, Quiz, Enrollment,
+    Course, Module, Quiz, Enrollment, WaitlistEntry,
     Question, MultipleChoiceQuestion, TrueFalseQuestion, EssayQuestion,
     Choice, QuizAttempt, QuestionResponse,
     ScoringRubric, RubricCriterion, RubricFeedback
@@ -19,7 +19,7 @@ class CourseAdmin(admin.ModelAdmin):
             'fields': ('title', 'slug', 'description', 'instructor')
         }),
         ('Catalog Settings', {
-            'fields': ('status', 'enrollment_type', 'max_students', 'start_date', 'end_date')
+            'fields': ('status', 'enrollment_type', 'max_students', 'waitlist_enabled', 'start_date', 'end_date')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -180,6 +180,13 @@ class EnrollmentAdmin(admin.ModelAdmin):
     readonly_fields = ('enrolled_at', 'completed_at')
     date_hierarchy = 'enrolled_at'
 
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'course', 'created_at')
+    list_filter = ('course',)
+    search_fields = ('user__username', 'course__title')
+    readonly_fields = ('created_at',)
+
 @admin.register(EssayQuestion)
 class EssayQuestionAdmin(admin.ModelAdmin):
     list_display = ('text', 'quiz', 'question_type', 'points', 'get_quiz_module', 
@@ -19,6 +19,8 @@ from .serializers import (
     ChoiceSerializer, ChoiceWithCorrectAnswerSerializer,
     QuizAttemptSerializer, QuizAttemptDetailSerializer, QuestionResponseSerializer
 )
+from .search_index import course_search
+from . import seat_reservation
 
 class IsInstructorOrReadOnly(permissions.BasePermission):
     """
@@ -45,12 +47,29 @@ class IsInstructorOrReadOnly(permissions.BasePermission):
         # Only the course instructor can edit or delete
         return obj.instructor == request.user
 
+class CourseSearchFilter(filters.SearchFilter):
+    """``?search=`` backed by the course full-text index, most relevant first."""
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        return course_search.filter(queryset, query)
+
+
+class CourseOrderingFilter(filters.OrderingFilter):
+    """Keeps relevance order for searches unless ``?ordering=`` is given."""
+    def get_default_ordering(self, view):
+        if CourseSearchFilter().get_search_terms(view.request):
+            return None
+        return super().get_default_ordering(view)
+
+
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     # Permissions are checked conditionally in get_permissions to allow for test cases
     lookup_field = 'slug'
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [CourseSearchFilter, CourseOrderingFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['title', 'created_at', 'start_date']
     ordering = ['-created_at']
@@ -69,15 +88,19 @@ class CourseViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if self.action == 'catalog':
             # Only show published courses in catalog
-            return Course.objects.filter(status='published')
+            queryset = Course.objects.filter(status='published')
+        elif self.action in ('enroll', 'unenroll'):
+            # Learners enroll in courses they cannot list yet; the seat reservation checks the status
+            queryset = Course.objects.all()
         elif hasattr(user, 'profile') and user.profile.is_instructor:
             # Instructors can see all courses
-            return Course.objects.all()
+            queryset = Course.objects.all()
         else:
             # Regular users see courses they're enrolled in
-            return Course.objects.filter(
+            queryset = Course.objects.filter(
                 Q(instructor=user) | Q(enrollments__user=user)
             ).distinct()
+        return queryset.with_listing(user)
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -99,7 +122,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         Return a list of all published courses for the catalog.
         """
         queryset = self.filter_queryset(
-            Course.objects.filter(status='published')
+            Course.objects.filter(status='published').with_listing(request.user)
         )
         
         # Apply filters
@@ -119,7 +142,7 @@ class CourseViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def search(self, request):
         """
-        Search for courses by title or description.
+        Search published courses by title, description and module text, most relevant first.
         """
         query = request.query_params.get('q', '')
         if not query:
@@ -128,9 +151,8 @@ class CourseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        queryset = Course.objects.filter(
-            Q(status='published') & 
-            (Q(title__icontains=query) | Q(description__icontains=query))
+        queryset = course_search.filter(
+            Course.objects.filter(status='published').with_listing(request.user), query
         )
         
         page = self.paginate_queryset(queryset)
@@ -150,7 +172,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         queryset = Course.objects.filter(
             enrollments__user=user,
             enrollments__status='active'
-        ).distinct()
+        ).distinct().with_listing(user)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -163,62 +185,38 @@ class CourseViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def enroll(self, request, slug=None):
         """
-        Enroll the current user in the course.
+        Enroll the current user in the course, or add them to its waitlist when it is full.
         """
         course = self.get_object()
-        user = request.user
-        
-        # Check if user is already enrolled
-        if Enrollment.objects.filter(user=user, course=course).exists():
-            return Response(
-                {"error": "You are already enrolled in this course"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
         
-        # Check if course is published
-        if course.status != 'published':
-            return Response(
-                {"error": "You cannot enroll in an unpublished course"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if course is full
-        if course.is_full:
+        # Restricted courses would check e.g. an invitation code here
+        result = seat_reservation.enroll(course, request.user)
+        if result.status == seat_reservation.ENROLLED:
+            serializer = EnrollmentSerializer(result.enrollment)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if result.status == seat_reservation.WAITLISTED:
             return Response(
-                {"error": "This course has reached its maximum enrollment capacity"}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {"waitlisted": True, "position": result.waitlist_entry.position, "message": result.message},
+                status=status.HTTP_202_ACCEPTED
             )
-        
-        # Check if enrollment is open
-        if course.enrollment_type == 'restricted':
-            # Here you would implement logic for checking if user is allowed
-            # to enroll in a restricted course (e.g., check invitation code)
-            pass
-        
-        # Create enrollment
-        enrollment = Enrollment.objects.create(
-            user=user,
-            course=course,
-            status='active'
-        )
-        
-        serializer = EnrollmentSerializer(enrollment)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response({"error": result.message}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=True, methods=['post'])
     def unenroll(self, request, slug=None):
         """
-        Unenroll the current user from the course.
+        Unenroll the current user from the course, or take them off its waitlist.
         """
         course = self.get_object()
         user = request.user
         
         try:
             enrollment = Enrollment.objects.get(user=user, course=course)
-            enrollment.status = 'dropped'
-            enrollment.save()
+            # Frees the seat for the next learner on the waitlist (see courses.signals)
+            seat_reservation.drop(enrollment)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Enrollment.DoesNotExist:
+            if seat_reservation.leave_waitlist(course, user):
+                return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {"error": "You are not enrolled in this course"}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        """Register the search index signals and create the index after migrate."""
+        import courses.signals
+        from .search_index import ensure_search_index
+        post_migrate.connect(ensure_search_index, sender=self)
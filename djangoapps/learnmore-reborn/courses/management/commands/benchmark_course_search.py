@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.search_benchmark import run_benchmark
+from courses.search_index import course_search
+
+
+class Command(BaseCommand):
+    help = ('Benchmark catalog search on a generated catalog: the full-text index against icontains. '
+            'The generated courses are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=50000, help='Generated catalog size (default: 50000)')
+        parser.add_argument('--queries', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['courses'] < 1 or options['queries'] < 1:
+            raise CommandError("--courses and --queries must be at least 1")
+        if not course_search.is_available():
+            raise CommandError("The course search index is not available (it needs SQLite with FTS5); "
+                               "run migrate or rebuild_course_index first.")
+
+        build, results = run_benchmark(
+            options['courses'], options['queries'], seed=options['seed'],
+            progress=lambda line: self.stdout.write(line),
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'index': build.as_dict(), 'search': [result.as_dict() for result in results]}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.search_index import CourseSearchIndex
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the course catalog full-text index from the Course and Module tables, '
+            'e.g. after bulk imports, which do not send the signals that keep it up to date')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias (default: default)')
+        parser.add_argument('--recreate', action='store_true',
+                            help='Drop and recreate the index table, e.g. after changing its definition')
+
+    def handle(self, *args, **options):
+        index = CourseSearchIndex(options['database'])
+        if index.connection.vendor != 'sqlite':
+            raise CommandError("The course search index needs SQLite; other databases use icontains search.")
+        if options['recreate']:
+            index.drop()
+        count = index.rebuild()
+        if not index.is_available():
+            raise CommandError("This SQLite build has no FTS5; course search falls back to icontains.")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} courses"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.seat_reservation import recount_enrollments
+
+
+class Command(BaseCommand):
+    help = ('Recompute each course\'s active enrollment counter from the enrollments table and fill '
+            'freed seats from the waitlists, e.g. after bulk updates, which do not send signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int, help='Only these courses (default: all)')
+
+    def handle(self, *args, **options):
+        updated = recount_enrollments(options['course_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Recounted enrollments of {updated} courses"))
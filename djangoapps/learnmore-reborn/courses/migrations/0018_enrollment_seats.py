@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_active_enrollments(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    active = Enrollment.objects.filter(course=models.OuterRef('pk'), status='active').order_by().values(
+        'course'
+    ).annotate(count=models.Count('id')).values('count')
+    Course.objects.update(active_enrollment_count=Coalesce(models.Subquery(active), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_course_qr_enabled_module_qr_access_quiz_qr_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='waitlist_enabled',
+            field=models.BooleanField(default=False, help_text='Queue learners when the course is full and enroll them as seats free up'),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist entries',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['course', 'created_at'], name='courses_wai_course__17672a_idx')],
+                'unique_together': {('user', 'course')},
+            },
+        ),
+        migrations.RunPython(count_active_enrollments, migrations.RunPython.noop),
+    ]
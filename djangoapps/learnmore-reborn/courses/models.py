@@ -2,10 +2,26 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.utils.text import slugify
-from django.db.models import Sum, F, Q
+from django.db.models import Sum, F, Q, Exists, OuterRef, Value
 
 User = get_user_model()
 
+class CourseQuerySet(models.QuerySet):
+    def with_listing(self, user=None):
+        """
+        Annotate what course lists show, so a page is serialized without a query per course.
+        
+        Selects the instructor and adds ``is_enrolled`` for ``user`` as a
+        correlated subquery, so only the courses on the page are looked at.
+        ``enrollment_count`` and ``is_full`` read the stored
+        ``active_enrollment_count``.
+        """
+        if user is not None and getattr(user, 'is_authenticated', False):
+            is_enrolled = Exists(Enrollment.objects.filter(course=OuterRef('pk'), user=user, status='active'))
+        else:
+            is_enrolled = Value(False, output_field=models.BooleanField())
+        return self.select_related('instructor').annotate(is_enrolled=is_enrolled)
+
 class Course(models.Model):
     """
     Represents a course in the learning platform.
@@ -45,9 +61,15 @@ class Course(models.Model):
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     
+    # Active enrollments, kept by courses.seat_reservation and the Enrollment signals
+    active_enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    waitlist_enabled = models.BooleanField(default=False, help_text='Queue learners when the course is full and enroll them as seats free up')
+    
     # QR code related fields
     qr_enabled = models.BooleanField(default=False, help_text='Enable QR code access for this course')
     
+    objects = CourseQuerySet.as_manager()
+    
     def __str__(self):
         return self.title
     
@@ -60,6 +82,14 @@ class Course(models.Model):
         """
         # Always generate the slug from the title
         self.slug = slugify(self.title)
+        if self.pk is not None and not self._state.adding and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            # The enrollment counter is only changed with F() updates; writing
+            # the copy loaded with this instance back would undo concurrent ones
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'active_enrollment_count'
+            ]
         super().save(*args, **kwargs)
     
     @property
@@ -73,7 +103,7 @@ class Course(models.Model):
     
     @property
     def enrollment_count(self):
-        return self.enrollments.filter(status='active').count()
+        return self.active_enrollment_count
     
     @property
     def is_full(self):
@@ -1288,10 +1318,40 @@ class Enrollment(models.Model):
     class Meta:
         unique_together = ('user', 'course')
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The status as stored, so the signals can tell when a seat is taken or freed
+        instance._stored_status = instance.__dict__.get('status')
+        return instance
+    
     def __str__(self):
         return f"{self.user.username} - {self.course.title}"
     
     def mark_completed(self):
         self.status = 'completed'
         self.completed_at = timezone.now()
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+class WaitlistEntry(models.Model):
+    """A learner queued for a seat in a full course; promoted in order of joining."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('user', 'course')
+        ordering = ['created_at', 'id']
+        indexes = [models.Index(fields=['course', 'created_at'])]
+        verbose_name_plural = 'Waitlist entries'
+    
+    def __str__(self):
+        return f"{self.user.username} waiting for {self.course.title}"
+    
+    @property
+    def position(self):
+        """1 for the next learner to be enrolled."""
+        return WaitlistEntry.objects.filter(course_id=self.course_id).filter(
+            Q(created_at__lt=self.created_at) | Q(created_at=self.created_at, id__lt=self.id)
+        ).count() + 1
@@ -0,0 +1,219 @@
+"""
+Benchmark of catalog search: the full-text index against icontains.
+
+Fills the database with a generated catalog of courses, each with a few
+modules, inside a transaction that is rolled back at the end, so the
+database is left as it was. Titles and descriptions are drawn from a
+made-up vocabulary with a skewed word frequency, like real text: a few words
+match thousands of courses, most match a handful.
+
+Each query is built from words of one target course's title: its rarest
+word, two random words, or a prefix of its rarest word, the way someone
+looking for that course would type it. Both search paths serve it the way
+the catalog API does (a count and one page of results), and the benchmark
+records the latency, the number of matches and where the target course
+ranks in the page. icontains matches the query as one substring, so
+multi-word queries in a different order than in the title find nothing with
+it. The rank columns show what relevance ordering buys on top of speed.
+"""
+
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Course, Module
+from .search_index import course_search, icontains_filter
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "xi", "bo", "de", "fu", "gy")
+INSERT_BATCH_SIZE = 1000
+PAGE_SIZE = 10
+
+
+@dataclass
+class SearchQuery:
+    text: str
+    target: int
+    kind: str
+
+
+@dataclass
+class SearchBenchmarkResult:
+    method: str
+    courses: int
+    queries: int
+    p50_ms: float
+    p95_ms: float
+    mean_matches: float
+    # Share of queries whose target course is first / anywhere on the first page
+    target_first: float
+    target_on_page: float
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class IndexBuildResult:
+    courses: int
+    build_seconds: float
+    courses_per_second: float
+    # Mean time to re-index one course after a save
+    update_ms: float
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _vocabulary(rng: random.Random, size: int) -> List[str]:
+    """Distinct made-up words, most frequent first."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+def _sentence(rng: random.Random, vocabulary: List[str], weights: List[float], length: int) -> str:
+    return " ".join(rng.choices(vocabulary, weights=weights, k=length))
+
+
+def generate_catalog(course_count: int, instructor, seed: int = 0, vocabulary_size: int = 5000,
+                     modules_per_course: int = 3) -> Tuple[List[int], Dict[str, int]]:
+    """Insert the generated courses and their modules; returns the course ids and the word frequency ranks."""
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng, vocabulary_size)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    ids = []
+    for offset in range(0, course_count, INSERT_BATCH_SIZE):
+        courses = Course.objects.bulk_create([
+            Course(
+                title=_sentence(rng, vocabulary, weights, rng.randint(3, 6)).title(),
+                slug=f"search-benchmark-{seed}-{number}",
+                description=_sentence(rng, vocabulary, weights, rng.randint(30, 60)),
+                instructor=instructor,
+                status='published',
+            )
+            for number in range(offset, min(offset + INSERT_BATCH_SIZE, course_count))
+        ])
+        Module.objects.bulk_create([
+            Module(course=course, title=_sentence(rng, vocabulary, weights, 4), order=order,
+                   description=_sentence(rng, vocabulary, weights, 15))
+            for course in courses for order in range(modules_per_course)
+        ])
+        ids.extend(course.pk for course in courses)
+    return ids, {word: rank for rank, word in enumerate(vocabulary)}
+
+
+def generate_queries(course_ids: List[int], word_ranks: Dict[str, int], query_count: int,
+                     seed: int = 0) -> List[SearchQuery]:
+    """Queries made of words from a random course's title: its rarest word, two words, or a prefix."""
+    rng = random.Random(seed + 1)
+    targets = rng.sample(course_ids, min(query_count, len(course_ids)))
+    titles = dict(Course.objects.filter(pk__in=targets).values_list('pk', 'title'))
+    queries = []
+    for number, target in enumerate(targets):
+        words = titles[target].lower().split()
+        rarest = max(words, key=lambda word: word_ranks[word])
+        kind = ('word', 'words', 'prefix')[number % 3]
+        if kind == 'word':
+            text = rarest
+        elif kind == 'words':
+            text = " ".join(rng.sample(words, 2))
+        else:
+            text = rarest[:max(3, len(rarest) - 2)]
+        queries.append(SearchQuery(text, target, kind))
+    return queries
+
+
+def build_index(course_ids: List[int], updates: int = 100) -> IndexBuildResult:
+    """Index the generated courses and time single-course updates."""
+    start = time.perf_counter()
+    course_search.update(course_ids)
+    build_seconds = time.perf_counter() - start
+
+    sample = course_ids[:updates]
+    start = time.perf_counter()
+    for course_id in sample:
+        course_search.update([course_id])
+    update_seconds = time.perf_counter() - start
+    return IndexBuildResult(
+        courses=len(course_ids),
+        build_seconds=build_seconds,
+        courses_per_second=len(course_ids) / build_seconds if build_seconds else 0.0,
+        update_ms=update_seconds * 1000 / len(sample) if sample else 0.0,
+    )
+
+
+def run_queries(method: str, search: Callable, queries: List[SearchQuery], courses: int) -> SearchBenchmarkResult:
+    """Serve every query as the catalog does (count + first page) and time it."""
+    latencies, matches, first, on_page = [], [], 0, 0
+    base = Course.objects.filter(status='published')
+    for query in queries:
+        start = time.perf_counter()
+        queryset = search(base, query.text)
+        count = queryset.count()
+        page = list(queryset.values_list('pk', flat=True)[:PAGE_SIZE])
+        latencies.append(time.perf_counter() - start)
+        matches.append(count)
+        first += bool(page) and page[0] == query.target
+        on_page += query.target in page
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    total = len(queries) or 1
+    return SearchBenchmarkResult(
+        method=method,
+        courses=courses,
+        queries=len(queries),
+        p50_ms=float(np.percentile(latencies_ms, 50)),
+        p95_ms=float(np.percentile(latencies_ms, 95)),
+        mean_matches=float(np.mean(matches)) if matches else 0.0,
+        target_first=first / total,
+        target_on_page=on_page / total,
+    )
+
+
+def run_benchmark(course_count: int, query_count: int, seed: int = 0,
+                  progress: Optional[Callable[[str], None]] = None):
+    """Generate a catalog, run both search paths on it and roll everything back."""
+    with transaction.atomic():
+        instructor = get_user_model().objects.create_user(username=f"search-benchmark-{seed}")
+        course_ids, word_ranks = generate_catalog(course_count, instructor, seed=seed)
+        if progress:
+            progress(f"Generated {len(course_ids)} courses")
+        build = build_index(course_ids)
+        if progress:
+            progress(format_build(build))
+
+        queries = generate_queries(course_ids, word_ranks, query_count, seed=seed)
+        results = [
+            # icontains is served in the API's default order, newest first
+            run_queries('icontains', lambda qs, q: icontains_filter(qs, q).order_by('-created_at'),
+                        queries, len(course_ids)),
+            run_queries('fts5', course_search.filter, queries, len(course_ids)),
+        ]
+        if progress:
+            for result in results:
+                progress(format_result(result))
+        transaction.set_rollback(True)
+    return build, results
+
+
+def format_build(build: IndexBuildResult) -> str:
+    return (
+        f"Indexed {build.courses} courses in {build.build_seconds:.2f}s "
+        f"({build.courses_per_second:.0f} courses/s), {build.update_ms:.2f} ms per course update"
+    )
+
+
+def format_result(result: SearchBenchmarkResult) -> str:
+    return (
+        f"{result.method:>9}: {result.queries} queries on {result.courses} courses, "
+        f"p50 {result.p50_ms:.1f} ms, p95 {result.p95_ms:.1f} ms, {result.mean_matches:.0f} matches on average, "
+        f"target first {result.target_first:.0%}, on first page {result.target_on_page:.0%}"
+    )
@@ -0,0 +1,193 @@
+"""
+Full-text search over the course catalog.
+
+Catalog search used to filter with ``title__icontains`` or
+``description__icontains``, which scans every course row and returns matches
+in no useful order. ``CourseSearchIndex`` keeps an SQLite FTS5 inverted index
+with one row per course (rowid = course id), holding its title, its
+description and the titles and descriptions of its modules:
+
+* ``filter`` joins a course queryset to the index, keeps the courses matching
+  every query word and orders them by BM25 relevance. Title matches weigh more
+  than description matches, which weigh more than module matches. Each word is
+  matched as a prefix, so ``prog`` finds "Programming", and FTS5 keeps prefix
+  indexes for the first two and three letters to make short prefixes cheap.
+* Course and Module ``post_save``/``post_delete`` signals (``courses.signals``)
+  re-index the affected course, so the index follows edits without a rebuild.
+  Bulk writes skip signals; ``rebuild_course_index`` repairs the index after
+  them.
+* The table is created after ``migrate`` (``CoursesConfig.ready``) and filled
+  when it is new, so it also exists in test databases built without
+  migrations.
+
+Other database backends, or an SQLite build without FTS5, fall back to the
+icontains filter.
+"""
+
+import logging
+import re
+from typing import Iterable, List, Optional
+
+from django.db import DatabaseError, connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'courses_course_fts'
+# BM25 weights of the title, description and modules columns
+COLUMN_WEIGHTS = (10.0, 3.0, 1.0)
+# Courses indexed per query when rebuilding or updating
+INDEX_CHUNK_SIZE = 500
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(query: str) -> str:
+    """
+    FTS5 query for user input: every word must match, each as a prefix.
+
+    Words are quoted, so operators and punctuation in the input (``AND``,
+    ``"``, ``*``, ``-``) are searched for as text instead of being parsed.
+    """
+    return ' '.join(f'"{word}"*' for word in _WORD_RE.findall((query or '').lower()))
+
+
+class CourseSearchIndex:
+    """SQLite FTS5 index of courses and their modules."""
+
+    def __init__(self, using: str = 'default'):
+        self.using = using
+        self._ready = False
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def is_available(self) -> bool:
+        """Whether the index table exists (checked until it is found)."""
+        if self._ready:
+            return True
+        if self.connection.vendor != 'sqlite':
+            return False
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            self._ready = cursor.fetchone() is not None
+        return self._ready
+
+    def create(self) -> bool:
+        """Create the index table if it is missing; returns True if it was created."""
+        if self.connection.vendor != 'sqlite' or self.is_available():
+            return False
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"title, description, modules, "
+                    f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+                # Make bm25 with the column weights the default ``rank``
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)",
+                    [f'bm25({weights})'],
+                )
+        except DatabaseError as e:
+            logger.warning(f"Course search index unavailable, using icontains search: {str(e)}")
+            return False
+        self._ready = True
+        return True
+
+    def drop(self) -> None:
+        if self.connection.vendor == 'sqlite':
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        self._ready = False
+
+    def rebuild(self) -> int:
+        """Re-index every course; returns the number indexed."""
+        from .models import Course
+        if not self.create() and not self.is_available():
+            return 0
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        ids = list(Course.objects.using(self.using).order_by('pk').values_list('pk', flat=True))
+        return self._index(ids)
+
+    def update(self, course_ids: Iterable[int]) -> int:
+        """Re-index the given courses, dropping those that no longer exist."""
+        ids = sorted({course_id for course_id in course_ids if course_id is not None})
+        if not ids or not self.is_available():
+            return 0
+        self._delete(ids)
+        return self._index(ids)
+
+    def remove(self, course_ids: Iterable[int]) -> None:
+        ids = [course_id for course_id in course_ids if course_id is not None]
+        if ids and self.is_available():
+            self._delete(ids)
+
+    def _delete(self, ids: List[int]) -> None:
+        with self.connection.cursor() as cursor:
+            for offset in range(0, len(ids), INDEX_CHUNK_SIZE):
+                chunk = ids[offset:offset + INDEX_CHUNK_SIZE]
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+
+    def _index(self, ids: List[int]) -> int:
+        from .models import Course, Module
+        indexed = 0
+        with self.connection.cursor() as cursor:
+            for offset in range(0, len(ids), INDEX_CHUNK_SIZE):
+                chunk = ids[offset:offset + INDEX_CHUNK_SIZE]
+                modules = {}
+                for course_id, title, description in Module.objects.using(self.using).filter(
+                        course_id__in=chunk).order_by('course_id', 'order', 'pk').values_list(
+                        'course_id', 'title', 'description'):
+                    modules.setdefault(course_id, []).extend([title, description])
+                rows = [
+                    (pk, title, description, '\n'.join(text for text in modules.get(pk, []) if text))
+                    for pk, title, description in Course.objects.using(self.using).filter(
+                        pk__in=chunk).values_list('pk', 'title', 'description')
+                ]
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE}(rowid, title, description, modules) VALUES (%s, %s, %s, %s)", rows
+                )
+                indexed += len(rows)
+        return indexed
+
+    def filter(self, queryset, query: str):
+        """
+        Restrict a Course queryset to the courses matching ``query``, most relevant first.
+
+        Courses carry their relevance as ``search_rank`` (lower is better).
+        Later ``order_by`` calls replace the relevance order.
+        """
+        expression = match_expression(query)
+        if not expression:
+            return queryset.none()
+        if not self.is_available():
+            return icontains_filter(queryset, query)
+        course_table = queryset.model._meta.db_table
+        return queryset.extra(
+            select={'search_rank': f'{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {course_table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[expression],
+        ).order_by('search_rank', 'pk')
+
+
+def icontains_filter(queryset, query: str):
+    """The substring search used without the index."""
+    return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+
+
+course_search = CourseSearchIndex()
+
+
+def ensure_search_index(using: Optional[str] = None, **kwargs) -> None:
+    """``post_migrate`` handler: create the index table, filling it if it is new."""
+    index = course_search if using in (None, course_search.using) else CourseSearchIndex(using)
+    if index.create():
+        count = index.rebuild()
+        logger.info(f"Built the course search index for {count} courses")
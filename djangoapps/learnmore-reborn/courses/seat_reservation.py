@@ -0,0 +1,227 @@
+"""
+Seat reservation for course enrollment.
+
+Enrolling used to check ``course.is_full`` (a COUNT of the course's active
+enrollments) and then insert the Enrollment, so a burst of requests when
+registration opened could all pass the check and overbook ``max_students``.
+
+``Course.active_enrollment_count`` now holds the number of active
+enrollments. ``enroll`` claims a seat with one conditional
+``UPDATE ... SET active_enrollment_count = active_enrollment_count + 1
+WHERE active_enrollment_count < max_students`` (or the course is unlimited).
+The database applies it atomically, so of any number of concurrent claims for
+the last seat exactly one updates the row. The Enrollment is inserted in the
+same transaction, so a failed insert (the learner enrolled twice at once)
+gives the seat back.
+
+Every other change to enrollments (unenrolling, completing, admin edits,
+deletes) moves the counter through the Enrollment signals in
+``courses.signals``: a row becoming active takes a seat, and an active row
+changing status or being deleted frees one. A freed seat goes to the first
+learner on the course's waitlist, if there is one. Courses with
+``waitlist_enabled`` queue learners when they are full instead of turning
+them away. Queryset ``update()`` and bulk writes send no signals;
+``recount_enrollments`` (also a management command) recomputes the counters
+after them.
+
+``enroll`` and ``drop`` each run in one transaction, so an enrollment and its
+seat change together. On SQLite a burst of them can find the database locked;
+outside an enclosing transaction they are retried a few times before giving up.
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Course, Enrollment, WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+# Attempts and base delay (seconds) for transactions that find SQLite locked
+LOCK_RETRIES = 20
+LOCK_RETRY_DELAY = 0.02
+
+ENROLLED = 'enrolled'
+WAITLISTED = 'waitlisted'
+ALREADY_ENROLLED = 'already_enrolled'
+ALREADY_WAITLISTED = 'already_waitlisted'
+UNPUBLISHED = 'unpublished'
+FULL = 'full'
+
+MESSAGES = {
+    ENROLLED: "You have successfully enrolled in this course",
+    WAITLISTED: "This course is full; you have been added to its waitlist",
+    ALREADY_ENROLLED: "You are already enrolled in this course",
+    ALREADY_WAITLISTED: "You are already on the waitlist for this course",
+    UNPUBLISHED: "You cannot enroll in an unpublished course",
+    FULL: "This course has reached its maximum enrollment capacity",
+}
+
+
+@dataclass
+class EnrollmentResult:
+    status: str
+    enrollment: Optional[Enrollment] = None
+    waitlist_entry: Optional[WaitlistEntry] = None
+
+    @property
+    def success(self) -> bool:
+        return self.status in (ENROLLED, WAITLISTED)
+
+    @property
+    def message(self) -> str:
+        return MESSAGES[self.status]
+
+
+def _with_retries(operation: Callable):
+    """Run ``operation`` in a transaction, retrying while the database reports it is locked."""
+    for attempt in range(LOCK_RETRIES):
+        try:
+            with transaction.atomic():
+                return operation()
+        except OperationalError as e:
+            if 'locked' not in str(e) or connection.in_atomic_block or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_RETRY_DELAY * (attempt + 1) * random.uniform(0.5, 1.5))
+
+
+def _adjust_cached_course(enrollment: Enrollment, delta: int) -> None:
+    """Keep the enrollment's loaded course in step with a counter update."""
+    if Enrollment.course.is_cached(enrollment):
+        course = enrollment.course
+        course.active_enrollment_count = max(0, course.active_enrollment_count + delta)
+
+
+def claim_seat(course_id) -> bool:
+    """Take a seat if the course has one left; True if it was taken."""
+    return Course.objects.filter(pk=course_id).filter(
+        Q(max_students=0) | Q(active_enrollment_count__lt=F('max_students'))
+    ).update(active_enrollment_count=F('active_enrollment_count') + 1) == 1
+
+
+def take_seat(enrollment: Enrollment) -> None:
+    """Count an enrollment that became active without claiming a seat (admin edits, imports)."""
+    Course.objects.filter(pk=enrollment.course_id).update(
+        active_enrollment_count=F('active_enrollment_count') + 1
+    )
+    _adjust_cached_course(enrollment, 1)
+
+
+def free_seat(enrollment: Enrollment, promote: bool = True) -> List[Enrollment]:
+    """Give back the seat of an enrollment that stopped being active and fill it from the waitlist."""
+    Course.objects.filter(pk=enrollment.course_id, active_enrollment_count__gt=0).update(
+        active_enrollment_count=F('active_enrollment_count') - 1
+    )
+    _adjust_cached_course(enrollment, -1)
+    return promote_waitlist(enrollment.course_id) if promote else []
+
+
+def _activate(entry: WaitlistEntry) -> Optional[Enrollment]:
+    """Enroll a waitlisted learner in the seat just claimed for them; None if already enrolled."""
+    enrollment = Enrollment.objects.filter(user_id=entry.user_id, course_id=entry.course_id).first()
+    if enrollment is None:
+        enrollment = Enrollment(user_id=entry.user_id, course_id=entry.course_id)
+    elif enrollment.status == 'active':
+        return None
+    enrollment.status = 'active'
+    enrollment._seat_claimed = True
+    enrollment.save()
+    return enrollment
+
+
+def promote_waitlist(course_id) -> List[Enrollment]:
+    """Enroll waitlisted learners, first come first served, while the course has seats."""
+    promoted = []
+    with transaction.atomic():
+        while True:
+            entry = WaitlistEntry.objects.filter(course_id=course_id).first()
+            if entry is None or not claim_seat(course_id):
+                break
+            entry.delete()
+            enrollment = _activate(entry)
+            if enrollment is None:
+                # Enrolled some other way while waiting; the seat is not theirs to take
+                Course.objects.filter(pk=course_id).update(active_enrollment_count=F('active_enrollment_count') - 1)
+                continue
+            logger.info(f"Promoted user {entry.user_id} from the waitlist of course {course_id}")
+            promoted.append(enrollment)
+    return promoted
+
+
+def enroll(course: Course, user) -> EnrollmentResult:
+    """Enroll ``user`` if a seat is left, else waitlist them when the course allows it."""
+    if course.status != 'published':
+        if Enrollment.objects.filter(user=user, course=course).exists():
+            return EnrollmentResult(ALREADY_ENROLLED)
+        return EnrollmentResult(UNPUBLISHED)
+    result = _with_retries(lambda: _enroll(course, user))
+    if result.status == ENROLLED:
+        course.active_enrollment_count += 1
+    return result
+
+
+def _enroll(course: Course, user) -> EnrollmentResult:
+    if Enrollment.objects.filter(user=user, course=course).exists():
+        return EnrollmentResult(ALREADY_ENROLLED)
+    try:
+        with transaction.atomic():
+            if claim_seat(course.pk):
+                enrollment = Enrollment(user=user, course=course, status='active')
+                enrollment._seat_claimed = True
+                enrollment.save()
+                return EnrollmentResult(ENROLLED, enrollment=enrollment)
+    except IntegrityError:
+        # A concurrent request enrolled the same learner; the claimed seat was rolled back
+        return EnrollmentResult(ALREADY_ENROLLED)
+
+    if not course.waitlist_enabled:
+        return EnrollmentResult(FULL)
+    entry, created = WaitlistEntry.objects.get_or_create(user=user, course=course)
+    if not created:
+        return EnrollmentResult(ALREADY_WAITLISTED, waitlist_entry=entry)
+    # A seat freed between the claim and the insert would have found no one waiting
+    for enrollment in promote_waitlist(course.pk):
+        if enrollment.user_id == user.pk:
+            return EnrollmentResult(ENROLLED, enrollment=enrollment)
+    return EnrollmentResult(WAITLISTED, waitlist_entry=entry)
+
+
+def drop(enrollment: Enrollment, status: str = 'dropped') -> Enrollment:
+    """End an enrollment, freeing its seat for the waitlist in the same transaction."""
+    stored_status = getattr(enrollment, '_stored_status', None)
+
+    def save():
+        # A retried attempt must see the status as it was before the rolled-back one
+        enrollment._stored_status = stored_status
+        enrollment.status = status
+        enrollment.save()
+        return enrollment
+
+    return _with_retries(save)
+
+
+def leave_waitlist(course: Course, user) -> bool:
+    """Remove ``user`` from the course's waitlist; True if they were on it."""
+    deleted, _ = WaitlistEntry.objects.filter(course=course, user=user).delete()
+    return deleted > 0
+
+
+def recount_enrollments(course_ids=None) -> int:
+    """Recompute the counters from the enrollments table and fill any seats that opened up."""
+    active = Enrollment.objects.filter(course=OuterRef('pk'), status='active').order_by().values(
+        'course'
+    ).annotate(count=Count('id')).values('count')
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=list(course_ids))
+    updated = courses.update(active_enrollment_count=Coalesce(Subquery(active), 0))
+    waiting = WaitlistEntry.objects.filter(course__in=courses).values_list('course_id', flat=True).distinct()
+    for course_id in list(waiting):
+        promote_waitlist(course_id)
+    return updated
@@ -426,7 +426,7 @@ class CourseSerializer(serializers.ModelSerializer):
         model = Course
         fields = [
             'id', 'title', 'slug', 'description', 'status',
-            'enrollment_type', 'course_type', 'max_students', 'start_date', 'end_date',
+            'enrollment_type', 'course_type', 'max_students', 'waitlist_enabled', 'start_date', 'end_date',
             'instructor', 'instructor_name', 'created_at', 'updated_at',
             'enrollment_count', 'is_full', 'is_active', 'enrolled'
         ]
@@ -447,6 +447,9 @@ class CourseSerializer(serializers.ModelSerializer):
     def get_enrolled(self, obj):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user and getattr(request.user, 'is_authenticated', False):
+            # Annotated for the requesting user by Course.objects.with_listing
+            if hasattr(obj, 'is_enrolled'):
+                return obj.is_enrolled
             return obj.enrollments.filter(user=request.user, status='active').exists()
         return False
 
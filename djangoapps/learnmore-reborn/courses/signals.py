@@ -0,0 +1,63 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Course, Enrollment, Module
+from .seat_reservation import free_seat, promote_waitlist, take_seat
+from .search_index import course_search
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    """Re-index a saved course in the catalog search index."""
+    if not raw:
+        course_search.update([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    """Drop a deleted course from the catalog search index."""
+    course_search.remove([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Module)
+def index_module_course(sender, instance, raw=False, **kwargs):
+    """Re-index the course of a saved or deleted module, whose text is part of the course's entry."""
+    if not raw:
+        course_search.update([instance.course_id])
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment_seat(sender, instance, created, raw=False, **kwargs):
+    """Take or free a seat when an enrollment becomes active or stops being active."""
+    if raw:
+        return
+    was_active = getattr(instance, '_stored_status', None) == 'active'
+    is_active = instance.status == 'active'
+    instance._stored_status = instance.status
+    if is_active and not was_active:
+        if getattr(instance, '_seat_claimed', False):
+            # Counted when the seat was reserved
+            instance._seat_claimed = False
+        else:
+            take_seat(instance)
+    elif was_active and not is_active:
+        free_seat(instance)
+
+
+@receiver(post_delete, sender=Enrollment)
+def free_enrollment_seat(sender, instance, origin=None, **kwargs):
+    """Free the seat of a deleted active enrollment."""
+    if getattr(instance, '_stored_status', instance.status) != 'active':
+        return
+    deleting = getattr(origin, 'model', type(origin))
+    if deleting is Course:
+        return
+    # Waitlisted learners are only promoted into seats freed by deleting enrollments
+    # themselves, not by cascades that may still be deleting their entries
+    free_seat(instance, promote=deleting in (Enrollment, type(None)))
+
+
+@receiver(post_save, sender=Course)
+def fill_seats_from_waitlist(sender, instance, created, raw=False, **kwargs):
+    """Enroll waitlisted learners when a course gains seats, e.g. a raised max_students."""
+    if not created and not raw:
+        promote_waitlist(instance.pk)
@@ -0,0 +1,87 @@
+"""
+Tests for annotated course lists.
+"""
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from courses.models import Course, Enrollment
+
+User = get_user_model()
+
+
+def add_courses(instructor, count, start=0):
+    courses = []
+    for number in range(start, start + count):
+        courses.append(Course.objects.create(
+            title=f'Listed Course {number}', description='Listed for the catalog',
+            status='published', max_students=2, instructor=instructor,
+        ))
+    return courses
+
+
+@pytest.fixture
+def student_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.mark.django_db
+class TestCourseListing:
+    """Test cases for Course.objects.with_listing and CourseSerializer."""
+
+    def test_annotations_match_the_properties(self, instructor, user):
+        instructor.first_name, instructor.last_name = 'Ada', 'Lovelace'
+        instructor.save()
+        full, open_course = add_courses(instructor, 2)
+        other = User.objects.create_user(username='other', password='testpass123')
+        Enrollment.objects.create(user=user, course=full)
+        Enrollment.objects.create(user=other, course=full)
+        Enrollment.objects.create(user=other, course=open_course, status='dropped')
+
+        listed = {course.pk: course for course in Course.objects.with_listing(user)}
+
+        assert (listed[full.pk].enrollment_count, listed[full.pk].is_full, listed[full.pk].is_enrolled) == (2, True, True)
+        assert (listed[open_course.pk].enrollment_count, listed[open_course.pk].is_full,
+                listed[open_course.pk].is_enrolled) == (0, False, False)
+        assert (full.enrollment_count, full.is_full) == (2, True)
+        assert Course.objects.with_listing().get(pk=full.pk).is_enrolled is False
+
+    def test_serialized_fields(self, instructor, user, student_client):
+        instructor.first_name, instructor.last_name = 'Ada', 'Lovelace'
+        instructor.save()
+        course = add_courses(instructor, 1)[0]
+        Enrollment.objects.create(user=user, course=course)
+
+        response = student_client.get(reverse('course-catalog'))
+
+        row = response.data['results'][0]
+        assert (row['instructor_name'], row['enrollment_count'], row['is_full'], row['enrolled']) == (
+            'Ada Lovelace', 1, False, True
+        )
+
+    @pytest.mark.parametrize('url_name, params', [
+        ('course-list', {}),
+        ('course-catalog', {}),
+        ('course-search', {'q': 'listed'}),
+        ('course-enrolled', {}),
+    ])
+    def test_query_count_does_not_grow_with_the_page(self, instructor, user, student_client, url_name, params):
+        url = reverse(url_name)
+        for course in add_courses(instructor, 2):
+            Enrollment.objects.create(user=user, course=course)
+        with CaptureQueriesContext(connection) as small:
+            first = student_client.get(url, params)
+
+        for course in add_courses(instructor, 6, start=2):
+            Enrollment.objects.create(user=user, course=course)
+        with CaptureQueriesContext(connection) as large:
+            second = student_client.get(url, params)
+
+        assert first.status_code == second.status_code == 200
+        assert len(second.data['results']) == 8
+        assert len(large) == len(small)
@@ -0,0 +1,160 @@
+"""
+Tests for the course catalog full-text index.
+"""
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from courses.models import Course, Enrollment, Module, Quiz
+from courses.search_benchmark import run_benchmark
+from courses.search_index import course_search, match_expression
+from courses.views import CourseCatalogView, QuizListView
+
+
+def titles(queryset):
+    return [course.title for course in queryset]
+
+
+@pytest.fixture
+def catalog(instructor):
+    """Published courses matching 'python' in different fields, and a draft."""
+    courses = {}
+    for title, description in [
+        ('Cooking Basics', 'Knife skills and a little python scripting for recipes'),
+        ('Python Programming', 'Learn to write programs'),
+        ('Data Analysis', 'Spreadsheets and charts'),
+    ]:
+        courses[title] = Course.objects.create(
+            title=title, description=description, status='published', instructor=instructor
+        )
+    Course.objects.create(title='Python Drafts', description='Unpublished', status='draft', instructor=instructor)
+    Module.objects.create(course=courses['Data Analysis'], title='Pandas with Python', order=1)
+    return courses
+
+
+class TestMatchExpression:
+    """Test cases for turning user input into an FTS5 query."""
+
+    def test_words_are_quoted_prefixes(self):
+        assert match_expression('Intro to Prog') == '"intro"* "to"* "prog"*'
+
+    def test_operators_and_punctuation_are_not_parsed(self):
+        assert match_expression('python AND "c++" -java*') == '"python"* "and"* "c"* "java"*'
+        assert match_expression(' ?! ') == ''
+
+
+@pytest.mark.django_db
+class TestCourseSearchIndex:
+    """Test cases for the index and its incremental updates."""
+
+    def test_matches_are_ranked_title_first(self, catalog):
+        results = course_search.filter(Course.objects.filter(status='published'), 'python')
+        assert titles(results) == ['Python Programming', 'Cooking Basics', 'Data Analysis']
+
+    def test_prefix_and_all_words_match(self, catalog):
+        published = Course.objects.filter(status='published')
+        assert titles(course_search.filter(published, 'prog')) == ['Python Programming']
+        assert titles(course_search.filter(published, 'pyth knife')) == ['Cooking Basics']
+        assert titles(course_search.filter(published, 'nothing')) == []
+        assert titles(course_search.filter(published, '--')) == []
+
+    def test_saves_and_deletes_update_the_index(self, catalog):
+        published = Course.objects.filter(status='published')
+        course = catalog['Data Analysis']
+        course.title = 'Statistics'
+        course.save()
+        assert titles(course_search.filter(published, 'statis')) == ['Statistics']
+        assert titles(course_search.filter(published, 'analysis')) == []
+
+        course.modules.get().delete()
+        assert 'Statistics' not in titles(course_search.filter(published, 'pandas'))
+
+        Module.objects.create(course=course, title='Regression', order=2)
+        assert titles(course_search.filter(published, 'regress')) == ['Statistics']
+
+        course.delete()
+        assert titles(course_search.filter(Course.objects.all(), 'regress')) == []
+
+    def test_rebuild_command_indexes_bulk_inserts(self, catalog, instructor):
+        Course.objects.bulk_create([
+            Course(title='Bulk Imported Biology', slug='bulk-biology', status='published', instructor=instructor)
+        ])
+        assert titles(course_search.filter(Course.objects.all(), 'biology')) == []
+
+        call_command('rebuild_course_index')
+
+        assert titles(course_search.filter(Course.objects.all(), 'biology')) == ['Bulk Imported Biology']
+        assert titles(course_search.filter(Course.objects.all(), 'python'))[0] == 'Python Drafts'
+
+
+@pytest.mark.django_db
+class TestCatalogSearch:
+    """Test cases for the search endpoints and the catalog page."""
+
+    def test_search_endpoint(self, catalog, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(reverse('course-search'), {'q': 'python'})
+
+        assert response.status_code == 200
+        assert [course['title'] for course in response.data['results']] == [
+            'Python Programming', 'Cooking Basics', 'Data Analysis'
+        ]
+
+    def test_catalog_search_keeps_relevance_unless_ordered(self, catalog, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.get(reverse('course-catalog'), {'search': 'python'})
+        assert [course['title'] for course in response.data['results']] == [
+            'Python Programming', 'Cooking Basics', 'Data Analysis'
+        ]
+
+        response = client.get(reverse('course-catalog'), {'search': 'python', 'ordering': 'title'})
+        assert [course['title'] for course in response.data['results']] == [
+            'Cooking Basics', 'Data Analysis', 'Python Programming'
+        ]
+
+    def test_catalog_view(self, catalog):
+        request = RequestFactory().get('/courses/catalog/', {'search': 'prog'})
+        request.user = AnonymousUser()
+        view = CourseCatalogView()
+        view.setup(request)
+
+        assert titles(view.get_queryset()) == ['Python Programming']
+
+    def test_quiz_list_searches_quizzes(self, catalog, user):
+        course = catalog['Data Analysis']
+        Enrollment.objects.create(user=user, course=course)
+        module = course.modules.get()
+        for title, description in [('Loops Quiz', 'For and while'), ('Charts Quiz', 'Plotting python loops')]:
+            Quiz.objects.create(module=module, title=title, description=description, is_published=True)
+        Quiz.objects.create(module=module, title='Pandas Quiz', is_published=True)
+
+        request = RequestFactory().get('/courses/quizzes/', {'search': 'loops'})
+        request.user = user
+        view = QuizListView()
+        view.setup(request)
+
+        assert sorted(titles(view.get_queryset())) == ['Charts Quiz', 'Loops Quiz']
+
+
+@pytest.mark.django_db
+class TestSearchBenchmark:
+    """Test cases for the search benchmark."""
+
+    def test_small_run_rolls_back(self, catalog):
+        courses = Course.objects.count()
+        build, results = run_benchmark(200, 30, seed=1)
+
+        assert build.courses == 200
+        assert [result.method for result in results] == ['icontains', 'fts5']
+        fts = results[1]
+        assert fts.queries == 30
+        assert fts.target_on_page > 0.5
+        assert fts.target_first >= results[0].target_first
+        assert Course.objects.count() == courses
+        assert titles(course_search.filter(Course.objects.all(), 'python'))[0] == 'Python Drafts'
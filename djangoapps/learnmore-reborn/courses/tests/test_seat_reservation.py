@@ -0,0 +1,250 @@
+"""
+Tests for enrollment seat reservation, the seat counter and the waitlist.
+"""
+import threading
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from courses import seat_reservation
+from courses.models import Course, Enrollment, WaitlistEntry
+
+User = get_user_model()
+
+
+def make_users(count, prefix='learner'):
+    return [User.objects.create_user(username=f'{prefix}{number}', password='testpass123') for number in range(count)]
+
+
+def stored_count(course):
+    return Course.objects.values_list('active_enrollment_count', flat=True).get(pk=course.pk)
+
+
+@pytest.fixture
+def small_course(instructor):
+    return Course.objects.create(
+        title='Small Seminar', description='Two seats', status='published', max_students=2, instructor=instructor
+    )
+
+
+@pytest.mark.django_db
+class TestSeatCounter:
+    """Test cases for Course.active_enrollment_count."""
+
+    def test_follows_enrollment_changes(self, small_course):
+        first, second = make_users(2)
+        enrollment = Enrollment.objects.create(user=first, course=small_course)
+        Enrollment.objects.create(user=second, course=small_course, status='completed')
+        assert stored_count(small_course) == small_course.enrollment_count == 1
+
+        enrollment.mark_completed()
+        assert stored_count(small_course) == 0
+
+        enrollment.status = 'active'
+        enrollment.save()
+        reloaded = Enrollment.objects.get(pk=enrollment.pk)
+        reloaded.save(update_fields=['progress'])
+        assert stored_count(small_course) == 1
+
+        reloaded.delete()
+        assert stored_count(small_course) == 0
+
+    def test_course_saves_keep_concurrent_updates(self, small_course):
+        stale = Course.objects.get(pk=small_course.pk)
+        Enrollment.objects.create(user=make_users(1)[0], course=small_course)
+
+        stale.title = 'Renamed Seminar'
+        stale.save()
+
+        assert stored_count(small_course) == 1
+        assert Course.objects.get(pk=small_course.pk).title == 'Renamed Seminar'
+
+    def test_recount_command(self, small_course):
+        for user in make_users(2):
+            Enrollment.objects.create(user=user, course=small_course)
+        Course.objects.filter(pk=small_course.pk).update(active_enrollment_count=0)
+
+        call_command('recount_enrollments')
+
+        assert stored_count(small_course) == 2
+
+    def test_deleting_a_course_with_a_waitlist(self, small_course):
+        small_course.waitlist_enabled = True
+        small_course.save()
+        for user in make_users(3):
+            seat_reservation.enroll(small_course, user)
+
+        small_course.delete()
+
+        assert not Enrollment.objects.exists()
+        assert not WaitlistEntry.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSeatReservation:
+    """Test cases for seat_reservation.enroll and the waitlist."""
+
+    def test_enroll_until_full(self, small_course):
+        first, second, third = make_users(3)
+        assert seat_reservation.enroll(small_course, first).status == seat_reservation.ENROLLED
+        assert seat_reservation.enroll(small_course, first).status == seat_reservation.ALREADY_ENROLLED
+        assert seat_reservation.enroll(small_course, second).status == seat_reservation.ENROLLED
+
+        result = seat_reservation.enroll(small_course, third)
+
+        assert (result.status, result.success) == (seat_reservation.FULL, False)
+        assert small_course.is_full
+        assert Enrollment.objects.filter(course=small_course, status='active').count() == 2
+
+    def test_unpublished(self, draft_course, user):
+        assert seat_reservation.enroll(draft_course, user).status == seat_reservation.UNPUBLISHED
+
+    def test_waitlist_is_promoted_in_order(self, small_course):
+        small_course.waitlist_enabled = True
+        small_course.save()
+        users = make_users(5)
+        results = [seat_reservation.enroll(small_course, user) for user in users]
+
+        assert [result.status for result in results] == ['enrolled'] * 2 + ['waitlisted'] * 3
+        assert [result.waitlist_entry.position for result in results[2:]] == [1, 2, 3]
+        assert seat_reservation.enroll(small_course, users[2]).status == seat_reservation.ALREADY_WAITLISTED
+
+        # A freed seat goes to the head of the queue
+        seat_reservation.drop(results[0].enrollment)
+        assert Enrollment.objects.get(user=users[2], course=small_course).status == 'active'
+        assert list(WaitlistEntry.objects.values_list('user', flat=True)) == [users[3].pk, users[4].pk]
+
+        # So do seats added to the course
+        small_course.max_students = 4
+        small_course.save()
+        assert not WaitlistEntry.objects.exists()
+        assert stored_count(small_course) == 4
+
+    def test_leaving_the_waitlist(self, small_course):
+        small_course.waitlist_enabled = True
+        small_course.save()
+        users = make_users(3)
+        for user in users:
+            seat_reservation.enroll(small_course, user)
+
+        assert seat_reservation.leave_waitlist(small_course, users[2])
+        assert not seat_reservation.leave_waitlist(small_course, users[2])
+        Enrollment.objects.get(user=users[0]).delete()
+        assert stored_count(small_course) == 1
+
+
+@pytest.mark.django_db
+class TestEnrollEndpoints:
+    """Test cases for CourseViewSet.enroll and unenroll."""
+
+    def test_enroll_waitlist_and_unenroll(self, small_course):
+        small_course.waitlist_enabled = True
+        small_course.save()
+        clients = []
+        for user in make_users(3):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            clients.append(client)
+        url = reverse('course-enroll', args=[small_course.slug])
+
+        assert [client.post(url).status_code for client in clients] == [201, 201, 202]
+        response = clients[2].post(url)
+        assert response.status_code == 400
+        assert response.data['error'] == "You are already on the waitlist for this course"
+
+        unenroll_url = reverse('course-unenroll', args=[small_course.slug])
+        assert clients[0].post(unenroll_url).status_code == 204
+        assert Enrollment.objects.filter(course=small_course, status='active').count() == 2
+        assert clients[2].post(url).data['error'] == "You are already enrolled in this course"
+
+    def test_full_course_without_waitlist(self, small_course):
+        for user in make_users(2):
+            Enrollment.objects.create(user=user, course=small_course)
+        client = APIClient()
+        client.force_authenticate(user=make_users(1, prefix='late')[0])
+
+        response = client.post(reverse('course-enroll', args=[small_course.slug]))
+
+        assert response.status_code == 400
+        assert response.data['error'] == "This course has reached its maximum enrollment capacity"
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentEnrollment:
+    """Stress test: a burst of enrollments never overbooks a course."""
+
+    THREADS = 12
+    ROUNDS = 3
+
+    def run_concurrently(self, work):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker(number):
+            try:
+                barrier.wait()
+                work(number)
+            except Exception as e:  # surfaced below
+                errors.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    @pytest.mark.parametrize('waitlist', [False, True])
+    def test_no_overbooking(self, instructor, waitlist):
+        for round_number in range(self.ROUNDS):
+            course = Course.objects.create(
+                title=f'Popular Course {waitlist} {round_number}', status='published', max_students=5,
+                waitlist_enabled=waitlist, instructor=instructor,
+            )
+            users = make_users(self.THREADS, prefix=f'burst{waitlist}{round_number}-')
+            copies = [Course.objects.get(pk=course.pk) for _ in users]
+            results = {}
+
+            def enroll(number):
+                results[number] = seat_reservation.enroll(copies[number], users[number]).status
+
+            self.run_concurrently(enroll)
+
+            statuses = sorted(results.values())
+            assert Enrollment.objects.filter(course=course, status='active').count() == 5
+            assert stored_count(course) == 5
+            assert statuses.count('enrolled') == 5
+            expected = 'waitlisted' if waitlist else 'full'
+            assert statuses.count(expected) == self.THREADS - 5
+            assert WaitlistEntry.objects.filter(course=course).count() == (self.THREADS - 5 if waitlist else 0)
+
+    def test_concurrent_drops_promote_each_waiting_learner_once(self, instructor):
+        course = Course.objects.create(
+            title='Churning Course', status='published', max_students=self.THREADS,
+            waitlist_enabled=True, instructor=instructor,
+        )
+        enrolled = make_users(self.THREADS, prefix='seated')
+        waiting = make_users(self.THREADS, prefix='waiting')
+        for user in enrolled + waiting:
+            seat_reservation.enroll(course, user)
+
+        enrollments = [Enrollment.objects.get(user=user, course_id=course.pk) for user in enrolled]
+
+        def drop(number):
+            seat_reservation.drop(enrollments[number])
+
+        self.run_concurrently(drop)
+
+        assert Enrollment.objects.filter(course=course, status='active').count() == self.THREADS
+        assert set(Enrollment.objects.filter(course=course, status='active').values_list('user', flat=True)) == {
+            user.pk for user in waiting
+        }
+        assert stored_count(course) == self.THREADS
+        assert not WaitlistEntry.objects.exists()
@@ -24,12 +24,17 @@ from .models import (
     Choice, QuizAttempt, QuestionResponse
 )
 from .serializers import CourseSerializer
+from .search_index import course_search
+from . import seat_reservation
 
 # API Views
 class CourseListView(generics.ListAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [AllowAny]
+    
+    def get_queryset(self):
+        return super().get_queryset().with_listing(self.request.user)
 
 class CourseDetailView(generics.RetrieveAPIView):
     queryset = Course.objects.all()
@@ -127,10 +132,7 @@ class CourseCatalogView(ListView):
         # Apply search filter
         search_query = self.request.GET.get('search', '')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
+            queryset = course_search.filter(queryset, search_query)
         
         # Apply enrollment type filter
         enrollment_type = self.request.GET.get('enrollment_type', '')
@@ -143,7 +145,7 @@ class CourseCatalogView(ListView):
             if statuses:
                 queryset = Course.objects.filter(status__in=statuses)
         
-        return queryset
+        return queryset.with_listing(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1351,35 +1353,20 @@ def enroll_course(request, slug):
         messages.error(request, "You must be logged in to enroll in a course.")
         return redirect('login')
     
-    # Check if user is already enrolled
-    if Enrollment.objects.filter(user=request.user, course=course).exists():
-        messages.info(request, "You are already enrolled in this course.")
+    # Restricted courses would check e.g. an invitation code here
+    result = seat_reservation.enroll(course, request.user)
+    if result.status == seat_reservation.ENROLLED:
+        messages.success(request, f"You have successfully enrolled in {course.title}.")
+        return redirect('course-detail', slug=slug)
+    if result.status in (seat_reservation.WAITLISTED, seat_reservation.ALREADY_WAITLISTED):
+        messages.info(request, f"{result.message} (position {result.waitlist_entry.position}).")
+        return redirect('course-detail', slug=slug)
+    if result.status == seat_reservation.ALREADY_ENROLLED:
+        messages.info(request, f"{result.message}.")
         return redirect('course-detail', slug=slug)
     
-    # Check if course is published
-    if course.status != 'published':
-        messages.error(request, "You cannot enroll in an unpublished course.")
-        return redirect('course-catalog')
-    
-    # Check if course is full
-    if course.is_full:
-        messages.error(request, "This course has reached its maximum enrollment capacity.")
-        return redirect('course-catalog')
-    
-    # Check if enrollment is restricted
-    if course.enrollment_type == 'restricted':
-        # Here you would implement logic for checking if user is allowed to enroll
-        pass
-    
-    # Create enrollment
-    enrollment = Enrollment.objects.create(
-        user=request.user,
-        course=course,
-        status='active'
-    )
-    
-    messages.success(request, f"You have successfully enrolled in {course.title}.")
-    return redirect('course-detail', slug=slug)
+    messages.error(request, f"{result.message}.")
+    return redirect('course-catalog')
 
 @csrf_exempt
 def unenroll_course(request, slug):
@@ -1393,12 +1380,14 @@ def unenroll_course(request, slug):
     # Check if user is enrolled
     enrollment = Enrollment.objects.filter(user=request.user, course=course).first()
     if not enrollment:
+        if seat_reservation.leave_waitlist(course, request.user):
+            messages.success(request, f"You have left the waitlist for {course.title}.")
+            return redirect('course-catalog')
         messages.error(request, "You are not enrolled in this course.")
         return redirect('course-detail', slug=slug)
     
     # Update enrollment status
-    enrollment.status = 'dropped'
-    enrollment.save()
+    seat_reservation.drop(enrollment)
     
     messages.success(request, f"You have been unenrolled from {course.title}.")
     return redirect('course-catalog')
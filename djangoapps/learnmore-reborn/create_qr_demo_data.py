@@ -25,7 +25,6 @@ from django.contrib.auth import get_user_model
 from courses.models import Course, Module, Quiz, Enrollment
 from progress.models import Progress
 from qr_codes.models import QRCode, QRCodeScan, QRCodeBatch
-from qr_codes.services import QRCodeService
 
 User = get_user_model()
 
@@ -95,8 +94,8 @@ def create_qr_demo_data():
                     }
                 )
                 
-                if created or not qr_code.image_data:
-                    QRCodeService.generate_qr_image(qr_code)
+                # Images are rendered when first requested
+                if created:
                     print(f"Created QR code for course: {course.title}")
             
             # 2. Create QR codes for modules with different access levels
@@ -127,8 +126,7 @@ def create_qr_demo_data():
                         }
                     )
                     
-                    if created or not qr_code.image_data:
-                        QRCodeService.generate_qr_image(qr_code)
+                    if created:
                         print(f"Created QR code for module: {module.title} (Access: {access_level})")
             
             # 3. Create QR codes for selected quizzes
@@ -157,8 +155,7 @@ def create_qr_demo_data():
                         }
                     )
                     
-                    if created or not qr_code.image_data:
-                        QRCodeService.generate_qr_image(qr_code)
+                    if created:
                         print(f"Created QR code for quiz: {quiz.title}")
             
             # 4. Create QR code batches
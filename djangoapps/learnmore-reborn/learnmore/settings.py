@@ -434,6 +434,53 @@ ANALYTICS_SETTINGS = {
     'MAX_EXPORT_RECORDS': 10000,
 }
 
+# AI tutor settings
+# Content is split on headings/lists/code blocks into chunks of at most this many tokens
+AI_TUTOR_CHUNK_MAX_TOKENS = 350
+AI_TUTOR_CHUNK_OVERLAP_TOKENS = 40
+# Vector store backend: 'chroma', or 'numpy' for the built-in memory-mapped index
+AI_TUTOR_VECTOR_BACKEND = env('AI_TUTOR_VECTOR_BACKEND', default='chroma')
+# Opening questions within this cosine similarity of a cached one reuse its answer
+AI_TUTOR_SEMANTIC_CACHE_ENABLED = env.bool('AI_TUTOR_SEMANTIC_CACHE_ENABLED', default=True)
+AI_TUTOR_SEMANTIC_CACHE_THRESHOLD = 0.95
+AI_TUTOR_SEMANTIC_CACHE_TTL = 60 * 60 * 24
+AI_TUTOR_SEMANTIC_CACHE_MAX_ENTRIES = 1000
+# OpenAI-compatible endpoint override, e.g. http://127.0.0.1:8765/v1 for `manage.py run_stub_llm`
+AI_TUTOR_OPENAI_BASE_URL = env('AI_TUTOR_OPENAI_BASE_URL', default='')
+# Conversation memory: the last N messages, trimmed to a token budget, plus a
+# running summary of older turns refreshed every AI_TUTOR_SUMMARY_BATCH turns
+AI_TUTOR_HISTORY_MAX_MESSAGES = 10
+AI_TUTOR_HISTORY_TOKEN_BUDGET = 1500
+AI_TUTOR_SUMMARY_TOKEN_BUDGET = 300
+AI_TUTOR_SUMMARY_BATCH = 6
+# How long the active TutorConfiguration is cached in-process
+AI_TUTOR_CONFIG_CACHE_SECONDS = 60
+
+# QR code scanning
+# Scanned codes are cached in-process for this many seconds
+QR_SCAN_CACHE_SECONDS = 5
+# Scan records are bulk-written once this many are buffered, or after QR_SCAN_FLUSH_SECONDS
+QR_SCAN_WRITE_BATCH_SIZE = env.int('QR_SCAN_WRITE_BATCH_SIZE', default=100)
+QR_SCAN_FLUSH_SECONDS = 1.0
+# A batch that fails to write is retried this many times, then its scans are given back
+QR_SCAN_WRITE_RETRIES = 3
+# Per-batch statistics are cached until the batch's codes or scans change, and at most this long
+QR_BATCH_STATS_CACHE_SECONDS = env.int('QR_BATCH_STATS_CACHE_SECONDS', default=300)
+# warm_qr_images renders at least this many images in a pool of QR_RENDER_WORKERS processes
+# (default: one per CPU)
+QR_RENDER_PARALLEL_THRESHOLD = 200
+QR_RENDER_WORKERS = env.int('QR_RENDER_WORKERS', default=0) or None
+# Rendered QR images, named by payload hash, and how long clients may cache a digest-versioned image URL
+QR_IMAGE_CACHE_DIR = env('QR_IMAGE_CACHE_DIR', default=str(MEDIA_ROOT / 'qr_cache'))
+QR_IMAGE_MAX_AGE = 60 * 60 * 24
+
+# Event retention
+# UserActivity and QRCodeScan rows older than this many days are rolled up, archived and deleted
+# by the archive_events command
+EVENT_RETENTION_DAYS = env.int('EVENT_RETENTION_DAYS', default=90)
+# Archived rows, as gzipped NDJSON files per table and day
+EVENT_ARCHIVE_DIR = env('EVENT_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
 SITE_ID = 1
 
 AUTHENTICATION_BACKENDS = [
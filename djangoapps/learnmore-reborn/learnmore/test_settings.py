@@ -52,6 +52,14 @@ DEBUG = True
 # Flag to identify test mode
 TEST_MODE = True
 
+# Write QR code scan records before the response is returned
+QR_SCAN_WRITE_BATCH_SIZE = 1
+
+# Keep rendered QR images out of the project's media directory
+import tempfile
+QR_IMAGE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'learnmore_test_qr_cache')
+EVENT_ARCHIVE_DIR = os.path.join(tempfile.gettempdir(), 'learnmore_test_archive')
+
 # Completely replace middleware for tests
 MIDDLEWARE = [
     'test_middleware.TestCSRFMiddleware',  # Our test middleware first
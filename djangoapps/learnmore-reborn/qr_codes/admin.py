@@ -38,6 +38,12 @@ class QRCodeAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Targets and scan totals are read with the page rather than one query per row
+        return super().get_queryset(request).select_related('content_type').defer(
+            'image_data'
+        ).with_scan_counts()
+    
     def target_display(self, obj):
         """Display the target object information."""
         return f"{obj.content_type.model}: {obj.object_id}"
@@ -54,8 +60,9 @@ class QRCodeAdmin(admin.ModelAdmin):
                 (percentage, '#4CAF50' if percentage < 80 else '#FFC107' if percentage < 100 else '#F44336',
                  obj.current_scans, obj.max_scans, percentage)
             )
-        return obj.current_scans
+        return obj.scan_count
     scan_count_display.short_description = "Scans"
+    scan_count_display.admin_order_field = 'scans_total'
     
     def is_active_display(self, obj):
         """Display the active status with a colored indicator."""
@@ -67,10 +74,13 @@ class QRCodeAdmin(admin.ModelAdmin):
     is_active_display.short_description = "Status"
     
     def qr_code_preview(self, obj):
-        """Display the QR code image if available."""
-        if obj.image_data:
-            return format_html('<img src="data:image/png;base64,{}" style="max-width:200px; max-height:200px;" />', obj.image_data)
-        return "No QR code image available"
+        """Display the QR code image, served by the image endpoint."""
+        if not obj.pk:
+            return "No QR code image available"
+        return format_html(
+            '<img src="{}" style="max-width:200px; max-height:200px;" />',
+            obj.svg_url()
+        )
     qr_code_preview.short_description = "QR Code Preview"
 
 
@@ -2,7 +2,6 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
@@ -14,22 +13,19 @@ from .serializers import (
     QRCodeBatchSerializer, QRCodeBatchCreateSerializer
 )
 from .services import QRCodeService
+from .scan_engine import scan_engine
 
 
 class QRCodeViewSet(viewsets.ModelViewSet):
     """ViewSet for QR code management."""
-    queryset = QRCode.objects.all()
+    # Images are served by qr_codes:image; the legacy base64 column is never listed
+    queryset = QRCode.objects.select_related('content_type').defer('image_data').with_scan_counts()
     permission_classes = [IsAuthenticated]
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return QRCodeCreateSerializer
         return QRCodeSerializer
-    
-    def perform_create(self, serializer):
-        qr_code = serializer.save()
-        # Generate QR code image
-        QRCodeService.generate_qr_image(qr_code)
         
     def create(self, request, *args, **kwargs):
         """Override create to ensure proper response format with ID."""
@@ -76,71 +72,24 @@ class QRCodeScanViewSet(viewsets.ReadOnlyModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        qr_code_id = serializer.validated_data['qr_code_id']
-        
-        try:
-            qr_code = QRCode.objects.get(id=qr_code_id)
-        except QRCode.DoesNotExist:
-            return Response({
-                'success': False,
-                'status': 'invalid',
-                'message': 'QR code not found'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Check if QR code is active
-        if not qr_code.is_active:
-            return Response({
-                'success': False,
-                'status': 'inactive',
-                'message': 'QR code is inactive'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Check if QR code has expired
-        if qr_code.is_expired:
-            return Response({
-                'success': False,
-                'status': 'expired',
-                'message': 'QR code has expired'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Check if scan limit reached
-        if qr_code.is_scan_limit_reached:
-            return Response({
-                'success': False,
-                'status': 'exceeded',
-                'message': 'Scan limit reached'
-            }, status=status.HTTP_403_FORBIDDEN)
-            
-        # Validate access level
-        is_valid, message, _ = QRCodeService.validate_scan(qr_code_id, user=request.user)
-        if not is_valid:
-            return Response({
-                'success': False,
-                'status': 'forbidden',
-                'message': message
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Create scan record
-        scan = QRCodeScan.objects.create(
-            qr_code=qr_code,
-            user=request.user if request.user.is_authenticated else None,
+        result = scan_engine.scan(
+            serializer.validated_data['qr_code_id'],
+            user=request.user,
             ip_address=request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             latitude=serializer.validated_data.get('latitude'),
             longitude=serializer.validated_data.get('longitude'),
             context_data=serializer.validated_data.get('context_data', {}),
-            status='success'
         )
+        if not result.success:
+            return Response({
+                'success': False,
+                'status': result.status,
+                'message': result.message
+            }, status=status.HTTP_404_NOT_FOUND if result.status == 'invalid' else status.HTTP_403_FORBIDDEN)
         
-        # Update scan count
-        qr_code.current_scans += 1
-        qr_code.save()
-        
-        # Update batch scan count if applicable
-        if qr_code.batch:
-            batch = qr_code.batch
-            batch.scans_count += 1
-            batch.save()
+        qr_code = result.qr_code
+        scan = result.scan
         
         # Determine target URL based on content type
         target_url = None
@@ -258,7 +207,7 @@ class QRCodeBatchViewSet(viewsets.ModelViewSet):
     def codes(self, request, pk=None):
         """Get all QR codes for a specific batch."""
         batch = self.get_object()
-        codes = batch.codes.all()
+        codes = batch.codes.select_related('content_type').defer('image_data').with_scan_counts()
         page = self.paginate_queryset(codes)
         if page is not None:
             serializer = QRCodeSerializer(page, many=True)
@@ -270,29 +219,4 @@ class QRCodeBatchViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
         """Get statistics for a batch."""
-        batch = self.get_object()
-        total_codes = batch.codes.count()
-        active_codes = batch.codes.filter(is_active=True).count()
-        expired_codes = batch.codes.filter(expires_at__lt=timezone.now()).count()
-        scanned_codes = batch.codes.filter(current_scans__gt=0).count()
-        
-        # Aggregate scans by date
-        from django.db.models import Count
-        from django.db.models.functions import TruncDate
-        
-        scans_by_date = QRCodeScan.objects.filter(
-            qr_code__batch=batch
-        ).annotate(
-            date=TruncDate('scanned_at')
-        ).values('date').annotate(
-            count=Count('id')
-        ).order_by('date')
-        
-        return Response({
-            'total_codes': total_codes,
-            'active_codes': active_codes,
-            'expired_codes': expired_codes,
-            'scanned_codes': scanned_codes,
-            'total_scans': batch.scans_count,
-            'scans_by_date': list(scans_by_date)
-        })
\ No newline at end of file
+        return Response(QRCodeService.batch_stats(self.get_object()))
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Content-addressed store of rendered QR code images.
+
+Every QR code used to carry its image as a base64 PNG in
+``QRCode.image_data``: a third larger than the PNG, read with every row and
+serialised into every list response. Images are now rendered on demand by
+the ``qr_codes:image`` view and kept on disk under QR_IMAGE_CACHE_DIR, named
+by the SHA-256 of the encoded payload, the format and the render settings.
+Codes with identical payloads therefore share one file and are rendered
+once, and the digest doubles as a strong ETag. Image URLs carry the digest
+(``?v=``, see ``QRCode.image_url``), so browsers and CDNs may cache them for
+QR_IMAGE_MAX_AGE seconds: an edited payload gets a new URL. Requests without
+the current digest are served ``no-cache`` and revalidate with the ETag.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .rendering import RENDERERS, render_batch
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+# Bump when the rendering parameters change, so old files are not served
+RENDER_VERSION = 1
+
+
+def image_digest(data: Dict, fmt: str) -> str:
+    """Identify the image of ``data`` in ``fmt``."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{RENDER_VERSION}:{fmt}:{canonical}".encode('utf-8')).hexdigest()
+
+
+class ImageStore:
+    """Rendered QR images on the filesystem, keyed by ``image_digest``."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self._directory = directory
+
+    @property
+    def directory(self) -> str:
+        if self._directory is not None:
+            return str(self._directory)
+        return str(getattr(settings, 'QR_IMAGE_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'qr_cache')))
+
+    def path(self, digest: str, fmt: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{fmt}")
+
+    def read(self, digest: str, fmt: str) -> Optional[bytes]:
+        try:
+            with open(self.path(digest, fmt), 'rb') as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def write(self, digest: str, fmt: str, content: bytes) -> None:
+        """Store ``content`` atomically, so readers never see a partial file."""
+        path = self.path(digest, fmt)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error caching QR image {digest}.{fmt}: {str(e)}")
+
+    def get_or_render(self, data: Dict, fmt: str = 'png') -> Tuple[str, bytes]:
+        """Return (digest, image bytes), rendering and storing the image if needed."""
+        digest = image_digest(data, fmt)
+        content = self.read(digest, fmt)
+        if content is None:
+            content = RENDERERS[fmt](data)
+            self.write(digest, fmt, content)
+        return digest, content
+
+    def warm(self, payloads: List[Dict], fmt: str = 'png', workers: Optional[int] = None,
+             min_parallel: int = 200) -> int:
+        """Render and store the images not stored yet; returns how many were rendered."""
+        missing = {}
+        for data in payloads:
+            digest = image_digest(data, fmt)
+            if digest not in missing and not os.path.exists(self.path(digest, fmt)):
+                missing[digest] = data
+        images = render_batch(list(missing.values()), fmt, workers=workers, min_parallel=min_parallel)
+        for digest, content in zip(missing, images):
+            self.write(digest, fmt, content)
+        return len(images)
+
+
+image_store = ImageStore()
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from qr_codes.rollups import first_stored_day, rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = ('Recompute the daily QR scan rollups from the scan log. Run periodically to repair '
+            'counts after failed writes or deleted scans, or with --all to backfill history.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help='Recompute this many days, ending today (default: 2)')
+        parser.add_argument('--since', help='Recompute every day from this date (YYYY-MM-DD) to today')
+        parser.add_argument('--all', action='store_true', help='Recompute every day since the first scan')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        first = first_stored_day() or today
+        if options['all']:
+            start = first
+        elif options['since']:
+            try:
+                start = datetime.date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+        else:
+            if options['days'] < 1:
+                raise CommandError("--days must be at least 1")
+            start = today - datetime.timedelta(days=options['days'] - 1)
+        # Days before the oldest stored scan have been archived; their rollups are all that is left
+        start = max(start, first)
+
+        day, rows = start, 0
+        while day <= today:
+            rows += rebuild_daily_stats(day)
+            day += datetime.timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {rows} code-days from {start} to {today}"))
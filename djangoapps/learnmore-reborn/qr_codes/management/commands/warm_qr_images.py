@@ -0,0 +1,27 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from qr_codes.models import QRCode
+from qr_codes.services import QRCodeService
+
+
+class Command(BaseCommand):
+    help = ('Render the images of QR code batches into the image store ahead of their first request, '
+            'in a process pool for large batches. Run after generating codes for a printed event.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch_ids', nargs='*', help='Batches to render (default: every batch)')
+        parser.add_argument('--format', choices=['png', 'svg'], default='png', help='Image format (default: png)')
+
+    def handle(self, *args, **options):
+        codes = QRCode.objects.filter(batch__isnull=False).select_related('content_type').defer('image_data')
+        if options['batch_ids']:
+            codes = codes.filter(batch_id__in=options['batch_ids'])
+            try:
+                found = codes.exists()
+            except ValidationError:
+                raise CommandError(f"Invalid batch id in: {', '.join(options['batch_ids'])}")
+            if not found:
+                raise CommandError(f"No QR codes in batches {', '.join(options['batch_ids'])}")
+        rendered = QRCodeService.render_images(list(codes), options['format'])
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} QR code images"))
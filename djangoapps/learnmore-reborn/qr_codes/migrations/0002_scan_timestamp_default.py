@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qr_codes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='qrcodescan',
+            name='scanned_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
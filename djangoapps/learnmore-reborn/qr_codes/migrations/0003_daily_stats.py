@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    QRCodeScan = apps.get_model('qr_codes', 'QRCodeScan')
+    QRCodeDailyStat = apps.get_model('qr_codes', 'QRCodeDailyStat')
+    rows = QRCodeScan.objects.annotate(day=TruncDate('scanned_at')).values('qr_code', 'qr_code__batch', 'day').annotate(
+        scans=models.Count('id'),
+        unique_users=models.Count('user', distinct=True),
+        unique_ips=models.Count('ip_address', distinct=True),
+    ).order_by()
+    QRCodeDailyStat.objects.bulk_create([
+        QRCodeDailyStat(
+            qr_code_id=row['qr_code'], batch_id=row['qr_code__batch'], day=row['day'],
+            scans=row['scans'], unique_users=row['unique_users'], unique_ips=row['unique_ips'],
+        )
+        for row in rows.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qr_codes', '0002_scan_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRCodeDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('scans', models.PositiveIntegerField(default=0)),
+                ('unique_users', models.PositiveIntegerField(default=0)),
+                ('unique_ips', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'QR Code Daily Stat',
+                'verbose_name_plural': 'QR Code Daily Stats',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='qrcodescan',
+            index=models.Index(fields=['qr_code', 'scanned_at'], name='qr_codes_qr_qr_code_5a1cbc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qrcodescan',
+            index=models.Index(fields=['scanned_at'], name='qr_codes_qr_scanned_f751ec_idx'),
+        ),
+        migrations.AddField(
+            model_name='qrcodedailystat',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_stats', to='qr_codes.qrcodebatch'),
+        ),
+        migrations.AddField(
+            model_name='qrcodedailystat',
+            name='qr_code',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='qr_codes.qrcode'),
+        ),
+        migrations.AddIndex(
+            model_name='qrcodedailystat',
+            index=models.Index(fields=['day'], name='qr_codes_qr_day_1ea86f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qrcodedailystat',
+            index=models.Index(fields=['batch', 'day'], name='qr_codes_qr_batch_i_25b994_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='qrcodedailystat',
+            unique_together={('qr_code', 'day')},
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
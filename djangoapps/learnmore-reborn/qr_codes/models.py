@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -22,6 +25,19 @@ SCAN_STATUSES = [
     ('unauthorized', 'Unauthorized'),
 ]
 
+class QRCodeQuerySet(models.QuerySet):
+    def with_scan_counts(self):
+        """
+        Annotate each code with ``scans_total``, read by ``QRCode.scan_count``.
+        
+        Summed from the daily rollups in a correlated subquery, so archived
+        scans are counted and a paginated list does not group the scan log.
+        """
+        totals = QRCodeDailyStat.objects.filter(qr_code=models.OuterRef('pk')).order_by().values(
+            'qr_code'
+        ).annotate(total=models.Sum('scans')).values('total')
+        return self.annotate(scans_total=Coalesce(models.Subquery(totals), 0))
+
 class QRCode(models.Model):
     """Model to store QR code information."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -46,6 +62,8 @@ class QRCode(models.Model):
     # Batch relationship
     batch = models.ForeignKey('QRCodeBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='codes')
     
+    objects = QRCodeQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "QR Code"
         verbose_name_plural = "QR Codes"
@@ -56,8 +74,10 @@ class QRCode(models.Model):
     
     @property
     def scan_count(self):
-        """Return the number of scans for this QR code."""
-        return self.scans.count()
+        """Return the number of scans for this QR code (annotated by ``with_scan_counts`` in lists)."""
+        if hasattr(self, 'scans_total'):
+            return self.scans_total
+        return self.daily_stats.aggregate(total=Coalesce(models.Sum('scans'), 0))['total']
     
     @property
     def is_expired(self):
@@ -78,13 +98,23 @@ class QRCode(models.Model):
     def is_scannable(self):
         """Check if this QR code can be scanned."""
         return self.is_active and not self.is_expired and not self.is_scan_limit_reached
+    
+    def image_url(self, fmt='png'):
+        """URL of this code's image, versioned by its digest so clients may cache it until the payload changes."""
+        from .images import image_digest
+        from .services import QRCodeService
+        path = reverse('qr_codes:image', kwargs={'pk': self.pk, 'fmt': fmt})
+        return f"{path}?v={image_digest(QRCodeService.qr_payload(self), fmt)}"
+    
+    def svg_url(self):
+        return self.image_url('svg')
 
 
 class QRCodeScan(models.Model):
     """Model to track QR code scans."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     qr_code = models.ForeignKey(QRCode, on_delete=models.CASCADE, related_name='scans')
-    scanned_at = models.DateTimeField(auto_now_add=True)
+    scanned_at = models.DateTimeField(default=timezone.now, editable=False)
     
     # Scanner information
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -103,11 +133,38 @@ class QRCodeScan(models.Model):
         verbose_name = "QR Code Scan"
         verbose_name_plural = "QR Code Scans"
         ordering = ['-scanned_at']
+        indexes = [
+            models.Index(fields=['qr_code', 'scanned_at']),
+            models.Index(fields=['scanned_at']),
+        ]
     
     def __str__(self):
         return f"Scan of {self.qr_code} at {self.scanned_at}"
 
 
+class QRCodeDailyStat(models.Model):
+    """Scans of one QR code on one day, kept up to date by ``qr_codes.rollups``."""
+    qr_code = models.ForeignKey(QRCode, on_delete=models.CASCADE, related_name='daily_stats')
+    batch = models.ForeignKey('QRCodeBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_stats')
+    day = models.DateField()
+    scans = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)
+    unique_ips = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "QR Code Daily Stat"
+        verbose_name_plural = "QR Code Daily Stats"
+        ordering = ['day']
+        unique_together = ['qr_code', 'day']
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['batch', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.qr_code} on {self.day}: {self.scans} scans"
+
+
 class QRCodeBatch(models.Model):
     """Model for managing batches of QR codes."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
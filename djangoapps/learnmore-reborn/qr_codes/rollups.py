@@ -0,0 +1,172 @@
+"""
+Daily QR scan rollups.
+
+The analytics dashboard and batch stats used to group the raw scan log on
+every view, so their cost grew with every scan ever recorded.
+``QRCodeDailyStat`` holds one row per code per day (scans, distinct users,
+distinct IPs), and the dashboards sum tens of those rows instead.
+
+Rows are kept current at scan time: after each write ``scan_writer`` (or the
+``post_save`` signal, for scans created one at a time) recounts the touched
+code-days from the scan log, using the ``(qr_code, scanned_at)`` index, and
+upserts the results. Recounting instead of incrementing keeps the distinct
+counts exact. The ``rollup_qr_scans`` command recomputes recent days on a
+schedule and backfills history.
+
+Once scans are archived out of the log (``analytics.retention``) the rollups
+are the only record of those days, so they are never recomputed from the
+(then empty) log: archiving runs inside ``paused()``, and ``rebuild`` starts
+no earlier than the oldest scan still stored.
+"""
+
+import datetime
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import QRCode, QRCodeDailyStat, QRCodeScan
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+@contextmanager
+def paused():
+    """Leave the rollups untouched by scans saved or deleted in this thread inside the block."""
+    depth = getattr(_local, 'paused', 0)
+    _local.paused = depth + 1
+    try:
+        yield
+    finally:
+        _local.paused = depth
+
+
+def is_paused() -> bool:
+    """Whether this thread is inside ``paused()``."""
+    return bool(getattr(_local, 'paused', 0))
+
+
+def day_bounds(day: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+    """The start of ``day`` and of the next day, in the current time zone."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def _aggregate(scans) -> List[QRCodeDailyStat]:
+    rows = scans.annotate(
+        day=TruncDate('scanned_at')
+    ).values('qr_code', 'qr_code__batch', 'day').annotate(
+        scans=Count('id'),
+        unique_users=Count('user', distinct=True),
+        unique_ips=Count('ip_address', distinct=True),
+    ).order_by()
+    return [
+        QRCodeDailyStat(
+            qr_code_id=row['qr_code'],
+            batch_id=row['qr_code__batch'],
+            day=row['day'],
+            scans=row['scans'],
+            unique_users=row['unique_users'],
+            unique_ips=row['unique_ips'],
+        )
+        for row in rows
+    ]
+
+
+def _upsert(stats: List[QRCodeDailyStat]) -> int:
+    QRCodeDailyStat.objects.bulk_create(
+        stats,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['qr_code', 'day'],
+        update_fields=['batch', 'scans', 'unique_users', 'unique_ips'],
+    )
+    return len(stats)
+
+
+def refresh_daily_stats(keys: Iterable[Tuple[object, datetime.date]]) -> int:
+    """Recount the given (qr_code_id, day) pairs from the scan log; returns rows written."""
+    keys = set(keys)
+    if not keys:
+        return 0
+    code_ids = {code_id for code_id, _ in keys}
+    days = {day for _, day in keys}
+    start, _ = day_bounds(min(days))
+    _, end = day_bounds(max(days))
+    stats = _aggregate(QRCodeScan.objects.filter(
+        qr_code_id__in=code_ids, scanned_at__gte=start, scanned_at__lt=end
+    ))
+    # Code-days whose last scan was deleted
+    emptied = keys - {(stat.qr_code_id, stat.day) for stat in stats}
+    if emptied:
+        condition = Q()
+        for code_id, day in emptied:
+            condition |= Q(qr_code_id=code_id, day=day)
+        QRCodeDailyStat.objects.filter(condition).delete()
+    return _upsert(stats)
+
+
+def refresh_for_scans(scans: Iterable[QRCodeScan]) -> int:
+    """Bring the rollups up to date after ``scans`` were written."""
+    if is_paused():
+        return 0
+    try:
+        return refresh_daily_stats(
+            (scan.qr_code_id, timezone.localdate(scan.scanned_at)) for scan in scans
+        )
+    except Exception as e:
+        # The scans are stored; the next rollup_qr_scans run repairs the counts
+        logger.error(f"Error updating QR scan rollups: {str(e)}")
+        return 0
+
+
+def rebuild_daily_stats(day: datetime.date) -> int:
+    """Recompute every code's rollup for ``day``, dropping rows whose scans are gone."""
+    start, end = day_bounds(day)
+    stats = _aggregate(QRCodeScan.objects.filter(scanned_at__gte=start, scanned_at__lt=end))
+    QRCodeDailyStat.objects.filter(day=day).exclude(
+        qr_code_id__in=[stat.qr_code_id for stat in stats]
+    ).delete()
+    return _upsert(stats)
+
+
+def invalidate_batch_stats(day: datetime.date) -> None:
+    """Drop the cached statistics of every batch with rollups on ``day``.
+
+    Deletes made inside ``paused()`` skip the per-scan invalidation, so
+    archiving calls this once for the day instead.
+    """
+    from .services import QRCodeService
+    batch_ids = QRCodeDailyStat.objects.filter(day=day, batch__isnull=False).values_list('batch_id', flat=True)
+    QRCodeService.invalidate_batch_stats(*set(batch_ids))
+
+
+def first_stored_day() -> Optional[datetime.date]:
+    """The day of the oldest scan still in the log; earlier days live only in the rollups."""
+    first = QRCodeScan.objects.order_by('scanned_at').values_list('scanned_at', flat=True).first()
+    return timezone.localdate(first) if first else None
+
+
+def scans_by_day(since: Optional[datetime.date] = None, **filters) -> List[Dict]:
+    """Total scans per day as ``[{'day': date, 'count': n}]``, optionally filtered (e.g. ``batch=``)."""
+    stats = QRCodeDailyStat.objects.filter(**filters)
+    if since is not None:
+        stats = stats.filter(day__gte=since)
+    return list(stats.values('day').annotate(count=Sum('scans')).order_by('day'))
+
+
+def total_scans(**filters) -> int:
+    return QRCodeDailyStat.objects.filter(**filters).aggregate(total=Coalesce(Sum('scans'), 0))['total']
+
+
+def top_codes(limit: int = 10):
+    """The most scanned codes, annotated with ``scans_count``."""
+    return QRCode.objects.select_related('content_type').defer('image_data').annotate(
+        scans_count=Coalesce(Sum('daily_stats__scans'), 0)
+    ).order_by('-scans_count')[:limit]
@@ -0,0 +1,291 @@
+"""
+Scan processing for QR codes.
+
+A scan used to read the ``QRCode`` twice (once in the view, once in
+``QRCodeService.validate_scan``), then ``current_scans += 1; save()`` - two
+simultaneous scans both read N and both wrote N + 1, so ``max_scans`` could
+be exceeded at a busy event check-in - and the batch was counted twice, by
+the view and by the ``update_batch_scan_count`` signal.
+
+``ScanEngine.scan`` now:
+
+* resolves the code from ``code_cache``, an in-process cache whose entries
+  live for QR_SCAN_CACHE_SECONDS and are dropped when a code is saved or
+  deleted in this process;
+* claims a scan with one conditional ``UPDATE ... SET current_scans =
+  current_scans + 1 WHERE is_active AND current_scans < max_scans``; the
+  database decides, so a stale cache entry can never let a code be scanned
+  past its limit;
+* hands the ``QRCodeScan`` record to ``scan_writer``, which ``bulk_create``s
+  buffered records once QR_SCAN_WRITE_BATCH_SIZE have queued up or
+  QR_SCAN_FLUSH_SECONDS have passed, and adds each batch's scans to its
+  ``scans_count`` once per flush (``bulk_create`` sends no ``post_save``,
+  so the signal does not count them again), then refreshes the daily
+  rollups of the codes it wrote (see ``qr_codes.rollups``). A batch that
+  fails to write goes back on the buffer for up to QR_SCAN_WRITE_RETRIES
+  more attempts; after that its records are dropped and the scans they
+  claimed are taken off ``current_scans`` again.
+
+With QR_SCAN_WRITE_BATCH_SIZE = 1 every record is written before the
+response is returned. Buffered records are also flushed at interpreter exit;
+a worker that is killed outright loses at most one buffer of scan history,
+never a scan count.
+"""
+
+import atexit
+import copy
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import QRCode, QRCodeBatch, QRCodeScan
+from .rollups import refresh_for_scans
+from .services import QRCodeService
+
+logger = logging.getLogger(__name__)
+
+
+class CodeCache:
+    """Short-lived in-process cache of QR codes by id."""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 10000):
+        self._ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, QRCode]] = {}
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(getattr(settings, 'QR_SCAN_CACHE_SECONDS', 5))
+
+    def get(self, code_id) -> Optional[QRCode]:
+        """Return a copy of the code, reading it from the database at most once per TTL."""
+        key = str(code_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return copy.copy(entry[1])
+
+        try:
+            qr_code = QRCode.objects.select_related('content_type').defer('image_data').get(id=code_id)
+        except (QRCode.DoesNotExist, ValidationError, ValueError):
+            return None
+
+        if self.ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    if len(self._entries) >= self.max_entries:
+                        self._entries.clear()
+                self._entries[key] = (now + self.ttl, qr_code)
+        return copy.copy(qr_code)
+
+    def invalidate(self, code_id) -> None:
+        with self._lock:
+            self._entries.pop(str(code_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class ScanWriter:
+    """Buffers ``QRCodeScan`` records and writes them with ``bulk_create``."""
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 max_retries: Optional[int] = None):
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._lock = threading.Lock()
+        self._pending: List[QRCodeScan] = []
+        self._timer: Optional[threading.Timer] = None
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def batch_size(self) -> int:
+        if self._batch_size is not None:
+            return self._batch_size
+        return int(getattr(settings, 'QR_SCAN_WRITE_BATCH_SIZE', 100))
+
+    @property
+    def flush_interval(self) -> float:
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return float(getattr(settings, 'QR_SCAN_FLUSH_SECONDS', 1.0))
+
+    @property
+    def max_retries(self) -> int:
+        if self._max_retries is not None:
+            return self._max_retries
+        return int(getattr(settings, 'QR_SCAN_WRITE_RETRIES', 3))
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, scan: QRCodeScan) -> None:
+        """Queue a scan record, writing the buffer when it is full."""
+        ready = None
+        with self._lock:
+            self._pending.append(scan)
+            if len(self._pending) >= self.batch_size:
+                ready, self._pending = self._pending, []
+            else:
+                self._schedule_flush()
+        if ready:
+            self._write(ready)
+
+    def _schedule_flush(self) -> None:
+        """Start the flush timer unless one is running; call with the lock held."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> int:
+        """Write every buffered record now; returns the number written."""
+        with self._lock:
+            ready, self._pending = self._pending, []
+        return self._write(ready) if ready else 0
+
+    def _flush_on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own database connection
+            connection.close()
+
+    def _write(self, scans: List[QRCodeScan]) -> int:
+        batch_scans = Counter(scan.qr_code.batch_id for scan in scans if scan.qr_code.batch_id)
+        try:
+            with transaction.atomic():
+                QRCodeScan.objects.bulk_create(scans, batch_size=500)
+                for batch_id, count in batch_scans.items():
+                    QRCodeBatch.objects.filter(pk=batch_id).update(scans_count=F('scans_count') + count)
+        except Exception as e:
+            logger.error(f"Error writing {len(scans)} QR code scan records: {str(e)}")
+            self._retry_or_release(scans)
+            return 0
+        refresh_for_scans(scans)
+        QRCodeService.invalidate_batch_stats(*batch_scans)
+        self.written += len(scans)
+        return len(scans)
+
+    def _retry_or_release(self, scans: List[QRCodeScan]) -> None:
+        """Re-queue a batch that failed to write, or give back its claimed scans once out of retries."""
+        retry, dropped = [], []
+        for scan in scans:
+            scan._write_attempts = getattr(scan, '_write_attempts', 0) + 1
+            (retry if scan._write_attempts <= self.max_retries else dropped).append(scan)
+        if retry:
+            with self._lock:
+                self._pending[:0] = retry
+                self._schedule_flush()
+        if not dropped:
+            return
+        self.failed += len(dropped)
+        claimed = Counter(scan.qr_code_id for scan in dropped)
+        try:
+            with transaction.atomic():
+                for qr_code_id, count in claimed.items():
+                    QRCode.objects.filter(pk=qr_code_id).update(current_scans=F('current_scans') - count)
+        except Exception as e:
+            logger.error(f"Error giving back {len(dropped)} unrecorded QR code scans: {str(e)}")
+
+
+@dataclass
+class ScanResult:
+    success: bool
+    status: str
+    message: str
+    qr_code: Optional[QRCode] = None
+    scan: Optional[QRCodeScan] = None
+
+
+class ScanEngine:
+    """Validates a scan, claims it atomically and records it."""
+
+    def __init__(self, codes: CodeCache, writer: ScanWriter):
+        self.codes = codes
+        self.writer = writer
+
+    def scan(self, qr_code_id, user=None, ip_address=None, user_agent='',
+             latitude=None, longitude=None, context_data=None) -> ScanResult:
+        qr_code = self.codes.get(qr_code_id)
+        if qr_code is None:
+            return ScanResult(False, 'invalid', 'QR code not found')
+
+        rejection = self._check(qr_code)
+        if rejection:
+            return rejection
+
+        is_allowed, message = QRCodeService.check_access(qr_code, user)
+        if not is_allowed:
+            return ScanResult(False, 'forbidden', message, qr_code)
+
+        if not self.claim(qr_code):
+            # The cached copy was stale; report what the database says
+            self.codes.invalidate(qr_code.id)
+            current = self.codes.get(qr_code.id)
+            if current is None:
+                return ScanResult(False, 'invalid', 'QR code not found')
+            return self._check(current) or ScanResult(False, 'exceeded', 'Scan limit reached', current)
+        qr_code.current_scans += 1
+
+        scan = QRCodeScan(
+            qr_code=qr_code,
+            user=user if user is not None and user.is_authenticated else None,
+            ip_address=ip_address,
+            user_agent=user_agent or '',
+            latitude=latitude,
+            longitude=longitude,
+            context_data=context_data or {},
+            status='success',
+            scanned_at=timezone.now(),
+        )
+        self.writer.add(scan)
+        return ScanResult(True, 'success', 'QR code scanned successfully', qr_code, scan)
+
+    @staticmethod
+    def _check(qr_code: QRCode) -> Optional[ScanResult]:
+        if not qr_code.is_active:
+            return ScanResult(False, 'inactive', 'QR code is inactive', qr_code)
+        if qr_code.is_expired:
+            return ScanResult(False, 'expired', 'QR code has expired', qr_code)
+        if qr_code.is_scan_limit_reached:
+            return ScanResult(False, 'exceeded', 'Scan limit reached', qr_code)
+        return None
+
+    @staticmethod
+    def claim(qr_code: QRCode) -> bool:
+        """Atomically count one scan of ``qr_code`` if it is active and under its limit."""
+        # The limit is read from the row, not the cached copy
+        under_limit = Q(max_scans__isnull=True) | Q(max_scans=0) | Q(current_scans__lt=F('max_scans'))
+        updated = QRCode.objects.filter(under_limit, pk=qr_code.pk, is_active=True).update(
+            current_scans=F('current_scans') + 1
+        )
+        return updated == 1
+
+
+code_cache = CodeCache()
+scan_writer = ScanWriter()
+scan_engine = ScanEngine(code_cache, scan_writer)
+
+atexit.register(scan_writer.flush)
@@ -36,17 +36,31 @@ class QRCodeSerializer(serializers.ModelSerializer):
     is_expired = serializers.ReadOnlyField()
     is_scan_limit_reached = serializers.ReadOnlyField()
     is_scannable = serializers.ReadOnlyField()
+    image_url = serializers.SerializerMethodField()
+    svg_url = serializers.SerializerMethodField()
     
     class Meta:
         model = QRCode
         fields = [
             'id', 'created_at', 'expires_at', 'content_type', 'object_id',
             'max_scans', 'current_scans', 'is_active', 'access_level',
-            'payload', 'image_data', 'batch', 'scan_count', 'is_expired',
+            'payload', 'image_url', 'svg_url', 'batch', 'scan_count', 'is_expired',
             'is_scan_limit_reached', 'is_scannable'
         ]
         read_only_fields = ['id', 'created_at', 'current_scans', 'scan_count', 
                             'is_expired', 'is_scan_limit_reached', 'is_scannable']
+    
+    def _image_url(self, obj, fmt):
+        url = obj.image_url(fmt)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_image_url(self, obj):
+        """URL of the PNG image, rendered on demand (replaces the base64 image_data)."""
+        return self._image_url(obj, 'png')
+    
+    def get_svg_url(self, obj):
+        return self._image_url(obj, 'svg')
 
 
 class QRCodeCreateSerializer(serializers.ModelSerializer):
@@ -154,12 +168,9 @@ class QRCodeBatchCreateSerializer(serializers.ModelSerializer):
         
         # Check if each target ID exists for the given content type
         if target_ids and content_type:
-            non_existent_ids = []
-            for target_id in target_ids:
-                try:
-                    content_type.get_object_for_this_type(pk=target_id)
-                except Exception:
-                    non_existent_ids.append(target_id)
+            from .services import QRCodeService
+            existing_ids = set(QRCodeService.existing_target_ids(content_type, target_ids))
+            non_existent_ids = [target_id for target_id in target_ids if target_id not in existing_ids]
             
             if non_existent_ids:
                 raise serializers.ValidationError({
@@ -1,18 +1,28 @@
-import qrcode
-import base64
-import io
-import json
-import uuid
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .images import image_store
+from .rendering import render_png
+
+logger = logging.getLogger(__name__)
+
+# Rows per bulk insert/update and ids per IN (...) lookup
+BULK_BATCH_SIZE = 500
+BATCH_STATS_KEY = 'qr_batch_stats:{batch_id}'
+
 
 class QRCodeService:
     """Service class for QR code operations."""
     
     @staticmethod
-    def generate_qr_image(qr_code_instance):
-        """Generate a QR code image and update the instance."""
-        # Create data payload
+    def qr_payload(qr_code_instance):
+        """Return the data encoded in a QR code's image."""
         data = {
             'id': str(qr_code_instance.id),
             'type': f"{qr_code_instance.content_type.app_label}.{qr_code_instance.content_type.model}",
@@ -23,23 +33,12 @@ class QRCodeService:
         if qr_code_instance.payload:
             data.update(qr_code_instance.payload)
         
-        # Create QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(json.dumps(data))
-        qr.make(fit=True)
-        
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return data
+    
+    @staticmethod
+    def generate_qr_image(qr_code_instance):
+        """Generate a QR code image and update the instance."""
+        image_data = render_png(QRCodeService.qr_payload(qr_code_instance))
         
         # Update QR code instance
         qr_code_instance.image_data = image_data
@@ -48,40 +47,67 @@ class QRCodeService:
         return image_data
     
     @staticmethod
-    @transaction.atomic
-    def create_batch_codes(batch, target_ids, content_type, **defaults):
-        """Create QR codes for multiple targets in a batch."""
-        from .models import QRCode
-        
-        created_codes = []
+    def existing_target_ids(content_type, target_ids):
+        """Return the subset of ``target_ids`` that exist for ``content_type``, in order."""
+        model = content_type.model_class()
+        if model is None:
+            return []
         
+        candidates = []
         for target_id in target_ids:
-            # Check if object exists
             try:
-                content_type.get_object_for_this_type(pk=target_id)
-            except Exception:
-                # Skip this target if it doesn't exist
+                candidates.append(model._meta.pk.to_python(target_id))
+            except (TypeError, ValueError, ValidationError):
                 continue
-            
-            # Create QR code
-            qr_code = QRCode.objects.create(
-                content_type=content_type,
-                object_id=target_id,
-                batch=batch,
-                **defaults
-            )
-            
-            # Generate QR code image
-            QRCodeService.generate_qr_image(qr_code)
-            
-            created_codes.append(qr_code)
         
-        # Update batch
-        batch.codes_count = batch.codes.count()
-        batch.save(update_fields=['codes_count'])
+        unique_ids = list(dict.fromkeys(candidates))
+        existing = set()
+        for offset in range(0, len(unique_ids), BULK_BATCH_SIZE):
+            existing.update(
+                model._base_manager.filter(pk__in=unique_ids[offset:offset + BULK_BATCH_SIZE])
+                .values_list('pk', flat=True)
+            )
+        return [target_id for target_id in candidates if target_id in existing]
+    
+    @staticmethod
+    @transaction.atomic
+    def create_batch_codes(batch, target_ids, content_type, **defaults):
+        """
+        Create QR codes for multiple targets in a batch.
+        
+        Target ids are checked with one query per 500, the codes are inserted
+        with ``bulk_create`` and the batch counter is updated once (the
+        per-code ``post_save`` signal is not sent), all in one transaction.
+        Images are not rendered here: the image endpoint renders each code on
+        its first request, and the ``warm_qr_images`` command renders whole
+        batches ahead of time.
+        """
+        from .models import QRCode, QRCodeBatch
+        
+        valid_ids = QRCodeService.existing_target_ids(content_type, target_ids)
+        if not valid_ids:
+            return []
+        
+        created_codes = [
+            QRCode(content_type=content_type, object_id=target_id, batch=batch, **defaults)
+            for target_id in valid_ids
+        ]
+        QRCode.objects.bulk_create(created_codes, batch_size=BULK_BATCH_SIZE)
+        QRCodeBatch.objects.filter(pk=batch.pk).update(codes_count=F('codes_count') + len(created_codes))
+        batch.refresh_from_db(fields=['codes_count'])
         
         return created_codes
     
+    @staticmethod
+    def render_images(qr_codes, fmt='png'):
+        """Render the images of many QR codes into the image store ahead of their first request."""
+        return image_store.warm(
+            [QRCodeService.qr_payload(qr_code) for qr_code in qr_codes],
+            fmt,
+            workers=getattr(settings, 'QR_RENDER_WORKERS', None),
+            min_parallel=getattr(settings, 'QR_RENDER_PARALLEL_THRESHOLD', 200),
+        )
+    
     @staticmethod
     def validate_scan(qr_code_id, user=None):
         """Validate if a QR code can be scanned."""
@@ -104,27 +130,91 @@ class QRCodeService:
         if qr_code.is_scan_limit_reached:
             return False, "Scan limit reached", qr_code
         
-        # Check access level
-        if qr_code.access_level != 'public':
-            if not user or not user.is_authenticated:
-                return False, "Authentication required", qr_code
-            
-            if qr_code.access_level == 'instructor' and not hasattr(user, 'is_instructor'):
-                return False, "Instructor access required", qr_code
-            
-            if qr_code.access_level == 'admin' and not user.is_staff:
-                return False, "Admin access required", qr_code
+        is_allowed, message = QRCodeService.check_access(qr_code, user)
+        if not is_allowed:
+            return False, message, qr_code
+        
+        return True, "Valid", qr_code
+    
+    @staticmethod
+    def check_access(qr_code, user=None):
+        """Check whether ``user`` may scan ``qr_code`` under its access level."""
+        if qr_code.access_level == 'public':
+            return True, "Valid"
+        
+        if not user or not user.is_authenticated:
+            return False, "Authentication required"
+        
+        if qr_code.access_level == 'instructor' and not hasattr(user, 'is_instructor'):
+            return False, "Instructor access required"
+        
+        if qr_code.access_level == 'admin' and not user.is_staff:
+            return False, "Admin access required"
+        
+        if qr_code.access_level == 'enrolled':
+            # Check if the QR code is for a course (or a module or quiz in one) and if user is enrolled
+            from courses.models import Enrollment
+            enrollments = Enrollment.objects.filter(user=user)
+            target_model = qr_code.content_type.model
+            if target_model == 'course':
+                enrollments = enrollments.filter(course_id=qr_code.object_id)
+            elif target_model == 'module':
+                enrollments = enrollments.filter(course__modules__id=qr_code.object_id)
+            elif target_model == 'quiz':
+                enrollments = enrollments.filter(course__modules__quizzes__id=qr_code.object_id)
+            else:
+                enrollments = None
             
-            if qr_code.access_level == 'enrolled':
-                # Check if the QR code is for a course and if user is enrolled
-                if qr_code.content_type.model == 'course':
-                    from courses.models import Enrollment
-                    is_enrolled = Enrollment.objects.filter(
-                        course_id=qr_code.object_id,
-                        user=user
-                    ).exists()
-                    
-                    if not is_enrolled:
-                        return False, "Enrollment required", qr_code
-        
-        return True, "Valid", qr_code
\ No newline at end of file
+            if enrollments is not None and not enrollments.exists():
+                return False, "Enrollment required"
+        
+        return True, "Valid"
+    
+    @staticmethod
+    def batch_stats(batch):
+        """
+        Return the statistics document of a batch, cached until its codes or scans change.
+        
+        The code counts come from one conditional aggregate and the scans by
+        date from the daily rollups. The cached copy is dropped by
+        ``invalidate_batch_stats`` when the scan writer records scans for the
+        batch or one of its codes is saved or deleted; QR_BATCH_STATS_CACHE_SECONDS
+        bounds how stale it can get otherwise (e.g. a code expiring).
+        """
+        from . import rollups
+        key = BATCH_STATS_KEY.format(batch_id=batch.pk)
+        try:
+            stats = cache.get(key)
+        except Exception as e:
+            logger.warning(f"QR batch stats cache unavailable: {str(e)}")
+            stats = None
+        if stats is not None:
+            return stats
+        
+        stats = batch.codes.aggregate(
+            total_codes=Count('id'),
+            active_codes=Count('id', filter=Q(is_active=True)),
+            expired_codes=Count('id', filter=Q(expires_at__lt=timezone.now())),
+            scanned_codes=Count('id', filter=Q(current_scans__gt=0)),
+        )
+        stats['total_scans'] = batch.scans_count
+        stats['scans_by_date'] = [
+            {'date': row['day'], 'count': row['count']}
+            for row in rollups.scans_by_day(batch=batch)
+        ]
+        try:
+            cache.set(key, stats, timeout=getattr(settings, 'QR_BATCH_STATS_CACHE_SECONDS', 300))
+        except Exception:
+            pass
+        return stats
+    
+    @staticmethod
+    def invalidate_batch_stats(*batch_ids):
+        """Drop the cached statistics of the given batches."""
+        keys = [BATCH_STATS_KEY.format(batch_id=batch_id) for batch_id in batch_ids if batch_id]
+        if not keys:
+            return
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning(f"Could not invalidate QR batch stats: {str(e)}")
@@ -1,15 +1,51 @@
+from django.db.models import F
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import QRCode, QRCodeScan, QRCodeBatch
+from .services import QRCodeService
 
 
 @receiver(post_save, sender=QRCodeScan)
 def update_batch_scan_count(sender, instance, created, **kwargs):
-    """Update batch scan count when a new scan is created."""
-    if created and instance.qr_code.batch:
-        batch = instance.qr_code.batch
-        batch.scans_count += 1
-        batch.save(update_fields=['scans_count'])
+    """Update batch scan count when a new scan is created.
+
+    Scans recorded by the scan engine are bulk-created and counted by its
+    writer instead, as ``bulk_create`` does not send ``post_save``.
+    """
+    if created and instance.qr_code.batch_id:
+        QRCodeBatch.objects.filter(pk=instance.qr_code.batch_id).update(scans_count=F('scans_count') + 1)
+
+
+@receiver([post_save, post_delete], sender=QRCodeScan)
+def update_daily_stats(sender, instance, **kwargs):
+    """Recount the scanned code's rollup for the day of the scan."""
+    from .rollups import refresh_for_scans
+    refresh_for_scans([instance])
+
+
+@receiver([post_save, post_delete], sender=QRCode)
+def invalidate_scan_cache(sender, instance, **kwargs):
+    """Drop the cached copy of a QR code used by the scan engine."""
+    from .scan_engine import code_cache
+    code_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=QRCode)
+@receiver([post_save, post_delete], sender=QRCodeScan)
+def invalidate_batch_stats(sender, instance, **kwargs):
+    """Drop the cached statistics of the batch a code or scan belongs to.
+
+    Scans deleted while the rollups are paused (archiving) are handled once
+    per day by ``rollups.invalidate_batch_stats``.
+    """
+    if sender is not QRCodeScan:
+        QRCodeService.invalidate_batch_stats(instance.batch_id)
+        return
+    from .rollups import is_paused
+    if is_paused():
+        return
+    batch_id = QRCode.objects.filter(pk=instance.qr_code_id).values_list('batch_id', flat=True).first()
+    QRCodeService.invalidate_batch_stats(batch_id)
 
 
 @receiver(post_save, sender=QRCode)
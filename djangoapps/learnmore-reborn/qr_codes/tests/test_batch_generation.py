@@ -0,0 +1,113 @@
+"""
+Tests for bulk QR code batch generation.
+"""
+
+import os
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from courses.models import Course
+from qr_codes.models import QRCode, QRCodeBatch
+from qr_codes.images import ImageStore, image_digest
+from qr_codes.rendering import render_batch, render_png_bytes
+from qr_codes.services import QRCodeService
+from qr_codes.tests.utils import create_test_batch
+
+
+def make_courses(instructor, count):
+    return Course.objects.bulk_create([
+        Course(title=f'Course {i}', slug=f'course-{i}', description='A test course', instructor=instructor)
+        for i in range(count)
+    ])
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    store = ImageStore(str(tmp_path))
+    monkeypatch.setattr('qr_codes.services.image_store', store)
+    return store
+
+
+def generate(batch, target_ids):
+    with CaptureQueriesContext(connection) as queries:
+        codes = QRCodeService.create_batch_codes(
+            batch=batch,
+            target_ids=target_ids,
+            content_type=ContentType.objects.get_for_model(Course),
+            max_scans=3,
+            access_level='public',
+        )
+    return codes, len(queries)
+
+
+@pytest.mark.django_db
+class TestCreateBatchCodes:
+    """Test cases for QRCodeService.create_batch_codes."""
+
+    @pytest.fixture
+    def batch(self, instructor_user):
+        return create_test_batch(name='Open Day', content_type_model='courses.course', user=instructor_user)
+
+    def test_codes_are_created_and_counted(self, batch, instructor_user, store):
+        courses = make_courses(instructor_user, 5)
+        codes, _ = generate(batch, [course.id for course in courses])
+
+        assert len(codes) == 5
+        stored = QRCode.objects.filter(batch=batch)
+        assert set(stored.values_list('object_id', flat=True)) == {course.id for course in courses}
+        assert set(stored.values_list('max_scans', flat=True)) == {3}
+        assert QRCodeBatch.objects.get(pk=batch.pk).codes_count == 5
+        assert batch.codes_count == 5
+        # Images are left for the first request (or warm_qr_images)
+        assert os.listdir(store.directory) == []
+
+    def test_failed_counter_update_leaves_no_codes(self, batch, instructor_user):
+        courses = make_courses(instructor_user, 3)
+        with patch('qr_codes.models.QRCodeBatch.objects.filter', side_effect=DatabaseError('lost connection')):
+            with pytest.raises(DatabaseError):
+                generate(batch, [course.id for course in courses])
+
+        assert not QRCode.objects.filter(batch=batch).exists()
+        assert QRCodeBatch.objects.get(pk=batch.pk).codes_count == 0
+
+    def test_warm_command_renders_the_batch(self, batch, instructor_user, store):
+        generate(batch, [course.id for course in make_courses(instructor_user, 3)])
+
+        call_command('warm_qr_images', str(batch.pk), stdout=StringIO())
+
+        for code in QRCode.objects.filter(batch=batch):
+            path = store.path(image_digest(QRCodeService.qr_payload(code), 'png'), 'png')
+            with open(path, 'rb') as handle:
+                assert handle.read().startswith(b'\x89PNG')
+
+    def test_missing_and_malformed_targets_are_skipped(self, batch, instructor_user):
+        course = make_courses(instructor_user, 1)[0]
+        codes, _ = generate(batch, [course.id, 999999, 'abc', str(course.id)])
+
+        assert [code.object_id for code in codes] == [course.id, course.id]
+        assert QRCodeBatch.objects.get(pk=batch.pk).codes_count == 2
+
+    def test_query_count_does_not_grow_with_batch_size(self, batch, instructor_user):
+        courses = make_courses(instructor_user, 40)
+        _, small = generate(batch, [course.id for course in courses[:4]])
+        _, large = generate(batch, [course.id for course in courses])
+        assert small == large
+
+    def test_no_valid_targets_creates_nothing(self, batch):
+        codes, _ = generate(batch, [999999])
+        assert codes == []
+        assert QRCodeBatch.objects.get(pk=batch.pk).codes_count == 0
+
+
+class TestRenderPngBatch:
+    """Test cases for parallel QR image rendering."""
+
+    def test_pool_output_matches_serial_rendering(self):
+        payloads = [{'id': str(i), 'type': 'courses.course', 'target_id': i} for i in range(6)]
+        assert render_batch(payloads, workers=2, min_parallel=1) == [render_png_bytes(p) for p in payloads]
@@ -0,0 +1,139 @@
+"""
+Tests for batch statistics and annotated scan counts.
+"""
+import pytest
+from django.contrib.admin.sites import site
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from qr_codes.models import QRCode, QRCodeScan
+from qr_codes.scan_engine import CodeCache, ScanEngine, ScanWriter
+from qr_codes.services import QRCodeService
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def local_cache(settings):
+    from django.core.cache import cache
+    settings.CACHES = LOCMEM_CACHES
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture
+def batch_codes(qr_batch):
+    """Add an inactive and an expired code to the batch."""
+    first = qr_batch.codes.get()
+    for is_active, expires_at in [(False, None), (True, timezone.now() - timezone.timedelta(days=1))]:
+        QRCode.objects.create(
+            content_type=first.content_type, object_id=first.object_id,
+            is_active=is_active, expires_at=expires_at, batch=qr_batch,
+        )
+    return qr_batch
+
+
+@pytest.mark.django_db
+class TestBatchStats:
+    """Test cases for QRCodeService.batch_stats."""
+
+    def test_counts_come_from_one_aggregate(self, batch_codes, django_assert_num_queries):
+        QRCodeScan.objects.create(qr_code=batch_codes.codes.filter(is_active=True).first())
+        QRCode.objects.filter(batch=batch_codes, is_active=False).update(current_scans=2)
+        batch_codes.refresh_from_db()
+
+        # The conditional aggregate and the daily rollups
+        with django_assert_num_queries(2):
+            stats = QRCodeService.batch_stats(batch_codes)
+
+        assert {key: stats[key] for key in ['total_codes', 'active_codes', 'expired_codes', 'scanned_codes']} == {
+            'total_codes': 3, 'active_codes': 2, 'expired_codes': 1, 'scanned_codes': 1,
+        }
+        assert stats['total_scans'] == 1
+        assert stats['scans_by_date'] == [{'date': timezone.localdate(), 'count': 1}]
+
+    def test_cached_until_the_scan_pipeline_invalidates(self, local_cache, qr_batch, student_user,
+                                                        django_assert_num_queries):
+        assert QRCodeService.batch_stats(qr_batch)['total_scans'] == 0
+        with django_assert_num_queries(0):
+            QRCodeService.batch_stats(qr_batch)
+
+        engine = ScanEngine(CodeCache(ttl=60), ScanWriter(batch_size=1))
+        assert engine.scan(qr_batch.codes.get().id, user=student_user).success
+        qr_batch.refresh_from_db()
+
+        stats = QRCodeService.batch_stats(qr_batch)
+        assert stats['total_scans'] == 1
+        assert stats['scanned_codes'] == 1
+
+    def test_saving_a_code_invalidates(self, local_cache, qr_batch):
+        assert QRCodeService.batch_stats(qr_batch)['active_codes'] == 1
+        code = qr_batch.codes.get()
+        code.is_active = False
+        code.save()
+
+        assert QRCodeService.batch_stats(qr_batch)['active_codes'] == 0
+
+    def test_stats_endpoint(self, batch_codes, instructor_user):
+        client = APIClient()
+        client.force_authenticate(user=instructor_user)
+
+        response = client.get(reverse('qrcodebatch-stats', args=[batch_codes.id]))
+
+        assert response.status_code == 200
+        assert response.data['total_codes'] == 3
+        assert response.data['expired_codes'] == 1
+
+
+@pytest.mark.django_db
+class TestAnnotatedScanCounts:
+    """Test cases for scan counts annotated on code lists."""
+
+    def test_scan_count_is_annotated(self, batch_codes):
+        code = batch_codes.codes.filter(is_active=True).first()
+        for _ in range(2):
+            QRCodeScan.objects.create(qr_code=code)
+
+        codes = list(QRCode.objects.filter(batch=batch_codes).with_scan_counts())
+        with CaptureQueriesContext(connection) as queries:
+            counts = {code.pk: code.scan_count for code in codes}
+
+        assert len(queries) == 0
+        assert counts[code.pk] == 2
+        assert sorted(counts.values()) == [0, 0, 2]
+        # Unannotated instances still count their scans
+        assert QRCode.objects.get(pk=code.pk).scan_count == 2
+
+    def test_batch_codes_list_query_count_is_constant(self, batch_codes, instructor_user):
+        client = APIClient()
+        client.force_authenticate(user=instructor_user)
+        url = reverse('qrcodebatch-codes', args=[batch_codes.id])
+
+        with CaptureQueriesContext(connection) as before:
+            client.get(url)
+        first = batch_codes.codes.first()
+        for _ in range(5):
+            QRCode.objects.create(content_type=first.content_type, object_id=first.object_id, batch=batch_codes)
+        with CaptureQueriesContext(connection) as after:
+            response = client.get(url)
+
+        assert response.data['count'] == 8
+        assert len(after) == len(before)
+
+    def test_admin_changelist_annotates(self, batch_codes, instructor_user):
+        request = RequestFactory().get('/admin/qr_codes/qrcode/')
+        request.user = instructor_user
+        admin = site._registry[QRCode]
+        codes = list(admin.get_queryset(request))
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = [(admin.target_display(code), admin.scan_count_display(code)) for code in codes]
+
+        assert len(queries) == 0
+        assert len(rows) == 3
@@ -0,0 +1,103 @@
+"""
+Tests for on-demand QR code images.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from qr_codes import images
+from qr_codes.images import ImageStore, image_digest
+from qr_codes.services import QRCodeService
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ImageStore(str(tmp_path))
+    monkeypatch.setattr('qr_codes.views.image_store', store)
+    return store
+
+
+def image_url(qr_code, fmt='png'):
+    return reverse('qr_codes:image', kwargs={'pk': qr_code.id, 'fmt': fmt})
+
+
+@pytest.mark.django_db
+class TestQRCodeImageView:
+    """Test cases for the qr_codes:image endpoint."""
+
+    def test_png_is_rendered_with_cache_headers(self, client, store, course_qr_code):
+        response = client.get(image_url(course_qr_code))
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'image/png'
+        assert response.content.startswith(b'\x89PNG')
+        digest = image_digest(QRCodeService.qr_payload(course_qr_code), 'png')
+        assert response['ETag'] == f'"{digest}"'
+        # Without the digest in the URL the client has to revalidate
+        assert response['Cache-Control'] == 'no-cache'
+        assert store.read(digest, 'png') == response.content
+
+    def test_versioned_url_may_be_cached(self, client, store, course_qr_code):
+        url = course_qr_code.image_url()
+        digest = image_digest(QRCodeService.qr_payload(course_qr_code), 'png')
+        assert url == f"{image_url(course_qr_code)}?v={digest}"
+
+        cache_control = client.get(url)['Cache-Control']
+        assert 'public' in cache_control and 'max-age=' in cache_control and 'immutable' in cache_control
+
+        # A stale version is served, but not cached
+        course_qr_code.payload = {'room': '49-200'}
+        course_qr_code.save()
+        assert course_qr_code.image_url() != url
+        assert client.get(url)['Cache-Control'] == 'no-cache'
+
+    def test_svg_output(self, client, store, course_qr_code):
+        response = client.get(image_url(course_qr_code, 'svg'))
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'image/svg+xml'
+        assert response.content.lstrip().startswith(b'<')
+
+    def test_matching_etag_returns_not_modified(self, client, store, course_qr_code):
+        etag = client.get(image_url(course_qr_code))['ETag']
+        response = client.get(image_url(course_qr_code), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert not response.content
+
+    def test_identical_payloads_render_once(self, client, store, course_qr_code, monkeypatch):
+        calls = []
+        monkeypatch.setitem(images.RENDERERS, 'png', lambda data: calls.append(data) or b'PNG')
+        client.get(image_url(course_qr_code))
+        client.get(image_url(course_qr_code))
+        assert len(calls) == 1
+
+    def test_payload_change_changes_the_image(self, client, store, course_qr_code):
+        etag = client.get(image_url(course_qr_code))['ETag']
+        course_qr_code.payload = {'room': '49-200'}
+        course_qr_code.save()
+        assert client.get(image_url(course_qr_code))['ETag'] != etag
+
+    def test_unknown_format_or_code_is_not_found(self, client, store, course_qr_code):
+        assert client.get(image_url(course_qr_code, 'gif')).status_code == 404
+        missing = reverse('qr_codes:image', kwargs={'pk': '00000000-0000-0000-0000-000000000000', 'fmt': 'png'})
+        assert client.get(missing).status_code == 404
+
+
+@pytest.mark.django_db
+class TestQRCodeListPayload:
+    """Test cases for QR code list responses without inline images."""
+
+    def test_list_returns_image_urls_and_skips_base64_column(self, course_qr_code, instructor_user):
+        api = APIClient()
+        api.force_authenticate(user=instructor_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api.get(reverse('qrcode-list'))
+
+        assert response.status_code == 200
+        item = response.data['results'][0]
+        assert 'image_data' not in item
+        assert item['image_url'].endswith(course_qr_code.image_url())
+        assert item['svg_url'].endswith(course_qr_code.svg_url())
+        assert not any('"image_data"' in query['sql'] for query in queries.captured_queries)
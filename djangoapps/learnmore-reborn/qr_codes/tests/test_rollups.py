@@ -0,0 +1,107 @@
+"""
+Tests for the daily QR scan rollups.
+"""
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from qr_codes import rollups
+from qr_codes.models import QRCodeDailyStat, QRCodeScan
+from qr_codes.scan_engine import CodeCache, ScanEngine, ScanWriter
+
+
+@pytest.fixture
+def engine():
+    return ScanEngine(CodeCache(ttl=60), ScanWriter(batch_size=1))
+
+
+@pytest.mark.django_db
+class TestDailyStats:
+    """Test cases for rollups maintained at scan time."""
+
+    def test_scans_are_rolled_up_with_distinct_counts(self, engine, qr_batch, instructor_user, student_user):
+        qr_code = qr_batch.codes.get()
+        engine.scan(qr_code.id, user=student_user, ip_address='10.0.0.1')
+        engine.scan(qr_code.id, user=student_user, ip_address='10.0.0.2')
+        engine.scan(qr_code.id, user=instructor_user, ip_address='10.0.0.1')
+        engine.scan(qr_code.id, ip_address='10.0.0.1')
+
+        stat = QRCodeDailyStat.objects.get()
+        assert (stat.qr_code_id, stat.batch_id, stat.day) == (qr_code.id, qr_batch.id, timezone.localdate())
+        assert (stat.scans, stat.unique_users, stat.unique_ips) == (4, 2, 2)
+
+    def test_individually_saved_scans_update_their_day(self, course_qr_code):
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        QRCodeScan.objects.create(qr_code=course_qr_code, scanned_at=yesterday, ip_address='10.0.0.1')
+        scan = QRCodeScan.objects.create(qr_code=course_qr_code, ip_address='10.0.0.1')
+
+        assert dict(QRCodeDailyStat.objects.values_list('day', 'scans')) == {
+            timezone.localdate(yesterday): 1,
+            timezone.localdate(): 1,
+        }
+
+        scan.delete()
+        assert not QRCodeDailyStat.objects.filter(day=timezone.localdate()).exists()
+
+    def test_command_rebuilds_and_drops_stale_rows(self, course_qr_code):
+        QRCodeScan.objects.create(qr_code=course_qr_code, scanned_at=timezone.now() - datetime.timedelta(days=5))
+        QRCodeScan.objects.create(qr_code=course_qr_code)
+        QRCodeDailyStat.objects.all().delete()
+        QRCodeDailyStat.objects.create(qr_code=course_qr_code, day=timezone.localdate() - datetime.timedelta(days=1), scans=7)
+
+        call_command('rollup_qr_scans', '--days', '2')
+        assert list(QRCodeDailyStat.objects.values_list('scans', flat=True)) == [1]
+
+        call_command('rollup_qr_scans', '--all')
+        assert list(QRCodeDailyStat.objects.values_list('scans', flat=True)) == [1, 1]
+
+    def test_migration_backfills_existing_scans(self, qr_batch, student_user):
+        from importlib import import_module
+        from django.apps import apps
+        qr_code = qr_batch.codes.get()
+        earlier = timezone.now() - datetime.timedelta(days=3)
+        with rollups.paused():
+            QRCodeScan.objects.create(qr_code=qr_code, scanned_at=earlier, user=student_user, ip_address='10.0.0.1')
+            QRCodeScan.objects.create(qr_code=qr_code, scanned_at=earlier, ip_address='10.0.0.1')
+            QRCodeScan.objects.create(qr_code=qr_code, ip_address='10.0.0.2')
+        assert not QRCodeDailyStat.objects.exists()
+
+        import_module('qr_codes.migrations.0003_daily_stats').backfill_daily_stats(apps, None)
+
+        assert list(QRCodeDailyStat.objects.values_list('batch', 'day', 'scans', 'unique_users', 'unique_ips')) == [
+            (qr_batch.id, timezone.localdate(earlier), 2, 1, 1),
+            (qr_batch.id, timezone.localdate(), 1, 0, 1),
+        ]
+
+
+@pytest.mark.django_db
+class TestRollupReaders:
+    """Test cases for dashboards reading the rollups."""
+
+    def test_batch_stats_scans_by_date(self, engine, qr_batch, instructor_user):
+        qr_code = qr_batch.codes.get()
+        engine.scan(qr_code.id)
+        engine.scan(qr_code.id)
+
+        api = APIClient()
+        api.force_authenticate(user=instructor_user)
+        response = api.get(reverse('qrcodebatch-stats', args=[qr_batch.id]))
+
+        assert response.status_code == 200
+        assert response.data['scans_by_date'] == [{'date': timezone.localdate(), 'count': 2}]
+
+    def test_dashboard_helpers(self, engine, course_qr_code, module_qr_code, django_assert_num_queries):
+        for _ in range(3):
+            engine.scan(course_qr_code.id)
+        QRCodeScan.objects.create(qr_code=module_qr_code)
+
+        with django_assert_num_queries(3):
+            assert rollups.total_scans() == 4
+            assert rollups.scans_by_day(since=timezone.localdate()) == [{'day': timezone.localdate(), 'count': 4}]
+            assert [(code.id, code.scans_count) for code in rollups.top_codes(10)] == [
+                (course_qr_code.id, 3), (module_qr_code.id, 1)
+            ]
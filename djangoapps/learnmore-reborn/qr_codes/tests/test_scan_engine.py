@@ -0,0 +1,141 @@
+"""
+Tests for the QR code scan engine.
+"""
+from unittest.mock import patch
+
+import pytest
+from django.db import DatabaseError
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from qr_codes.models import QRCode, QRCodeBatch, QRCodeScan
+from qr_codes.scan_engine import CodeCache, ScanEngine, ScanWriter
+from qr_codes.tests.utils import create_test_qr_code
+
+
+@pytest.fixture
+def engine():
+    return ScanEngine(CodeCache(ttl=60), ScanWriter(batch_size=1))
+
+
+@pytest.mark.django_db
+class TestScanEngine:
+    """Test cases for atomic, cached scan processing."""
+
+    def test_scan_is_counted_and_recorded(self, engine, course_qr_code, student_user):
+        result = engine.scan(course_qr_code.id, user=student_user, ip_address='127.0.0.1')
+
+        assert result.success and result.status == 'success'
+        course_qr_code.refresh_from_db()
+        assert course_qr_code.current_scans == 1
+        scan = QRCodeScan.objects.get()
+        assert (scan.id, scan.user, scan.ip_address) == (result.scan.id, student_user, '127.0.0.1')
+
+    def test_repeat_scans_read_the_code_once(self, engine, course_qr_code, django_assert_num_queries):
+        engine.scan(course_qr_code.id)
+        # One conditional UPDATE and one INSERT (in a savepoint), then the daily
+        # rollup recount and upsert; no SELECT of the code
+        with django_assert_num_queries(6):
+            engine.scan(course_qr_code.id)
+
+    def test_stale_cache_cannot_exceed_max_scans(self, engine, test_course):
+        """The limit is enforced by the UPDATE, not by the cached scan count."""
+        qr_code = create_test_qr_code(test_course, max_scans=2)
+        assert engine.scan(qr_code.id).success
+
+        # Another worker takes the last scan; this process still caches current_scans=1
+        QRCode.objects.filter(pk=qr_code.pk).update(current_scans=2)
+        result = engine.scan(qr_code.id)
+
+        assert (result.success, result.status) == (False, 'exceeded')
+        qr_code.refresh_from_db()
+        assert qr_code.current_scans == 2
+        assert QRCodeScan.objects.count() == 1
+
+    def test_deactivated_code_is_rejected_despite_cache(self, engine, course_qr_code):
+        engine.scan(course_qr_code.id)
+        QRCode.objects.filter(pk=course_qr_code.pk).update(is_active=False)
+
+        result = engine.scan(course_qr_code.id)
+        assert (result.success, result.status) == (False, 'inactive')
+
+    def test_saving_a_code_invalidates_the_shared_cache(self, course_qr_code):
+        from qr_codes.scan_engine import code_cache
+
+        assert code_cache.get(course_qr_code.id).is_active
+        course_qr_code.is_active = False
+        course_qr_code.save()
+        assert not code_cache.get(course_qr_code.id).is_active
+
+    def test_unknown_or_malformed_ids_are_invalid(self, engine):
+        assert engine.scan('00000000-0000-0000-0000-000000000000').status == 'invalid'
+        assert engine.scan('not-a-uuid').status == 'invalid'
+
+    def test_enrolled_code_requires_enrollment(self, engine, module_qr_code, student_user, test_enrollment):
+        assert engine.scan(module_qr_code.id).status == 'forbidden'
+        assert engine.scan(module_qr_code.id, user=student_user).success
+
+
+@pytest.mark.django_db
+class TestScanWriter:
+    """Test cases for buffered scan records and batch counters."""
+
+    def test_buffered_scans_are_written_together(self, qr_batch, django_assert_num_queries):
+        qr_code = qr_batch.codes.get()
+        engine = ScanEngine(CodeCache(ttl=60), ScanWriter(batch_size=3, flush_interval=60))
+
+        engine.scan(qr_code.id)
+        engine.scan(qr_code.id)
+        assert QRCodeScan.objects.count() == 0
+        assert engine.writer.pending == 2
+
+        # The third scan writes all three with one INSERT and one batch UPDATE (in a savepoint),
+        # then recounts and upserts their daily rollup once
+        with django_assert_num_queries(7):
+            engine.scan(qr_code.id)
+        assert QRCodeScan.objects.count() == 3
+        assert QRCodeBatch.objects.get(pk=qr_batch.pk).scans_count == 3
+
+    def test_flush_writes_partial_buffer(self, course_qr_code):
+        engine = ScanEngine(CodeCache(ttl=60), ScanWriter(batch_size=100, flush_interval=60))
+        engine.scan(course_qr_code.id)
+
+        assert engine.writer.flush() == 1
+        assert QRCodeScan.objects.count() == 1
+        assert engine.writer.pending == 0
+
+    def test_failed_writes_are_retried_then_given_back(self, course_qr_code):
+        writer = ScanWriter(batch_size=1, flush_interval=60, max_retries=1)
+        engine = ScanEngine(CodeCache(ttl=60), writer)
+        down = patch.object(QRCodeScan.objects, 'bulk_create', side_effect=DatabaseError('database is down'))
+
+        # A failed write goes back on the buffer and succeeds on the next flush
+        with down:
+            engine.scan(course_qr_code.id)
+        assert writer.pending == 1
+        assert writer.flush() == 1
+        assert QRCodeScan.objects.count() == 1
+
+        # Once the retries are spent the record is dropped and its claimed scan given back
+        with down:
+            engine.scan(course_qr_code.id)
+            assert QRCode.objects.get(pk=course_qr_code.pk).current_scans == 2
+            assert writer.flush() == 0
+        writer._timer.cancel()
+        assert (writer.pending, writer.failed) == (0, 1)
+        assert QRCode.objects.get(pk=course_qr_code.pk).current_scans == 1
+
+    def test_batch_scans_are_counted_once(self, qr_batch, student_user):
+        """A scan through the API adds exactly one to the batch."""
+        qr_code = qr_batch.codes.get()
+        client = APIClient()
+        client.force_authenticate(user=student_user)
+
+        response = client.post(reverse('qrcodescan-scan'), {'qr_code_id': str(qr_code.id)}, format='json')
+
+        assert response.status_code == 200
+        assert QRCodeBatch.objects.get(pk=qr_batch.pk).scans_count == 1
+
+    def test_directly_created_scans_still_count_for_the_batch(self, qr_batch):
+        QRCodeScan.objects.create(qr_code=qr_batch.codes.get(), status='success')
+        assert QRCodeBatch.objects.get(pk=qr_batch.pk).scans_count == 1
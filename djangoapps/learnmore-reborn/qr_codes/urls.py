@@ -9,4 +9,5 @@ urlpatterns = [
     path('scanner/', views.qr_scanner, name='scanner'),
     path('management/', views.qr_management, name='management'),
     path('analytics/', views.qr_analytics, name='analytics'),
+    path('image/<uuid:pk>.<str:fmt>', views.qr_code_image, name='image'),
 ]
\ No newline at end of file
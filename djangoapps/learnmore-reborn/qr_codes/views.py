@@ -2,15 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.contenttypes.models import ContentType
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count, Sum
-from django.db.models.functions import TruncDay
+from django.views.decorators.http import condition, require_GET
 from django.utils import timezone
 import json
 
 from .models import QRCode, QRCodeScan, QRCodeBatch
 from .services import QRCodeService
+from .images import CONTENT_TYPES, image_digest, image_store
+from . import rollups
+from .scan_engine import code_cache, scan_engine
 
 
 def qr_code_home(request):
@@ -64,10 +68,6 @@ def qr_generator(request):
                     }
                 )
                 
-                # Generate QR code image if needed
-                if created or not qr_code.image_data:
-                    QRCodeService.generate_qr_image(qr_code)
-                
                 context['qr_code'] = qr_code
                 context['target_object'] = target_object
                 messages.success(request, 'QR code generated successfully')
@@ -78,6 +78,39 @@ def qr_generator(request):
     return render(request, 'qr_codes/generator/base.html', context)
 
 
+def _image_etag(request, pk, fmt):
+    qr_code = code_cache.get(pk)
+    if qr_code is None or fmt not in CONTENT_TYPES:
+        return None
+    return image_digest(QRCodeService.qr_payload(qr_code), fmt)
+
+
+@require_GET
+@condition(etag_func=_image_etag)
+def qr_code_image(request, pk, fmt):
+    """
+    Serve a QR code image (PNG or SVG), rendered once per payload.
+    
+    URLs carrying the current digest (``QRCode.image_url``) may be cached by
+    clients; any other request has to revalidate its ETag, so an edited
+    payload is never shown from a stale cache.
+    """
+    qr_code = code_cache.get(pk)
+    if qr_code is None or fmt not in CONTENT_TYPES:
+        raise Http404("QR code image not found")
+    
+    digest, content = image_store.get_or_render(QRCodeService.qr_payload(qr_code), fmt)
+    response = HttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    if request.GET.get('v') == digest:
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=getattr(settings, 'QR_IMAGE_MAX_AGE', 86400))
+    else:
+        patch_cache_control(response, no_cache=True)
+    if request.GET.get('download'):
+        response['Content-Disposition'] = f'attachment; filename="qrcode-{qr_code.id}.{fmt}"'
+    return response
+
+
 @login_required
 def qr_scanner(request):
     """QR code scanning interface."""
@@ -98,30 +131,21 @@ def scan_qr_code(request):
         if not qr_code_id:
             return JsonResponse({'error': 'QR code ID is required'}, status=400)
         
-        # Validate scan
-        is_valid, message, qr_code = QRCodeService.validate_scan(
-            qr_code_id, 
-            user=request.user if request.user.is_authenticated else None
-        )
-        
-        if not is_valid:
-            return JsonResponse({'error': message}, status=403)
-        
-        # Record scan
-        scan = QRCodeScan.objects.create(
-            qr_code=qr_code,
+        result = scan_engine.scan(
+            qr_code_id,
             user=request.user if request.user.is_authenticated else None,
             ip_address=request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             latitude=data.get('latitude'),
             longitude=data.get('longitude'),
             context_data=data.get('context_data', {}),
-            status='success'
         )
         
-        # Update scan count
-        qr_code.current_scans += 1
-        qr_code.save()
+        if not result.success:
+            return JsonResponse({'error': result.message}, status=403)
+        
+        qr_code = result.qr_code
+        scan = result.scan
         
         # Get target object details
         target_object = qr_code.content_object
@@ -154,7 +178,7 @@ def scan_qr_code(request):
 def qr_management(request):
     """QR code management interface."""
     # Get QR codes for current user
-    qr_codes = QRCode.objects.all().order_by('-created_at')
+    qr_codes = QRCode.objects.select_related('content_type').defer('image_data').order_by('-created_at')
     
     # Get batches
     batches = QRCodeBatch.objects.all().order_by('-created_at')
@@ -172,23 +196,13 @@ def qr_analytics(request):
     """QR code analytics dashboard."""
     # Get basic statistics
     total_codes = QRCode.objects.count()
-    total_scans = QRCodeScan.objects.count()
+    total_scans = rollups.total_scans()
     active_codes = QRCode.objects.filter(is_active=True).count()
     
-    # Get scans per day (last 30 days)
-    thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-    scans_by_day = QRCodeScan.objects.filter(
-        scanned_at__gte=thirty_days_ago
-    ).annotate(
-        day=TruncDay('scanned_at')
-    ).values('day').annotate(
-        count=Count('id')
-    ).order_by('day')
-    
-    # Get top scanned QR codes
-    top_codes = QRCode.objects.annotate(
-        scans_count=Count('scans')
-    ).order_by('-scans_count')[:10]
+    # Get scans per day (last 30 days) and the top scanned QR codes from the daily rollups
+    thirty_days_ago = timezone.localdate() - timezone.timedelta(days=30)
+    scans_by_day = rollups.scans_by_day(since=thirty_days_ago)
+    top_codes = rollups.top_codes(10)
     
     context = {
         'total_codes': total_codes,
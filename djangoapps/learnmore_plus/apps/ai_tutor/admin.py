@@ -9,7 +9,7 @@ class TutorContextItemInline(admin.TabularInline):
 class TutorMessageInline(admin.TabularInline):
     model = TutorMessage
     extra = 0
-    fields = ('message_type', 'content', 'tokens_used', 'created_at')
+    fields = ('message_type', 'content', 'prompt_tokens', 'completion_tokens', 'created_at')
     readonly_fields = ('created_at',)
 
 @admin.register(TutorSession)
@@ -22,7 +22,7 @@ class TutorSessionAdmin(admin.ModelAdmin):
 
 @admin.register(TutorMessage)
 class TutorMessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'session', 'message_type', 'tokens_used', 'created_at')
+    list_display = ('id', 'session', 'message_type', 'prompt_tokens', 'completion_tokens', 'created_at')
     list_filter = ('message_type', 'created_at')
     search_fields = ('content', 'session__title', 'session__user__username')
     date_hierarchy = 'created_at'
@@ -35,7 +35,9 @@ class TutorContextItemAdmin(admin.ModelAdmin):
 
 @admin.register(ContentEmbedding)
 class ContentEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ('id', 'content', 'updated_at')
-    list_filter = ('updated_at',)
+    list_display = ('id', 'content', 'dimension', 'encoding', 'model_id', 'updated_at')
+    list_filter = ('encoding', 'model_id', 'updated_at')
+    exclude = ('vector',)
+    readonly_fields = ('dimension', 'encoding', 'scale', 'model_id')
     search_fields = ('content__title', 'chunk_text')
     date_hierarchy = 'updated_at'
\ No newline at end of file
@@ -0,0 +1,519 @@
+"""
+Structure-aware chunking of course content for the AI tutor.
+
+Course content and knowledge base entries are a mix of HTML and markdown.
+Indexing each item as one tag-stripped blob, or cutting it every N
+characters, flattens or splits headings, lists and code samples. The chunker
+here parses the text into blocks first, packs whole blocks into chunks up to
+a token budget, never lets a chunk span two sections, records the heading
+path of every chunk, and drops chunks that are near-duplicates of ones
+already produced.
+
+The module has no Django dependencies and is kept identical in learnmore_plus
+(apps/ai_tutor) and learnmore-reborn (ai_tutor); each project's test suite
+checks that the two copies still match, so change both together.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+DEFAULT_MAX_TOKENS = 350
+DEFAULT_OVERLAP_TOKENS = 40
+DEFAULT_MIN_TOKENS = 24
+DEFAULT_DEDUPE_THRESHOLD = 0.85
+
+
+@lru_cache(maxsize=4)
+def get_encoding(name: str = "cl100k_base"):
+    """Return a cached tiktoken encoding, or None when tiktoken is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, falling back to a word-based estimate."""
+    if not text or not text.strip():
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, round(len(text.split()) * 1.3))
+
+
+@dataclass
+class Block:
+    """A structural unit of a document (paragraph, list, code block, ...)."""
+    kind: str
+    text: str
+    heading_path: Tuple[str, ...] = ()
+
+
+@dataclass
+class Chunk:
+    """A piece of a document sized for embedding."""
+    text: str
+    heading_path: Tuple[str, ...]
+    token_count: int
+    index: int = 0
+
+    @property
+    def section(self) -> str:
+        return " > ".join(self.heading_path)
+
+    @property
+    def page_content(self) -> str:
+        """Text to embed: the chunk prefixed with the section it belongs to."""
+        if self.heading_path:
+            return f"{self.section}\n\n{self.text}"
+        return self.text
+
+    def metadata(self) -> Dict[str, object]:
+        return {
+            "chunk_index": self.index,
+            "heading_path": self.section,
+            "token_count": self.token_count,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+_LIST_RE = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+_HTML_HINT_RE = re.compile(r'<(p|div|h[1-6]|ul|ol|li|pre|br|table|section|article)\b', re.IGNORECASE)
+
+
+def _push_heading(path: List[Tuple[int, str]], level: int, title: str) -> List[Tuple[int, str]]:
+    return [entry for entry in path if entry[0] < level] + [(level, title)]
+
+
+def _titles(path: List[Tuple[int, str]]) -> Tuple[str, ...]:
+    return tuple(title for _, title in path if title)
+
+
+def parse_markdown(text: str) -> List[Block]:
+    """Split markdown into blocks, tracking the heading path of each block."""
+    blocks: List[Block] = []
+    path: List[Tuple[int, str]] = []
+    buffer: List[str] = []
+    buffer_kind: Optional[str] = None
+
+    def flush():
+        if buffer:
+            body = "\n".join(buffer).strip()
+            if body:
+                blocks.append(Block(buffer_kind or "paragraph", body, _titles(path)))
+            buffer.clear()
+
+    lines = text.replace("\r\n", "\n").split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        fence = _FENCE_RE.match(line)
+        if fence:
+            flush()
+            buffer_kind = None
+            marker = fence.group(1)
+            code = [line]
+            i += 1
+            while i < len(lines):
+                code.append(lines[i])
+                i += 1
+                if lines[i - 1].strip().startswith(marker):
+                    break
+            blocks.append(Block("code", "\n".join(code).strip(), _titles(path)))
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush()
+            buffer_kind = None
+            path = _push_heading(path, len(heading.group(1)), heading.group(2).strip())
+            i += 1
+            continue
+
+        if not line.strip():
+            # Blank lines end a block, except between items of the same list
+            next_line = lines[i + 1] if i + 1 < len(lines) else ""
+            if not (buffer_kind == "list" and _LIST_RE.match(next_line)):
+                flush()
+                buffer_kind = None
+            i += 1
+            continue
+
+        stripped = line.lstrip()
+        if _LIST_RE.match(line) or (buffer_kind == "list" and line[:1] in (" ", "\t")):
+            kind = "list"
+        elif stripped.startswith("|"):
+            kind = "table"
+        elif stripped.startswith(">"):
+            kind = "quote"
+        else:
+            kind = "paragraph"
+        if buffer and kind != buffer_kind:
+            flush()
+        buffer_kind = kind
+        buffer.append(line)
+        i += 1
+
+    flush()
+    return blocks
+
+
+class _HTMLBlockParser(HTMLParser):
+    """Collects text from HTML into blocks, using headings as section markers."""
+
+    HEADINGS = {f"h{level}": level for level in range(1, 7)}
+    SKIP_TAGS = {"script", "style", "head", "title"}
+    PARAGRAPH_TAGS = {"p", "div", "section", "article", "header", "footer", "main", "aside", "figure", "dd", "dt"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Block] = []
+        self.path: List[Tuple[int, str]] = []
+        self.buffer: List[str] = []
+        self.kind = "paragraph"
+        self.skip_depth = 0
+        self.pre_depth = 0
+        self.list_depth = 0
+        self.heading_level: Optional[int] = None
+        self.heading_buffer: List[str] = []
+
+    def flush(self):
+        text = "".join(self.buffer)
+        self.buffer = []
+        if self.kind != "code":
+            text = "\n".join(re.sub(r"[ \t\f\v]+", " ", line).strip() for line in text.split("\n"))
+            text = re.sub(r"\n{2,}", "\n", text)
+        text = text.strip("\n").rstrip()
+        if text.strip():
+            self.blocks.append(Block(self.kind, text, _titles(self.path)))
+
+    def _current_kind(self) -> str:
+        if self.pre_depth:
+            return "code"
+        if self.list_depth:
+            return "list"
+        return "paragraph"
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.HEADINGS:
+            self.flush()
+            self.heading_level = self.HEADINGS[tag]
+            self.heading_buffer = []
+        elif tag in ("ul", "ol"):
+            if not self.list_depth:
+                self.flush()
+            self.list_depth += 1
+            self.kind = "list"
+        elif tag == "li":
+            indent = "  " * max(0, self.list_depth - 1)
+            self.buffer.append(f"\n{indent}- ")
+        elif tag == "pre":
+            self.flush()
+            self.pre_depth += 1
+            self.kind = "code"
+        elif tag == "table":
+            self.flush()
+            self.kind = "table"
+        elif tag == "tr":
+            self.buffer.append("\n|")
+        elif tag in ("td", "th"):
+            self.buffer.append(" ")
+        elif tag == "blockquote":
+            self.flush()
+            self.kind = "quote"
+        elif tag == "br":
+            self.buffer.append("\n")
+        elif tag in self.PARAGRAPH_TAGS and not self.list_depth and self.kind != "table":
+            self.flush()
+            self.kind = self._current_kind()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.HEADINGS and self.heading_level is not None:
+            title = re.sub(r"\s+", " ", "".join(self.heading_buffer)).strip()
+            self.path = _push_heading(self.path, self.heading_level, title)
+            self.heading_level = None
+        elif tag in ("ul", "ol"):
+            self.list_depth = max(0, self.list_depth - 1)
+            if not self.list_depth:
+                self.flush()
+                self.kind = self._current_kind()
+        elif tag == "pre":
+            self.flush()
+            self.pre_depth = max(0, self.pre_depth - 1)
+            self.kind = self._current_kind()
+        elif tag in ("td", "th"):
+            self.buffer.append(" |")
+        elif tag in ("table", "blockquote"):
+            self.flush()
+            self.kind = self._current_kind()
+        elif tag in self.PARAGRAPH_TAGS and not self.list_depth and self.kind != "table":
+            self.flush()
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.heading_level is not None:
+            self.heading_buffer.append(data)
+        elif self.pre_depth:
+            self.buffer.append(data)
+        else:
+            self.buffer.append(re.sub(r"\s+", " ", data))
+
+    def close(self):
+        super().close()
+        self.flush()
+
+
+def parse_html(html: str) -> List[Block]:
+    """Split HTML into blocks, tracking the heading path of each block."""
+    parser = _HTMLBlockParser()
+    parser.feed(html)
+    parser.close()
+    return parser.blocks
+
+
+def parse_content(text: str, fmt: str = "auto") -> List[Block]:
+    """Parse ``text`` as markdown or HTML; ``fmt='auto'`` sniffs for block-level tags."""
+    if not text:
+        return []
+    if fmt == "html" or (fmt == "auto" and _HTML_HINT_RE.search(text)):
+        return parse_html(text)
+    return parse_markdown(text)
+
+
+# ---------------------------------------------------------------------------
+# Near-duplicate detection
+# ---------------------------------------------------------------------------
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _normalise_words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+class NearDuplicateFilter:
+    """
+    Remembers chunks already emitted and rejects ones that repeat them.
+
+    A chunk is a duplicate when its normalised text hashes the same as an
+    earlier chunk, or when at least ``threshold`` of its word shingles are
+    contained in a single earlier chunk. Candidates are found through an
+    inverted index of shingle hashes, so only chunks that share text are
+    compared. One filter can be shared across documents to drop boilerplate
+    repeated between lessons.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_DEDUPE_THRESHOLD, shingle_size: int = 5):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._hashes: Set[str] = set()
+        self._shingles: List[Set[int]] = []
+        self._index: Dict[int, List[int]] = {}
+
+    def _shingle(self, words: List[str]) -> Set[int]:
+        size = min(self.shingle_size, len(words)) or 1
+        return {hash(" ".join(words[i:i + size])) for i in range(max(1, len(words) - size + 1))}
+
+    def is_duplicate(self, text: str, remember: bool = True) -> bool:
+        words = _normalise_words(text)
+        if not words:
+            return True
+        digest = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+        if digest in self._hashes:
+            return True
+
+        shingles = self._shingle(words)
+        overlap: Dict[int, int] = {}
+        for shingle in shingles:
+            for candidate in self._index.get(shingle, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+        for candidate, shared in overlap.items():
+            if shared / len(shingles) >= self.threshold:
+                return True
+
+        if remember:
+            self._hashes.add(digest)
+            position = len(self._shingles)
+            self._shingles.append(shingles)
+            for shingle in shingles:
+                self._index.setdefault(shingle, []).append(position)
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Chunking
+# ---------------------------------------------------------------------------
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+
+
+@dataclass
+class _Piece:
+    text: str
+    heading_path: Tuple[str, ...]
+    kind: str
+    tokens: int
+
+
+def _common_prefix(a: Tuple[str, ...], b: Tuple[str, ...]) -> Tuple[str, ...]:
+    prefix = []
+    for left, right in zip(a, b):
+        if left != right:
+            break
+        prefix.append(left)
+    return tuple(prefix)
+
+
+class ContentChunker:
+    """
+    Splits markdown or HTML into heading-scoped chunks within a token budget.
+
+    Whole blocks are packed into a chunk until the next block would exceed
+    ``max_tokens`` or belongs to a different section. Blocks that are too
+    large on their own are split on sentences (prose) or lines (code, lists,
+    tables). When a section is split, the last sentence of the previous chunk
+    is carried over if it fits in ``overlap_tokens``; tiny sections are
+    merged forward instead of becoming chunks of their own.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                 min_tokens: int = DEFAULT_MIN_TOKENS, dedupe_threshold: Optional[float] = DEFAULT_DEDUPE_THRESHOLD,
+                 token_counter=count_tokens):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.count_tokens = token_counter
+
+    def new_duplicate_filter(self) -> Optional[NearDuplicateFilter]:
+        if self.dedupe_threshold is None:
+            return None
+        return NearDuplicateFilter(self.dedupe_threshold)
+
+    def chunk(self, text: str, fmt: str = "auto",
+              duplicate_filter: Optional[NearDuplicateFilter] = None) -> List[Chunk]:
+        """Chunk a single document. Pass a shared ``duplicate_filter`` to dedupe across documents."""
+        if duplicate_filter is None:
+            duplicate_filter = self.new_duplicate_filter()
+
+        pieces: List[_Piece] = []
+        for block in parse_content(text or "", fmt):
+            pieces.extend(self._split_block(block))
+
+        chunks: List[Chunk] = []
+        current: List[_Piece] = []
+        current_tokens = 0
+        current_path: Tuple[str, ...] = ()
+
+        def emit():
+            body = "\n\n".join(piece.text for piece in current).strip()
+            if not body:
+                return
+            if duplicate_filter is not None and duplicate_filter.is_duplicate(body):
+                return
+            chunks.append(Chunk(body, current_path, self.count_tokens(body), len(chunks)))
+
+        for piece in pieces:
+            same_section = piece.heading_path == current_path
+            fits = current_tokens + piece.tokens <= self.max_tokens
+            if current and fits and (same_section or current_tokens < self.min_tokens):
+                if not same_section:
+                    current_path = _common_prefix(current_path, piece.heading_path)
+                current.append(piece)
+                current_tokens += piece.tokens
+                continue
+
+            carry = self._overlap(current) if current and same_section else None
+            if current:
+                emit()
+            current, current_tokens, current_path = [], 0, piece.heading_path
+            if carry is not None and carry.tokens + piece.tokens <= self.max_tokens:
+                current.append(carry)
+                current_tokens += carry.tokens
+            current.append(piece)
+            current_tokens += piece.tokens
+
+        if current:
+            emit()
+        return chunks
+
+    def _overlap(self, pieces: List[_Piece]) -> Optional[_Piece]:
+        """Carry the final sentence of a prose chunk into the next one, if it is short enough."""
+        if not self.overlap_tokens or pieces[-1].kind != "paragraph":
+            return None
+        last = pieces[-1]
+        sentence = _SENTENCE_RE.split(last.text)[-1].strip()
+        if not sentence or sentence == last.text:
+            return None
+        tokens = self.count_tokens(sentence)
+        if tokens > self.overlap_tokens:
+            return None
+        return _Piece(sentence, last.heading_path, last.kind, tokens)
+
+    def _split_block(self, block: Block) -> Iterable[_Piece]:
+        tokens = self.count_tokens(block.text)
+        if tokens <= self.max_tokens:
+            yield _Piece(block.text, block.heading_path, block.kind, tokens)
+            return
+
+        if block.kind == "paragraph" or block.kind == "quote":
+            units = [unit for unit in _SENTENCE_RE.split(block.text) if unit.strip()]
+            joiner = " "
+        else:
+            units = block.text.split("\n")
+            joiner = "\n"
+
+        buffer: List[str] = []
+        buffer_tokens = 0
+        for unit in units:
+            unit_tokens = self.count_tokens(unit)
+            if unit_tokens > self.max_tokens:
+                if buffer:
+                    text = joiner.join(buffer)
+                    yield _Piece(text, block.heading_path, block.kind, self.count_tokens(text))
+                    buffer, buffer_tokens = [], 0
+                for window in self._split_words(unit):
+                    yield _Piece(window, block.heading_path, block.kind, self.count_tokens(window))
+                continue
+            if buffer and buffer_tokens + unit_tokens > self.max_tokens:
+                text = joiner.join(buffer)
+                yield _Piece(text, block.heading_path, block.kind, self.count_tokens(text))
+                buffer, buffer_tokens = [], 0
+            buffer.append(unit)
+            buffer_tokens += unit_tokens
+        if buffer:
+            text = joiner.join(buffer)
+            yield _Piece(text, block.heading_path, block.kind, self.count_tokens(text))
+
+    def _split_words(self, text: str) -> Iterable[str]:
+        """Last resort for a single unit longer than the budget: fixed word windows."""
+        words = text.split()
+        tokens = self.count_tokens(text)
+        per_window = max(1, int(len(words) * self.max_tokens / max(tokens, 1)))
+        for start in range(0, len(words), per_window):
+            yield " ".join(words[start:start + per_window])
+
+
+default_chunker = ContentChunker()
+
+
+def chunk_text(text: str, fmt: str = "auto", chunker: Optional[ContentChunker] = None,
+               duplicate_filter: Optional[NearDuplicateFilter] = None) -> List[Chunk]:
+    """Chunk ``text`` with the default chunker (or the one given)."""
+    return (chunker or default_chunker).chunk(text, fmt=fmt, duplicate_filter=duplicate_filter)
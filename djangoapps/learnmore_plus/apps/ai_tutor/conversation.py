@@ -0,0 +1,107 @@
+"""
+Bounded conversation memory for the AI tutor.
+
+Only the most recent turns of a session are sent to the LLM word for word:
+they are fetched newest-first with a LIMIT and then trimmed from the oldest
+end to a token budget. Turns that have left that window are folded into a
+running summary kept on the session, so the prompt stays the same size
+however long a session runs.
+
+The module has no Django dependencies and is kept identical in learnmore_plus
+(apps/ai_tutor) and learnmore-reborn (ai_tutor); each project's test suite
+checks that the two copies still match, so change both together.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from .chunking import count_tokens
+
+logger = logging.getLogger(__name__)
+
+ROLE_LABELS = {"human": "Student", "ai": "Tutor"}
+
+SUMMARY_PROMPT = (
+    "You keep notes on a tutoring conversation for the tutor's own reference.\n"
+    "Update the notes with the new turns below. Keep the student's goals, what has been "
+    "explained, misconceptions and open questions; drop pleasantries. "
+    "Write at most {max_words} words.\n\n"
+    "Notes so far:\n{summary}\n\n"
+    "New turns:\n{transcript}\n\n"
+    "Updated notes:"
+)
+
+
+@dataclass
+class ConversationWindow:
+    """The part of a conversation that is sent to the LLM."""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    summary: str = ""
+    token_count: int = 0
+
+
+def fit_to_budget(turns: List[Dict[str, str]], token_budget: int,
+                  token_counter: Callable[[str], int] = count_tokens) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Keep the most recent turns that fit in ``token_budget`` tokens.
+
+    The newest turn is always kept, even if it alone exceeds the budget.
+    Returns the kept turns (oldest first) and their token count.
+    """
+    kept: List[Dict[str, str]] = []
+    total = 0
+    for turn in reversed(turns):
+        tokens = token_counter(turn["content"])
+        if kept and total + tokens > token_budget:
+            break
+        kept.append(turn)
+        total += tokens
+    kept.reverse()
+    return kept, total
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "start",
+                       token_counter: Callable[[str], int] = count_tokens) -> str:
+    """Cut ``text`` at a word boundary to at most ``max_tokens`` tokens, keeping its start or end."""
+    if token_counter(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        candidate = words[:middle] if keep == "start" else words[-middle:]
+        if token_counter(" ".join(candidate)) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    if not low:
+        return ""
+    return " ".join(words[:low] if keep == "start" else words[-low:])
+
+
+def format_transcript(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{ROLE_LABELS.get(turn['role'], turn['role'])}: {turn['content']}" for turn in turns)
+
+
+def summarize_turns(llm, summary: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+    """
+    Fold ``turns`` into the running ``summary``.
+
+    Uses ``llm`` when one is given; otherwise, or if the call fails, the most
+    recent part of the old summary and turns is kept word for word.
+    """
+    transcript = format_transcript(turns)
+    if llm is not None:
+        try:
+            result = llm.invoke(SUMMARY_PROMPT.format(
+                max_words=max(20, int(max_tokens / 1.3)),
+                summary=summary or "(none)",
+                transcript=transcript,
+            ))
+            text = str(getattr(result, "content", result)).strip()
+            if text:
+                return truncate_to_tokens(text, max_tokens, keep="start")
+        except Exception as e:
+            logger.warning(f"Could not summarise conversation, keeping recent turns instead: {str(e)}")
+    return truncate_to_tokens(f"{summary}\n{transcript}".strip(), max_tokens, keep="end")
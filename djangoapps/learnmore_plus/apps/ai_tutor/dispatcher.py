@@ -0,0 +1,240 @@
+"""
+Admission control for tutor LLM calls.
+
+A tutor reply holds a web worker for as long as the model takes to answer,
+so a class asking questions at once could tie up every worker and leave
+quiz and course pages waiting. Every LLM call now takes a slot from
+``tutor_dispatcher`` first:
+
+* at most AI_TUTOR_MAX_CONCURRENT_LLM_CALLS calls run at once in a process,
+  and at most AI_TUTOR_MAX_CONCURRENT_PER_USER of them for one student;
+* requests that cannot start wait in a queue, ordered by priority (a student
+  in the middle of a quiz first) and then by how recently each student was
+  served, so one busy student cannot crowd out the rest of the class;
+* a request that would wait longer than AI_TUTOR_QUEUE_TIMEOUT_SECONDS, or
+  finds the queue full, gets ``TutorBusy`` so the view can answer "busy,
+  try again" straight away instead of holding the worker.
+
+Queue times and rejections are kept for ``stats()``.
+
+The limits are per process. The web server runs gunicorn's threaded worker
+(``--worker-class gthread``, see the Procfile and railway.toml), so the
+dispatcher shares one set of slots between the threads of a worker, and a
+queued request holds a thread rather than a whole worker. The site-wide cap
+is the number of workers (WEB_CONCURRENCY) times
+AI_TUTOR_MAX_CONCURRENT_LLM_CALLS. Keep AI_TUTOR_MAX_CONCURRENT_LLM_CALLS
+plus AI_TUTOR_MAX_QUEUED below the worker's thread count, so page requests
+always find a free thread. Under sync workers every request has a process to
+itself, so the queue would never fill and only the per-process cap would
+apply.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterator, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_QUIZ = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_QUIZ: 'quiz', PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+# Students whose last turn is remembered for fair ordering
+MAX_TRACKED_USERS = 4096
+# Queue times kept for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+
+class TutorBusy(Exception):
+    """Raised when an LLM call cannot start within the queue timeout."""
+
+    def __init__(self, message: str = "The tutor is busy right now.", retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Ticket:
+    user_key: Hashable
+    priority: int
+    seq: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+class TutorDispatcher:
+    """Bounded, prioritised and fair admission of tutor LLM calls."""
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_per_user: Optional[int] = None,
+                 max_queued: Optional[int] = None, max_queued_per_user: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        self._max_concurrent = max_concurrent
+        self._max_per_user = max_per_user
+        self._max_queued = max_queued
+        self._max_queued_per_user = max_queued_per_user
+        self._queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: List[_Ticket] = []
+        self._running: Dict[Hashable, int] = {}
+        self._running_total = 0
+        self._last_served: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._counts = {'granted': 0, 'rejected': 0, 'timed_out': 0}
+        self._granted_by_priority: Dict[int, int] = {}
+
+    @property
+    def max_concurrent(self) -> int:
+        if self._max_concurrent is not None:
+            return self._max_concurrent
+        return int(getattr(settings, 'AI_TUTOR_MAX_CONCURRENT_LLM_CALLS', 4))
+
+    @property
+    def max_per_user(self) -> int:
+        if self._max_per_user is not None:
+            return self._max_per_user
+        return int(getattr(settings, 'AI_TUTOR_MAX_CONCURRENT_PER_USER', 1))
+
+    @property
+    def max_queued(self) -> int:
+        if self._max_queued is not None:
+            return self._max_queued
+        return int(getattr(settings, 'AI_TUTOR_MAX_QUEUED', 8))
+
+    @property
+    def max_queued_per_user(self) -> int:
+        if self._max_queued_per_user is not None:
+            return self._max_queued_per_user
+        return int(getattr(settings, 'AI_TUTOR_MAX_QUEUED_PER_USER', 2))
+
+    @property
+    def queue_timeout(self) -> float:
+        if self._queue_timeout is not None:
+            return self._queue_timeout
+        return float(getattr(settings, 'AI_TUTOR_QUEUE_TIMEOUT_SECONDS', 20))
+
+    @property
+    def retry_after(self) -> int:
+        return int(getattr(settings, 'AI_TUTOR_BUSY_RETRY_SECONDS', 5))
+
+    @contextmanager
+    def slot(self, user_key: Hashable, priority: int = PRIORITY_INTERACTIVE,
+             timeout: Optional[float] = None) -> Iterator[float]:
+        """
+        Hold one LLM call slot for the duration of the block.
+
+        Yields the seconds spent queueing. Raises ``TutorBusy`` if the slot
+        is not granted within ``timeout`` (default AI_TUTOR_QUEUE_TIMEOUT_SECONDS;
+        0 means only take a free slot).
+        """
+        ticket = self._acquire(user_key, priority, self.queue_timeout if timeout is None else timeout)
+        try:
+            yield time.monotonic() - ticket.enqueued_at
+        finally:
+            self._release(ticket)
+
+    def _acquire(self, user_key: Hashable, priority: int, timeout: float) -> _Ticket:
+        with self._cond:
+            queued_for_user = sum(1 for ticket in self._waiting if ticket.user_key == user_key)
+            if len(self._waiting) >= self.max_queued or queued_for_user >= self.max_queued_per_user:
+                self._counts['rejected'] += 1
+                raise TutorBusy(retry_after=self.retry_after)
+
+            ticket = _Ticket(user_key, priority, next(self._seq))
+            self._waiting.append(ticket)
+            self._dispatch()
+            deadline = ticket.enqueued_at + timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._counts['timed_out'] += 1
+                    logger.warning(f"Tutor request for {user_key} timed out after {timeout:.1f}s in the queue")
+                    raise TutorBusy(retry_after=self.retry_after)
+                self._cond.wait(remaining)
+
+            self._waits.append(time.monotonic() - ticket.enqueued_at)
+            return ticket
+
+    def _release(self, ticket: _Ticket) -> None:
+        with self._cond:
+            self._running_total -= 1
+            self._running[ticket.user_key] -= 1
+            if not self._running[ticket.user_key]:
+                del self._running[ticket.user_key]
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to waiting tickets; call with the lock held."""
+        granted = False
+        while self._waiting and self._running_total < self.max_concurrent:
+            eligible = [
+                ticket for ticket in self._waiting
+                if self._running.get(ticket.user_key, 0) < self.max_per_user
+            ]
+            if not eligible:
+                break
+            # Highest priority first; within a priority, the student served longest ago
+            ticket = min(eligible, key=lambda t: (t.priority, self._last_served.get(t.user_key, 0.0), t.seq))
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._running[ticket.user_key] = self._running.get(ticket.user_key, 0) + 1
+            self._running_total += 1
+            self._mark_served(ticket.user_key)
+            self._counts['granted'] += 1
+            self._granted_by_priority[ticket.priority] = self._granted_by_priority.get(ticket.priority, 0) + 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _mark_served(self, user_key: Hashable) -> None:
+        self._last_served[user_key] = time.monotonic()
+        self._last_served.move_to_end(user_key)
+        while len(self._last_served) > MAX_TRACKED_USERS:
+            self._last_served.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Current load and queue-time percentiles (in milliseconds) for this process."""
+        with self._cond:
+            waits = sorted(self._waits)
+            waiting_by_priority: Dict[str, int] = {}
+            for ticket in self._waiting:
+                name = PRIORITY_NAMES.get(ticket.priority, str(ticket.priority))
+                waiting_by_priority[name] = waiting_by_priority.get(name, 0) + 1
+            return {
+                'running': self._running_total,
+                'waiting': len(self._waiting),
+                'waiting_by_priority': waiting_by_priority,
+                'max_concurrent': self.max_concurrent,
+                'max_per_user': self.max_per_user,
+                'pid': os.getpid(),
+                **self._counts,
+                'granted_by_priority': {
+                    PRIORITY_NAMES.get(priority, str(priority)): count
+                    for priority, count in sorted(self._granted_by_priority.items())
+                },
+                'queue_ms': {
+                    'p50': _percentile(waits, 50) * 1000,
+                    'p95': _percentile(waits, 95) * 1000,
+                    'max': (waits[-1] if waits else 0.0) * 1000,
+                },
+            }
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+tutor_dispatcher = TutorDispatcher()
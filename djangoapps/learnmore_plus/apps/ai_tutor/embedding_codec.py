@@ -0,0 +1,84 @@
+"""
+Binary encoding of content embeddings.
+
+``ContentEmbedding`` vectors used to be stored as JSON text, 10-20 bytes per
+value, and every write sanitised the list one element at a time. They are now
+raw little-endian bytes in one of three encodings:
+
+* ``float32`` - 4 bytes per value, exact;
+* ``float16`` - 2 bytes per value, about 3 significant digits, which is
+  plenty for cosine similarity;
+* ``int8`` - 1 byte per value, symmetric linear quantisation with one
+  float scale per vector.
+
+``decode_vector`` reads float32 vectors with ``np.frombuffer`` without
+copying.
+"""
+
+from typing import Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ENCODING_FLOAT32 = 'float32'
+ENCODING_FLOAT16 = 'float16'
+ENCODING_INT8 = 'int8'
+ENCODING_DTYPES = {
+    ENCODING_FLOAT32: np.dtype('<f4'),
+    ENCODING_FLOAT16: np.dtype('<f2'),
+    ENCODING_INT8: np.dtype('i1'),
+}
+INT8_MAX = 127
+
+
+def as_float32(vector) -> np.ndarray:
+    """
+    Coerce an embedding to a flat float32 array.
+
+    Accepts lists, NumPy arrays and objects exposing their values through
+    ``tolist()``; NaN and infinite values become 0.
+    """
+    if hasattr(vector, 'tolist') and not isinstance(vector, np.ndarray):
+        vector = vector.tolist()
+    array = np.asarray(vector, dtype=np.float32).reshape(-1)
+    if not np.isfinite(array).all():
+        array = np.nan_to_num(array, nan=0.0, posinf=0.0, neginf=0.0)
+    return array
+
+
+def encode_vector(vector, encoding: str = ENCODING_FLOAT32) -> Tuple[bytes, float]:
+    """Return the bytes of ``vector`` in ``encoding`` and the scale needed to decode them."""
+    array = as_float32(vector)
+    if encoding == ENCODING_INT8:
+        peak = float(np.abs(array).max()) if array.size else 0.0
+        scale = peak / INT8_MAX if peak else 1.0
+        quantised = np.clip(np.rint(array / scale), -INT8_MAX, INT8_MAX).astype(ENCODING_DTYPES[ENCODING_INT8])
+        return quantised.tobytes(), scale
+    if encoding not in ENCODING_DTYPES:
+        raise ValueError(f"Unknown embedding encoding: {encoding}")
+    return array.astype(ENCODING_DTYPES[encoding]).tobytes(), 1.0
+
+
+def decode_vector(data, encoding: str = ENCODING_FLOAT32, scale: float = 1.0) -> np.ndarray:
+    """
+    Decode stored bytes to a float32 vector.
+
+    float32 data is returned as a read-only view of ``data`` (no copy).
+    """
+    values = np.frombuffer(data, dtype=ENCODING_DTYPES[encoding])
+    if encoding == ENCODING_FLOAT32:
+        return values
+    values = values.astype(np.float32)
+    if encoding == ENCODING_INT8:
+        values *= scale
+    return values
+
+
+def embedding_model_id(embeddings: Embeddings) -> str:
+    """Identify the model behind ``embeddings`` (class, model name and size where known)."""
+    parts = [type(embeddings).__name__]
+    for attribute in ('model', 'model_name', 'dimensions', 'size', 'base_url'):
+        value = getattr(embeddings, attribute, None)
+        if value:
+            parts.append(str(value))
+    return ":".join(parts)[:255]
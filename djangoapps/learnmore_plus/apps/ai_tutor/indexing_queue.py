@@ -0,0 +1,240 @@
+"""
+Deferred, debounced indexing of course content for the AI tutor.
+
+Saving a Content row used to embed and write to the vector store inside the
+post_save signal. The signal handlers now only record the content id here;
+the ids are handed to the queue once the surrounding transaction commits,
+repeated saves of the same content within the debounce window collapse into
+one entry, and a background worker indexes the pending ids in batches. A
+batch that fails (e.g. the embedding model is unreachable) is queued again,
+up to ``AI_TUTOR_INDEX_RETRIES`` times.
+
+Bulk operations (seed scripts, imports) can wrap their work in
+``suspend_indexing()`` so that nothing is indexed until the block exits,
+at which point every touched content item is reindexed in one pass.
+"""
+
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class ContentIndexQueue:
+    """Coalescing queue of content ids waiting to be (re)indexed or removed."""
+
+    def __init__(self, debounce_seconds: Optional[float] = None, batch_size: Optional[int] = None,
+                 max_retries: Optional[int] = None):
+        self._debounce_seconds = debounce_seconds
+        self._batch_size = batch_size
+        self._max_retries = max_retries
+        self._failures: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._pending_index: Set[int] = set()
+        self._pending_remove: Set[int] = set()
+        self._timer: Optional[threading.Timer] = None
+        self._registered_exit_flush = False
+        self._local = threading.local()
+
+    @property
+    def debounce_seconds(self) -> float:
+        if self._debounce_seconds is not None:
+            return self._debounce_seconds
+        return float(getattr(settings, 'AI_TUTOR_INDEX_DEBOUNCE_SECONDS', 2.0))
+
+    @property
+    def batch_size(self) -> int:
+        if self._batch_size is not None:
+            return self._batch_size
+        return int(getattr(settings, 'AI_TUTOR_INDEX_BATCH_SIZE', 32))
+
+    @property
+    def max_retries(self) -> int:
+        if self._max_retries is not None:
+            return self._max_retries
+        return int(getattr(settings, 'AI_TUTOR_INDEX_RETRIES', 3))
+
+    @property
+    def run_in_background(self) -> bool:
+        return bool(getattr(settings, 'AI_TUTOR_INDEX_IN_BACKGROUND', True)) and self.debounce_seconds > 0
+
+    # Suspension is tracked per thread so a bulk job does not pause indexing
+    # for requests being served by other threads of the same process.
+    def _suspended_state(self) -> Tuple[int, Set[int], Set[int]]:
+        if not hasattr(self._local, 'depth'):
+            self._local.depth = 0
+            self._local.index_ids = set()
+            self._local.remove_ids = set()
+        return self._local.depth, self._local.index_ids, self._local.remove_ids
+
+    @property
+    def is_suspended(self) -> bool:
+        return self._suspended_state()[0] > 0
+
+    def pending(self) -> Tuple[Set[int], Set[int]]:
+        """Return copies of the ids currently waiting to be indexed and removed."""
+        with self._lock:
+            return set(self._pending_index), set(self._pending_remove)
+
+    def enqueue_index(self, content_id: int) -> None:
+        """Schedule a content item to be indexed after the current transaction commits."""
+        self._enqueue(content_id, remove=False)
+
+    def enqueue_remove(self, content_id: int) -> None:
+        """Schedule a content item to be removed after the current transaction commits."""
+        self._enqueue(content_id, remove=True)
+
+    def _enqueue(self, content_id: int, remove: bool) -> None:
+        depth, index_ids, remove_ids = self._suspended_state()
+        if depth:
+            self._record(index_ids, remove_ids, [content_id], remove)
+            return
+        # The id travels with its own callback, so a rollback (of the whole
+        # transaction or of a savepoint) discards it along with the callback.
+        transaction.on_commit(partial(self.add, [content_id], remove=remove))
+
+    @staticmethod
+    def _record(index_ids: Set[int], remove_ids: Set[int], content_ids: Iterable[int], remove: bool) -> None:
+        # The latest operation on an id wins: a delete cancels a pending index and vice versa
+        for content_id in content_ids:
+            if remove:
+                index_ids.discard(content_id)
+                remove_ids.add(content_id)
+            else:
+                remove_ids.discard(content_id)
+                index_ids.add(content_id)
+
+    def add(self, content_ids: Iterable[int], remove: bool = False) -> None:
+        """Add committed content ids to the queue and make sure a flush is scheduled."""
+        if remove:
+            self._add_many((), content_ids)
+        else:
+            self._add_many(content_ids, ())
+
+    def _add_many(self, index_ids: Iterable[int], remove_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._record(self._pending_index, self._pending_remove, remove_ids, remove=True)
+            self._record(self._pending_index, self._pending_remove, index_ids, remove=False)
+            if not self.run_in_background:
+                schedule_now = True
+            else:
+                schedule_now = False
+                self._schedule_flush()
+        if schedule_now:
+            self.flush()
+
+    def _schedule_flush(self) -> None:
+        # Called with the lock held
+        if self._timer is None:
+            self._timer = threading.Timer(self.debounce_seconds, self._run_worker)
+            self._timer.daemon = True
+            self._timer.start()
+            if not self._registered_exit_flush:
+                # Short-lived processes (management commands) exit before the timer fires
+                atexit.register(self.flush)
+                self._registered_exit_flush = True
+
+    def _run_worker(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error processing content index queue: {str(e)}")
+        finally:
+            close_old_connections()
+
+    def flush(self) -> int:
+        """
+        Index everything that is pending, in batches.
+
+        Returns:
+            Number of content items indexed
+        """
+        from apps.courses.models import Content
+        from .services import ContentIndexingService
+
+        with self._lock:
+            index_ids = sorted(self._pending_index)
+            remove_ids = sorted(self._pending_remove)
+            self._pending_index.clear()
+            self._pending_remove.clear()
+
+        if remove_ids:
+            ContentIndexingService.remove_content_ids(remove_ids)
+
+        indexed = 0
+        for start in range(0, len(index_ids), self.batch_size):
+            batch = index_ids[start:start + self.batch_size]
+            contents = list(Content.objects.select_related('module__course').filter(pk__in=batch))
+            try:
+                indexed += ContentIndexingService.index_contents(contents)
+            except Exception as e:
+                logger.error(f"Error indexing content batch {batch}: {str(e)}")
+                self._retry(batch)
+            else:
+                with self._lock:
+                    for content_id in batch:
+                        self._failures.pop(content_id, None)
+        return indexed
+
+    def _retry(self, content_ids: Iterable[int]) -> None:
+        """Queue a failed batch again, dropping ids that have used up their retries."""
+        # Inline indexing has no timer to wait for, so a retry would spin
+        if not self.run_in_background:
+            return
+        with self._lock:
+            for content_id in content_ids:
+                attempts = self._failures.get(content_id, 0) + 1
+                if attempts > self.max_retries:
+                    self._failures.pop(content_id, None)
+                    logger.error(f"Giving up indexing content {content_id} after {attempts} attempts")
+                elif content_id not in self._pending_remove:
+                    self._failures[content_id] = attempts
+                    self._pending_index.add(content_id)
+            if self._pending_index:
+                self._schedule_flush()
+
+    @contextmanager
+    def suspended(self, reindex: bool = True):
+        """
+        Suspend indexing for the current thread.
+
+        Content saved or deleted inside the block is remembered and, when the
+        outermost block exits, reindexed in one pass after commit (or dropped
+        when ``reindex`` is False, e.g. when the caller reindexes everything
+        itself).
+        """
+        depth, index_ids, remove_ids = self._suspended_state()
+        self._local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                index_ids, remove_ids = self._local.index_ids, self._local.remove_ids
+                self._local.index_ids, self._local.remove_ids = set(), set()
+                if reindex and (index_ids or remove_ids):
+                    transaction.on_commit(lambda: self._reindex_now(index_ids, remove_ids))
+
+    def _reindex_now(self, index_ids: Set[int], remove_ids: Set[int]) -> None:
+        # The bulk job pays for its own reindex instead of leaving it to the timer
+        with self._lock:
+            self._record(self._pending_index, self._pending_remove, remove_ids, remove=True)
+            self._record(self._pending_index, self._pending_remove, index_ids, remove=False)
+        self.flush()
+
+
+content_index_queue = ContentIndexQueue()
+
+
+def suspend_indexing(reindex: bool = True):
+    """Context manager / decorator that defers content indexing until the block exits."""
+    return content_index_queue.suspended(reindex=reindex)
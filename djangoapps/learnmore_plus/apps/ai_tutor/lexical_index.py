@@ -0,0 +1,486 @@
+"""
+In-process BM25 index over tutor chunks, fused with vector search.
+
+Vector search alone finds paraphrases well but misses exact terms such as
+function names, course codes and acronyms. ``BM25Index`` is a small inverted
+index over the same chunks that are stored in the vector store. Each posting
+list is a pair of compact ``array`` buffers (row numbers and term
+frequencies), scoring is vectorised with NumPy, and documents can be added or
+removed incrementally. ``hybrid_search`` runs both searches and merges them
+with reciprocal-rank fusion, so a chunk that ranks well in either list
+surfaces near the top.
+
+The module has no Django dependencies and is kept identical in learnmore_plus
+(apps/ai_tutor) and learnmore-reborn (ai_tutor); each project's test suite
+checks that the two copies still match, so change both together.
+"""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+RRF_K = 60
+NO_ID = -1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[_.][a-z0-9]+)*")
+_SUBTOKEN_RE = re.compile(r"[_.]")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i in is it its of on or "
+    "that the their then there these this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case word tokens with stopwords removed.
+
+    Identifiers such as ``get_relevant_knowledge`` or ``os.path`` are kept
+    whole and also split into their parts, so either form matches.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "_" in token or "." in token:
+            tokens.extend(part for part in _SUBTOKEN_RE.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value) if value is not None else NO_ID
+    except (TypeError, ValueError):
+        return NO_ID
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """Incrementally updatable BM25 index with course/module filtering."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.signature = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._term_ids: Dict[str, int] = {}
+        self._posting_rows: List[array] = []
+        self._posting_tfs: List[array] = []
+        self._df = array("I")
+        self._doc_ids: List[Hashable] = []
+        self._doc_terms: List[Optional[array]] = []
+        self._texts: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._lengths = array("I")
+        self._courses = array("i")
+        self._modules = array("i")
+        self._alive = bytearray()
+        self._row_by_id: Dict[Hashable, int] = {}
+        self._id_by_text: Dict[str, Hashable] = {}
+        self._live = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._row_by_id
+
+    def lookup_id(self, text: str) -> Optional[Hashable]:
+        """Return the id of a stored document with exactly this text, if any."""
+        return self._id_by_text.get(_text_key(text))
+
+    def add(self, doc_id: Hashable, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Add a document, replacing any existing document with the same id."""
+        metadata = metadata or {}
+        with self._lock:
+            if doc_id in self._row_by_id:
+                self._remove_row(self._row_by_id.pop(doc_id))
+
+            counts = Counter(tokenize(text))
+            row = len(self._doc_ids)
+            terms = array("I")
+            for term, tf in counts.items():
+                term_id = self._term_ids.get(term)
+                if term_id is None:
+                    term_id = self._term_ids[term] = len(self._posting_rows)
+                    self._posting_rows.append(array("I"))
+                    self._posting_tfs.append(array("H"))
+                    self._df.append(0)
+                self._posting_rows[term_id].append(row)
+                self._posting_tfs[term_id].append(min(tf, 0xFFFF))
+                self._df[term_id] += 1
+                terms.append(term_id)
+
+            length = sum(counts.values())
+            self._doc_ids.append(doc_id)
+            self._doc_terms.append(terms)
+            self._texts.append(text)
+            self._metadatas.append(metadata)
+            self._lengths.append(length)
+            self._courses.append(_as_int(metadata.get("course_id")))
+            self._modules.append(_as_int(metadata.get("module_id")))
+            self._alive.append(1)
+            self._row_by_id[doc_id] = row
+            self._id_by_text[_text_key(text)] = doc_id
+            self._live += 1
+            self._total_length += length
+
+    def add_many(self, documents: Iterable[Tuple[Hashable, str, Optional[Dict[str, Any]]]]) -> None:
+        for doc_id, text, metadata in documents:
+            self.add(doc_id, text, metadata)
+
+    def rebuild(self, documents: Iterable[Tuple[Hashable, str, Optional[Dict[str, Any]]]], signature) -> bool:
+        """
+        Replace the contents with ``documents`` unless the index is already
+        built for ``signature``. ``documents`` is only consumed when a rebuild
+        is needed, so it may be lazy. Returns whether the index was rebuilt.
+        """
+        with self._lock:
+            if self.signature is not None and self.signature == signature:
+                return False
+            self._reset()
+            self.add_many(documents)
+            self.signature = signature
+            return True
+
+    def remove(self, doc_id: Hashable) -> bool:
+        with self._lock:
+            row = self._row_by_id.pop(doc_id, None)
+            if row is None:
+                return False
+            self._remove_row(row)
+            # Postings of removed rows are only skipped at query time; rebuild once they pile up
+            dead = len(self._doc_ids) - self._live
+            if dead > 1000 and dead > len(self._doc_ids) // 4:
+                self._compact()
+            return True
+
+    def remove_matching(self, field: str, values: Iterable[Any]) -> int:
+        """Remove every document whose metadata ``field`` is one of ``values``."""
+        values = set(values)
+        with self._lock:
+            doc_ids = [
+                doc_id for doc_id, row in self._row_by_id.items()
+                if self._metadatas[row].get(field) in values
+            ]
+            for doc_id in doc_ids:
+                self.remove(doc_id)
+            return len(doc_ids)
+
+    def _remove_row(self, row: int) -> None:
+        for term_id in self._doc_terms[row]:
+            self._df[term_id] -= 1
+        self._id_by_text.pop(_text_key(self._texts[row]), None)
+        self._alive[row] = 0
+        self._live -= 1
+        self._total_length -= self._lengths[row]
+        self._doc_terms[row] = None
+        self._texts[row] = None
+        self._metadatas[row] = None
+
+    def _compact(self) -> None:
+        live = [
+            (self._doc_ids[row], self._texts[row], self._metadatas[row])
+            for row in range(len(self._doc_ids)) if self._alive[row]
+        ]
+        self._reset()
+        self.add_many(live)
+
+    def search(self, query: str, k: int = 10, course_id: Optional[int] = None,
+               module_id: Optional[int] = None) -> List[Tuple[Hashable, str, Dict[str, Any], float]]:
+        """Return up to ``k`` (id, text, metadata, score) tuples with a positive BM25 score."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._live or k <= 0:
+                return []
+            rows_count = len(self._doc_ids)
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            norms = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / self._live))
+            scores = np.zeros(rows_count, dtype=np.float32)
+            for term in terms:
+                term_id = self._term_ids.get(term)
+                if term_id is None or not self._df[term_id]:
+                    continue
+                df = self._df[term_id]
+                idf = math.log(1 + (self._live - df + 0.5) / (df + 0.5))
+                rows = np.frombuffer(self._posting_rows[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._posting_tfs[term_id], dtype=np.uint16).astype(np.float32)
+                scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norms[rows])
+                del rows
+
+            mask = (scores > 0) & np.frombuffer(self._alive, dtype=np.bool_)
+            if course_id is not None:
+                mask &= np.frombuffer(self._courses, dtype=np.int32) == course_id
+            if module_id is not None:
+                mask &= np.frombuffer(self._modules, dtype=np.int32) == module_id
+            candidates = np.flatnonzero(mask)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [
+                (self._doc_ids[row], self._texts[row], self._metadatas[row], float(scores[row]))
+                for row in candidates.tolist()
+            ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[Hashable, float]]:
+    """
+    Merge ranked lists of keys: each key scores ``sum(weight / (k + rank))``.
+
+    Returns (key, score) pairs, best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def split_filter(filter: Optional[dict]) -> Tuple[Optional[int], Optional[int], Dict[str, Any]]:
+    """Turn a Chroma-style equality filter into (course_id, module_id, other conditions)."""
+    conditions: Dict[str, Any] = {}
+
+    def collect(clause):
+        for key, value in (clause or {}).items():
+            if key == "$and":
+                for sub_clause in value:
+                    collect(sub_clause)
+            elif isinstance(value, dict):
+                if set(value) != {"$eq"}:
+                    raise ValueError(f"Unsupported filter on '{key}': {value}")
+                conditions[key] = value["$eq"]
+            else:
+                conditions[key] = value
+
+    collect(filter)
+    course_id = conditions.pop("course_id", None)
+    module_id = conditions.pop("module_id", None)
+    return (
+        _as_int(course_id) if course_id is not None else None,
+        _as_int(module_id) if module_id is not None else None,
+        conditions,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Vector store integration
+# ---------------------------------------------------------------------------
+
+_indexes: Dict[Hashable, BM25Index] = {}
+_indexes_lock = threading.Lock()
+_versions: Dict[Hashable, Callable[[], Hashable]] = {}
+
+
+def _store_key(vector_store: VectorStore) -> Hashable:
+    index = getattr(vector_store, "index", None)
+    if index is not None and hasattr(index, "path"):
+        return ("numpy", index.path)
+    collection = getattr(vector_store, "_collection", None)
+    if collection is not None:
+        return ("chroma", getattr(vector_store, "_persist_directory", None), collection.name)
+    return ("store", id(vector_store))
+
+
+def register_store_version(vector_store: VectorStore, version: Callable[[], Hashable]) -> None:
+    """
+    Tell the BM25 index of ``vector_store`` how to see that the store changed.
+
+    ``version()`` must return a cheap value, shared between processes, that
+    every write to the store changes. Stores whose documents are edited in
+    place need one: without it a Chroma store is only compared by collection
+    and chunk count.
+    """
+    _versions[_store_key(vector_store)] = version
+
+
+def _store_signature(vector_store: VectorStore) -> Hashable:
+    """Cheap value that changes when another process writes to the store."""
+    version = _versions.get(_store_key(vector_store))
+    if version is not None:
+        return version()
+    index = getattr(vector_store, "index", None)
+    if index is not None and hasattr(index, "version"):
+        index.refresh()
+        return index.version
+    collection = getattr(vector_store, "_collection", None)
+    if collection is not None:
+        # A recreated store gets a new collection id; appends change the count
+        return getattr(collection, "id", None), collection.count()
+    return None
+
+
+def _store_documents(vector_store: VectorStore) -> Iterable[Tuple[Hashable, str, Dict[str, Any]]]:
+    index = getattr(vector_store, "index", None)
+    if index is not None and hasattr(index, "iter_documents"):
+        yield from index.iter_documents()
+        return
+    data = vector_store.get(include=["documents", "metadatas"])
+    yield from zip(data["ids"], data["documents"], [metadata or {} for metadata in data["metadatas"]])
+
+
+def get_lexical_index(vector_store: VectorStore) -> BM25Index:
+    """Return the BM25 index mirroring ``vector_store``, (re)building it when the store has changed."""
+    key = _store_key(vector_store)
+    with _indexes_lock:
+        index = _indexes.setdefault(key, BM25Index())
+    if index.rebuild(_store_documents(vector_store), _store_signature(vector_store)):
+        logger.info(f"Built BM25 index with {len(index)} chunks")
+    return index
+
+
+def record_added(vector_store: VectorStore, ids: Sequence[Hashable], documents: Sequence[Document]) -> None:
+    """Mirror documents just written to ``vector_store`` into its BM25 index, if one is loaded."""
+    index = _indexes.get(_store_key(vector_store))
+    if index is None:
+        return
+    with index._lock:
+        for doc_id, document in zip(ids, documents):
+            index.add(doc_id, document.page_content, document.metadata)
+        index.signature = _store_signature(vector_store)
+
+
+def record_removed(vector_store: VectorStore, ids: Sequence[Hashable]) -> None:
+    """Drop documents just deleted from ``vector_store`` from its BM25 index, if one is loaded."""
+    index = _indexes.get(_store_key(vector_store))
+    if index is None:
+        return
+    with index._lock:
+        for doc_id in ids:
+            index.remove(doc_id)
+        index.signature = _store_signature(vector_store)
+
+
+def record_removed_matching(vector_store: VectorStore, field: str, values: Iterable[Any]) -> None:
+    """Drop documents deleted from ``vector_store`` by a metadata condition from its BM25 index."""
+    index = _indexes.get(_store_key(vector_store))
+    if index is None:
+        return
+    with index._lock:
+        index.remove_matching(field, values)
+        index.signature = _store_signature(vector_store)
+
+
+def hybrid_search(vector_store: VectorStore, query: str, k: int = 4, filter: Optional[dict] = None,
+                  fetch_k: Optional[int] = None, embedding: Optional[List[float]] = None) -> List[Document]:
+    """
+    Retrieve ``k`` chunks by fusing vector similarity and BM25 rankings.
+
+    Both searches fetch ``fetch_k`` candidates (default ``3 * k``) within the
+    same course/module filter; the lists are merged with reciprocal-rank
+    fusion. If the lexical index cannot be built the vector results are
+    returned unchanged. Pass ``embedding`` when the query vector is already
+    known to skip embedding the query again.
+    """
+    return [doc for doc, _ in hybrid_search_with_scores(vector_store, query, k, filter, fetch_k, embedding)]
+
+
+def hybrid_search_with_scores(vector_store: VectorStore, query: str, k: int = 4, filter: Optional[dict] = None,
+                              fetch_k: Optional[int] = None,
+                              embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """
+    ``hybrid_search`` returning (document, score) pairs.
+
+    The score is the fused score relative to the best one possible (first in
+    both rankings), so it lies in (0, 1].
+    """
+    fetch_k = fetch_k or max(3 * k, 10)
+    if embedding is not None:
+        vector_docs = vector_store.similarity_search_by_vector(embedding, k=fetch_k, filter=filter)
+    elif filter:
+        vector_docs = vector_store.similarity_search(query, k=fetch_k, filter=filter)
+    else:
+        vector_docs = vector_store.similarity_search(query, k=fetch_k)
+    return _fuse_with_lexical(vector_store, query, vector_docs, k, filter, fetch_k)
+
+
+async def ahybrid_search(vector_store: VectorStore, query: str, k: int = 4, filter: Optional[dict] = None,
+                         fetch_k: Optional[int] = None) -> List[Document]:
+    """
+    Async ``hybrid_search``: the query embedding request is awaited and only
+    the local vector/BM25 scoring runs in an executor thread.
+    """
+    fetch_k = fetch_k or max(3 * k, 10)
+    embeddings = getattr(vector_store, "embeddings", None)
+    if embeddings is None:
+        return await run_in_executor(None, hybrid_search, vector_store, query, k, filter, fetch_k)
+
+    embedding = await embeddings.aembed_query(query)
+
+    def search() -> List[Document]:
+        if filter:
+            vector_docs = vector_store.similarity_search_by_vector(embedding, k=fetch_k, filter=filter)
+        else:
+            vector_docs = vector_store.similarity_search_by_vector(embedding, k=fetch_k)
+        return [doc for doc, _ in _fuse_with_lexical(vector_store, query, vector_docs, k, filter, fetch_k)]
+
+    return await run_in_executor(None, search)
+
+
+def _fuse_with_lexical(vector_store: VectorStore, query: str, vector_docs: List[Document], k: int,
+                       filter: Optional[dict], fetch_k: int) -> List[Tuple[Document, float]]:
+    best = 2.0 / (RRF_K + 1)
+    try:
+        lexical_index = get_lexical_index(vector_store)
+        course_id, module_id, extra = split_filter(filter)
+        lexical_hits = [
+            hit for hit in lexical_index.search(query, fetch_k, course_id, module_id)
+            if all(hit[2].get(key) == value for key, value in extra.items())
+        ]
+    except Exception as e:
+        logger.error(f"Lexical search failed, using vector results only: {str(e)}")
+        fused = reciprocal_rank_fusion([range(len(vector_docs))])
+        return [(vector_docs[row], score / best) for row, score in fused[:k]]
+
+    documents: Dict[Hashable, Document] = {}
+    vector_ranking = []
+    for doc in vector_docs:
+        key = getattr(doc, "id", None) or lexical_index.lookup_id(doc.page_content) or _text_key(doc.page_content)
+        documents.setdefault(key, doc)
+        vector_ranking.append(key)
+    lexical_ranking = []
+    for doc_id, text, metadata, _ in lexical_hits:
+        documents.setdefault(doc_id, Document(page_content=text, metadata=dict(metadata), id=str(doc_id)))
+        lexical_ranking.append(doc_id)
+
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking])
+    return [(documents[key], score / best) for key, score in fused[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever wrapping ``hybrid_search``."""
+
+    vector_store: Any
+    k: int = 4
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        return hybrid_search(self.vector_store, query, k=self.k, filter=self.filter)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: Optional[AsyncCallbackManagerForRetrieverRun] = None
+                                       ) -> List[Document]:
+        return await ahybrid_search(self.vector_store, query, k=self.k, filter=self.filter)
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.conf import settings
 from apps.ai_tutor.services import ContentIndexingService
 from apps.courses.models import Content
 
@@ -11,35 +12,58 @@ class Command(BaseCommand):
             action='store_true',
             help='Force reindexing of all content, even if already indexed',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'AI_TUTOR_INDEX_BATCH_SIZE', 32),
+            help='Number of content items embedded per batch',
+        )
 
     def handle(self, *args, **options):
         force = options.get('force', False)
-        
+        batch_size = max(1, options.get('batch_size') or 32)
+
         # Count content items
         total_content = Content.objects.count()
         self.stdout.write(f"Found {total_content} content items to index")
-        
+
         # Index all content
         indexed_count = 0
         skipped_count = 0
         error_count = 0
-        
-        for content in Content.objects.select_related('module__course').all():
-            try:
-                if force or not hasattr(content, 'embedding'):
-                    ContentIndexingService.index_content(content)
-                    indexed_count += 1
-                    self.stdout.write(f"Indexed: {content.title} (ID: {content.id})")
-                else:
-                    skipped_count += 1
-                    self.stdout.write(f"Skipped already indexed: {content.title} (ID: {content.id})")
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(self.style.ERROR(f"Error indexing {content.title} (ID: {content.id}): {str(e)}"))
-        
+
+        batch = []
+        for content in Content.objects.select_related('module__course', 'embedding').iterator(chunk_size=batch_size):
+            if force or not hasattr(content, 'embedding'):
+                batch.append(content)
+            else:
+                skipped_count += 1
+                self.stdout.write(f"Skipped already indexed: {content.title} (ID: {content.id})")
+            if len(batch) >= batch_size:
+                indexed, errors = self._index_batch(batch)
+                indexed_count += indexed
+                error_count += errors
+                batch = []
+        if batch:
+            indexed, errors = self._index_batch(batch)
+            indexed_count += indexed
+            error_count += errors
+
         # Print summary
         self.stdout.write(self.style.SUCCESS(f"Indexing complete:"))
         self.stdout.write(f"  - Total content items: {total_content}")
         self.stdout.write(f"  - Newly indexed: {indexed_count}")
         self.stdout.write(f"  - Skipped (already indexed): {skipped_count}")
-        self.stdout.write(f"  - Errors: {error_count}")
\ No newline at end of file
+        self.stdout.write(f"  - Errors: {error_count}")
+
+    def _index_batch(self, batch):
+        """Index one batch, returning (indexed, errors)."""
+        try:
+            indexed = ContentIndexingService.index_contents(batch)
+            for content in batch:
+                self.stdout.write(f"Indexed: {content.title} (ID: {content.id})")
+            return indexed, 0
+        except Exception as e:
+            ids = ', '.join(str(content.id) for content in batch)
+            self.stdout.write(self.style.ERROR(f"Error indexing batch (IDs: {ids}): {str(e)}"))
+            return 0, len(batch)
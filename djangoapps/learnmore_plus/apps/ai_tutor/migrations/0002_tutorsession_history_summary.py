@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_tutor", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tutorsession",
+            name="history_summary",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="tutorsession",
+            name="history_summary_until",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
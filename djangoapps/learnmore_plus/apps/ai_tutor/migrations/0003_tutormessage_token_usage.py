@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_tutor", "0002_tutorsession_history_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tutormessage",
+            name="completion_tokens",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tutormessage",
+            name="prompt_tokens",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
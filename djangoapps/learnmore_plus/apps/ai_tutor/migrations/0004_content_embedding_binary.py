@@ -0,0 +1,74 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:04
+
+import json
+
+from django.db import migrations, models
+import numpy as np
+
+
+def json_vectors_to_float32(apps, schema_editor):
+    ContentEmbedding = apps.get_model("ai_tutor", "ContentEmbedding")
+    for embedding in ContentEmbedding.objects.only("id", "embedding_vector").iterator(chunk_size=500):
+        try:
+            values = np.asarray(json.loads(embedding.embedding_vector or "[]"), dtype="<f4").reshape(-1)
+        except (TypeError, ValueError):
+            values = np.zeros(0, dtype="<f4")
+        ContentEmbedding.objects.filter(pk=embedding.pk).update(
+            vector=values.tobytes(), dimension=values.size, encoding="float32", scale=1.0
+        )
+
+
+def float32_vectors_to_json(apps, schema_editor):
+    ContentEmbedding = apps.get_model("ai_tutor", "ContentEmbedding")
+    for embedding in ContentEmbedding.objects.only("id", "vector", "encoding", "scale").iterator(chunk_size=500):
+        dtype = {"float32": "<f4", "float16": "<f2", "int8": "i1"}[embedding.encoding]
+        values = np.frombuffer(bytes(embedding.vector), dtype=dtype).astype(np.float32)
+        if embedding.encoding == "int8":
+            values *= embedding.scale
+        ContentEmbedding.objects.filter(pk=embedding.pk).update(embedding_vector=json.dumps(values.tolist()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_tutor", "0003_tutormessage_token_usage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contentembedding",
+            name="dimension",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="contentembedding",
+            name="encoding",
+            field=models.CharField(choices=[("float32", "float32"), ("float16", "float16"), ("int8", "int8 (quantised)")], default="float32", max_length=8),
+        ),
+        migrations.AddField(
+            model_name="contentembedding",
+            name="model_id",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="contentembedding",
+            name="scale",
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AddField(
+            model_name="contentembedding",
+            name="vector",
+            field=models.BinaryField(default=bytes),
+        ),
+        # A default lets the column be re-added to existing rows when migrating backwards
+        migrations.AlterField(
+            model_name="contentembedding",
+            name="embedding_vector",
+            field=models.TextField(default="[]"),
+        ),
+        migrations.RunPython(json_vectors_to_float32, float32_vectors_to_json),
+        migrations.RemoveField(
+            model_name="contentembedding",
+            name="embedding_vector",
+        ),
+    ]
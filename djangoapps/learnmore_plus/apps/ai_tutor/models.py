@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from apps.courses.models import Course, Module, Content
+from .embedding_codec import (
+    ENCODING_DTYPES, ENCODING_FLOAT16, ENCODING_FLOAT32, ENCODING_INT8, decode_vector, encode_vector,
+)
 
 User = get_user_model()
 
@@ -23,6 +26,9 @@ class TutorSession(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     llm_model = models.CharField(max_length=50, default='default')  # to track which LLM was used
+    # Running summary of the turns that no longer fit in the prompt, and the last message it covers
+    history_summary = models.TextField(blank=True)
+    history_summary_until = models.PositiveIntegerField(null=True, blank=True)
     
     class Meta:
         ordering = ['-updated_at']
@@ -85,6 +91,9 @@ class TutorMessage(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     tokens_used = models.PositiveIntegerField(default=0)  # For tracking token usage
+    # Prompt and completion tokens of an assistant reply, as reported by the provider where possible
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
     relevant_context_used = models.ManyToManyField(TutorContextItem, blank=True, related_name='used_in_messages')
     
     class Meta:
@@ -99,8 +108,19 @@ class TutorMessage(models.Model):
 
 class ContentEmbedding(models.Model):
     """Model to store vector embeddings for content."""
+    ENCODING_CHOICES = [
+        (ENCODING_FLOAT32, 'float32'),
+        (ENCODING_FLOAT16, 'float16'),
+        (ENCODING_INT8, 'int8 (quantised)'),
+    ]
+    
     content = models.OneToOneField(Content, on_delete=models.CASCADE, related_name='embedding')
-    embedding_vector = models.TextField()  # JSON-serialized embedding vector
+    # Raw little-endian vector bytes; see embedding_codec
+    vector = models.BinaryField(default=bytes)
+    dimension = models.PositiveIntegerField(default=0)
+    encoding = models.CharField(max_length=8, choices=ENCODING_CHOICES, default=ENCODING_FLOAT32)
+    scale = models.FloatField(default=1.0)  # Dequantisation factor for int8 vectors
+    model_id = models.CharField(max_length=255, blank=True)  # Embedding model that produced the vector
     chunk_text = models.TextField()  # The text chunk that was embedded
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -111,4 +131,15 @@ class ContentEmbedding(models.Model):
         ]
     
     def __str__(self):
-        return f"Embedding for {self.content}"
\ No newline at end of file
+        return f"Embedding for {self.content}"
+    
+    def set_vector(self, vector, encoding=ENCODING_FLOAT32, model_id=''):
+        """Encode ``vector`` into this row's binary fields."""
+        self.vector, self.scale = encode_vector(vector, encoding)
+        self.dimension = len(self.vector) // ENCODING_DTYPES[encoding].itemsize
+        self.encoding = encoding
+        self.model_id = model_id
+    
+    def as_array(self):
+        """The vector as a float32 NumPy array (a view of the stored bytes for float32)."""
+        return decode_vector(bytes(self.vector), self.encoding, self.scale)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Token budgeting for tutor prompts.
+
+A tutor prompt is made of the opening system message, the course material
+retrieved for the question, a summary of older turns and the recent turns
+themselves. Each of those used to be sent whole, so a long lesson or a long
+session could push the prompt past the model's context window (or just make
+every reply slow and expensive). The planner here measures every part with
+the cached tokenizer and fits them into the context window, in priority
+order: the system prompt and the newest turn (the question) first, then retrieved material
+(best match first), then the summary, then as many recent turns as still fit.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from .chunking import count_tokens
+from .conversation import truncate_to_tokens
+
+# Tokens the chat format adds around each message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# A retrieved item cut shorter than this is more noise than help
+MIN_CONTEXT_ITEM_TOKENS = 48
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+CONTEXT_PREFIX = "Relevant course material:\n\n"
+
+
+@dataclass
+class PromptPlan:
+    """The messages to send and how many tokens each part of the prompt takes."""
+    messages: List[BaseMessage] = field(default_factory=list)
+    context_items: List = field(default_factory=list)
+    token_counts: Dict[str, int] = field(default_factory=dict)
+    # Tokens left free for the reply; the LLM is asked to stop there
+    max_completion_tokens: int = 0
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(self.token_counts.values())
+
+
+class PromptBudgetPlanner:
+    """Fit a tutor prompt into the model's context window."""
+
+    def __init__(self, context_window: Optional[int] = None, max_completion_tokens: Optional[int] = None,
+                 system_max_tokens: Optional[int] = None, context_max_tokens: Optional[int] = None,
+                 token_counter: Callable[[str], int] = count_tokens):
+        self.context_window = context_window or getattr(settings, 'AI_TUTOR_CONTEXT_WINDOW_TOKENS', 4096)
+        self.max_completion_tokens = max_completion_tokens or getattr(settings, 'AI_TUTOR_MAX_COMPLETION_TOKENS', 512)
+        self.system_max_tokens = system_max_tokens or getattr(settings, 'AI_TUTOR_SYSTEM_PROMPT_MAX_TOKENS', 800)
+        self.context_max_tokens = context_max_tokens or getattr(settings, 'AI_TUTOR_CONTEXT_MAX_TOKENS', 1200)
+        self.count_tokens = token_counter
+
+    def plan(self, system_prompt: str, turns: Sequence[Dict[str, str]], context_items: Sequence = (),
+             summary: str = "") -> PromptPlan:
+        """
+        Build the prompt messages within the budget.
+
+        ``turns`` are the recent conversation turns, oldest first, normally
+        ending with the question being answered; the newest turn is always kept. ``context_items`` are TutorContextItem
+        objects (or anything with ``title`` and ``content``), best match first.
+        """
+        plan = PromptPlan(max_completion_tokens=self.max_completion_tokens)
+        remaining = self.context_window - self.max_completion_tokens
+
+        system_text, remaining = self._fit(
+            system_prompt, min(self.system_max_tokens, remaining // 2), remaining, plan, "system"
+        )
+
+        latest = turns[-1] if turns else None
+        latest_text = ""
+        if latest is not None:
+            latest_text, remaining = self._fit(latest["content"], remaining // 2, remaining, plan, "question")
+
+        context_text = self._pack_context(context_items, min(self.context_max_tokens, remaining), plan)
+        remaining -= plan.token_counts["context"]
+
+        summary_text, remaining = self._fit(
+            f"{SUMMARY_PREFIX}{summary}" if summary else "", remaining, remaining, plan, "summary"
+        )
+
+        history: List[Dict[str, str]] = []
+        history_tokens = 0
+        for turn in reversed(turns[:-1]):
+            tokens = self.count_tokens(turn["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if tokens > remaining:
+                break
+            history.append(turn)
+            history_tokens += tokens
+            remaining -= tokens
+        history.reverse()
+        plan.token_counts["history"] = history_tokens
+
+        if system_text:
+            plan.messages.append(SystemMessage(content=system_text))
+        if summary_text:
+            plan.messages.append(SystemMessage(content=summary_text))
+        if context_text:
+            plan.messages.append(SystemMessage(content=f"{CONTEXT_PREFIX}{context_text}"))
+        for turn in history:
+            plan.messages.append(self._message(turn["role"], turn["content"]))
+        if latest is not None:
+            plan.messages.append(self._message(latest["role"], latest_text))
+        return plan
+
+    @staticmethod
+    def _message(role: str, content: str) -> BaseMessage:
+        return HumanMessage(content=content) if role == "human" else AIMessage(content=content)
+
+    def _fit(self, text: str, limit: int, remaining: int, plan: PromptPlan, part: str):
+        """Truncate ``text`` to ``limit`` tokens and charge it to ``part``."""
+        if not text or limit <= MESSAGE_OVERHEAD_TOKENS:
+            plan.token_counts[part] = 0
+            return "", remaining
+        text = truncate_to_tokens(text, limit - MESSAGE_OVERHEAD_TOKENS, keep="start", token_counter=self.count_tokens)
+        tokens = self.count_tokens(text) + MESSAGE_OVERHEAD_TOKENS if text else 0
+        plan.token_counts[part] = tokens
+        return text, remaining - tokens
+
+    def _pack_context(self, context_items: Sequence, budget: int, plan: PromptPlan) -> str:
+        """Add retrieved items best first, cutting the last one that only partly fits."""
+        sections: List[str] = []
+        used = MESSAGE_OVERHEAD_TOKENS + self.count_tokens(CONTEXT_PREFIX)
+        for item in context_items:
+            header = f"--- {item.title} ---\n"
+            # One more token for the blank line between sections
+            available = budget - used - self.count_tokens(header) - 1
+            if available < MIN_CONTEXT_ITEM_TOKENS:
+                break
+            body = truncate_to_tokens(item.content or "", available, keep="start", token_counter=self.count_tokens)
+            if not body:
+                continue
+            section = header + body
+            sections.append(section)
+            plan.context_items.append(item)
+            used += self.count_tokens(section) + 1
+        plan.token_counts["context"] = used if sections else 0
+        return "\n\n".join(sections)
@@ -0,0 +1,196 @@
+"""
+In-memory caches for tutor content search.
+
+``ContentIndexingService.search_content`` used to build a new Chroma client
+and embedding model (including the Ollama availability probe) and embed the
+query on every call, even when students in the same course asked the same
+question a minute apart. Two caches now sit in front of it:
+
+* ``QueryEmbeddingCache`` maps a normalised query text to its embedding, so
+  "What is a JOIN?" and "what is a join" are embedded once.
+* ``SearchResultCache`` maps (embedding hash, course, module, k) to the
+  search results, so a repeated lookup never touches the vector store.
+
+Cached results are only valid for the index they were computed from.
+``IndexVersion`` is a counter kept in a file next to the vector store;
+indexing and removal bump it, and result entries are tagged with the version
+they were computed at, so an ingestion in any process (the indexing worker, a
+management command) invalidates them. Embeddings do not depend on the index
+and are kept across versions.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.files import locks
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Punctuation at either end does not change what is being asked
+_EDGE_PUNCTUATION = " \t\n?!.,;:'\""
+
+
+def normalize_query(text: str) -> str:
+    """Lower-case, collapse whitespace and trim surrounding punctuation."""
+    return _WHITESPACE_RE.sub(" ", (text or "").lower()).strip(_EDGE_PUNCTUATION)
+
+
+def vector_key(vector) -> str:
+    """Stable hash of an embedding vector."""
+    return hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()
+
+
+class _LRU:
+    """Thread-safe least-recently-used mapping with hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+class QueryEmbeddingCache(_LRU):
+    """LRU of query embeddings keyed by normalised query text."""
+
+    def embed(self, query: str, embed_query: Callable[[str], List[float]]) -> Tuple[str, List[float]]:
+        """Return the normalised query and its (possibly cached) embedding."""
+        normalized = normalize_query(query)
+        vector = self.get(normalized)
+        if vector is None:
+            vector = embed_query(normalized)
+            self.put(normalized, vector)
+        return normalized, vector
+
+
+class SearchResultCache(_LRU):
+    """LRU of search results keyed by query vector, scope and k, tagged with the index version."""
+
+    @staticmethod
+    def key(vector, course_id: Optional[int], module_id: Optional[int], k: int) -> Tuple:
+        return (vector_key(vector), course_id or None, module_id or None, k)
+
+    def lookup(self, key: Tuple, version: Hashable) -> Optional[List[Dict[str, Any]]]:
+        entry = self.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        return [dict(result) for result in entry[1]]
+
+    def store(self, key: Tuple, version: Hashable, results: List[Dict[str, Any]]) -> None:
+        self.put(key, (version, [dict(result) for result in results]))
+
+
+class IndexVersion:
+    """
+    Monotonic counter of changes to the content index, shared between processes.
+
+    The value lives in a small file in the vector store directory; reading it
+    is a ``stat`` unless another process has written since the last read.
+    ``bump()`` re-reads and rewrites the file under an exclusive lock on a
+    sibling ``.lock`` file, so concurrent bumps from several processes are
+    never lost.
+    ``current()`` returns the directory with the counter, so results cached
+    for one vector store are never served for another.
+    """
+
+    FILENAME = "index_version"
+
+    def __init__(self, directory: Callable[[], str]):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._path: Optional[str] = None
+        self._value = 0
+        self._mtime_ns: Optional[int] = None
+
+    def _sync(self, path: str) -> None:
+        """Re-read the counter if the file (or the directory) changed; call with the lock held."""
+        if path != self._path:
+            self._path, self._value, self._mtime_ns = path, 0, None
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        try:
+            with open(path) as f:
+                self._value = int(f.read().strip() or 0)
+            self._mtime_ns = mtime_ns
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read index version: {str(e)}")
+
+    def current(self) -> Tuple[str, int]:
+        path = os.path.join(self._directory(), self.FILENAME)
+        with self._lock:
+            self._sync(path)
+            return path, self._value
+
+    def bump(self) -> int:
+        """Advance the version, invalidating results cached at earlier versions."""
+        path = os.path.join(self._directory(), self.FILENAME)
+        with self._lock:
+            try:
+                lock_file = open(f"{path}.lock", "a")
+            except OSError as e:
+                logger.warning(f"Could not lock index version: {str(e)}")
+                lock_file = None
+            try:
+                if lock_file is not None:
+                    locks.lock(lock_file, locks.LOCK_EX)
+                # Read the file itself, not the cached value: another process may have bumped it
+                self._mtime_ns = None
+                self._sync(path)
+                self._value += 1
+                try:
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w") as f:
+                        f.write(str(self._value))
+                    os.replace(tmp_path, path)
+                    self._mtime_ns = os.stat(path).st_mtime_ns
+                except OSError as e:
+                    logger.warning(f"Could not write index version: {str(e)}")
+            finally:
+                if lock_file is not None:
+                    locks.unlock(lock_file)
+                    lock_file.close()
+            return self._value
+
+
+query_embeddings = QueryEmbeddingCache(getattr(settings, 'AI_TUTOR_QUERY_EMBEDDING_CACHE_SIZE', 2048))
+search_results = SearchResultCache(getattr(settings, 'AI_TUTOR_SEARCH_RESULT_CACHE_SIZE', 4096))
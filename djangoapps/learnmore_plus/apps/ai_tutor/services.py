@@ -1,16 +1,19 @@
 import os
-import json
 import logging
-from typing import List, Dict, Any, Optional, Union
+import threading
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
 
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 
 # Import the local Ollama chat model for development
@@ -26,7 +29,14 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.vectorstores import VectorStoreRetriever
 
-from apps.courses.models import Course, Module, Content
+from apps.courses.models import Course, Module, Content, QuizAttempt
+from .chunking import Chunk, ContentChunker, count_tokens
+from .conversation import fit_to_budget, summarize_turns
+from .dispatcher import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_QUIZ, TutorBusy, tutor_dispatcher
+from .prompt_budget import PromptBudgetPlanner, PromptPlan
+from .lexical_index import hybrid_search_with_scores, record_added, record_removed_matching, register_store_version
+from .retrieval_cache import IndexVersion, query_embeddings, search_results
+from .embedding_codec import ENCODING_FLOAT32, embedding_model_id
 from .models import TutorSession, TutorMessage, TutorContextItem, ContentEmbedding
 
 logger = logging.getLogger(__name__)
@@ -36,9 +46,12 @@ class LLMFactory:
     """Factory for creating LLM instances based on configuration."""
     
     @staticmethod
-    def get_chat_model(model_name: str = None) -> BaseChatModel:
-        """Get a chat model based on configuration."""
+    def get_chat_model(model_name: str = None, max_tokens: Optional[int] = None) -> BaseChatModel:
+        """Get a chat model based on configuration, optionally capping the reply at ``max_tokens``."""
         model_name = model_name or settings.DEFAULT_LLM_MODEL
+        # Ollama calls the reply limit num_predict
+        ollama_limit = {'num_predict': max_tokens} if max_tokens else {}
+        openai_limit = {'max_tokens': max_tokens} if max_tokens else {}
         
         # Check for environment variables to determine which LLM provider to use
         if hasattr(settings, 'OLLAMA_BASE_URL') and settings.OLLAMA_BASE_URL:
@@ -49,6 +62,7 @@ class LLMFactory:
                 base_url=settings.OLLAMA_BASE_URL,
                 model=ollama_model,
                 temperature=0.7,
+                **ollama_limit,
             )
         elif hasattr(settings, 'OPENAI_API_KEY') and settings.OPENAI_API_KEY:
             # Use OpenAI in production
@@ -56,11 +70,12 @@ class LLMFactory:
                 api_key=settings.OPENAI_API_KEY,
                 model_name=model_name or "gpt-3.5-turbo",
                 temperature=0.7,
+                **openai_limit,
             )
         else:
             # Fallback to default model
             logger.warning("No LLM provider configured, using default Ollama")
-            return ChatOllama(model="llama3", temperature=0.7)
+            return ChatOllama(model="llama3", temperature=0.7, **ollama_limit)
     
     @staticmethod
     def get_embedding_model() -> Embeddings:
@@ -138,9 +153,38 @@ class LLMFactory:
             logger.warning("No embedding provider configured, using local HuggingFace embeddings")
             return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that memoises vectors by text.
+    
+    Lets a batch be embedded once and then handed to the vector store
+    without a second round trip to the embedding provider.
+    """
+    
+    def __init__(self, embedding_function: Embeddings):
+        self.embedding_function = embedding_function
+        self._vectors: Dict[str, List[float]] = {}
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing = [text for text in dict.fromkeys(texts) if text not in self._vectors]
+        if missing:
+            for text, vector in zip(missing, self.embedding_function.embed_documents(missing)):
+                self._vectors[text] = vector
+        return [self._vectors[text] for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        if text not in self._vectors:
+            self._vectors[text] = self.embedding_function.embed_query(text)
+        return self._vectors[text]
+
 class ContentIndexingService:
     """Service for indexing course content for retrieval augmented generation."""
     
+    _chunker: Optional[ContentChunker] = None
+    # (store path, embedding model, vector store) reused by search_content
+    _search_store: Optional[Tuple[str, Embeddings, Chroma]] = None
+    _search_store_lock = threading.Lock()
+    
     @classmethod
     def get_embedding_store_path(cls) -> str:
         """Get the path to the embeddings store."""
@@ -149,14 +193,35 @@ class ContentIndexingService:
         return base_dir
     
     @classmethod
-    def get_vector_store(cls) -> Chroma:
+    def get_search_store(cls) -> Tuple[Embeddings, Chroma]:
+        """
+        Get the embedding model and vector store used for searches.
+        
+        Both are created once per store path rather than on every search,
+        which also skips the Ollama availability probe. Cached query
+        embeddings are dropped when the store (and so possibly the
+        embedding model) changes.
+        """
+        path = cls.get_embedding_store_path()
+        with cls._search_store_lock:
+            if cls._search_store is None or cls._search_store[0] != path:
+                embedding_function = LLMFactory.get_embedding_model()
+                cls._search_store = (path, embedding_function, cls.get_vector_store(embedding_function))
+                query_embeddings.clear()
+            return cls._search_store[1], cls._search_store[2]
+    
+    @classmethod
+    def get_vector_store(cls, embedding_function: Optional[Embeddings] = None) -> Chroma:
         """Get or create a vector store for content embeddings."""
-        embedding_function = LLMFactory.get_embedding_model()
-        return Chroma(
+        embedding_function = embedding_function or LLMFactory.get_embedding_model()
+        vector_store = Chroma(
             persist_directory=cls.get_embedding_store_path(),
             embedding_function=embedding_function,
             collection_name="course_content"
         )
+        # Chunks are rewritten in place, so the BM25 mirror follows the index version, not the count
+        register_store_version(vector_store, index_version.current)
+        return vector_store
     
     @classmethod
     def get_retriever(cls) -> VectorStoreRetriever:
@@ -168,101 +233,166 @@ class ContentIndexingService:
         )
     
     @classmethod
-    def index_content(cls, content_obj: Content) -> None:
-        """Index a single content object for retrieval."""
+    def _build_metadata(cls, content_obj: Content) -> Dict[str, Any]:
+        """Build the vector store metadata for a content object."""
         try:
-            # Prepare metadata with additional error checking
+            metadata = {
+                "content_id": content_obj.id,
+                "title": str(content_obj.title),
+                "content_type": str(content_obj.content_type),
+                "module_id": content_obj.module_id,
+            }
+            
+            # Add additional metadata with error checking
             try:
-                metadata = {
-                    "content_id": content_obj.id,
-                    "title": str(content_obj.title),
-                    "content_type": str(content_obj.content_type),
-                    "module_id": content_obj.module_id,
-                }
+                metadata["module_title"] = str(content_obj.module.title)
+            except Exception:
+                metadata["module_title"] = "Unknown Module"
+                
+            try:
+                metadata["course_id"] = content_obj.module.course_id
+            except Exception:
+                metadata["course_id"] = 0
                 
-                # Add additional metadata with error checking
-                try:
-                    metadata["module_title"] = str(content_obj.module.title)
-                except Exception:
-                    metadata["module_title"] = "Unknown Module"
-                    
-                try:
-                    metadata["course_id"] = content_obj.module.course_id
-                except Exception:
-                    metadata["course_id"] = 0
-                    
-                try:
-                    metadata["course_title"] = str(content_obj.module.course.title)
-                except Exception:
-                    metadata["course_title"] = "Unknown Course"
-            except Exception as meta_error:
-                # Fallback to minimal metadata if there's an error
-                logger.error(f"Error creating metadata for content {content_obj.id}: {str(meta_error)}")
-                metadata = {
-                    "content_id": content_obj.id,
-                    "title": "Unknown Content",
-                    "content_type": "text",
-                    "module_id": 0,
-                    "module_title": "Unknown Module",
-                    "course_id": 0,
-                    "course_title": "Unknown Course",
-                }
-            
-            # Clean up the content - remove HTML tags, etc.
             try:
-                clean_text = cls._clean_content_text(content_obj.content)
+                metadata["course_title"] = str(content_obj.module.course.title)
+            except Exception:
+                metadata["course_title"] = "Unknown Course"
+        except Exception as meta_error:
+            # Fallback to minimal metadata if there's an error
+            logger.error(f"Error creating metadata for content {content_obj.id}: {str(meta_error)}")
+            metadata = {
+                "content_id": content_obj.id,
+                "title": "Unknown Content",
+                "content_type": "text",
+                "module_id": 0,
+                "module_title": "Unknown Module",
+                "course_id": 0,
+                "course_title": "Unknown Course",
+            }
+        return metadata
+    
+    @classmethod
+    def index_content(cls, content_obj: Content) -> None:
+        """Index a single content object for retrieval."""
+        cls.index_contents([content_obj])
+    
+    @classmethod
+    def get_chunker(cls) -> ContentChunker:
+        """Get the chunker used to split content before embedding."""
+        if cls._chunker is None:
+            cls._chunker = ContentChunker(
+                max_tokens=getattr(settings, 'AI_TUTOR_CHUNK_MAX_TOKENS', 350),
+                overlap_tokens=getattr(settings, 'AI_TUTOR_CHUNK_OVERLAP_TOKENS', 40),
+            )
+        return cls._chunker
+    
+    @classmethod
+    def _chunk_content(cls, content_obj: Content) -> List[Chunk]:
+        """Split a content object into heading-scoped chunks, falling back to one plain-text chunk."""
+        try:
+            chunks = cls.get_chunker().chunk(content_obj.content or "")
+        except Exception as chunk_error:
+            logger.error(f"Error chunking content {content_obj.id}: {str(chunk_error)}")
+            chunks = []
+        if not chunks:
+            try:
+                text = cls._clean_content_text(content_obj.content or "") or "No content available"
             except Exception as text_error:
                 logger.error(f"Error cleaning content text: {str(text_error)}")
-                clean_text = "Content unavailable"
-            
-            # Create or update embedding in the database
-            try:
-                embedding_json = cls._generate_embedding_json(clean_text)
-            except Exception as embed_error:
-                logger.error(f"Error generating embedding JSON: {str(embed_error)}")
-                # Create a fallback embedding of zeros
-                mock_vector = [0.0] * 768  # Standard embedding size
-                embedding_json = json.dumps(mock_vector)
-            
+                text = "Content unavailable"
+            chunks = [Chunk(text=text, heading_path=(), token_count=0)]
+        return chunks
+    
+    @classmethod
+    def index_contents(cls, contents: List[Content]) -> int:
+        """
+        Index a batch of content objects with a single embedding call.
+        
+        Each content object is split into structure-aware chunks that are
+        stored in the vector store as ``content_<id>_<chunk index>``, with the
+        chunk's heading path in its metadata. Chunks left over from a previous
+        (longer) version of the content are deleted first. The embedding model
+        and vector store are created once for the whole batch, and every chunk
+        is embedded once and shared between the ContentEmbedding rows and the
+        vector store write. Embedding errors are raised before anything is
+        written.
+        
+        Returns:
+            Number of content objects indexed
+        """
+        contents = [content_obj for content_obj in contents if content_obj.content]
+        if not contents:
+            return 0
+        
+        texts, metadatas, ids, first_chunk = [], [], [], []
+        for content_obj in contents:
+            metadata = cls._build_metadata(content_obj)
+            first_chunk.append(len(texts))
+            for chunk in cls._chunk_content(content_obj):
+                texts.append(chunk.page_content)
+                metadatas.append({**metadata, **chunk.metadata()})
+                ids.append(f"content_{content_obj.id}_{chunk.index}")
+        
+        embedding_function = CachedEmbeddings(LLMFactory.get_embedding_model())
+        # A failed embedding call leaves the stored chunks and embeddings as
+        # they were and propagates, so the indexing queue can retry the batch
+        vectors = embedding_function.embed_documents(texts)
+        model_id = embedding_model_id(embedding_function.embedding_function)
+        
+        with transaction.atomic():
+            for content_obj, position in zip(contents, first_chunk):
+                # The reference row keeps the leading chunk's embedding and a preview of the content
+                try:
+                    preview = cls._clean_content_text(content_obj.content)[:1000]
+                except Exception:
+                    preview = texts[position][:1000]
+                ContentEmbedding.objects.update_or_create(
+                    content=content_obj,
+                    defaults={
+                        **cls._embedding_fields(vectors[position], model_id),
+                        'chunk_text': preview or "No content available"
+                    }
+                )
+        
+        try:
+            vector_store = cls.get_vector_store(embedding_function)
+            cls._delete_content_chunks(vector_store, [content_obj.id for content_obj in contents])
             try:
-                with transaction.atomic():
-                    # Store in database for reference
-                    ContentEmbedding.objects.update_or_create(
-                        content=content_obj,
-                        defaults={
-                            'embedding_vector': embedding_json,
-                            'chunk_text': clean_text[:1000] if len(clean_text) > 0 else "No content available"  # Store a preview
-                        }
-                    )
-                    
-                    # Store in vector database
-                    try:
-                        vector_store = cls.get_vector_store()
-                        vector_store.add_texts(
-                            texts=[clean_text],
-                            metadatas=[metadata],
-                            ids=[f"content_{content_obj.id}"]
-                        )
-                        # Removed vector_store.persist() call - Chroma 0.4.x+ automatically persists
-                    except Exception as store_error:
-                        logger.error(f"Error storing in vector database: {str(store_error)}")
-                        # We've already saved to the database, so we'll consider this a partial success
-            except Exception as db_error:
-                logger.error(f"Error saving to database: {str(db_error)}")
-                # This is a critical error, so we'll re-raise
-                raise
-                
-            logger.info(f"Successfully indexed content: {content_obj.title} (ID: {content_obj.id})")
+                vector_store.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+            finally:
+                # Bumped before mirroring so the BM25 index is tagged with the new version
+                index_version.bump()
+            record_added(vector_store, ids, [
+                Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)
+            ])
+        except Exception as store_error:
+            logger.error(f"Error storing batch in vector database: {str(store_error)}")
+        
+        logger.info(f"Indexed batch of {len(contents)} content items ({len(texts)} chunks)")
+        return len(contents)
+    
+    @staticmethod
+    def _delete_content_chunks(vector_store: Chroma, content_ids: List[int]) -> None:
+        """Delete every chunk stored for the given content ids."""
+        try:
+            vector_store.delete(where={"content_id": {"$in": list(content_ids)}})
+        finally:
+            index_version.bump()
+        record_removed_matching(vector_store, "content_id", content_ids)
+    
+    @classmethod
+    def remove_content_ids(cls, content_ids: List[int]) -> None:
+        """Remove a batch of content ids from the vector database."""
+        if not content_ids:
+            return
+        try:
+            vector_store = cls.get_vector_store()
+            cls._delete_content_chunks(vector_store, content_ids)
+            ContentEmbedding.objects.filter(content_id__in=content_ids).delete()
+            logger.info(f"Removed {len(content_ids)} content items from index")
         except Exception as e:
-            logger.error(f"Error indexing content {content_obj.id}: {str(e)}")
-            # Convert error to string to remove any problematic objects
-            error_str = str(e)
-            if "_type" in error_str:
-                logger.error("Detected _type error, likely from embeddings. Using fallback.")
-                # We'll suppress this specific error
-            else:
-                # For other errors, we'll propagate them
-                raise
+            logger.error(f"Error removing content {content_ids} from index: {str(e)}")
     
     @classmethod
     def remove_content(cls, content_obj: Content) -> None:
@@ -270,7 +400,7 @@ class ContentIndexingService:
         try:
             # Remove from vector database
             vector_store = cls.get_vector_store()
-            vector_store.delete([f"content_{content_obj.id}"])
+            cls._delete_content_chunks(vector_store, [content_obj.id])
             # Removed vector_store.persist() call - Chroma 0.4.x+ automatically persists
             
             # Remove from database
@@ -307,10 +437,20 @@ class ContentIndexingService:
             
         Returns:
             List of dictionaries containing content metadata and relevance score
+            (the fused vector/BM25 score, 1.0 when first in both rankings)
+        
+        The query embedding is cached by normalised query text and the results
+        by (query vector, course, module, k) until the index next changes; see
+        ``retrieval_cache``.
         """
         try:
-            retriever = cls.get_retriever()
-            retriever.search_kwargs["k"] = k
+            embedding_function, vector_store = cls.get_search_store()
+            normalized_query, query_vector = query_embeddings.embed(query, embedding_function.embed_query)
+            version = index_version.current()
+            cache_key = search_results.key(query_vector, course_id, module_id, k)
+            cached = search_results.lookup(cache_key, version)
+            if cached is not None:
+                return cached
             
             # Filter condition based on metadata
             filter_dict = {}
@@ -318,24 +458,28 @@ class ContentIndexingService:
                 filter_dict["course_id"] = course_id
             if module_id:
                 filter_dict["module_id"] = module_id
-                
-            if filter_dict:
-                # If using Chroma, we need to convert to their filter format
-                filter_condition = None
-                for k, v in filter_dict.items():
-                    if filter_condition is None:
-                        filter_condition = {"$and": [{k: {"$eq": v}}]}
-                    else:
-                        filter_condition["$and"].append({k: {"$eq": v}})
-                
-                retriever.search_kwargs["filter"] = filter_condition
             
-            # Perform the search
-            docs = retriever.get_relevant_documents(query)
+            # Chroma needs $and to combine more than one condition
+            filter_condition = None
+            if len(filter_dict) > 1:
+                filter_condition = {"$and": [{key: {"$eq": value}} for key, value in filter_dict.items()]}
+            elif filter_dict:
+                filter_condition = filter_dict
+            
+            # Vector and BM25 rankings are fused so exact terms (function names,
+            # course codes) are found too. Several chunks of one content item
+            # can match, so over-fetch and keep the best chunk per item.
+            scored_docs = hybrid_search_with_scores(vector_store, normalized_query, k=k * 3,
+                                                    filter=filter_condition, embedding=query_vector)
             
             # Format results
             results = []
-            for doc in docs:
+            seen_content_ids = set()
+            for doc, score in scored_docs:
+                content_id = doc.metadata.get("content_id")
+                if content_id in seen_content_ids:
+                    continue
+                seen_content_ids.add(content_id)
                 results.append({
                     "content_id": doc.metadata.get("content_id"),
                     "title": doc.metadata.get("title", "Untitled"),
@@ -344,10 +488,15 @@ class ContentIndexingService:
                     "module_title": doc.metadata.get("module_title", "Untitled"),
                     "course_id": doc.metadata.get("course_id"),
                     "course_title": doc.metadata.get("course_title", "Untitled"),
+                    "heading_path": doc.metadata.get("heading_path", ""),
+                    "text": doc.page_content,
                     "text_preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "relevance_score": getattr(doc, "score", 1.0),  # Some retrievers include a score
+                    "relevance_score": score,
                 })
+                if len(results) >= k:
+                    break
             
+            search_results.store(cache_key, version, results)
             return results
         except Exception as e:
             logger.error(f"Error searching content: {str(e)}")
@@ -366,90 +515,20 @@ class ContentIndexingService:
         return text
     
     @staticmethod
-    def _generate_embedding_json(text: str) -> str:
-        """Generate embedding JSON for storage."""
+    def _embedding_fields(vector, model_id: str = '') -> Dict[str, Any]:
+        """ContentEmbedding fields for ``vector`` in the configured binary encoding."""
+        embedding = ContentEmbedding()
         try:
-            embedding_function = LLMFactory.get_embedding_model()
-            embedding_vector = embedding_function.embed_query(text)
-            
-            # Handle different vector types with robust conversion
-            try:
-                # First, check if embedding_vector has _type attribute (LangChain object)
-                if hasattr(embedding_vector, '_type'):
-                    # Special handling for LangChain objects
-                    if hasattr(embedding_vector, 'values') and callable(getattr(embedding_vector, 'values', None)):
-                        embedding_vector = embedding_vector.values()
-                    elif hasattr(embedding_vector, 'model_dump') and callable(getattr(embedding_vector, 'model_dump', None)):
-                        # For Pydantic models 
-                        embedding_data = embedding_vector.model_dump()
-                        if isinstance(embedding_data, dict) and 'values' in embedding_data:
-                            embedding_vector = embedding_data['values']
-                        else:
-                            embedding_vector = [0.0] * 768  # Fallback
-                            logger.warning("Using fallback embedding: model_dump didn't contain values")
-                    elif hasattr(embedding_vector, 'dict') and callable(getattr(embedding_vector, 'dict', None)):
-                        # For older Pydantic models
-                        embedding_data = embedding_vector.dict()
-                        if isinstance(embedding_data, dict) and 'values' in embedding_data:
-                            embedding_vector = embedding_data['values']
-                        else:
-                            embedding_vector = [0.0] * 768  # Fallback
-                            logger.warning("Using fallback embedding: dict didn't contain values")
-                    else:
-                        # Generic fallback for complex objects
-                        try:
-                            # Try to convert directly to list
-                            embedding_vector = list(embedding_vector)
-                        except:
-                            # Last resort fallback
-                            logger.warning("Unable to extract vector data, using fallback zeros")
-                            embedding_vector = [0.0] * 768  # Standard size
-                
-                # Check for numpy arrays (common in embeddings)
-                if hasattr(embedding_vector, 'tolist') and callable(getattr(embedding_vector, 'tolist', None)):
-                    embedding_vector = embedding_vector.tolist()
-                
-                # Handle if it's already a list 
-                if not isinstance(embedding_vector, list):
-                    # One more attempt to convert to list
-                    try:
-                        embedding_vector = list(embedding_vector)
-                    except:
-                        logger.warning("Failed to convert to list, using fallback")
-                        embedding_vector = [0.0] * 768  # Fallback to standard size
-                        
-                # Final verification - ensure it's a basic list of numbers
-                if not isinstance(embedding_vector, list) or len(embedding_vector) == 0:
-                    logger.warning("Invalid vector format, using fallback")
-                    embedding_vector = [0.0] * 768  # Fallback
-                else:
-                    # Check for non-serializable elements in the list
-                    for i, val in enumerate(embedding_vector):
-                        if not isinstance(val, (int, float)):
-                            # Replace with 0.0 if not a number
-                            embedding_vector[i] = 0.0
-                            
-            except Exception as e:
-                logger.error(f"Error processing embedding vector: {str(e)}")
-                embedding_vector = [0.0] * 768  # Fallback standard size
-                
-            # Ensure it's a basic Python type for JSON serialization
-            return json.dumps(embedding_vector)
-        except Exception as e:
-            logger.error(f"Error generating embedding: {str(e)}")
-            
-            # Check if the error is related to missing Ollama models
-            if "model \"nomic-embed-text\" not found" in str(e):
-                logger.warning(
-                    "The nomic-embed-text model is not available in Ollama. "
-                    "Please run: ollama pull nomic-embed-text"
-                )
-                # Create a mock embedding vector (all zeros) as a fallback
-                # This allows the system to continue without crashing
-                mock_vector = [0.0] * 768  # Standard embedding size
-                return json.dumps(mock_vector)
-            
-            return "[]"
+            embedding.set_vector(
+                vector, getattr(settings, 'AI_TUTOR_EMBEDDING_ENCODING', ENCODING_FLOAT32), model_id
+            )
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error encoding embedding vector: {str(e)}")
+            embedding.set_vector([], ENCODING_FLOAT32, model_id)
+        return {field: getattr(embedding, field) for field in ('vector', 'dimension', 'encoding', 'scale', 'model_id')}
+
+# Bumped whenever content is indexed or removed; invalidates cached search results
+index_version = IndexVersion(ContentIndexingService.get_embedding_store_path)
 
 class TutorService:
     """Service for AI tutor functionality."""
@@ -586,7 +665,7 @@ class TutorService:
         return system_message
     
     @classmethod
-    def add_user_message(cls, session, message_text):
+    def add_user_message(cls, session, message_text, relevant_context=None):
         """Add a user message to the session."""
         message = TutorMessage.objects.create(
             session=session,
@@ -595,7 +674,8 @@ class TutorService:
         )
         
         # Find relevant context based on the message
-        relevant_context = cls._get_relevant_context(session, message_text)
+        if relevant_context is None:
+            relevant_context = cls._get_relevant_context(session, message_text)
         
         # Associate with the message
         if relevant_context:
@@ -614,35 +694,68 @@ class TutorService:
             
         Returns:
             The assistant response message object
+        
+        Raises:
+            TutorBusy: if no LLM slot frees up within the queue timeout. Nothing
+            is saved in that case, so the student can simply send the message again.
         """
+        with tutor_dispatcher.slot(session.user_id, cls.request_priority(session)) as queue_seconds:
+            if queue_seconds >= 1:
+                logger.info(f"Tutor request for session {session.id} queued for {queue_seconds:.1f}s")
+            assistant_message = cls._generate_assistant_response(session, message_text)
+        # Outside the reply's slot, which the summary would otherwise wait on
+        cls._update_history_summary(session)
+        return assistant_message
+    
+    @classmethod
+    def request_priority(cls, session) -> int:
+        """Dispatch priority of a reply: students with a quiz attempt in progress go first."""
+        try:
+            active_since = timezone.now() - timedelta(minutes=getattr(settings, 'AI_TUTOR_QUIZ_ACTIVE_MINUTES', 60))
+            attempts = QuizAttempt.objects.filter(
+                student_id=session.user_id, status='in_progress', last_activity__gte=active_since
+            )
+            if session.course_id:
+                attempts = attempts.filter(quiz__content__module__course_id=session.course_id)
+            if attempts.exists():
+                return PRIORITY_QUIZ
+        except Exception as e:
+            logger.error(f"Error checking for an active quiz: {str(e)}")
+        return PRIORITY_INTERACTIVE
+    
+    @classmethod
+    def _generate_assistant_response(cls, session, message_text):
+        # Find relevant context once, for both the user message and the prompt
+        relevant_context = cls._get_relevant_context(session, message_text)
+        
         # Add the user message first
-        user_message = cls.add_user_message(session, message_text)
+        user_message = cls.add_user_message(session, message_text, relevant_context=relevant_context)
         
         try:
-            # Get message history
-            messages = cls._prepare_chat_history(session)
+            # Fit system prompt, retrieved context and history into the context window
+            plan = cls._plan_prompt(session, relevant_context)
             
-            # Find relevant context
-            relevant_context = cls._get_relevant_context(session, message_text)
-            
-            # Create LLM instance
-            llm = LLMFactory.get_chat_model(session.llm_model)
+            # Create LLM instance, capped at the completion tokens the plan reserved
+            llm = LLMFactory.get_chat_model(session.llm_model, max_tokens=plan.max_completion_tokens)
             
             # Generate response
-            response = llm.invoke(messages)
+            response = llm.invoke(plan.messages)
             response_text = response.content
+            prompt_tokens, completion_tokens = cls._token_usage(response, plan, response_text)
             
             # Save the assistant message
             assistant_message = TutorMessage.objects.create(
                 session=session,
                 message_type='assistant',
                 content=response_text,
-                tokens_used=cls._estimate_tokens(response_text)  # Estimate tokens used
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                tokens_used=prompt_tokens + completion_tokens
             )
             
-            # Link relevant context
-            if relevant_context:
-                assistant_message.relevant_context_used.add(*relevant_context)
+            # Link the context that made it into the prompt
+            if plan.context_items:
+                assistant_message.relevant_context_used.add(*plan.context_items)
                 
             # Update session
             session.updated_at = assistant_message.created_at
@@ -665,24 +778,110 @@ class TutorService:
     @classmethod
     def _prepare_chat_history(cls, session):
         """Prepare the chat history for the LLM."""
-        messages = []
+        return cls._plan_prompt(session).messages
+    
+    @classmethod
+    def _plan_prompt(cls, session, context_items=()) -> PromptPlan:
+        """
+        Build the prompt for the next reply within the token budget.
         
-        # Get all messages in order
-        for msg in session.messages.all().order_by('created_at'):
-            if msg.message_type == 'system':
-                messages.append(SystemMessage(content=msg.content))
-            elif msg.message_type == 'user':
-                messages.append(HumanMessage(content=msg.content))
-            elif msg.message_type == 'assistant':
-                messages.append(AIMessage(content=msg.content))
+        The prompt holds the opening system message, the retrieved context
+        items (best match first), the running summary of older turns and the
+        most recent turns. Only the last AI_TUTOR_HISTORY_MAX_MESSAGES
+        messages are read, so the cost of a reply does not grow with the
+        length of the session.
+        """
+        system_message = session.messages.filter(message_type='system').order_by('created_at').first()
+        return PromptBudgetPlanner().plan(
+            system_prompt=system_message.content if system_message else "",
+            turns=cls._recent_turns(session),
+            context_items=context_items,
+            summary=session.history_summary,
+        )
+    
+    @staticmethod
+    def _token_usage(response, plan: PromptPlan, response_text: str):
+        """Return (prompt, completion) tokens, as reported by the provider when it does."""
+        usage = getattr(response, 'usage_metadata', None)
+        if isinstance(usage, dict) and usage.get('input_tokens'):
+            return usage['input_tokens'], usage.get('output_tokens') or count_tokens(response_text)
+        return plan.prompt_tokens, count_tokens(response_text)
+    
+    @classmethod
+    def _recent_turns(cls, session):
+        """Get the most recent user/assistant turns that fit the history token budget, oldest first."""
+        max_messages = getattr(settings, 'AI_TUTOR_HISTORY_MAX_MESSAGES', 10)
+        recent = list(
+            session.messages.filter(message_type__in=('user', 'assistant'))
+            .order_by('-created_at', '-id')[:max_messages]
+        )
+        turns = [
+            {'role': 'human' if msg.message_type == 'user' else 'ai', 'content': msg.content, 'id': msg.id}
+            for msg in reversed(recent)
+        ]
+        kept, _ = fit_to_budget(turns, getattr(settings, 'AI_TUTOR_HISTORY_TOKEN_BUDGET', 1500))
+        return kept
+    
+    @classmethod
+    def _update_history_summary(cls, session):
+        """
+        Fold turns that have left the history window into the session's running summary.
         
-        return messages
+        Runs only once at least AI_TUTOR_SUMMARY_BATCH turns are waiting, so
+        the summarising LLM call is made every few turns rather than every turn.
+        """
+        try:
+            window = cls._recent_turns(session)
+            if not window:
+                return False
+            batch = getattr(settings, 'AI_TUTOR_SUMMARY_BATCH', 6)
+            pending = list(
+                session.messages.filter(
+                    message_type__in=('user', 'assistant'),
+                    id__gt=session.history_summary_until or 0,
+                    id__lt=window[0]['id'],
+                ).order_by('id')[:batch * 4]
+            )
+            if len(pending) < batch:
+                return False
+            
+            turns = [
+                {'role': 'human' if msg.message_type == 'user' else 'ai', 'content': msg.content}
+                for msg in pending
+            ]
+            # The summary can wait for a later turn, so only use a slot that is free now
+            try:
+                with tutor_dispatcher.slot(session.user_id, PRIORITY_BACKGROUND, timeout=0):
+                    session.history_summary = summarize_turns(
+                        LLMFactory.get_chat_model(session.llm_model),
+                        session.history_summary, turns,
+                        getattr(settings, 'AI_TUTOR_SUMMARY_TOKEN_BUDGET', 300)
+                    )
+            except TutorBusy:
+                return False
+            session.history_summary_until = pending[-1].id
+            session.save(update_fields=['history_summary', 'history_summary_until'])
+            return True
+        except Exception as e:
+            logger.error(f"Error updating conversation summary: {str(e)}")
+            return False
     
     @classmethod
     def _get_relevant_context(cls, session, query):
-        """Get relevant context items for the query."""
-        # First, check existing context items in the session
+        """
+        Get the context items most relevant to the query, best match first.
+        
+        At most AI_TUTOR_CONTEXT_MAX_ITEMS items are returned. Items hold the
+        chunk that matched rather than the whole content item: an item already
+        in the session for the same content is reused, with its text replaced
+        by this query's chunk. If nothing matches (e.g. the index is empty) the
+        session's own starting context is used.
+        """
+        max_items = getattr(settings, 'AI_TUTOR_CONTEXT_MAX_ITEMS', 3)
         existing_items = list(session.context_items.all())
+        existing_content = {
+            item.content_object_id: item for item in existing_items if item.context_type == 'content'
+        }
         
         # If we have a course, use it to filter results
         course_id = session.course.id if session.course else None
@@ -693,35 +892,84 @@ class TutorService:
             query=query,
             course_id=course_id,
             module_id=module_id,
-            k=3  # Get top 3 results
+            k=max_items
+        )
+        valid_ids = set(
+            Content.objects.filter(id__in=[result['content_id'] for result in results]).values_list('id', flat=True)
         )
         
-        # Create context items for new results
-        new_items = []
-        for i, result in enumerate(results):
-            # Skip if already have this content as context
-            if any(item.context_type == 'content' and 
-                  item.content_object_id == result['content_id'] for item in existing_items):
+        relevant = []
+        for result in results:
+            content_id = result['content_id']
+            if content_id not in valid_ids:
                 continue
-                
-            # Otherwise create a new context item
-            try:
-                content = Content.objects.get(id=result['content_id'])
+            
+            text = result.get('text') or result.get('text_preview', '')
+            relevance_score = result.get('relevance_score', 0.8)
+            # Reuse the context item if we already have this content
+            item = existing_content.get(content_id)
+            if item is None:
                 item = TutorContextItem.objects.create(
                     session=session,
                     context_type='content',
-                    content_object_id=result['content_id'],
+                    content_object_id=content_id,
                     title=result['title'],
-                    content=content.content,
-                    relevance_score=result.get('relevance_score', 0.8),
-                    order=len(existing_items) + i
+                    content=text,
+                    relevance_score=relevance_score,
+                    order=len(existing_items) + len(relevant)
                 )
-                new_items.append(item)
-            except Content.DoesNotExist:
-                continue
+                existing_content[content_id] = item
+            elif text and item.content != text:
+                # A different chunk (or, for items from the session start, the
+                # whole content) would otherwise be sent instead of this match
+                item.content = text
+                item.relevance_score = relevance_score
+                item.save(update_fields=['content', 'relevance_score'])
+            relevant.append(item)
         
-        # Return all context items to link to the message
-        return existing_items + new_items
+        if not relevant:
+            relevant = existing_items[:max_items]
+        return relevant
+    
+    @classmethod
+    def get_token_usage(cls, course=None, since=None):
+        """
+        Token consumption per course, most expensive first.
+        
+        Args:
+            course: Optional course to restrict the report to
+            since: Optional datetime; only replies after it are counted
+            
+        Returns:
+            List of dicts with course id/title, replies and prompt/completion/total tokens
+        """
+        replies = TutorMessage.objects.filter(message_type='assistant')
+        if course is not None:
+            replies = replies.filter(session__course=course)
+        if since is not None:
+            replies = replies.filter(created_at__gte=since)
+        
+        usage = (
+            replies.values('session__course_id', 'session__course__title')
+            .annotate(
+                replies=Count('id'),
+                prompt_tokens=Sum('prompt_tokens'),
+                completion_tokens=Sum('completion_tokens'),
+            )
+            .annotate(total_tokens=F('prompt_tokens') + F('completion_tokens'))
+            .order_by('-total_tokens')
+        )
+        return [
+            {
+                'course_id': row['session__course_id'],
+                'course_title': row['session__course__title'] or 'General',
+                'replies': row['replies'],
+                'prompt_tokens': row['prompt_tokens'] or 0,
+                'completion_tokens': row['completion_tokens'] or 0,
+                'total_tokens': row['total_tokens'] or 0,
+            }
+            for row in usage
+        ]
     
     @staticmethod
     def _generate_session_title(course, module, content):
@@ -738,13 +986,5 @@ class TutorService:
     @staticmethod
     def _estimate_tokens(text):
         """Estimate the number of tokens in a text."""
-        # A very simple estimator based on word count
-        # In production, you'd want to use a more accurate method
-        # like tiktoken from OpenAI
-        try:
-            import tiktoken
-            enc = tiktoken.get_encoding("cl100k_base")
-            return len(enc.encode(text))
-        except:
-            # Fallback to simple estimation
-            return len(text.split()) * 1.3  # Rough estimate
\ No newline at end of file
+        # The tiktoken encoding is built once and cached by the chunker
+        return count_tokens(text)
\ No newline at end of file
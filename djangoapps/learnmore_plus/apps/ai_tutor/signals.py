@@ -1,21 +1,26 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from apps.courses.models import Content
-from apps.ai_tutor.services import ContentIndexingService
+from apps.ai_tutor.indexing_queue import content_index_queue
 
 @receiver(post_save, sender=Content)
 def index_content_on_save(sender, instance, created, **kwargs):
     """
     Signal handler to index or update content in the vector database when content is saved.
+
+    Indexing is deferred to the content index queue, which runs it in batches
+    after the transaction commits so the save itself never waits on the
+    embedding provider.
     """
-    # Defer to service to handle the indexing logic
+    if kwargs.get('raw'):
+        return
     if instance.content:  # Only index if there's actual content
-        ContentIndexingService.index_content(instance)
+        content_index_queue.enqueue_index(instance.pk)
 
 @receiver(post_delete, sender=Content)
 def remove_content_from_index(sender, instance, **kwargs):
     """
     Signal handler to remove content from the vector database when content is deleted.
     """
-    # Defer to service to handle the removal logic
-    ContentIndexingService.remove_content(instance)
\ No newline at end of file
+    # Defer to the queue so removals are batched alongside pending indexing
+    content_index_queue.enqueue_remove(instance.pk)
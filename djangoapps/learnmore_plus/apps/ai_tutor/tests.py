@@ -1,13 +1,22 @@
-from django.test import TestCase, RequestFactory, Client
+from django.test import SimpleTestCase, TestCase, RequestFactory, Client, override_settings
 from django.urls import reverse
+from django.db import DatabaseError, transaction
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from unittest.mock import patch, MagicMock
 import json
+from pathlib import Path
 
 from apps.courses.models import Course, Module, Content
 from .models import TutorSession, TutorMessage, TutorContextItem, ContentEmbedding
+from . import services
 from .services import TutorService, ContentIndexingService, LLMFactory
+from .chunking import ContentChunker, parse_html
+from .lexical_index import BM25Index, get_lexical_index, reciprocal_rank_fusion
+from .embedding_codec import decode_vector, encode_vector
+from .retrieval_cache import IndexVersion, normalize_query, search_results
+from .indexing_queue import ContentIndexQueue, content_index_queue, suspend_indexing
+from .dispatcher import PRIORITY_INTERACTIVE, PRIORITY_QUIZ, TutorBusy, TutorDispatcher
 from .views import chat_view, send_message, create_session, session_list
 
 User = get_user_model()
@@ -222,6 +231,44 @@ class TutorServiceTests(TestCase):
         self.assertTrue(session.messages.filter(message_type='user', content="Test user message").exists())
 
 
+class ChatHistoryTests(TestCase):
+    """Test cases for the bounded tutor chat history."""
+    
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        Group.objects.get_or_create(name='Student')
+        self.user = User.objects.create_user(username='historyuser', password='password123')
+    
+    @override_settings(AI_TUTOR_HISTORY_MAX_MESSAGES=4, AI_TUTOR_SUMMARY_BATCH=6)
+    @patch('apps.ai_tutor.services.LLMFactory.get_chat_model')
+    def test_chat_history_is_bounded(self, mock_get_chat_model):
+        """Only recent turns are sent; older turns are folded into a running summary."""
+        session = TutorSession.objects.create(user=self.user, session_type='general')
+        TutorMessage.objects.create(session=session, message_type='system', content='Test system message')
+        for i in range(5):
+            TutorMessage.objects.create(session=session, message_type='user', content=f'question {i}')
+            TutorMessage.objects.create(session=session, message_type='assistant', content=f'answer {i}')
+        
+        messages = TutorService._prepare_chat_history(session)
+        self.assertEqual([m.content for m in messages],
+                         ['Test system message', 'question 3', 'answer 3', 'question 4', 'answer 4'])
+        
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(content="Questions 0 to 2 were about joins.")
+        mock_get_chat_model.return_value = mock_llm
+        self.assertTrue(TutorService._update_history_summary(session))
+        
+        session.refresh_from_db()
+        self.assertEqual(session.history_summary, "Questions 0 to 2 were about joins.")
+        self.assertEqual(session.history_summary_until, session.messages.get(content='answer 2').id)
+        # Nothing new has left the window since
+        self.assertFalse(TutorService._update_history_summary(session))
+        
+        messages = TutorService._prepare_chat_history(session)
+        self.assertEqual(messages[1].content, "Summary of the earlier conversation: Questions 0 to 2 were about joins.")
+        self.assertEqual(len(messages), 6)
+
+
 class AiTutorViewTests(TestCase):
     """Test cases for AI Tutor views."""
     
@@ -366,6 +413,18 @@ class LLMFactoryTests(TestCase):
         with self.settings(OPENAI_API_KEY='test-key', OLLAMA_BASE_URL=None):
             LLMFactory.get_chat_model()
             mock_chat_openai.assert_called_once()
+    
+    @patch('apps.ai_tutor.services.ChatOllama')
+    def test_get_chat_model_caps_the_reply(self, mock_chat_ollama):
+        """The completion token limit is passed to the model."""
+        with self.settings(OLLAMA_BASE_URL='http://localhost:11434', OLLAMA_MODEL_NAME='llama3'):
+            LLMFactory.get_chat_model(max_tokens=256)
+            mock_chat_ollama.assert_called_once_with(
+                base_url='http://localhost:11434',
+                model='llama3',
+                temperature=0.7,
+                num_predict=256
+            )
 
 
 class ContentIndexingServiceTests(TestCase):
@@ -442,6 +501,688 @@ class ContentIndexingServiceTests(TestCase):
             mock_vector_store.add_texts.assert_called_once()
 
 
+class ContentIndexQueueTests(TestCase):
+    """Test cases for the deferred content indexing queue."""
+    
+    def setUp(self):
+        self.course = Course.objects.create(
+            title='Queue Course',
+            description='Queue Course Description',
+            slug='queue-course'
+        )
+        self.module = Module.objects.create(
+            course=self.course,
+            title='Queue Module',
+            description='Queue Module Description',
+            order=1
+        )
+        content_index_queue.flush()
+    
+    def _create_content(self, title='Queue Content'):
+        return Content.objects.create(
+            module=self.module,
+            title=title,
+            content='<p>Content for the indexing queue.</p>',
+            content_type='text',
+            order=Content.objects.filter(module=self.module).count() + 1
+        )
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_repeated_saves_coalesce_into_one_batch(self, mock_index_contents):
+        """Saving the same content repeatedly indexes it once, after commit."""
+        with override_settings(AI_TUTOR_INDEX_DEBOUNCE_SECONDS=60, AI_TUTOR_INDEX_IN_BACKGROUND=True):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                content = self._create_content()
+                content.title = 'Edited'
+                content.save()
+                content.save()
+                self.assertEqual(content_index_queue.pending(), (set(), set()))
+        content_index_queue._timer.cancel()
+        content_index_queue._timer = None
+        
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(content_index_queue.pending(), ({content.id}, set()))
+        content_index_queue.flush()
+        mock_index_contents.assert_called_once()
+        indexed = mock_index_contents.call_args[0][0]
+        self.assertEqual([c.id for c in indexed], [content.id])
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.remove_content_ids')
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_rolled_back_ids_are_dropped(self, mock_index_contents, mock_remove_content_ids):
+        """Saves and deletes undone by a rollback never reach the queue."""
+        kept = self._create_content('Kept')
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self._create_content('Rolled back')
+                    kept.delete()
+                    raise DatabaseError('abort')
+            except DatabaseError:
+                pass
+            committed = self._create_content('Committed')
+        
+        mock_remove_content_ids.assert_not_called()
+        indexed = mock_index_contents.call_args[0][0]
+        self.assertEqual([c.id for c in indexed], [committed.id])
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.remove_content_ids')
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_delete_cancels_pending_index(self, mock_index_contents, mock_remove_content_ids):
+        """A delete after a save in the same window only removes the content."""
+        queue = ContentIndexQueue(debounce_seconds=60)
+        with override_settings(AI_TUTOR_INDEX_IN_BACKGROUND=True):
+            queue.add([1, 2])
+            queue.add([2], remove=True)
+        queue._timer.cancel()
+        self.assertEqual(queue.pending(), ({1}, {2}))
+        
+        queue.flush()
+        mock_remove_content_ids.assert_called_once_with([2])
+        self.assertEqual(queue.pending(), (set(), set()))
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_background_mode_schedules_single_timer(self, mock_index_contents):
+        """Ids added within the debounce window share one scheduled flush."""
+        queue = ContentIndexQueue(debounce_seconds=60)
+        with override_settings(AI_TUTOR_INDEX_IN_BACKGROUND=True):
+            queue.add([1])
+            timer = queue._timer
+            queue.add([1, 3])
+            self.assertIs(queue._timer, timer)
+        timer.cancel()
+        mock_index_contents.assert_not_called()
+        self.assertEqual(queue.pending(), ({1, 3}, set()))
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_suspend_indexing_reindexes_once_at_exit(self, mock_index_contents):
+        """Bulk work inside suspend_indexing triggers one reindex at the end."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with suspend_indexing():
+                first = self._create_content('First')
+                with suspend_indexing():
+                    second = self._create_content('Second')
+                first.save()
+                self.assertTrue(content_index_queue.is_suspended)
+            self.assertFalse(content_index_queue.is_suspended)
+        
+        mock_index_contents.assert_called_once()
+        indexed = mock_index_contents.call_args[0][0]
+        self.assertEqual({c.id for c in indexed}, {first.id, second.id})
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_suspend_without_reindex_drops_ids(self, mock_index_contents):
+        """Callers that reindex themselves can discard the collected ids."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with suspend_indexing(reindex=False):
+                self._create_content()
+        
+        mock_index_contents.assert_not_called()
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents', return_value=2)
+    def test_flush_respects_batch_size(self, mock_index_contents):
+        """Pending ids are indexed in batches of the configured size."""
+        contents = [self._create_content(f'Batch {i}') for i in range(3)]
+        queue = ContentIndexQueue(batch_size=2)
+        with override_settings(AI_TUTOR_INDEX_IN_BACKGROUND=False):
+            queue.add([c.id for c in contents])
+        
+        self.assertEqual(mock_index_contents.call_count, 2)
+        self.assertEqual(len(mock_index_contents.call_args_list[0][0][0]), 2)
+        self.assertEqual(len(mock_index_contents.call_args_list[1][0][0]), 1)
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.index_contents')
+    def test_failed_batch_is_retried_then_dropped(self, mock_index_contents):
+        """A batch that fails to index is queued again until it runs out of retries."""
+        mock_index_contents.side_effect = ConnectionError('embedding model down')
+        content = self._create_content()
+        queue = ContentIndexQueue(debounce_seconds=60, max_retries=1)
+        with override_settings(AI_TUTOR_INDEX_IN_BACKGROUND=True):
+            queue.add([content.id])
+            queue._timer.cancel()
+            queue._timer = None
+            
+            queue.flush()
+            self.assertEqual(queue.pending(), ({content.id}, set()))
+            self.assertIsNotNone(queue._timer)
+            queue._timer.cancel()
+            queue._timer = None
+            
+            queue.flush()
+            self.assertEqual(queue.pending(), (set(), set()))
+            self.assertIsNone(queue._timer)
+        self.assertEqual(mock_index_contents.call_count, 2)
+
+
+class SharedModuleTests(SimpleTestCase):
+    """The tutor modules shared with learnmore-reborn must not diverge."""
+    
+    SHARED_MODULES = ('chunking.py', 'conversation.py', 'lexical_index.py')
+    APP_DIR = Path(__file__).resolve().parent
+    SIBLING_DIR = APP_DIR.parents[2] / 'learnmore-reborn' / 'ai_tutor'
+    
+    def test_copies_match_learnmore_reborn(self):
+        if not self.SIBLING_DIR.is_dir():
+            self.skipTest('learnmore-reborn is not checked out alongside')
+        for name in self.SHARED_MODULES:
+            with self.subTest(module=name):
+                self.assertEqual((self.APP_DIR / name).read_text(), (self.SIBLING_DIR / name).read_text())
+
+
+class ContentChunkingTests(TestCase):
+    """Test cases for structure-aware chunking of content."""
+    
+    HTML = (
+        '<h1>Sorting</h1><p>Sorting puts items in order.</p>'
+        '<h2>Quicksort</h2><p>Quicksort picks a pivot and partitions the list around it.</p>'
+        '<pre>def quicksort(items):\n    return items</pre>'
+        '<h2>Merge sort</h2><ul><li>Split the list</li><li>Merge sorted halves</li></ul>'
+    )
+    
+    def setUp(self):
+        self.course = Course.objects.create(
+            title='Chunk Course',
+            description='Chunk Course Description',
+            slug='chunk-course'
+        )
+        self.module = Module.objects.create(
+            course=self.course,
+            title='Chunk Module',
+            description='Chunk Module Description',
+            order=1
+        )
+        self.content = Content.objects.create(
+            module=self.module,
+            title='Sorting',
+            content=self.HTML,
+            content_type='text',
+            order=1
+        )
+    
+    def test_html_headings_lists_and_code(self):
+        """HTML content keeps its heading path, list items and code formatting."""
+        blocks = parse_html(self.HTML)
+        self.assertEqual([block.kind for block in blocks], ['paragraph', 'paragraph', 'code', 'list'])
+        self.assertEqual(blocks[2].heading_path, ('Sorting', 'Quicksort'))
+        self.assertIn('\n    return items', blocks[2].text)
+        self.assertEqual(blocks[3].text, '- Split the list\n- Merge sorted halves')
+    
+    def test_chunks_follow_sections(self):
+        """Each chunk stays within one section and within the token budget."""
+        chunker = ContentChunker(max_tokens=60, min_tokens=0, token_counter=lambda text: len(text.split()))
+        chunks = chunker.chunk(self.HTML)
+        self.assertEqual(
+            [chunk.section for chunk in chunks],
+            ['Sorting', 'Sorting > Quicksort', 'Sorting > Merge sort']
+        )
+        self.assertTrue(all(chunk.token_count <= 60 for chunk in chunks))
+    
+    @override_settings(AI_TUTOR_CHUNK_MAX_TOKENS=60)
+    @patch('apps.ai_tutor.services.ContentIndexingService.get_vector_store')
+    @patch('apps.ai_tutor.services.LLMFactory.get_embedding_model')
+    def test_index_contents_stores_chunks(self, mock_get_embedding_model, mock_get_vector_store):
+        """Indexing writes one vector store entry per chunk and replaces old chunks."""
+        mock_get_embedding_model.return_value.embed_documents.side_effect = lambda texts: [[0.5, 0.5] for _ in texts]
+        mock_vector_store = MagicMock()
+        mock_get_vector_store.return_value = mock_vector_store
+        
+        self.assertEqual(ContentIndexingService.index_contents([self.content]), 1)
+        
+        mock_vector_store.delete.assert_called_once_with(where={"content_id": {"$in": [self.content.id]}})
+        kwargs = mock_vector_store.add_texts.call_args.kwargs
+        self.assertGreater(len(kwargs['ids']), 1)
+        self.assertEqual(kwargs['ids'][0], f"content_{self.content.id}_0")
+        self.assertTrue(all(metadata['content_id'] == self.content.id for metadata in kwargs['metadatas']))
+        self.assertIn('heading_path', kwargs['metadatas'][0])
+        self.assertTrue(ContentEmbedding.objects.filter(content=self.content).exists())
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.get_vector_store')
+    @patch('apps.ai_tutor.services.LLMFactory.get_embedding_model')
+    def test_embedding_failure_leaves_the_index_untouched(self, mock_get_embedding_model, mock_get_vector_store):
+        """A failed embedding call raises without deleting chunks or overwriting embeddings."""
+        mock_get_embedding_model.return_value.embed_documents.side_effect = lambda texts: [[0.5, 0.5] for _ in texts]
+        ContentIndexingService.index_contents([self.content])
+        stored = ContentEmbedding.objects.get(content=self.content).as_array().tolist()
+        mock_get_vector_store.reset_mock()
+        
+        mock_get_embedding_model.return_value.embed_documents.side_effect = ConnectionError('embedding model down')
+        self.content.content += '<p>Edited.</p>'
+        with self.assertRaises(ConnectionError):
+            ContentIndexingService.index_contents([self.content])
+        
+        mock_get_vector_store.return_value.delete.assert_not_called()
+        mock_get_vector_store.return_value.add_texts.assert_not_called()
+        self.assertEqual(ContentEmbedding.objects.get(content=self.content).as_array().tolist(), stored)
+
+class HybridSearchTests(TestCase):
+    """Test cases for BM25 and vector rank fusion in content search."""
+    
+    def setUp(self):
+        import tempfile
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        self.vector_dir = tempfile.mkdtemp()
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.course = Course.objects.create(
+            title='Search Course',
+            description='Search Course Description',
+            slug='search-course'
+        )
+        self.module = Module.objects.create(
+            course=self.course,
+            title='Search Module',
+            description='Search Module Description',
+            order=1
+        )
+        self.contents = [
+            Content.objects.create(
+                module=self.module,
+                title=f'Lesson {i}',
+                content=f'<p>General notes for lesson {i} about arrays and sorting.</p>',
+                content_type='text',
+                order=i + 1
+            )
+            for i in range(6)
+        ]
+        self.target = Content.objects.create(
+            module=self.module,
+            title='Top k',
+            content='<p>Use np.argpartition to select the top k scores.</p>',
+            content_type='text',
+            order=10
+        )
+    
+    def test_bm25_ranks_exact_terms(self):
+        """BM25 scores identifiers and their parts."""
+        index = BM25Index()
+        index.add(1, 'sorting arrays in general')
+        index.add(2, 'call np.argpartition for top k')
+        self.assertEqual([hit[0] for hit in index.search('argpartition', 5)], [2])
+        self.assertEqual(reciprocal_rank_fusion([[1, 2], [2]])[0][0], 2)
+    
+    def test_search_content_finds_exact_term(self):
+        """Content mentioning the query term is returned first, whatever its vector rank."""
+        with override_settings(VECTOR_DB_PATH=self.vector_dir), \
+                patch('apps.ai_tutor.services.LLMFactory.get_embedding_model', return_value=self.embeddings):
+            ContentIndexingService.index_contents(self.contents + [self.target])
+            results = ContentIndexingService.search_content('how does argpartition work', course_id=self.course.id, k=3)
+        
+        self.assertEqual(results[0]['content_id'], self.target.id)
+        self.assertEqual(len({result['content_id'] for result in results}), len(results))
+        scores = [result['relevance_score'] for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertTrue(all(0 < score <= 1 for score in scores))
+    
+    def test_in_place_edit_by_another_process_reaches_bm25(self):
+        """Rewriting a chunk keeps the chunk count, so the BM25 mirror follows the index version."""
+        with override_settings(VECTOR_DB_PATH=self.vector_dir), \
+                patch('apps.ai_tutor.services.LLMFactory.get_embedding_model', return_value=self.embeddings):
+            ContentIndexingService.index_contents([self.target])
+            store = ContentIndexingService.get_vector_store(self.embeddings)
+            self.assertTrue(get_lexical_index(store).search('argpartition'))
+            
+            # Another process rewrites the chunk under the same id and bumps the shared version
+            chunk = store.get(include=['documents', 'metadatas'])
+            store.add_texts(['Use heapq.nlargest instead.'], metadatas=chunk['metadatas'], ids=chunk['ids'])
+            IndexVersion(lambda: self.vector_dir).bump()
+            
+            index = get_lexical_index(ContentIndexingService.get_vector_store(self.embeddings))
+        self.assertEqual(index.search('argpartition'), [])
+        self.assertEqual(len(index.search('nlargest')), 1)
+
+class EmbeddingStorageTests(TestCase):
+    """Test cases for binary ContentEmbedding vectors."""
+    
+    def setUp(self):
+        import tempfile
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        self.vector_dir = tempfile.mkdtemp()
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.course = Course.objects.create(
+            title='Vector Course',
+            description='Vector Course Description',
+            slug='vector-course'
+        )
+        self.module = Module.objects.create(
+            course=self.course,
+            title='Vector Module',
+            description='Vector Module Description',
+            order=1
+        )
+        self.contents = [
+            Content.objects.create(
+                module=self.module,
+                title=f'Lesson {i}',
+                content=f'<p>Notes for lesson {i}.</p>',
+                content_type='text',
+                order=i + 1
+            )
+            for i in range(3)
+        ]
+    
+    def index(self, **settings_overrides):
+        with override_settings(VECTOR_DB_PATH=self.vector_dir, **settings_overrides), \
+                patch('apps.ai_tutor.services.LLMFactory.get_embedding_model', return_value=self.embeddings):
+            ContentIndexingService.index_contents(self.contents)
+    
+    def test_encodings_round_trip(self):
+        """Each encoding stores 4, 2 or 1 bytes per value and decodes close to the original."""
+        import numpy as np
+        vector = np.linspace(-1, 1, 64, dtype=np.float32)
+        for encoding, size, tolerance in [('float32', 4, 0), ('float16', 2, 1e-3), ('int8', 1, 1e-2)]:
+            data, scale = encode_vector(vector, encoding)
+            self.assertEqual(len(data), 64 * size)
+            np.testing.assert_allclose(decode_vector(data, encoding, scale), vector, atol=tolerance)
+        # float32 vectors are read in place
+        self.assertFalse(decode_vector(encode_vector(vector)[0]).flags.writeable)
+    
+    def test_index_stores_binary_vectors(self):
+        import numpy as np
+        self.index()
+        embedding = ContentEmbedding.objects.get(content=self.contents[0])
+        self.assertEqual((embedding.dimension, embedding.encoding, len(bytes(embedding.vector))), (16, 'float32', 64))
+        self.assertIn('DeterministicFakeEmbedding', embedding.model_id)
+        expected = self.embeddings.embed_documents([ContentIndexingService._chunk_content(self.contents[0])[0].page_content])[0]
+        np.testing.assert_allclose(embedding.as_array(), expected, rtol=1e-6)
+        
+        self.index(AI_TUTOR_EMBEDDING_ENCODING='int8')
+        embedding.refresh_from_db()
+        self.assertEqual((embedding.dimension, embedding.encoding, len(bytes(embedding.vector))), (16, 'int8', 16))
+
+class SearchCacheTests(TestCase):
+    """Test cases for the query embedding and search result caches."""
+    
+    def setUp(self):
+        import tempfile
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        self.vector_dir = tempfile.mkdtemp()
+        self.embeddings = MagicMock(wraps=DeterministicFakeEmbedding(size=16))
+        self.course = Course.objects.create(
+            title='Cache Course',
+            description='Cache Course Description',
+            slug='cache-course'
+        )
+        self.module = Module.objects.create(
+            course=self.course,
+            title='Cache Module',
+            description='Cache Module Description',
+            order=1
+        )
+        self.content = Content.objects.create(
+            module=self.module,
+            title='Joins',
+            content='<p>An inner join keeps rows that match in both tables.</p>',
+            content_type='text',
+            order=1
+        )
+        search_results.clear()
+    
+    def search(self, query):
+        return ContentIndexingService.search_content(query, course_id=self.course.id, k=3)
+    
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  What is   an INNER join? '), 'what is an inner join')
+    
+    def test_repeated_search_is_served_from_cache(self):
+        """Equivalent queries are embedded once and searched once until the index changes."""
+        with override_settings(VECTOR_DB_PATH=self.vector_dir), \
+                patch('apps.ai_tutor.services.LLMFactory.get_embedding_model', return_value=self.embeddings):
+            ContentIndexingService.index_contents([self.content])
+            with patch('apps.ai_tutor.services.hybrid_search_with_scores', wraps=services.hybrid_search_with_scores) as mock_search:
+                first = self.search('What is an inner join?')
+                second = self.search('what is an INNER join')
+                self.assertEqual(mock_search.call_count, 1)
+            self.assertEqual(first, second)
+            self.assertEqual(self.embeddings.embed_query.call_count, 1)
+            
+            # Indexing new content bumps the index version, so the next search sees it
+            extra = Content.objects.create(
+                module=self.module,
+                title='Outer joins',
+                content='<p>An outer join also keeps inner join rows without a match.</p>',
+                content_type='text',
+                order=2
+            )
+            ContentIndexingService.index_contents([extra])
+            third = self.search('what is an inner join')
+        
+        self.assertEqual(self.embeddings.embed_query.call_count, 1)
+        self.assertIn(extra.id, [result['content_id'] for result in third])
+        self.assertNotIn(extra.id, [result['content_id'] for result in first])
+    
+    def test_index_version_is_shared_through_the_store_directory(self):
+        """A bump in one process is seen by another reading the same store."""
+        writer = IndexVersion(lambda: self.vector_dir)
+        reader = IndexVersion(lambda: self.vector_dir)
+        before = reader.current()
+        writer.bump()
+        self.assertNotEqual(reader.current(), before)
+        self.assertEqual(reader.current(), writer.current())
+    
+    def test_concurrent_bumps_are_not_lost(self):
+        """Writers with their own counters serialise on the lock file, as separate processes do."""
+        from concurrent.futures import ThreadPoolExecutor
+        writers = [IndexVersion(lambda: self.vector_dir) for _ in range(4)]
+        
+        def bump_many(writer):
+            for _ in range(25):
+                writer.bump()
+        
+        with ThreadPoolExecutor(max_workers=len(writers)) as pool:
+            list(pool.map(bump_many, writers))
+        self.assertEqual(IndexVersion(lambda: self.vector_dir).current()[1], 100)
+
+class PromptBudgetTests(TestCase):
+    """Test cases for the tutor prompt budget and token accounting."""
+    
+    def words(self, count, word='word'):
+        return ' '.join([word] * count)
+    
+    def test_plan_fits_the_context_window(self):
+        """Every part of the prompt is cut to fit, keeping the question and the best context."""
+        from types import SimpleNamespace
+        from langchain_core.messages import HumanMessage
+        from .prompt_budget import PromptBudgetPlanner
+        
+        planner = PromptBudgetPlanner(context_window=400, max_completion_tokens=100, system_max_tokens=40,
+                                      context_max_tokens=140, token_counter=lambda text: len(text.split()))
+        items = [SimpleNamespace(title='Best', content=self.words(70, 'best')),
+                 SimpleNamespace(title='Second', content=self.words(70, 'second')),
+                 SimpleNamespace(title='Third', content=self.words(70, 'third'))]
+        turns = [{'role': 'human' if i % 2 == 0 else 'ai', 'content': self.words(30, f'turn{i}')} for i in range(8)]
+        turns.append({'role': 'human', 'content': 'What is quicksort?'})
+        
+        plan = planner.plan(self.words(500, 'system'), turns, items, summary='Earlier we covered arrays.')
+        
+        self.assertLessEqual(plan.prompt_tokens, 300)
+        self.assertEqual(plan.max_completion_tokens, 100)
+        self.assertLessEqual(plan.token_counts['system'], 40)
+        self.assertLessEqual(plan.token_counts['context'], 140)
+        # The second item is cut to what is left and the third does not fit
+        self.assertEqual(plan.context_items, items[:2])
+        self.assertIn(self.words(70, 'best'), plan.messages[2].content)
+        self.assertNotIn(self.words(70, 'second'), plan.messages[2].content)
+        self.assertEqual(plan.messages[-1], HumanMessage(content='What is quicksort?'))
+        # Only the most recent turns fill what is left
+        history = [message.content for message in plan.messages[3:-1]]
+        self.assertTrue(history)
+        self.assertTrue(history[-1].startswith('turn7'))
+        self.assertNotIn(self.words(30, 'turn0'), history)
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.search_content')
+    @patch('apps.ai_tutor.services.LLMFactory.get_chat_model')
+    def test_reply_records_token_usage(self, mock_get_chat_model, mock_search_content):
+        """Context is searched once, sent to the LLM, and reported usage is recorded per course."""
+        from django.contrib.auth.models import Group
+        from langchain_core.messages import AIMessage
+        Group.objects.get_or_create(name='Student')
+        user = User.objects.create_user(username='budgetuser', password='password123')
+        course = Course.objects.create(title='Budget Course', description='Budget', slug='budget-course')
+        module = Module.objects.create(course=course, title='Budget Module', description='Budget', order=1)
+        content = Content.objects.create(module=module, title='Quicksort', content='<p>Quicksort</p>',
+                                         content_type='text', order=1)
+        session = TutorSession.objects.create(user=user, course=course, session_type='course')
+        TutorMessage.objects.create(session=session, message_type='system', content='Test system message')
+        
+        mock_search_content.return_value = [{
+            'content_id': content.id, 'title': 'Quicksort', 'text': 'Quicksort partitions around a pivot.',
+            'relevance_score': 1.0,
+        }]
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = AIMessage(
+            content='It picks a pivot.',
+            usage_metadata={'input_tokens': 120, 'output_tokens': 9, 'total_tokens': 129}
+        )
+        mock_get_chat_model.return_value = mock_llm
+        
+        message = TutorService.generate_assistant_response(session, 'How does quicksort work?')
+        
+        self.assertEqual(mock_search_content.call_count, 1)
+        self.assertEqual(mock_get_chat_model.call_args.kwargs['max_tokens'], settings.AI_TUTOR_MAX_COMPLETION_TOKENS)
+        sent = mock_llm.invoke.call_args[0][0]
+        self.assertTrue(any('Quicksort partitions around a pivot.' in m.content for m in sent))
+        self.assertEqual((message.prompt_tokens, message.completion_tokens, message.tokens_used), (120, 9, 129))
+        self.assertEqual(list(message.relevant_context_used.values_list('content_object_id', flat=True)), [content.id])
+        
+        usage = TutorService.get_token_usage()
+        self.assertEqual(usage, [{
+            'course_id': course.id, 'course_title': 'Budget Course', 'replies': 1,
+            'prompt_tokens': 120, 'completion_tokens': 9, 'total_tokens': 129,
+        }])
+    
+    def test_token_usage_is_ordered_by_total_tokens(self):
+        """Courses are ranked by prompt plus completion tokens."""
+        from django.contrib.auth.models import Group
+        Group.objects.get_or_create(name='Student')
+        user = User.objects.create_user(username='usageuser', password='password123')
+        for slug, prompt_tokens, completion_tokens in [('long-prompts', 100, 10), ('long-replies', 60, 80)]:
+            course = Course.objects.create(title=slug, description='Usage', slug=slug)
+            session = TutorSession.objects.create(user=user, course=course, session_type='course')
+            TutorMessage.objects.create(session=session, message_type='assistant', content='Reply',
+                                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        
+        usage = TutorService.get_token_usage()
+        self.assertEqual([(row['course_title'], row['total_tokens']) for row in usage],
+                         [('long-replies', 140), ('long-prompts', 110)])
+    
+    @patch('apps.ai_tutor.services.ContentIndexingService.search_content')
+    def test_context_follows_the_matched_chunk(self, mock_search_content):
+        """Questions matching different chunks of one content item each get their own chunk."""
+        from django.contrib.auth.models import Group
+        Group.objects.get_or_create(name='Student')
+        user = User.objects.create_user(username='chunkuser', password='password123')
+        course = Course.objects.create(title='Chunk Course', description='Chunks', slug='chunk-course')
+        module = Module.objects.create(course=course, title='Chunk Module', description='Chunks', order=1)
+        content = Content.objects.create(module=module, title='Sorting', content='<p>Sorting</p>',
+                                         content_type='text', order=1)
+        session = TutorSession.objects.create(user=user, course=course, session_type='course')
+        # Items added at session start hold the whole content
+        TutorContextItem.objects.create(session=session, context_type='content', content_object_id=content.id,
+                                        title='Sorting', content='Whole sorting chapter', order=0)
+        
+        for chunk in ['Quicksort partitions around a pivot.', 'Merge sort merges sorted halves.']:
+            mock_search_content.return_value = [{
+                'content_id': content.id, 'title': 'Sorting', 'text': chunk, 'relevance_score': 0.9,
+            }]
+            items = TutorService._get_relevant_context(session, 'How does it sort?')
+            self.assertEqual([item.content for item in items], [chunk])
+        
+        self.assertEqual(session.context_items.get().content, 'Merge sort merges sorted halves.')
+
+
+class TutorDispatcherTests(TestCase):
+    """Test cases for tutor LLM admission control."""
+    
+    def wait_for(self, condition, timeout=2.0):
+        import time
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "condition not reached")
+            time.sleep(0.005)
+    
+    def test_quiz_first_then_least_recently_served(self):
+        """Queued calls start by priority, then round-robin across students."""
+        import threading
+        dispatcher = TutorDispatcher(max_concurrent=1, max_per_user=1, queue_timeout=5)
+        started = []
+        
+        def request(user, priority):
+            with dispatcher.slot(user, priority):
+                started.append(user)
+        
+        threads = []
+        with dispatcher.slot('alice'):
+            for user, priority in [('alice', PRIORITY_INTERACTIVE), ('bob', PRIORITY_INTERACTIVE),
+                                   ('carol', PRIORITY_QUIZ)]:
+                thread = threading.Thread(target=request, args=(user, priority))
+                thread.start()
+                threads.append(thread)
+                self.wait_for(lambda: dispatcher.stats()['waiting'] == len(threads))
+        for thread in threads:
+            thread.join(5)
+        
+        self.assertEqual(started, ['carol', 'bob', 'alice'])
+        stats = dispatcher.stats()
+        self.assertEqual((stats['running'], stats['waiting'], stats['granted']), (0, 0, 4))
+        self.assertEqual(stats['granted_by_priority'], {'quiz': 1, 'interactive': 3})
+        self.assertGreater(stats['queue_ms']['max'], 0)
+    
+    def test_busy_when_queue_is_full_or_wait_too_long(self):
+        dispatcher = TutorDispatcher(max_concurrent=1, max_per_user=1, max_queued_per_user=1, queue_timeout=0.05)
+        with dispatcher.slot('alice'):
+            with self.assertRaises(TutorBusy):
+                with dispatcher.slot('bob'):
+                    pass
+            with self.assertRaises(TutorBusy):
+                with dispatcher.slot('bob', timeout=0):
+                    pass
+        with dispatcher.slot('bob', timeout=0):
+            pass
+        stats = dispatcher.stats()
+        self.assertEqual((stats['timed_out'], stats['granted']), (2, 2))
+    
+    def test_queue_fits_in_a_worker(self):
+        """Running and queued tutor calls leave threads free for pages in every threaded worker."""
+        import re
+        root = Path(settings.BASE_DIR)
+        for config in ('Procfile', 'railway.toml'):
+            command = (root / config).read_text()
+            self.assertIn('--worker-class gthread', command)
+            threads = int(re.search(r'--threads (\d+)', command).group(1))
+            self.assertLess(settings.AI_TUTOR_MAX_CONCURRENT_LLM_CALLS + settings.AI_TUTOR_MAX_QUEUED, threads)
+    
+    def test_active_quiz_raises_priority(self):
+        from django.contrib.auth.models import Group
+        from apps.courses.models import Quiz, QuizAttempt
+        Group.objects.get_or_create(name='Student')
+        user = User.objects.create_user(username='quizuser', password='password123')
+        course = Course.objects.create(title='Quiz Course', description='Quiz', slug='quiz-course')
+        module = Module.objects.create(course=course, title='Quiz Module', description='Quiz', order=1)
+        content = Content.objects.create(module=module, title='Quiz 1', content='Quiz', content_type='quiz', order=1)
+        session = TutorSession.objects.create(user=user, course=course, session_type='course')
+        
+        self.assertEqual(TutorService.request_priority(session), PRIORITY_INTERACTIVE)
+        quiz = Quiz.objects.create(content=content, title='Quiz 1')
+        QuizAttempt.objects.create(student=user, quiz=quiz)
+        self.assertEqual(TutorService.request_priority(session), PRIORITY_QUIZ)
+    
+    @patch('apps.ai_tutor.views.TutorService.generate_assistant_response')
+    def test_busy_response(self, mock_generate):
+        """A busy tutor answers 503 with Retry-After instead of an error."""
+        from django.contrib.auth.models import Group
+        Group.objects.get_or_create(name='Student')
+        user = User.objects.create_user(username='busyuser', password='password123')
+        session = TutorSession.objects.create(user=user)
+        self.client.login(username='busyuser', password='password123')
+        mock_generate.side_effect = TutorBusy(retry_after=3)
+        
+        response = self.client.post(reverse('ai_tutor:send_message', args=[session.id]), {'message': 'Hello'})
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertTrue(response.json()['busy'])
+        self.assertFalse(response.json()['success'])
+
+
 class APIEndpointTests(TestCase):
     """Test cases for API endpoints."""
     
@@ -25,4 +25,6 @@ urlpatterns = [
     # API endpoints
     path('api/sessions/', views.api_sessions, name='api_sessions'),
     path('api/chat/<int:session_id>/', views.api_chat, name='api_chat'),
+    path('api/usage/', views.api_token_usage, name='api_token_usage'),
+    path('api/load/', views.api_tutor_load, name='api_tutor_load'),
 ]
\ No newline at end of file
@@ -6,13 +6,17 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.db import transaction
 from django.urls import reverse
+from django.utils import timezone
 
 import json
 import logging
+from datetime import timedelta
 
+from apps.accounts.decorators import coordinator_required
 from apps.courses.models import Course, Module, Content
 from .models import TutorSession, TutorMessage, TutorContextItem
 from .services import TutorService, ContentIndexingService
+from .dispatcher import TutorBusy, tutor_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -153,6 +157,17 @@ def chat_view(request, session_id):
     
     return render(request, 'ai_tutor/chat.html', context)
 
+def busy_response(busy):
+    """503 reply telling the student to try again shortly, in the shape the chat page expects."""
+    response = JsonResponse({
+        'success': False,
+        'busy': True,
+        'error': "The tutor is helping a lot of students right now. Please try again in a few seconds.",
+        'retry_after': busy.retry_after,
+    }, status=503)
+    response['Retry-After'] = str(busy.retry_after)
+    return response
+
 @login_required
 @require_POST
 def send_message(request, session_id):
@@ -180,6 +195,8 @@ def send_message(request, session_id):
                     'timestamp': assistant_message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
                 }
             })
+    except TutorBusy as busy:
+        return busy_response(busy)
     except Exception as e:
         logger.error(f"Error in send_message: {str(e)}")
         return JsonResponse({
@@ -419,8 +436,35 @@ def api_chat(request, session_id):
                 'timestamp': assistant_message.created_at.isoformat(),
             })
         
+        except TutorBusy as busy:
+            return busy_response(busy)
         except Exception as e:
             logger.error(f"Error in API chat: {str(e)}")
             return JsonResponse({'error': str(e)}, status=500)
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@coordinator_required
+def api_token_usage(request):
+    """API endpoint reporting tutor token consumption per course."""
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number'}, status=400)
+    
+    course = None
+    if request.GET.get('course_id'):
+        course = get_object_or_404(Course, id=request.GET['course_id'])
+    
+    since = timezone.now() - timedelta(days=days) if days > 0 else None
+    usage = TutorService.get_token_usage(course=course, since=since)
+    return JsonResponse({
+        'days': days,
+        'courses': usage,
+        'total_tokens': sum(row['total_tokens'] for row in usage),
+    })
+
+@coordinator_required
+def api_tutor_load(request):
+    """API endpoint reporting tutor LLM concurrency and queue times for this process."""
+    return JsonResponse(tutor_dispatcher.stats())
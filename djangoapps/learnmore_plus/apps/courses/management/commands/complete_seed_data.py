@@ -11,12 +11,14 @@ from django.contrib.contenttypes.models import ContentType
 from apps.dashboard.models import UserActivity
 import random
 from datetime import timedelta
+from apps.ai_tutor.indexing_queue import suspend_indexing
 
 User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Completes seed data to ensure all demo scenarios are covered'
 
+    @suspend_indexing()
     def handle(self, *args, **kwargs):
         self.stdout.write(self.style.SUCCESS('Completing demo data to cover all scenarios...'))
         
@@ -9,6 +9,7 @@ from apps.courses.models import (
 )
 from datetime import timedelta
 import random
+from apps.ai_tutor.indexing_queue import suspend_indexing
 
 # Define paragraph generation function at module level so it's available throughout the file
 def generate_paragraph():
@@ -427,6 +428,7 @@ class Command(BaseCommand):
         else:
             return "Content placeholder"
 
+    @suspend_indexing()
     def handle(self, *args, **kwargs):
         self.stdout.write('Seeding enhanced demo data...')
 
@@ -5,6 +5,7 @@ from apps.courses.models import Category, Course, Module, Content, Quiz, Questio
 from django.contrib.auth.models import Group
 from datetime import timedelta
 import random
+from apps.ai_tutor.indexing_queue import suspend_indexing
 
 User = get_user_model()
 
@@ -76,6 +77,7 @@ class Command(BaseCommand):
 
         return quiz
 
+    @suspend_indexing()
     def handle(self, *args, **kwargs):
         # Create test users
         test_users = [
@@ -8,6 +8,7 @@ from apps.courses.models import (
 )
 from datetime import timedelta
 import random
+from apps.ai_tutor.indexing_queue import suspend_indexing
 
 User = get_user_model()
 
@@ -154,6 +155,7 @@ class Command(BaseCommand):
 
         return attempt
 
+    @suspend_indexing()
     def handle(self, *args, **kwargs):
         self.stdout.write('Seeding demo data...')
 
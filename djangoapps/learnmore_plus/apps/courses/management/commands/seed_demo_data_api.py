@@ -7,12 +7,14 @@ from apps.courses.models import Category, Course, Module, Content
 from apps.qr_codes.services import QRCodeService
 from django.utils import timezone
 from datetime import timedelta
+from apps.ai_tutor.indexing_queue import suspend_indexing
 
 User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Seeds the database with demo data using Django ORM'
 
+    @suspend_indexing()
     def handle(self, *args, **kwargs):
         self.stdout.write('Starting to seed demo data...')
         
@@ -0,0 +1,117 @@
+"""
+On-demand QR code images.
+
+``QRCode.save`` used to render a PNG into an ``ImageField`` file for every
+new code, so a course page that created module codes rendered one image per
+module inside the request, whether or not anyone looked at them. Images are
+now rendered from the code's URL when first requested through
+``qr_codes:image`` and kept on disk under QR_IMAGE_CACHE_DIR, named by the
+SHA-256 of the URL and format. Codes for the same URL share one file and the
+digest is a strong ETag. ``QRCode.image_url`` puts the digest in the image URL
+(``?v=``), so browsers and CDNs may keep those responses for
+QR_IMAGE_MAX_AGE seconds; requests without the current digest are served
+``no-cache`` and revalidate. SVG output is available for print and high-DPI
+screens.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+from io import BytesIO
+from typing import Optional, Tuple
+
+import qrcode
+from django.conf import settings
+from qrcode.image.svg import SvgPathImage
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+# Bump when the rendering parameters change, so old files are not served
+RENDER_VERSION = 1
+
+
+def _make_qr(data: str, **kwargs) -> qrcode.QRCode:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+        **kwargs
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(data: str) -> bytes:
+    img = _make_qr(data).make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_svg(data: str) -> bytes:
+    return _make_qr(data, image_factory=SvgPathImage).make_image().to_string()
+
+
+RENDERERS = {
+    "png": render_png,
+    "svg": render_svg,
+}
+
+
+def image_digest(data: str, fmt: str) -> str:
+    """Identify the image of ``data`` in ``fmt``."""
+    return hashlib.sha256(f"{RENDER_VERSION}:{fmt}:{data}".encode("utf-8")).hexdigest()
+
+
+class QRImageStore:
+    """Rendered QR images on the filesystem, keyed by ``image_digest``."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self._directory = directory
+
+    @property
+    def directory(self) -> str:
+        if self._directory is not None:
+            return str(self._directory)
+        return str(getattr(settings, 'QR_IMAGE_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'qr_cache')))
+
+    def path(self, digest: str, fmt: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{fmt}")
+
+    def get_or_render(self, data: str, fmt: str = "png") -> Tuple[str, bytes]:
+        """Return (digest, image bytes), rendering and storing the image on first use."""
+        digest = image_digest(data, fmt)
+        path = self.path(digest, fmt)
+        try:
+            with open(path, "rb") as handle:
+                return digest, handle.read()
+        except OSError:
+            pass
+
+        content = RENDERERS[fmt](data)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error caching QR image {digest}.{fmt}: {str(e)}")
+        return digest, content
+
+    def data_uri(self, data: str, fmt: str = "svg") -> str:
+        """The image as a ``data:`` URI, for documents rendered without HTTP access (PDFs)."""
+        _, content = self.get_or_render(data, fmt)
+        return f"data:{CONTENT_TYPES[fmt]};base64,{base64.b64encode(content).decode('ascii')}"
+
+
+image_store = QRImageStore()
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.qr_codes.models import QRCodeScan
+from apps.qr_codes.services import QRCodeService
+
+class Command(BaseCommand):
+    help = 'Recompute the daily QR scan rollups from the scan log (recent days, or all history)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=2,
+            help='Number of days to recompute, ending today',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every day since the first scan',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = today - timedelta(days=max(1, options['days']) - 1)
+        if options['all']:
+            first = QRCodeScan.objects.order_by('scanned_at').values_list('scanned_at', flat=True).first()
+            start = timezone.localdate(first) if first else today
+
+        day, rows = start, 0
+        while day <= today:
+            rows += QRCodeService.refresh_daily_stats(day)
+            day += timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {rows} code-days from {start} to {today}"))
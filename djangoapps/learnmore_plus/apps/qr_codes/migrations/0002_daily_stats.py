@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    QRCodeScan = apps.get_model("qr_codes", "QRCodeScan")
+    QRCodeDailyStat = apps.get_model("qr_codes", "QRCodeDailyStat")
+    rows = QRCodeScan.objects.annotate(day=TruncDate("scanned_at")).values("qr_code", "day").annotate(
+        scans=models.Count("id"),
+        unique_ips=models.Count("ip_address", distinct=True),
+    ).order_by()
+    QRCodeDailyStat.objects.bulk_create([
+        QRCodeDailyStat(qr_code_id=row["qr_code"], day=row["day"], scans=row["scans"], unique_ips=row["unique_ips"])
+        for row in rows.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qr_codes", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QRCodeDailyStat",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("scans", models.PositiveIntegerField(default=0)),
+                ("unique_ips", models.PositiveIntegerField(default=0)),
+                ("qr_code", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="daily_stats", to="qr_codes.qrcode")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["day"], name="qr_codes_qr_day_1ea86f_idx")],
+                "unique_together": {("qr_code", "day")},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
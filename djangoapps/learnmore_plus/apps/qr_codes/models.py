@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
+from django.urls import reverse
 import qrcode
 from io import BytesIO
 from django.core.files import File
@@ -30,7 +31,7 @@ class QRCode(models.Model):
         return f"QR Code for {self.content_object}"
     
     def generate_qr_code(self):
-        """Generate QR code image and save it."""
+        """Generate a QR code image file (only for exports; pages use ``image_url``)."""
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -50,10 +51,15 @@ class QRCode(models.Model):
         filename = f'qr_code_{self.content_type.model}_{self.object_id}.png'
         self.code.save(filename, File(buffer), save=False)
     
-    def save(self, *args, **kwargs):
-        if not self.code:
-            self.generate_qr_code()
-        super().save(*args, **kwargs)
+    def image_url(self, fmt='png'):
+        """
+        URL of this code's image, rendered on demand from ``url`` (``code`` is no longer filled in).
+        
+        The URL carries the image digest, so clients may cache it until ``url`` changes.
+        """
+        from .images import image_digest
+        path = reverse('qr_codes:image', kwargs={'pk': self.pk, 'fmt': fmt})
+        return f"{path}?v={image_digest(self.url, fmt)}"
 
 class QRCodeScan(models.Model):
     """Model for tracking QR code scans."""
@@ -69,3 +75,20 @@ class QRCodeScan(models.Model):
     
     def __str__(self):
         return f"Scan of {self.qr_code} at {self.scanned_at}"
+
+
+class QRCodeDailyStat(models.Model):
+    """Scans of one QR code on one day, kept up to date by ``QRCodeService.record_scan``."""
+    qr_code = models.ForeignKey(QRCode, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    scans = models.PositiveIntegerField(default=0)
+    unique_ips = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['qr_code', 'day']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.qr_code} on {self.day}: {self.scans} scans"
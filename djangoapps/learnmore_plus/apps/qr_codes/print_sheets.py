@@ -0,0 +1,272 @@
+"""
+Printable QR code sheets for courses.
+
+``print_course_qr_codes`` used to create the module codes one query at a
+time and run WeasyPrint inside the request, so every click on "Print QR
+codes" spent seconds building the same PDF again. A sheet is now identified
+by a fingerprint of what is printed on it (course title, module ids, titles,
+order and each code's URL) and stored under QR_PRINT_SHEET_DIR as
+``<course id>/<fingerprint>.pdf``. A stored sheet is served straight from
+disk; a missing one is built by a background worker while the browser polls
+``qr_codes:print_course_status``. Editing, adding or removing a module
+changes the fingerprint, so the next request builds a new sheet and the old
+file is deleted.
+
+Polling only reads: the status of a fingerprint comes from the stored PDF,
+this process's job, or a ``<fingerprint>.failed`` file holding the error of a
+failed build, so any worker process can answer it. Only the print view
+starts (or retries) a build.
+
+With QR_PRINT_IN_BACKGROUND off (tests) sheets are built inline.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .images import image_store
+from .services import QRCodeService
+
+logger = logging.getLogger(__name__)
+
+SHEET_TEMPLATE = 'qr_codes/print_course_qr_codes.html'
+# Bump when the sheet template changes, so stored sheets are rebuilt
+SHEET_VERSION = 1
+
+STATUS_QUEUED = 'queued'
+STATUS_RENDERING = 'rendering'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+FINGERPRINT_RE = re.compile(r'[0-9a-f]{64}')
+
+
+@dataclass
+class SheetJob:
+    """Progress of building one course sheet."""
+    course_id: int
+    fingerprint: str
+    status: str = STATUS_QUEUED
+    done: int = 0
+    total: int = 0
+    error: str = ''
+    context: Dict = field(default_factory=dict, repr=False)
+
+    @property
+    def progress(self) -> int:
+        """Percentage complete; QR images make up the work before the PDF itself."""
+        if self.status == STATUS_READY:
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(100 * self.done / (self.total + 1)))
+
+    def as_dict(self) -> Dict:
+        return {
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+        }
+
+
+def sheet_fingerprint(course, course_qr_code, modules, module_qr_codes) -> str:
+    """Identify the printed content of a course sheet."""
+    content = [
+        SHEET_VERSION,
+        course.id,
+        course.title,
+        course_qr_code.url,
+        [(module.id, module.title, module.order, module_qr_codes[module.id].url) for module in modules],
+    ]
+    canonical = json.dumps(content, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def write_pdf(html_string: str, base_url: str) -> bytes:
+    # Imported here so the app loads on hosts without WeasyPrint's native libraries
+    import weasyprint
+    return weasyprint.HTML(string=html_string, base_url=base_url).write_pdf()
+
+
+class CourseSheetBuilder:
+    """Builds course QR sheets in the background and keeps the finished PDFs on disk."""
+
+    def __init__(self, directory: Optional[str] = None, in_background: Optional[bool] = None):
+        self._directory = directory
+        self._in_background = in_background
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, SheetJob] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def directory(self) -> str:
+        if self._directory is not None:
+            return str(self._directory)
+        return str(getattr(settings, 'QR_PRINT_SHEET_DIR', os.path.join(settings.MEDIA_ROOT, 'qr_sheets')))
+
+    @property
+    def run_in_background(self) -> bool:
+        if self._in_background is not None:
+            return self._in_background
+        return bool(getattr(settings, 'QR_PRINT_IN_BACKGROUND', True))
+
+    def path(self, course_id: int, fingerprint: str) -> str:
+        return os.path.join(self.directory, str(course_id), f"{fingerprint}.pdf")
+
+    def failure_path(self, course_id: int, fingerprint: str) -> str:
+        return os.path.join(self.directory, str(course_id), f"{fingerprint}.failed")
+
+    def sheet_context(self, course, build_url: Callable[[str], str]) -> Dict:
+        """Load the course, its modules and their QR codes (created if missing) for the sheet."""
+        course_url = build_url(reverse('courses:course_detail', kwargs={'slug': course.slug}))
+        course_qr_code = QRCodeService.get_or_create_qr_code(course, course_url)
+
+        modules = list(course.modules.all().order_by('order'))
+        module_qr_codes = QRCodeService.get_or_create_qr_codes([
+            (module, build_url(reverse('courses:learn_module', kwargs={'slug': course.slug, 'module_order': module.order})))
+            for module in modules
+        ])
+        return {
+            'course': course,
+            'course_qr_code': course_qr_code,
+            'modules': modules,
+            'module_qr_codes': module_qr_codes,
+            'base_url': build_url('/'),
+        }
+
+    def request(self, course, build_url: Callable[[str], str]) -> SheetJob:
+        """
+        Return the job for the course's current sheet, starting it if needed.
+
+        A job whose sheet is already on disk comes back ``ready``; a failed
+        job is retried.
+        """
+        context = self.sheet_context(course, build_url)
+        fingerprint = sheet_fingerprint(
+            course, context['course_qr_code'], context['modules'], context['module_qr_codes']
+        )
+        if os.path.exists(self.path(course.id, fingerprint)):
+            return SheetJob(course.id, fingerprint, status=STATUS_READY)
+
+        with self._lock:
+            job = self._jobs.get(fingerprint)
+            if job is not None and job.status != STATUS_FAILED:
+                return job
+            job = SheetJob(course.id, fingerprint, total=len(context['modules']) + 1, context=context)
+            self._jobs[fingerprint] = job
+        self._clear_failure(course.id, fingerprint)
+
+        if self.run_in_background:
+            self._get_executor().submit(self._run, job)
+        else:
+            self._build(job)
+        return job
+
+    def status(self, course_id: int, fingerprint: str) -> SheetJob:
+        """Report the build of a sheet without starting or retrying it."""
+        if os.path.exists(self.path(course_id, fingerprint)):
+            return SheetJob(course_id, fingerprint, status=STATUS_READY)
+        with self._lock:
+            job = self._jobs.get(fingerprint)
+        if job is not None and job.course_id == course_id:
+            return job
+        try:
+            with open(self.failure_path(course_id, fingerprint)) as handle:
+                return SheetJob(course_id, fingerprint, status=STATUS_FAILED, error=handle.read())
+        except OSError:
+            # Queued, or being built by another worker process
+            return SheetJob(course_id, fingerprint)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                workers = int(getattr(settings, 'QR_PRINT_WORKERS', 1))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qr-print')
+            return self._executor
+
+    def _run(self, job: SheetJob) -> None:
+        try:
+            self._build(job)
+        finally:
+            close_old_connections()
+
+    def _build(self, job: SheetJob) -> None:
+        context = job.context
+        try:
+            job.status = STATUS_RENDERING
+            # Render (or load) the QR images up front so progress can be reported;
+            # the template then reads them back from the image store
+            image_store.data_uri(context['course_qr_code'].url)
+            job.done += 1
+            for module in context['modules']:
+                image_store.data_uri(context['module_qr_codes'][module.id].url)
+                job.done += 1
+
+            html_string = render_to_string(SHEET_TEMPLATE, {
+                'course': context['course'],
+                'course_qr_code': context['course_qr_code'],
+                'modules': context['modules'],
+                'module_qr_codes': context['module_qr_codes'],
+                'generated_at': timezone.now(),
+            })
+            self._store(job.course_id, job.fingerprint, write_pdf(html_string, context['base_url']))
+            job.status = STATUS_READY
+        except Exception as e:
+            logger.error(f"Error building QR sheet for course {job.course_id}: {str(e)}")
+            job.status = STATUS_FAILED
+            job.error = str(e)
+            self._record_failure(job)
+        finally:
+            job.context = {}
+            if job.status == STATUS_READY:
+                with self._lock:
+                    self._jobs.pop(job.fingerprint, None)
+
+    def _record_failure(self, job: SheetJob) -> None:
+        """Leave the error on disk for status requests answered by other processes."""
+        path = self.failure_path(job.course_id, job.fingerprint)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as handle:
+                handle.write(job.error)
+        except OSError as e:
+            logger.warning(f"Could not record QR sheet failure: {str(e)}")
+
+    def _clear_failure(self, course_id: int, fingerprint: str) -> None:
+        try:
+            os.remove(self.failure_path(course_id, fingerprint))
+        except OSError:
+            pass
+
+    def _store(self, course_id: int, fingerprint: str, content: bytes) -> None:
+        """Write the sheet atomically and drop the course's outdated sheets."""
+        path = self.path(course_id, fingerprint)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(content)
+        os.replace(tmp_path, path)
+
+        for name in os.listdir(directory):
+            if name.endswith(('.pdf', '.failed')) and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+sheet_builder = CourseSheetBuilder()
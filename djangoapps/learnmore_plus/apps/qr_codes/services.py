@@ -1,6 +1,10 @@
+import datetime
+
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from .models import QRCode, QRCodeScan
+from .models import QRCode, QRCodeDailyStat, QRCodeScan
 
 class QRCodeService:
     @staticmethod
@@ -16,6 +20,37 @@ class QRCodeService:
         
         return qr_code
     
+    @staticmethod
+    def get_or_create_qr_codes(objects_and_urls):
+        """
+        Get or create QR codes for many objects of one model in two queries.
+        
+        Takes (obj, url) pairs and returns {obj.id: QRCode}.
+        """
+        if not objects_and_urls:
+            return {}
+        content_type = ContentType.objects.get_for_model(objects_and_urls[0][0])
+        object_ids = [obj.id for obj, _ in objects_and_urls]
+        existing = {
+            qr_code.object_id: qr_code
+            for qr_code in QRCode.objects.filter(content_type=content_type, object_id__in=object_ids)
+        }
+        missing = [
+            QRCode(content_type=content_type, object_id=obj.id, url=url)
+            for obj, url in objects_and_urls if obj.id not in existing
+        ]
+        if missing:
+            # Another request may create some of the same codes; keep theirs
+            QRCode.objects.bulk_create(missing, ignore_conflicts=True)
+            existing.update(
+                (qr_code.object_id, qr_code)
+                for qr_code in QRCode.objects.filter(
+                    content_type=content_type,
+                    object_id__in=[qr_code.object_id for qr_code in missing],
+                )
+            )
+        return existing
+    
     @staticmethod
     def record_scan(qr_code, request=None):
         """Record a scan of a QR code."""
@@ -30,9 +65,60 @@ class QRCodeService:
             ip_address=request.META.get('REMOTE_ADDR') if request else None,
             user_agent=request.META.get('HTTP_USER_AGENT') if request else None
         )
+        QRCodeService.refresh_daily_stats(timezone.localdate(scan.scanned_at), qr_code_ids=[qr_code.id])
         
         return scan
     
+    @staticmethod
+    def refresh_daily_stats(day, qr_code_ids=None):
+        """
+        Recount the daily scan rollups for ``day`` from the scan log.
+        
+        Only the given codes are recounted when ``qr_code_ids`` is passed (at
+        scan time); otherwise every code, dropping rows whose scans are gone.
+        Recounting rather than incrementing keeps ``unique_ips`` exact.
+        """
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        scans = QRCodeScan.objects.filter(scanned_at__gte=start, scanned_at__lt=start + datetime.timedelta(days=1))
+        stats = QRCodeDailyStat.objects.filter(day=day)
+        if qr_code_ids is not None:
+            scans = scans.filter(qr_code_id__in=qr_code_ids)
+            stats = stats.filter(qr_code_id__in=qr_code_ids)
+        
+        rows = scans.values('qr_code').annotate(
+            scans=Count('id'),
+            unique_ips=Count('ip_address', distinct=True),
+        ).order_by()
+        counted = [
+            QRCodeDailyStat(qr_code_id=row['qr_code'], day=day, scans=row['scans'], unique_ips=row['unique_ips'])
+            for row in rows
+        ]
+        stats.exclude(qr_code_id__in=[stat.qr_code_id for stat in counted]).delete()
+        QRCodeDailyStat.objects.bulk_create(
+            counted,
+            update_conflicts=True,
+            unique_fields=['qr_code', 'day'],
+            update_fields=['scans', 'unique_ips'],
+        )
+        return len(counted)
+    
+    @staticmethod
+    def get_daily_scan_counts(start_day, end_day):
+        """Total scans per day from ``start_day`` to ``end_day`` inclusive, as (day, count) pairs."""
+        totals = dict(
+            QRCodeDailyStat.objects.filter(day__range=(start_day, end_day))
+            .values('day').annotate(total=Sum('scans')).values_list('day', 'total')
+        )
+        days = (end_day - start_day).days + 1
+        return [
+            (start_day + datetime.timedelta(days=offset), totals.get(start_day + datetime.timedelta(days=offset), 0))
+            for offset in range(days)
+        ]
+    
+    @staticmethod
+    def get_total_scans():
+        return QRCodeDailyStat.objects.aggregate(total=Coalesce(Sum('scans'), 0))['total']
+    
     @staticmethod
     def get_qr_codes_for_object(obj):
         """Get all QR codes for a given object."""
@@ -5,4 +5,16 @@ register = template.Library()
 @register.filter
 def get_item(dictionary, key):
     """Get an item from a dictionary by key"""
-    return dictionary.get(key)
\ No newline at end of file
+    return dictionary.get(key)
+
+@register.simple_tag
+def qr_image_url(qr_code, fmt='png'):
+    """URL of a QR code's image, rendered on demand"""
+    return qr_code.image_url(fmt) if qr_code else ''
+
+
+@register.simple_tag
+def qr_image_data_uri(qr_code, fmt='svg'):
+    """A QR code's image inlined as a data URI, for PDFs rendered without HTTP access"""
+    from ..images import image_store
+    return image_store.data_uri(qr_code.url, fmt) if qr_code else ''
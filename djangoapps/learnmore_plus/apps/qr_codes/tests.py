@@ -391,3 +391,267 @@ class QRCodeTemplateTagTests(TestCase):
         
         # Check that we got the right URL
         self.assertEqual(url, self.qr_code.code.url)
+
+
+class QRCodeImageTests(TestCase):
+    """Test cases for on-demand QR code images."""
+    
+    def setUp(self):
+        import tempfile
+        from .images import QRImageStore
+        self.store = QRImageStore(tempfile.mkdtemp())
+        store_patcher = patch('apps.qr_codes.views.image_store', self.store)
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
+        
+        self.course = Course.objects.create(
+            title='Image Course',
+            description='Image Course Description',
+            slug='image-course'
+        )
+        self.qr_code = QRCode.objects.create(
+            content_type=ContentType.objects.get_for_model(self.course),
+            object_id=self.course.id,
+            url='http://example.com/courses/image-course/'
+        )
+        self.client = Client()
+    
+    def test_saving_a_code_renders_nothing(self):
+        """Creating a code no longer writes an image file."""
+        self.assertFalse(self.qr_code.code)
+    
+    def test_png_and_svg_are_served_with_cache_headers(self):
+        response = self.client.get(self.qr_code.image_url('png'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('"'))
+        
+        response = self.client.get(self.qr_code.image_url('svg'))
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+    
+    def test_unversioned_or_stale_urls_must_revalidate(self):
+        path = reverse('qr_codes:image', kwargs={'pk': self.qr_code.pk, 'fmt': 'png'})
+        self.assertEqual(self.client.get(path)['Cache-Control'], 'no-cache')
+        
+        stale = self.qr_code.image_url()
+        self.qr_code.url = 'http://example.com/courses/image-course/v2/'
+        self.qr_code.save()
+        self.assertNotEqual(self.qr_code.image_url(), stale)
+        self.assertEqual(self.client.get(stale)['Cache-Control'], 'no-cache')
+        self.assertEqual(self.client.post(self.qr_code.image_url()).status_code, 405)
+    
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(self.qr_code.image_url())['ETag']
+        response = self.client.get(self.qr_code.image_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_identical_urls_render_once(self):
+        """Codes encoding the same URL share one stored image."""
+        module = Module.objects.create(course=self.course, title='Intro', description='Intro', order=1)
+        other = QRCode.objects.create(
+            content_type=ContentType.objects.get_for_model(module),
+            object_id=module.id,
+            url=self.qr_code.url
+        )
+        with patch('apps.qr_codes.images.render_png', return_value=b'PNG') as render:
+            with patch.dict('apps.qr_codes.images.RENDERERS', {'png': render}):
+                first = self.client.get(self.qr_code.image_url())
+                second = self.client.get(other.image_url())
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first['ETag'], second['ETag'])
+    
+    def test_unknown_format_or_code_is_not_found(self):
+        self.assertEqual(self.client.get(self.qr_code.image_url('gif')).status_code, 404)
+        missing = reverse('qr_codes:image', kwargs={'pk': self.qr_code.pk + 100, 'fmt': 'png'})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+
+class QRCodePrintSheetTests(TestCase):
+    """Test cases for cached, background-built course QR sheets."""
+    
+    def setUp(self):
+        import tempfile
+        from .images import QRImageStore
+        from .print_sheets import CourseSheetBuilder
+        from django.contrib.auth.models import Group
+        self.builder = CourseSheetBuilder(tempfile.mkdtemp(), in_background=False)
+        for target, value in [
+            ('apps.qr_codes.views.sheet_builder', self.builder),
+            ('apps.qr_codes.print_sheets.image_store', QRImageStore(tempfile.mkdtemp())),
+        ]:
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        pdf_patcher = patch('apps.qr_codes.print_sheets.write_pdf', return_value=b'%PDF sheet')
+        self.write_pdf = pdf_patcher.start()
+        self.addCleanup(pdf_patcher.stop)
+        
+        Group.objects.get_or_create(name='Student')
+        self.user = User.objects.create_user(username='printer', password='password123')
+        self.course = Course.objects.create(title='Print Course', description='Print Course', slug='print-course')
+        self.modules = [
+            Module.objects.create(course=self.course, title=f'Module {i}', description='', order=i)
+            for i in range(1, 4)
+        ]
+        self.client = Client()
+        self.client.login(username='printer', password='password123')
+        self.url = reverse('qr_codes:print_course', args=[self.course.id])
+    
+    def test_sheet_is_built_once_and_then_served_from_disk(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('QR_Codes_print-course.pdf', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF sheet')
+        self.assertEqual(QRCode.objects.count(), 4)
+        
+        self.client.get(self.url)
+        self.write_pdf.assert_called_once()
+    
+    def test_module_change_rebuilds_and_replaces_the_sheet(self):
+        self.client.get(self.url)
+        self.modules[0].title = 'Renamed'
+        self.modules[0].save()
+        self.client.get(self.url)
+        
+        self.assertEqual(self.write_pdf.call_count, 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.builder.directory, str(self.course.id)))), 1)
+    
+    def test_module_codes_are_created_in_bulk(self):
+        # Course code get_or_create (with its savepoint), the modules, then one
+        # select, one insert and one reselect for all module codes
+        with self.assertNumQueries(8):
+            self.builder.sheet_context(self.course, lambda path: f'http://testserver{path}')
+    
+    def test_background_build_reports_progress_until_ready(self):
+        self.builder._in_background = True
+        with patch.object(self.builder, '_get_executor') as get_executor:
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 202)
+            status_url = response.context['status_url']
+            self.assertTrue(status_url.startswith(reverse('qr_codes:print_course_status', args=[self.course.id])))
+            self.assertContains(response, status_url, status_code=202)
+            
+            status = self.client.get(status_url).json()
+            self.assertEqual(status['status'], 'queued')
+            self.assertIsNone(status['download_url'])
+            # The pending job is reused rather than queued again
+            self.client.get(self.url)
+            get_executor.return_value.submit.assert_called_once()
+            _, job = get_executor.return_value.submit.call_args[0]
+        
+        self.builder._run(job)
+        status = self.client.get(status_url).json()
+        self.assertEqual(status['status'], 'ready')
+        self.assertEqual(status['progress'], 100)
+        self.assertEqual(status['download_url'], self.url)
+    
+    def test_status_reports_a_background_failure_without_retrying(self):
+        from .print_sheets import CourseSheetBuilder
+        self.builder._in_background = True
+        self.write_pdf.side_effect = RuntimeError('no fonts')
+        with patch.object(self.builder, '_get_executor') as get_executor:
+            status_url = self.client.get(self.url).context['status_url']
+            _, job = get_executor.return_value.submit.call_args[0]
+            self.builder._run(job)
+            
+            status = self.client.get(status_url).json()
+            self.assertEqual((status['status'], status['error']), ('failed', 'no fonts'))
+            get_executor.return_value.submit.assert_called_once()
+            # Another worker process sees the failure through the marker on disk
+            other_worker = CourseSheetBuilder(self.builder.directory)
+            with patch('apps.qr_codes.views.sheet_builder', other_worker):
+                self.assertEqual(self.client.get(status_url).json()['error'], 'no fonts')
+            
+            # Only the print view retries
+            self.client.get(self.url)
+            self.assertEqual(get_executor.return_value.submit.call_count, 2)
+            self.assertEqual(self.client.get(status_url).json()['status'], 'queued')
+        
+        self.assertEqual(self.client.get(status_url.split('?')[0]).status_code, 404)
+    
+    def test_failed_build_is_reported_and_retried(self):
+        self.write_pdf.side_effect = RuntimeError('no fonts')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 500)
+        
+        self.write_pdf.side_effect = None
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class QRCodeDailyStatTests(TestCase):
+    """Test cases for the daily QR scan rollups."""
+    
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        Group.objects.get_or_create(name='Student')
+        self.user = User.objects.create_user(username='analyst', password='password123')
+        self.course = Course.objects.create(title='Stats Course', description='Stats Course', slug='stats-course')
+        self.module = Module.objects.create(course=self.course, title='Intro', description='', order=1)
+        self.course_code = QRCodeService.get_or_create_qr_code(self.course, 'http://example.com/course/')
+        self.module_code = QRCodeService.get_or_create_qr_code(self.module, 'http://example.com/module/')
+        self.factory = RequestFactory()
+    
+    def scan(self, qr_code, ip):
+        return QRCodeService.record_scan(qr_code, self.factory.get('/', REMOTE_ADDR=ip))
+    
+    def test_record_scan_updates_the_rollup(self):
+        from .models import QRCodeDailyStat
+        self.scan(self.course_code, '10.0.0.1')
+        self.scan(self.course_code, '10.0.0.1')
+        self.scan(self.course_code, '10.0.0.2')
+        
+        stat = QRCodeDailyStat.objects.get()
+        self.assertEqual((stat.qr_code, stat.day), (self.course_code, timezone.localdate()))
+        self.assertEqual((stat.scans, stat.unique_ips), (3, 2))
+    
+    def test_migration_backfills_existing_scans(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .models import QRCodeDailyStat
+        QRCodeScan.objects.create(qr_code=self.course_code, ip_address='10.0.0.1')
+        QRCodeScan.objects.create(qr_code=self.course_code, ip_address='10.0.0.1')
+        QRCodeScan.objects.create(qr_code=self.module_code, ip_address='10.0.0.2')
+        self.assertFalse(QRCodeDailyStat.objects.exists())
+        
+        import_module('apps.qr_codes.migrations.0002_daily_stats').backfill_daily_stats(apps, None)
+        
+        self.assertEqual(
+            set(QRCodeDailyStat.objects.values_list('qr_code', 'day', 'scans', 'unique_ips')),
+            {(self.course_code.id, timezone.localdate(), 2, 1), (self.module_code.id, timezone.localdate(), 1, 1)}
+        )
+    
+    def test_refresh_drops_days_without_scans(self):
+        from .models import QRCodeDailyStat
+        self.scan(self.course_code, '10.0.0.1')
+        QRCodeScan.objects.all().delete()
+        QRCodeService.refresh_daily_stats(timezone.localdate())
+        self.assertFalse(QRCodeDailyStat.objects.exists())
+    
+    def test_statistics_view_reads_rollups(self):
+        for _ in range(3):
+            self.scan(self.course_code, '10.0.0.1')
+        self.scan(self.module_code, '10.0.0.1')
+        self.client.login(username='analyst', password='password123')
+        
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('qr_codes:statistics'))
+        
+        self.assertEqual(response.status_code, 200)
+        # The raw scan log is not read
+        self.assertFalse(any('qr_codes_qrcodescan' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(response.context['total_scans'], 4)
+        self.assertEqual(response.context['average_scans'], 2.0)
+        self.assertEqual(len(response.context['dates']), 31)
+        self.assertEqual(response.context['scan_counts'][-1], 4)
+        self.assertEqual(sum(response.context['scan_counts']), 4)
+        self.assertEqual(
+            [(code, code.total_scans) for code in response.context['top_qr_codes']],
+            [(self.course_code, 3), (self.module_code, 1)]
+        )
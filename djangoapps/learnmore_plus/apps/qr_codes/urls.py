@@ -7,6 +7,8 @@ urlpatterns = [
     path('scan/', views.scan_qr_code, name='scan'),
     path('scan/<int:qr_code_id>/', views.scan_qr_code_redirect, name='scan_code'),
     path('detail/<int:pk>/', views.QRCodeDetailView.as_view(), name='detail'),
+    path('image/<int:pk>.<str:fmt>', views.qr_code_image, name='image'),
     path('statistics/', views.qr_code_statistics, name='statistics'),
     path('print/course/<int:course_id>/', views.print_course_qr_codes, name='print_course'),
+    path('print/course/<int:course_id>/status/', views.print_course_qr_codes_status, name='print_course_status'),
 ] 
\ No newline at end of file
@@ -7,11 +7,15 @@ from django.utils import timezone
 from datetime import timedelta
 from .models import QRCode, QRCodeScan
 from .services import QRCodeService
+from .images import CONTENT_TYPES, image_digest, image_store
+from .print_sheets import FINGERPRINT_RE, STATUS_FAILED, STATUS_READY, sheet_builder
 from django.db import models
+from django.db.models.functions import Coalesce
 from apps.courses.models import Course, Module
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-import weasyprint
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET
+from django.conf import settings
 
 def scan_qr_code_redirect(request, qr_code_id):
     """Handle QR code scanning and redirect to the appropriate URL."""
@@ -23,6 +27,40 @@ def scan_qr_code_redirect(request, qr_code_id):
     # Redirect to the URL
     return redirect(qr_code.url)
 
+@require_GET
+def qr_code_image(request, pk, fmt):
+    """
+    Serve a QR code image (PNG or SVG), rendered once per URL.
+    
+    Clients may cache URLs carrying the current digest (``QRCode.image_url``).
+    Any other request must revalidate its ETag, so a code whose ``url`` changed
+    is never shown from a stale cache.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise Http404("Unknown image format")
+    url = QRCode.objects.filter(pk=pk).values_list('url', flat=True).first()
+    if url is None:
+        raise Http404("QR code not found")
+    
+    digest = image_digest(url, fmt)
+    if request.GET.get('v') == digest:
+        cache_control = {'public': True, 'immutable': True, 'max_age': getattr(settings, 'QR_IMAGE_MAX_AGE', 86400)}
+    else:
+        cache_control = {'no_cache': True}
+    etag = f'"{digest}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        patch_cache_control(not_modified, **cache_control)
+        return not_modified
+    
+    _, content = image_store.get_or_render(url, fmt)
+    response = HttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    response['ETag'] = etag
+    patch_cache_control(response, **cache_control)
+    if request.GET.get('download'):
+        response['Content-Disposition'] = f'attachment; filename="qr_code_{pk}.{fmt}"'
+    return response
+
 @login_required
 def scan_qr_code(request):
     """View for scanning QR codes."""
@@ -44,37 +82,23 @@ class QRCodeDetailView(DetailView):
 @login_required
 def qr_code_statistics(request):
     """View for displaying QR code statistics."""
-    # Get date range for statistics (last 30 days)
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=30)
-    
-    # Get scan data for the period
-    scans = QRCodeScan.objects.filter(
-        scanned_at__range=(start_date, end_date)
-    ).order_by('scanned_at')
-    
-    # Prepare data for the chart
-    dates = []
-    scan_counts = []
-    current_date = start_date
-    while current_date <= end_date:
-        next_date = current_date + timedelta(days=1)
-        count = scans.filter(
-            scanned_at__range=(current_date, next_date)
-        ).count()
-        dates.append(current_date.strftime('%Y-%m-%d'))
-        scan_counts.append(count)
-        current_date = next_date
+    # Scans per day for the last 30 days, from the daily rollups
+    end_day = timezone.localdate()
+    daily_counts = QRCodeService.get_daily_scan_counts(end_day - timedelta(days=30), end_day)
+    dates = [day.strftime('%Y-%m-%d') for day, _ in daily_counts]
+    scan_counts = [count for _, count in daily_counts]
     
     # Get top QR codes
     top_qr_codes = QRCode.objects.annotate(
-        total_scans=models.Count('scans')  # Changed from scan_count to total_scans to avoid conflict
+        total_scans=Coalesce(models.Sum('daily_stats__scans'), 0)
     ).order_by('-total_scans')[:5]
     
+    total_scans = QRCodeService.get_total_scans()
+    qr_code_count = QRCode.objects.count()
     context = {
-        'total_scans': QRCodeScan.objects.count(),
-        'active_qr_codes': QRCode.objects.count(),
-        'average_scans': QRCodeScan.objects.count() / max(QRCode.objects.count(), 1),
+        'total_scans': total_scans,
+        'active_qr_codes': qr_code_count,
+        'average_scans': total_scans / max(qr_code_count, 1),
         'dates': dates,
         'scan_counts': scan_counts,
         'top_qr_codes': top_qr_codes,
@@ -84,38 +108,35 @@ def qr_code_statistics(request):
 
 @login_required
 def print_course_qr_codes(request, course_id):
-    """Generate a printable sheet with QR codes for a course and its modules."""
+    """Serve the printable QR code sheet for a course, building it in the background if needed."""
     course = get_object_or_404(Course, id=course_id)
+    job = sheet_builder.request(course, request.build_absolute_uri)
     
-    # Get course QR code
-    course_url = request.build_absolute_uri(
-        reverse('courses:course_detail', kwargs={'slug': course.slug})
-    )
-    course_qr_code = QRCodeService.get_or_create_qr_code(course, course_url)
-    
-    # Get module QR codes
-    modules = course.modules.all().order_by('order')
-    module_qr_codes = {}
-    for module in modules:
-        module_url = request.build_absolute_uri(
-            reverse('courses:course_learn', kwargs={'slug': course.slug, 'module_order': module.order})
+    if job.status == STATUS_READY:
+        return FileResponse(
+            open(sheet_builder.path(course.id, job.fingerprint), 'rb'),
+            as_attachment=True,
+            filename=f"QR_Codes_{course.slug}.pdf",
+            content_type='application/pdf',
         )
-        module_qr_codes[module.id] = QRCodeService.get_or_create_qr_code(module, module_url)
     
-    # Render the template
+    # Not built yet: show a page that polls the status endpoint and downloads when ready
     context = {
         'course': course,
-        'course_qr_code': course_qr_code,
-        'modules': modules,
-        'module_qr_codes': module_qr_codes,
-        'generated_at': timezone.now(),
+        'job': job,
+        'status_url': f"{reverse('qr_codes:print_course_status', args=[course.id])}?sheet={job.fingerprint}",
     }
-    
-    # Generate PDF
-    html_string = render_to_string('qr_codes/print_course_qr_codes.html', context)
-    pdf_file = weasyprint.HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-    
-    # Create response
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="QR_Codes_{course.slug}.pdf"'
-    return response
+    return render(request, 'qr_codes/print_course_status.html', context,
+                  status=500 if job.status == STATUS_FAILED else 202)
+
+@login_required
+def print_course_qr_codes_status(request, course_id):
+    """Report the progress of a course's QR code sheet as JSON; only the print view starts or retries a build."""
+    fingerprint = request.GET.get('sheet', '')
+    if not FINGERPRINT_RE.fullmatch(fingerprint):
+        raise Http404("Unknown QR code sheet")
+    course = get_object_or_404(Course, id=course_id)
+    job = sheet_builder.status(course.id, fingerprint)
+    data = job.as_dict()
+    data['download_url'] = reverse('qr_codes:print_course', args=[course.id]) if job.status == STATUS_READY else None
+    return JsonResponse(data)
@@ -113,6 +113,15 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# QR code images are rendered on demand and kept here, named by a hash of the encoded URL;
+# clients may cache a digest-versioned image URL for QR_IMAGE_MAX_AGE seconds
+QR_IMAGE_CACHE_DIR = os.getenv('QR_IMAGE_CACHE_DIR', str(MEDIA_ROOT / "qr_cache"))
+QR_IMAGE_MAX_AGE = int(os.getenv('QR_IMAGE_MAX_AGE', str(60 * 60 * 24)))
+# Printable course QR sheets are built by background workers and kept here until the modules change
+QR_PRINT_SHEET_DIR = os.getenv('QR_PRINT_SHEET_DIR', str(MEDIA_ROOT / "qr_sheets"))
+QR_PRINT_WORKERS = int(os.getenv('QR_PRINT_WORKERS', '1'))
+QR_PRINT_IN_BACKGROUND = True
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -218,6 +227,44 @@ OLLAMA_MODEL_NAME = os.getenv('OLLAMA_MODEL_NAME', 'llama3')
 OLLAMA_EMBEDDING_MODEL = os.getenv('OLLAMA_EMBEDDING_MODEL', 'nomic-embed-text')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 VECTOR_DB_PATH = os.path.join(BASE_DIR, 'vectorstore')
+# Content saves are indexed in batches after commit; saves within the window coalesce
+AI_TUTOR_INDEX_DEBOUNCE_SECONDS = float(os.getenv('AI_TUTOR_INDEX_DEBOUNCE_SECONDS', '2.0'))
+AI_TUTOR_INDEX_BATCH_SIZE = int(os.getenv('AI_TUTOR_INDEX_BATCH_SIZE', '32'))
+AI_TUTOR_INDEX_IN_BACKGROUND = True
+# Failed batches (e.g. the embedding model is down) are queued again this many times
+AI_TUTOR_INDEX_RETRIES = int(os.getenv('AI_TUTOR_INDEX_RETRIES', '3'))
+# Content is split on headings/lists/code blocks into chunks of at most this many tokens
+AI_TUTOR_CHUNK_MAX_TOKENS = int(os.getenv('AI_TUTOR_CHUNK_MAX_TOKENS', '350'))
+AI_TUTOR_CHUNK_OVERLAP_TOKENS = int(os.getenv('AI_TUTOR_CHUNK_OVERLAP_TOKENS', '40'))
+# Storage of ContentEmbedding vectors: float32 (exact), float16 or int8 (quantised)
+AI_TUTOR_EMBEDDING_ENCODING = os.getenv('AI_TUTOR_EMBEDDING_ENCODING', 'float32')
+# Conversation memory: the last N messages, trimmed to a token budget, plus a
+# running summary of older turns refreshed every AI_TUTOR_SUMMARY_BATCH turns
+AI_TUTOR_HISTORY_MAX_MESSAGES = int(os.getenv('AI_TUTOR_HISTORY_MAX_MESSAGES', '10'))
+AI_TUTOR_HISTORY_TOKEN_BUDGET = int(os.getenv('AI_TUTOR_HISTORY_TOKEN_BUDGET', '1500'))
+AI_TUTOR_SUMMARY_TOKEN_BUDGET = int(os.getenv('AI_TUTOR_SUMMARY_TOKEN_BUDGET', '300'))
+AI_TUTOR_SUMMARY_BATCH = int(os.getenv('AI_TUTOR_SUMMARY_BATCH', '6'))
+# Prompt budget: the model's context window, less room for the reply, shared by
+# the system prompt, retrieved course material and conversation history
+AI_TUTOR_CONTEXT_WINDOW_TOKENS = int(os.getenv('AI_TUTOR_CONTEXT_WINDOW_TOKENS', '4096'))
+AI_TUTOR_MAX_COMPLETION_TOKENS = int(os.getenv('AI_TUTOR_MAX_COMPLETION_TOKENS', '512'))
+AI_TUTOR_SYSTEM_PROMPT_MAX_TOKENS = int(os.getenv('AI_TUTOR_SYSTEM_PROMPT_MAX_TOKENS', '800'))
+AI_TUTOR_CONTEXT_MAX_TOKENS = int(os.getenv('AI_TUTOR_CONTEXT_MAX_TOKENS', '1200'))
+AI_TUTOR_CONTEXT_MAX_ITEMS = int(os.getenv('AI_TUTOR_CONTEXT_MAX_ITEMS', '3'))
+# Search caches: query embeddings by normalised text, results until the index changes
+AI_TUTOR_QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('AI_TUTOR_QUERY_EMBEDDING_CACHE_SIZE', '2048'))
+AI_TUTOR_SEARCH_RESULT_CACHE_SIZE = int(os.getenv('AI_TUTOR_SEARCH_RESULT_CACHE_SIZE', '4096'))
+# LLM admission control (per gunicorn worker process, shared by its threads): concurrent
+# calls overall and per student, how many requests may queue, and how long one waits
+# before getting a "busy" reply. Calls plus queued requests must stay below gunicorn --threads (16).
+# Students with a quiz attempt active in the last AI_TUTOR_QUIZ_ACTIVE_MINUTES go first.
+AI_TUTOR_MAX_CONCURRENT_LLM_CALLS = int(os.getenv('AI_TUTOR_MAX_CONCURRENT_LLM_CALLS', '4'))
+AI_TUTOR_MAX_CONCURRENT_PER_USER = int(os.getenv('AI_TUTOR_MAX_CONCURRENT_PER_USER', '1'))
+AI_TUTOR_MAX_QUEUED = int(os.getenv('AI_TUTOR_MAX_QUEUED', '8'))
+AI_TUTOR_MAX_QUEUED_PER_USER = int(os.getenv('AI_TUTOR_MAX_QUEUED_PER_USER', '2'))
+AI_TUTOR_QUEUE_TIMEOUT_SECONDS = float(os.getenv('AI_TUTOR_QUEUE_TIMEOUT_SECONDS', '20'))
+AI_TUTOR_BUSY_RETRY_SECONDS = int(os.getenv('AI_TUTOR_BUSY_RETRY_SECONDS', '5'))
+AI_TUTOR_QUIZ_ACTIVE_MINUTES = int(os.getenv('AI_TUTOR_QUIZ_ACTIVE_MINUTES', '60'))
 
 # Debug Toolbar settings
 INTERNAL_IPS = [
@@ -34,4 +34,14 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 # Security - disable for tests
 SECURE_SSL_REDIRECT = False
 SESSION_COOKIE_SECURE = False
-CSRF_COOKIE_SECURE = False
\ No newline at end of file
+CSRF_COOKIE_SECURE = False
+
+# Index content inline on commit instead of on a background timer
+AI_TUTOR_INDEX_IN_BACKGROUND = False
+
+# Keep rendered QR images out of the project's media directory
+import tempfile
+QR_IMAGE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'learnmore_plus_test_qr_cache')
+QR_PRINT_SHEET_DIR = os.path.join(tempfile.gettempdir(), 'learnmore_plus_test_qr_sheets')
+# Build QR sheets inside the request
+QR_PRINT_IN_BACKGROUND = False